@@ -1,34 +1,23 @@
-import smtplib
-from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 import os
 from typing import List
 import logging
 from datetime import datetime
 
-# Email configuration
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME", "your-email@gmail.com")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "your-app-password")
-FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@universererp.com")
+# Email configuration lives with the outbound queue; every send below only enqueues
+from services.email_templates import compile_template
+from services.email_queue import email_queue, SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, FROM_EMAIL
 
 # Base URL for approval links
 BASE_URL = os.getenv("BASE_URL", "http://localhost:5176")
 
-def create_approval_email_html(
-    approver_name: str,
-    reference_title: str,
-    approval_type: str,
-    approval_url: str,
-    rejection_url: str,
-    description: str = None
-) -> str:
-    """Create HTML email template for approval requests"""
+# Templates are compiled once at import; each create_*_html() only fills in the variables
+MAINTENANCE_CRITICAL_NOTICE = '<div class="urgent"><strong>🚨 Critical Alert:</strong> This maintenance should be addressed immediately to prevent asset failure and ensure operational safety.</div>'
 
-    html = f"""
+def generated_at() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+APPROVAL_EMAIL_TEMPLATE = compile_template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -61,8 +50,8 @@ def create_approval_email_html(
 
                 <div style="background: white; padding: 20px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #667eea;">
                     <h4 style="margin-top: 0; color: #667eea;">{reference_title}</h4>
-                    <p><strong>Type:</strong> {approval_type.replace('_', ' ').title()}</p>
-                    {f"<p><strong>Description:</strong> {description}</p>" if description else ""}
+                    <p><strong>Type:</strong> {approval_type_label}</p>
+                    {description_html}
                 </div>
 
                 <div class="warning">
@@ -93,28 +82,34 @@ def create_approval_email_html(
                 <p>
                     This email was sent by UniverserERP system.<br>
                     If you did not expect this email, please contact your system administrator.<br>
-                    Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+                    Generated on {generated_at}
                 </p>
             </div>
         </div>
     </body>
     </html>
-    """
-
-    return html
+    """, 'approval_request')
 
-def create_capital_call_alert_html(
-    investor_name: str,
-    fund_name: str,
-    call_number: str,
-    called_amount: float,
-    due_date: str,
-    purpose: str,
+def create_approval_email_html(
+    approver_name: str,
+    reference_title: str,
+    approval_type: str,
+    approval_url: str,
+    rejection_url: str,
     description: str = None
 ) -> str:
-    """Create HTML email template for capital call alerts"""
-
-    html = f"""
+    """Create HTML email template for approval requests"""
+    return APPROVAL_EMAIL_TEMPLATE.render(
+        approver_name=approver_name,
+        reference_title=reference_title,
+        approval_type_label=approval_type.replace('_', ' ').title(),
+        approval_url=approval_url,
+        rejection_url=rejection_url,
+        description_html=f"<p><strong>Description:</strong> {description}</p>" if description else "",
+        generated_at=generated_at()
+    )
+
+CAPITAL_CALL_TEMPLATE = compile_template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -153,7 +148,7 @@ def create_capital_call_alert_html(
                     <p><strong>Call Number:</strong> {call_number}</p>
                     <p><strong>Due Date:</strong> {due_date}</p>
                     <p><strong>Purpose:</strong> {purpose}</p>
-                    {"<p><strong>Description:</strong> " + str(description) + "</p>" if description else ""}
+                    {description_html}
                 </div>
 
                 <div class="due-date">
@@ -166,7 +161,7 @@ def create_capital_call_alert_html(
                 </div>
 
                 <div style="text-align: center; margin: 30px 0;">
-                    <a href="{BASE_URL}/investor/payments" style="background: #667eea; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; display: inline-block;">
+                    <a href="{base_url}/investor/payments" style="background: #667eea; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; display: inline-block;">
                         📋 View Payment Instructions
                     </a>
                 </div>
@@ -186,15 +181,34 @@ def create_capital_call_alert_html(
                 <p>
                     This capital call notice was generated by UniverserERP Investment Management System.<br>
                     Please treat this as an official legal document.<br>
-                    Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+                    Generated on {generated_at}
                 </p>
             </div>
         </div>
     </body>
     </html>
-    """
+    """, 'capital_call').bind(base_url=BASE_URL)
 
-    return html
+def create_capital_call_alert_html(
+    investor_name: str,
+    fund_name: str,
+    call_number: str,
+    called_amount: float,
+    due_date: str,
+    purpose: str,
+    description: str = None
+) -> str:
+    """Create HTML email template for capital call alerts"""
+    return CAPITAL_CALL_TEMPLATE.render(
+        investor_name=investor_name,
+        fund_name=fund_name,
+        call_number=call_number,
+        called_amount=called_amount,
+        due_date=due_date,
+        purpose=purpose,
+        description_html="<p><strong>Description:</strong> " + str(description) + "</p>" if description else "",
+        generated_at=generated_at()
+    )
 
 async def send_approval_email(
     requester_email: str,
@@ -222,23 +236,12 @@ async def send_approval_email(
             description=description
         )
 
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"Approval Request: {reference_title}"
-        msg['From'] = FROM_EMAIL
-        msg['To'] = approver_email
-
-        # Add HTML content
-        msg.attach(MIMEText(html_content, 'html'))
-
-        # Send email (implement actual SMTP sending)
-        print(f"Sending approval email to {approver_email}")
+        # Queue for delivery by the email workers
+        await email_queue.enqueue(approver_email, f"Approval Request: {reference_title}", html_content, category='approval')
+        print(f"Queued approval email to {approver_email}")
         print(f"Approval URL: {approval_url}")
         print(f"Rejection URL: {rejection_url}")
 
-        # TODO: Implement actual SMTP sending
-        # await send_smtp_email(msg)
-
         return True
 
     except Exception as e:
@@ -248,36 +251,26 @@ async def send_approval_email(
 async def send_capital_call_alerts(capital_call: dict, investor_emails: List[str]):
     """Send capital call alerts to all investors"""
     try:
-        for email in investor_emails:
-            # Find investor details
-            investor_name = "Valued Investor"  # Get from investor data
-
-            html_content = create_capital_call_alert_html(
-                investor_name=investor_name,
-                fund_name=capital_call["fund_name"],
-                call_number=capital_call["call_number"],
-                called_amount=capital_call["called_amount"],
-                due_date=capital_call["due_date"],
-                purpose=capital_call["purpose"],
-                description=capital_call.get("description")
-            )
-
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"Capital Call Notice - {capital_call['fund_name']} ({capital_call['call_number']})"
-            msg['From'] = FROM_EMAIL
-            msg['To'] = email
-
-            # Add HTML content
-            msg.attach(MIMEText(html_content, 'html'))
-
-            # Send email
-            print(f"Sending capital call alert to {email}")
-            print(f"Fund: {capital_call['fund_name']}")
-            print(f"Amount: ${capital_call['called_amount']}")
+        # Find investor details
+        investor_name = "Valued Investor"  # Get from investor data
+
+        # Every investor gets the same notice, so render it once
+        html_content = create_capital_call_alert_html(
+            investor_name=investor_name,
+            fund_name=capital_call["fund_name"],
+            call_number=capital_call["call_number"],
+            called_amount=capital_call["called_amount"],
+            due_date=capital_call["due_date"],
+            purpose=capital_call["purpose"],
+            description=capital_call.get("description")
+        )
+        subject = f"Capital Call Notice - {capital_call['fund_name']} ({capital_call['call_number']})"
 
-            # TODO: Implement actual SMTP sending
-            # await send_smtp_email(msg)
+        # One shared body for every investor
+        await email_queue.enqueue_shared(investor_emails, subject, html_content, category='capital_call')
+        print(f"Queued capital call alerts to {len(investor_emails)} investors")
+        print(f"Fund: {capital_call['fund_name']}")
+        print(f"Amount: ${capital_call['called_amount']}")
 
         return True
 
@@ -286,47 +279,20 @@ async def send_capital_call_alerts(capital_call: dict, investor_emails: List[str
         return False
 
 async def send_smtp_email(msg: MIMEMultipart):
-    """Send email via SMTP (implement with actual credentials)"""
+    """Queue a prepared message for delivery through the pooled SMTP workers"""
     try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-
-        text = msg.as_string()
-        server.sendmail(FROM_EMAIL, msg['To'], text)
-        server.quit()
+        if not msg['From']:
+            msg['From'] = FROM_EMAIL
+        await email_queue.enqueue_mime(msg)
 
-        print(f"Email sent successfully to {msg['To']}")
+        print(f"Email queued for {msg['To']}")
         return True
 
     except Exception as e:
         logging.error(f"Failed to send email: {str(e)}")
         return False
 
-def create_maintenance_alert_html(
-    recipient_name: str,
-    asset_name: str,
-    alert_type: str,
-    severity: str,
-    title: str,
-    description: str,
-    predicted_date: str,
-    recommended_action: str,
-    estimated_cost: float = None
-) -> str:
-    """Create HTML email template for maintenance alerts"""
-
-    # Color coding based on severity
-    severity_colors = {
-        'low': '#28a745',
-        'medium': '#ffc107',
-        'high': '#fd7e14',
-        'critical': '#dc3545'
-    }
-
-    severity_color = severity_colors.get(severity.lower(), '#6c757d')
-
-    html = f"""
+MAINTENANCE_ALERT_TEMPLATE = compile_template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -361,23 +327,23 @@ def create_maintenance_alert_html(
                 <div class="alert-card">
                     <div style="display: flex; justify-content: between; align-items: center; margin-bottom: 15px;">
                         <h4 style="margin: 0; color: #667eea;">{title}</h4>
-                        <span class="severity-badge">{severity.upper()}</span>
+                        <span class="severity-badge">{severity_label}</span>
                     </div>
 
                     <p><strong>Asset:</strong> {asset_name}</p>
-                    <p><strong>Alert Type:</strong> {alert_type.replace('_', ' ').title()}</p>
+                    <p><strong>Alert Type:</strong> {alert_type_label}</p>
                     <p><strong>Description:</strong> {description}</p>
                     <p><strong>Predicted Date:</strong> {predicted_date}</p>
 
-                    {f"<div class='cost-info'><strong>Estimated Cost:</strong> ${estimated_cost:,.2f}</div>" if estimated_cost else ""}
+                    {cost_html}
 
                     <p><strong>Recommended Action:</strong> {recommended_action}</p>
                 </div>
 
-                {f'<div class="urgent"><strong>🚨 Critical Alert:</strong> This maintenance should be addressed immediately to prevent asset failure and ensure operational safety.</div>' if severity.lower() == 'critical' else ''}
+                {critical_html}
 
                 <div style="text-align: center; margin: 30px 0;">
-                    <a href="{BASE_URL}/maintenance/alerts" class="action-button">
+                    <a href="{base_url}/maintenance/alerts" class="action-button">
                         📋 View All Maintenance Alerts
                     </a>
                 </div>
@@ -404,15 +370,48 @@ def create_maintenance_alert_html(
                 <p>
                     This maintenance alert was generated by UniverserERP Predictive Maintenance System.<br>
                     For questions, please contact your fleet manager or maintenance team.<br>
-                    Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+                    Generated on {generated_at}
                 </p>
             </div>
         </div>
     </body>
     </html>
-    """
+    """, 'maintenance_alert').bind(base_url=BASE_URL)
 
-    return html
+# Color coding based on severity
+SEVERITY_COLORS = {
+    'low': '#28a745',
+    'medium': '#ffc107',
+    'high': '#fd7e14',
+    'critical': '#dc3545'
+}
+
+def create_maintenance_alert_html(
+    recipient_name: str,
+    asset_name: str,
+    alert_type: str,
+    severity: str,
+    title: str,
+    description: str,
+    predicted_date: str,
+    recommended_action: str,
+    estimated_cost: float = None
+) -> str:
+    """Create HTML email template for maintenance alerts"""
+    return MAINTENANCE_ALERT_TEMPLATE.render(
+        recipient_name=recipient_name,
+        asset_name=asset_name,
+        alert_type_label=alert_type.replace('_', ' ').title(),
+        severity_color=SEVERITY_COLORS.get(severity.lower(), '#6c757d'),
+        severity_label=severity.upper(),
+        title=title,
+        description=description,
+        predicted_date=predicted_date,
+        recommended_action=recommended_action,
+        cost_html=f"<div class='cost-info'><strong>Estimated Cost:</strong> ${estimated_cost:,.2f}</div>" if estimated_cost else "",
+        critical_html=MAINTENANCE_CRITICAL_NOTICE if severity.lower() == 'critical' else '',
+        generated_at=generated_at()
+    )
 
 async def send_maintenance_alert_email(
     recipient_email: str,
@@ -453,42 +452,60 @@ async def send_maintenance_alert_email(
             estimated_cost=estimated_cost
         )
 
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🚨 Maintenance Alert: {title}"
-        msg['From'] = FROM_EMAIL
-        msg['To'] = recipient_email
-
-        # Add HTML content
-        msg.attach(MIMEText(html_content, 'html'))
-
-        # Send email (implement actual SMTP sending)
-        print(f"Sending maintenance alert email to {recipient_email}")
+        # Queue for delivery by the email workers
+        await email_queue.enqueue(recipient_email, f"🚨 Maintenance Alert: {title}", html_content, category='maintenance_alert')
+        print(f"Queued maintenance alert email to {recipient_email}")
         print(f"Alert: {title}")
         print(f"Asset: {asset_name}")
         print(f"Severity: {severity}")
 
-        # TODO: Implement actual SMTP sending
-        # await send_smtp_email(msg)
-
         return True
 
     except Exception as e:
         logging.error(f"Failed to send maintenance alert email: {str(e)}")
         return False
 
-def create_payroll_journal_notification_html(
-    recipient_name: str,
-    batch_number: str,
-    total_amount: float,
-    total_entries: int,
-    period_name: str,
-    posted_by: str,
-    journal_entries: List[dict] = None
-) -> str:
-    """Create HTML email template for payroll journal notifications"""
+async def send_maintenance_alert_emails(
+    alerts: List['PredictiveMaintenanceAlert'],
+    recipient_emails: List[str],
+    recipient_name: str = "Fleet Manager"
+) -> int:
+    """Queue every alert for every recipient, one shared body per alert; returns the number of emails queued"""
+    mailings = []
+    for alert in alerts:
+        try:
+            html_content = create_maintenance_alert_html(
+                recipient_name=recipient_name,
+                asset_name=alert.assetName,
+                alert_type=alert.alertType,
+                severity=alert.severity,
+                title=alert.title,
+                description=alert.description,
+                predicted_date=alert.predictedFailureDate,
+                recommended_action=alert.recommendedAction,
+                estimated_cost=alert.estimatedCost
+            )
+        except Exception as e:
+            logging.error(f"Failed to render maintenance alert email: {str(e)}")
+            continue
+        # Every recipient of an alert shares its body
+        mailings.append({
+            'recipients': recipient_emails,
+            'subject': f"🚨 Maintenance Alert: {alert.title}",
+            'html': html_content,
+            'category': 'maintenance_alert'
+        })
 
-    html = f"""
+    try:
+        queued = len(await email_queue.enqueue_shared_many(mailings))
+    except Exception as e:
+        logging.error(f"Failed to queue maintenance alert emails: {str(e)}")
+        return 0
+
+    print(f"Queued {queued} maintenance alert emails ({len(mailings)} alerts x {len(recipient_emails)} recipients)")
+    return queued
+
+PAYROLL_JOURNAL_TEMPLATE = compile_template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -552,31 +569,7 @@ def create_payroll_journal_notification_html(
                     Total Payroll Amount: ${total_amount:,.2f}
                 </div>
 
-                {f'''
-                <div style="background: white; padding: 20px; border-radius: 5px; margin: 20px 0;">
-                    <h4 style="margin-top: 0; color: #667eea;">Journal Entries Created</h4>
-                    <table class="detail-table">
-                        <thead>
-                            <tr>
-                                <th>Entry #</th>
-                                <th>Description</th>
-                                <th>Debit</th>
-                                <th>Credit</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                ''' + ''.join(f'''
-                            <tr>
-                                <td>{entry.get('entryNumber', 'N/A')}</td>
-                                <td>{entry.get('description', 'N/A')}</td>
-                                <td>${entry.get('totalDebit', 0):,.2f}</td>
-                                <td>${entry.get('totalCredit', 0):,.2f}</td>
-                            </tr>
-                ''' for entry in (journal_entries or [])) + '''
-                        </tbody>
-                    </table>
-                </div>
-                ''' if journal_entries else ''}
+                {journal_table_html}
 
                 <p>
                     <strong>What happens next?</strong><br>
@@ -588,7 +581,7 @@ def create_payroll_journal_notification_html(
                 </p>
 
                 <div style="text-align: center; margin: 30px 0;">
-                    <a href="{BASE_URL}/accounting/journals" style="background: #667eea; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; display: inline-block;">
+                    <a href="{base_url}/accounting/journals" style="background: #667eea; color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; display: inline-block;">
                         📊 View Journal Entries
                     </a>
                 </div>
@@ -603,15 +596,74 @@ def create_payroll_journal_notification_html(
                 <p>
                     This payroll journal notification was generated by UniverserERP Accounting System.<br>
                     For questions, please contact your accounting department.<br>
-                    Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+                    Generated on {generated_at}
                 </p>
             </div>
         </div>
     </body>
     </html>
-    """
+    """, 'payroll_journal').bind(base_url=BASE_URL)
+
+PAYROLL_JOURNAL_TABLE_TEMPLATE = compile_template("""
+                <div style="background: white; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <h4 style="margin-top: 0; color: #667eea;">Journal Entries Created</h4>
+                    <table class="detail-table">
+                        <thead>
+                            <tr>
+                                <th>Entry #</th>
+                                <th>Description</th>
+                                <th>Debit</th>
+                                <th>Credit</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+                {rows_html}
+                        </tbody>
+                    </table>
+                </div>
+                """, 'payroll_journal_table')
 
-    return html
+PAYROLL_JOURNAL_ROW_TEMPLATE = compile_template("""
+                            <tr>
+                                <td>{entry_number}</td>
+                                <td>{description}</td>
+                                <td>${total_debit:,.2f}</td>
+                                <td>${total_credit:,.2f}</td>
+                            </tr>
+                """, 'payroll_journal_row')
+
+def create_payroll_journal_notification_html(
+    recipient_name: str,
+    batch_number: str,
+    total_amount: float,
+    total_entries: int,
+    period_name: str,
+    posted_by: str,
+    journal_entries: List[dict] = None
+) -> str:
+    """Create HTML email template for payroll journal notifications"""
+    journal_table_html = ''
+    if journal_entries:
+        journal_table_html = PAYROLL_JOURNAL_TABLE_TEMPLATE.render(rows_html=''.join(
+            PAYROLL_JOURNAL_ROW_TEMPLATE.render(
+                entry_number=entry.get('entryNumber', 'N/A'),
+                description=entry.get('description', 'N/A'),
+                total_debit=entry.get('totalDebit', 0),
+                total_credit=entry.get('totalCredit', 0)
+            )
+            for entry in journal_entries
+        ))
+
+    return PAYROLL_JOURNAL_TEMPLATE.render(
+        recipient_name=recipient_name,
+        batch_number=batch_number,
+        total_amount=total_amount,
+        total_entries=total_entries,
+        period_name=period_name,
+        posted_by=posted_by,
+        journal_table_html=journal_table_html,
+        generated_at=generated_at()
+    )
 
 async def send_payroll_journal_notification(
     recipient_email: str,
@@ -645,23 +697,12 @@ async def send_payroll_journal_notification(
             journal_entries=journal_entries
         )
 
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"✅ Payroll Journal Posted - {batch_number}"
-        msg['From'] = FROM_EMAIL
-        msg['To'] = recipient_email
-
-        # Add HTML content
-        msg.attach(MIMEText(html_content, 'html'))
-
-        # Send email (implement actual SMTP sending)
-        print(f"Sending payroll journal notification to {recipient_email}")
+        # Queue for delivery by the email workers
+        await email_queue.enqueue(recipient_email, f"✅ Payroll Journal Posted - {batch_number}", html_content, category='payroll_journal')
+        print(f"Queued payroll journal notification to {recipient_email}")
         print(f"Batch: {batch_number}")
         print(f"Amount: ${total_amount}")
 
-        # TODO: Implement actual SMTP sending
-        # await send_smtp_email(msg)
-
         return True
 
     except Exception as e:
@@ -32,6 +32,17 @@ from routes.automated_payroll_journal_router import router as automated_payroll_
 from routes.chatbot_router import router as chatbot_router
 from routes.ai_service_router import router as ai_service_router
 from routes.settings_router import router as settings_router
+from routes.scheduler_router import router as scheduler_router
+from routes.email_queue_router import router as email_queue_router
+from routes.database_router import router as database_router
+from services.ollama_client import ollama_client
+from services.document_extraction import document_extraction_engine
+from services.maintenance_alert_service import maintenance_alert_service
+from services.job_scheduler import job_scheduler, SCHEDULER_ENABLED
+from services.scheduled_jobs import register_default_jobs
+from services.email_queue import email_queue, EMAIL_QUEUE_WORKERS
+from services.approval_store import approval_store
+from services.index_registry import index_registry
 
 app = FastAPI()
 
@@ -49,6 +60,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(abroad_staff_router, prefix="/api/abroad-staff", tags=["abroad_staff"])
@@ -80,6 +92,32 @@ app.include_router(automated_payroll_journal_router, prefix="/api/automated-payr
 app.include_router(chatbot_router, prefix="/api/chatbot", tags=["chatbot"])
 app.include_router(ai_service_router, prefix="/api/ai", tags=["ai_service"])
 app.include_router(settings_router, prefix="/api/settings", tags=["settings"])
+app.include_router(scheduler_router, prefix="/api/scheduler", tags=["scheduler"])
+app.include_router(email_queue_router, prefix="/api/email-queue", tags=["email_queue"])
+app.include_router(database_router, prefix="/api/database", tags=["database"])
+
+register_default_jobs(job_scheduler)
+
+@app.on_event("startup")
+async def startup():
+    # Indexes declared by the routers and services; large collections build in the background
+    await approval_store.normalize_legacy()
+    await index_registry.enable_profiler()
+    await index_registry.ensure_all()
+    # Periodic sweeps run in-process only when enabled; otherwise run worker.py
+    if SCHEDULER_ENABLED:
+        await job_scheduler.start()
+    # Outbound email delivery; EMAIL_QUEUE_WORKERS=0 leaves it to worker.py
+    await email_queue.start(EMAIL_QUEUE_WORKERS)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_scheduler.stop()
+    await email_queue.stop()
+    await index_registry.stop()
+    await ollama_client.aclose()
+    document_extraction_engine.shutdown()
+    maintenance_alert_service.shutdown()
 
 @app.get("/weather")
 async def get_weather(
@@ -0,0 +1,2017 @@
+"""
+In-memory MongoDB engine.
+
+``database.py`` uses it when ``MONGO_URI`` is ``memory://`` (or when no Motor
+client can be created), so dashboards, sweeps and services can be benchmarked
+and tested offline against a deterministic backend. It implements the part of
+the Motor API this codebase uses, with MongoDB semantics:
+
+- queries: ``$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin``, ``$exists``, ``$type``,
+  ``$regex``, ``$size``, ``$all``, ``$elemMatch``, ``$not``,
+  ``$and/$or/$nor`` and ``$expr``; dotted paths reach into embedded documents
+  and arrays, and comparisons only match values of the same BSON type bracket;
+- a ``collation`` on ``find``, ``count_documents``, ``distinct`` and indexes,
+  where strength 2 compares strings case-insensitively and strength 1 also
+  ignores accents;
+- updates: ``$set/$unset/$setOnInsert/$inc/$mul/$min/$max/$push/$addToSet/
+  $pull/$pop/$rename/$currentDate``, update pipelines and upserts;
+- aggregation: ``$match/$group/$sort/$limit/$skip/$project/$addFields/$set/
+  $unset/$unwind/$count/$facet/$lookup/$replaceRoot`` and the expression
+  operators our pipelines use;
+- cursors with ``sort/skip/limit/batch_size/to_list/explain``, ``bulk_write``,
+  ``find_one_and_*`` and pymongo result and error types;
+- ``start_session()`` and ``start_transaction()`` so transactional code paths
+  run, but without transactions: writes apply immediately and an aborted
+  transaction is not rolled back.
+
+Secondary indexes are real: every index keeps a hash of its leading field's
+values for equality and ``$in`` lookups and a sorted list of them for range
+queries, so indexed queries only visit matching documents. Unique indexes
+raise ``DuplicateKeyError``, TTL indexes expire documents, ``explain()``
+reports IXSCAN or COLLSCAN and ``serverStatus`` counts collection scans, which
+is what the index registry reports on.
+
+Documents are encoded on the way in (datetimes are stored as naive UTC with
+millisecond precision, str subclasses such as str enums as plain strings,
+unencodable values raise ``InvalidDocument``) and
+copied on the way out, so callers never share state with the store. Every
+operation completes without yielding to the event loop, which makes each one
+atomic like a single-document operation on the server.
+"""
+
+import re
+import copy
+import time
+import uuid
+import unicodedata
+import bisect
+import logging
+from datetime import datetime, date, timedelta, timezone
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId, Decimal128, Int64, Binary, Regex, Timestamp
+from bson.errors import InvalidDocument
+from pymongo import IndexModel, MongoClient, ReturnDocument
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, DuplicateKeyError, InvalidOperation, OperationFailure, WriteError
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between TTL sweeps, as on the server
+TTL_MONITOR_INTERVAL = 60
+DUPLICATE_KEY_ERROR = 11000
+INT64_MAX = 2 ** 63 - 1
+
+_MISSING = object()
+
+# ---------------- BSON values ----------------
+
+_SCALARS = (str, bytes, ObjectId, Decimal128, Int64, Binary, Regex, Timestamp, uuid.UUID, re.Pattern)
+
+
+def _encode(value: Any) -> Any:
+    """A stored copy of ``value``, as the server would hand it back"""
+    if value is None or isinstance(value, (bool, float)):
+        return value
+    if isinstance(value, int):
+        if abs(value) > INT64_MAX:
+            raise OverflowError("MongoDB can only handle up to 8-byte ints")
+        return int(value)
+    if isinstance(value, str) and type(value) is not str:
+        # str subclasses such as str enums are stored as their plain value, as BSON does
+        return str.__str__(value)
+    if isinstance(value, _SCALARS):
+        return value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise InvalidDocument(f"documents must have only string keys, key was {key!r}")
+            encoded[key] = _encode(item)
+        return encoded
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    raise InvalidDocument(f"cannot encode object: {value!r}, of type: {type(value)!r}")
+
+
+def _type_rank(value: Any) -> int:
+    # BSON comparison order
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float, Decimal128)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, (bytes, Binary, uuid.UUID)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, (datetime, date)):
+        return 9
+    if isinstance(value, Timestamp):
+        return 10
+    if isinstance(value, (re.Pattern, Regex)):
+        return 11
+    return 12
+
+
+def sort_key(value: Any) -> Tuple:
+    """A hashable key that orders values like MongoDB does"""
+    rank = _type_rank(value)
+    if rank == 1:
+        return (1, 0)
+    if rank == 2:
+        return (2, float(value.to_decimal()) if isinstance(value, Decimal128) else value)
+    if rank == 3:
+        return (3, value)
+    if rank == 4:
+        return (4, tuple((key, sort_key(item)) for key, item in value.items()))
+    if rank == 5:
+        return (5, tuple(sort_key(item) for item in value))
+    if rank == 6:
+        return (6, value.bytes if isinstance(value, uuid.UUID) else bytes(value))
+    if rank == 7:
+        return (7, value.binary)
+    if rank == 8:
+        return (8, int(value))
+    if rank == 9:
+        if not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day)
+        return (9, value)
+    if rank == 10:
+        return (10, (value.time, value.inc))
+    if rank == 11:
+        return (11, value.pattern)
+    return (12, str(value))
+
+
+def _collate(value: Any, collation: Optional[Dict[str, Any]]) -> Any:
+    """What a string compares as under a collation; other values and the simple collation compare as they are"""
+    if not collation or not isinstance(value, str) or collation.get('locale', 'simple') == 'simple':
+        return value
+    strength = collation.get('strength', 3)
+    if strength <= 2:
+        value = value.casefold()
+    if strength == 1:
+        value = ''.join(char for char in unicodedata.normalize('NFD', value) if not unicodedata.combining(char))
+    return value
+
+
+def _collation_key(collation: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+    """Collations that compare strings the same way share a key; the simple collation is None"""
+    if not collation or collation.get('locale', 'simple') == 'simple':
+        return None
+    return collation['locale'], collation.get('strength', 3)
+
+
+def _equal(a: Any, b: Any, collation: Optional[Dict[str, Any]] = None) -> bool:
+    return sort_key(_collate(a, collation)) == sort_key(_collate(b, collation))
+
+
+def _compare(a: Any, b: Any, collation: Optional[Dict[str, Any]] = None) -> int:
+    ka, kb = sort_key(_collate(a, collation)), sort_key(_collate(b, collation))
+    return (ka > kb) - (ka < kb)
+
+
+# ---------------- paths ----------------
+
+def _lookup(value: Any, parts: List[str]) -> List[Any]:
+    """Values at a dotted path for query matching; arrays of documents fan out"""
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        if parts[0] in value:
+            return _lookup(value[parts[0]], parts[1:])
+        return []
+    if isinstance(value, list):
+        if parts[0].isdigit():
+            index = int(parts[0])
+            found = _lookup(value[index], parts[1:]) if index < len(value) else []
+        else:
+            found = []
+        for item in value:
+            if isinstance(item, (dict, list)):
+                found.extend(_lookup(item, parts))
+        return found
+    return []
+
+
+def resolve(doc: Dict[str, Any], path: str) -> List[Any]:
+    if '.' not in path:
+        return [doc[path]] if path in doc else []
+    return _lookup(doc, path.split('.'))
+
+
+def _expand(values: List[Any]) -> Iterable[Any]:
+    # A field matches when its value or any element of its array value matches
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def get_field(doc: Any, path: str) -> Any:
+    """Value at a dotted path for aggregation: arrays of documents map to arrays of values"""
+    value = doc
+    for part in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            value = [item.get(part) for item in value if isinstance(item, dict) and part in item]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def set_field(doc: Dict[str, Any], path: str, value: Any):
+    parts = path.split('.')
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            index = int(part)
+            while len(target) <= index:
+                target.append(None)
+            if not isinstance(target[index], (dict, list)):
+                target[index] = {}
+            target = target[index]
+            continue
+        if not isinstance(target, dict):
+            raise WriteError(f"Cannot create field '{part}' in element {target!r}", code=28)
+        if not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    last = parts[-1]
+    if isinstance(target, list) and last.isdigit():
+        index = int(last)
+        while len(target) <= index:
+            target.append(None)
+        target[index] = value
+    elif isinstance(target, dict):
+        target[last] = value
+    else:
+        raise WriteError(f"Cannot create field '{last}' in element {target!r}", code=28)
+
+
+def unset_field(doc: Dict[str, Any], path: str):
+    parts = path.split('.')
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, dict):
+            target = target.get(part)
+        elif isinstance(target, list) and part.isdigit() and int(part) < len(target):
+            target = target[int(part)]
+        else:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+    elif isinstance(target, list) and parts[-1].isdigit() and int(parts[-1]) < len(target):
+        target[int(parts[-1])] = None
+
+
+# ---------------- query matching ----------------
+
+_TYPE_ALIASES = {
+    'double': 1, 'string': 2, 'object': 3, 'array': 4, 'binData': 5, 'objectId': 7, 'bool': 8,
+    'date': 9, 'null': 10, 'regex': 11, 'int': 16, 'timestamp': 17, 'long': 18, 'decimal': 19
+}
+
+
+def _bson_type(value: Any) -> int:
+    if value is None:
+        return 10
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, Int64):
+        return 18
+    if isinstance(value, int):
+        return 16 if -2 ** 31 <= value < 2 ** 31 else 18
+    if isinstance(value, float):
+        return 1
+    if isinstance(value, Decimal128):
+        return 19
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, (bytes, Binary, uuid.UUID)):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    if isinstance(value, (re.Pattern, Regex)):
+        return 11
+    if isinstance(value, Timestamp):
+        return 17
+    return -1
+
+
+def _type_matches(value: Any, wanted: Any) -> bool:
+    if wanted == 'number':
+        return _bson_type(value) in (1, 16, 18, 19)
+    code = _TYPE_ALIASES.get(wanted, wanted)
+    return _bson_type(value) == code
+
+
+def _regex(pattern: Any, options: str = '') -> re.Pattern:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    if isinstance(pattern, Regex):
+        return pattern.try_compile()
+    flags = 0
+    for option in options or '':
+        flags |= {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _is_operator_dict(cond: Any) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(key.startswith('$') for key in cond)
+
+
+def _match_op(values: List[Any], op: str, arg: Any, cond: Optional[Dict[str, Any]] = None,
+              collation: Optional[Dict[str, Any]] = None) -> bool:
+    if op == '$eq':
+        if isinstance(arg, (re.Pattern, Regex)):
+            pattern = _regex(arg)
+            return any(isinstance(value, str) and pattern.search(value) for value in _expand(values))
+        if arg is None:
+            return not values or any(value is None for value in _expand(values))
+        return any(_equal(value, arg, collation) for value in _expand(values))
+    if op == '$ne':
+        return not _match_op(values, '$eq', arg, collation=collation)
+    if op in ('$gt', '$gte', '$lt', '$lte'):
+        rank = _type_rank(arg)
+        for value in _expand(values):
+            if _type_rank(value) != rank:
+                continue
+            result = _compare(value, arg, collation)
+            if (op == '$gt' and result > 0) or (op == '$gte' and result >= 0) \
+                    or (op == '$lt' and result < 0) or (op == '$lte' and result <= 0):
+                return True
+        return False
+    if op == '$in':
+        if not isinstance(arg, list):
+            raise OperationFailure("$in needs an array", code=2)
+        return any(_match_op(values, '$eq', item, collation=collation) for item in arg)
+    if op == '$nin':
+        if not isinstance(arg, list):
+            raise OperationFailure("$nin needs an array", code=2)
+        return not _match_op(values, '$in', arg, collation=collation)
+    if op == '$exists':
+        return bool(values) == bool(arg)
+    if op == '$type':
+        wanted = arg if isinstance(arg, list) else [arg]
+        return any(_type_matches(value, t) for value in _expand(values) for t in wanted)
+    if op == '$regex':
+        pattern = _regex(arg, (cond or {}).get('$options', ''))
+        return any(isinstance(value, str) and pattern.search(value) for value in _expand(values))
+    if op == '$options':
+        return True
+    if op == '$size':
+        return any(isinstance(value, list) and len(value) == arg for value in values)
+    if op == '$all':
+        return all(_match_op(values, '$eq', item, collation=collation) for item in arg)
+    if op == '$elemMatch':
+        for value in values:
+            if not isinstance(value, list):
+                continue
+            for element in value:
+                if _is_operator_dict(arg) and not any(key in ('$and', '$or', '$nor') for key in arg):
+                    if all(_match_op([element], sub_op, sub_arg, arg, collation) for sub_op, sub_arg in arg.items()):
+                        return True
+                elif isinstance(element, dict) and matches(element, arg, collation):
+                    return True
+        return False
+    if op == '$not':
+        if isinstance(arg, (re.Pattern, Regex)):
+            return not _match_op(values, '$eq', arg)
+        return not all(_match_op(values, sub_op, sub_arg, arg, collation) for sub_op, sub_arg in arg.items())
+    if op == '$mod':
+        divisor, remainder = arg
+        return any(_type_rank(value) == 2 and int(value) % divisor == remainder for value in _expand(values))
+    raise OperationFailure(f"unknown operator: {op}", code=2)
+
+
+def _match_field(doc: Dict[str, Any], path: str, cond: Any, collation: Optional[Dict[str, Any]] = None) -> bool:
+    values = resolve(doc, path)
+    if _is_operator_dict(cond):
+        return all(_match_op(values, op, arg, cond, collation) for op, arg in cond.items())
+    return _match_op(values, '$eq', cond, collation=collation)
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]], collation: Optional[Dict[str, Any]] = None) -> bool:
+    """Whether a document matches a MongoDB query filter (comparing strings under a collation)"""
+    if not query:
+        return True
+    for key, cond in query.items():
+        if key == '$and':
+            if not all(matches(doc, sub, collation) for sub in cond):
+                return False
+        elif key == '$or':
+            if not any(matches(doc, sub, collation) for sub in cond):
+                return False
+        elif key == '$nor':
+            if any(matches(doc, sub, collation) for sub in cond):
+                return False
+        elif key == '$expr':
+            if not _truthy(evaluate(cond, doc)):
+                return False
+        elif key == '$comment':
+            continue
+        elif key.startswith('$'):
+            raise OperationFailure(f"unknown top level operator: {key}", code=2)
+        elif not _match_field(doc, key, cond, collation):
+            return False
+    return True
+
+
+# ---------------- aggregation expressions ----------------
+
+def _truthy(value: Any) -> bool:
+    if value is _MISSING or value is None or value is False:
+        return False
+    if isinstance(value, (int, float)):
+        return value != 0
+    return True
+
+
+def _value(value: Any) -> Any:
+    return None if value is _MISSING else value
+
+
+def _to_date(value: Any) -> Any:
+    value = _value(value)
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, ObjectId):
+        return value.generation_time.replace(tzinfo=None)
+    if isinstance(value, str):
+        return _parse_date(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime(1970, 1, 1) + timedelta(milliseconds=value)
+    raise OperationFailure(f"can't convert from BSON type {type(value).__name__} to Date", code=241)
+
+
+def _parse_date(text: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise OperationFailure(f"Error parsing date string '{text}'", code=241)
+    return _encode(parsed)
+
+
+def _date_to_string(value: datetime, fmt: str) -> str:
+    out = []
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%' and i + 1 < len(fmt):
+            spec = fmt[i + 1]
+            if spec == 'L':
+                out.append(f"{value.microsecond // 1000:03d}")
+            elif spec == '%':
+                out.append('%')
+            elif spec in 'YmdHMSjwUu':
+                out.append(value.strftime(f'%{spec}') if spec not in 'wu' else str(value.isoweekday() % 7 + 1 if spec == 'w' else value.isoweekday()))
+            else:
+                raise OperationFailure(f"Invalid format character '%{spec}' in format string", code=18536)
+            i += 2
+        else:
+            out.append(fmt[i])
+            i += 1
+    return ''.join(out)
+
+
+def _numbers(values: Iterable[Any]) -> List[Any]:
+    return [value for value in values if _type_rank(value) == 2 and not isinstance(value, bool)]
+
+
+def _arith(op: str, args: List[Any]) -> Any:
+    args = [_value(arg) for arg in args]
+    if any(arg is None for arg in args):
+        return None
+    if op == '$add':
+        dates = [arg for arg in args if isinstance(arg, datetime)]
+        total = sum(arg for arg in args if not isinstance(arg, datetime))
+        return dates[0] + timedelta(milliseconds=total) if dates else total
+    if op == '$subtract':
+        a, b = args
+        if isinstance(a, datetime) and isinstance(b, datetime):
+            return int((a - b).total_seconds() * 1000)
+        if isinstance(a, datetime):
+            return a - timedelta(milliseconds=b)
+        return a - b
+    if op == '$multiply':
+        result = 1
+        for arg in args:
+            result *= arg
+        return result
+    if op == '$divide':
+        a, b = args
+        if b == 0:
+            raise OperationFailure("can't $divide by zero", code=2)
+        return a / b
+    if op == '$mod':
+        a, b = args
+        return a % b
+
+
+_DATE_PARTS = {
+    '$year': lambda d: d.year,
+    '$month': lambda d: d.month,
+    '$dayOfMonth': lambda d: d.day,
+    '$hour': lambda d: d.hour,
+    '$minute': lambda d: d.minute,
+    '$second': lambda d: d.second,
+    '$millisecond': lambda d: d.microsecond // 1000,
+    '$dayOfYear': lambda d: d.timetuple().tm_yday,
+    '$dayOfWeek': lambda d: d.isoweekday() % 7 + 1,
+    '$week': lambda d: int(d.strftime('%U'))
+}
+
+
+def evaluate(expr: Any, doc: Any, variables: Optional[Dict[str, Any]] = None) -> Any:
+    """Evaluate an aggregation expression against a document (missing fields give _MISSING)"""
+    if isinstance(expr, str):
+        if expr.startswith('$$'):
+            name, _, rest = expr[2:].partition('.')
+            if name in ('ROOT', 'CURRENT'):
+                base = doc
+            elif name == 'NOW':
+                base = _encode(datetime.utcnow())
+            elif variables and name in variables:
+                base = variables[name]
+            else:
+                raise OperationFailure(f"Use of undefined variable: {name}", code=17276)
+            return get_field(base, rest) if rest else base
+        if expr.startswith('$'):
+            return get_field(doc, expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [_value(evaluate(item, doc, variables)) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith('$'):
+        result = {}
+        for key, item in expr.items():
+            value = evaluate(item, doc, variables)
+            if value is not _MISSING:
+                result[key] = value
+        return result
+
+    op, arg = next(iter(expr.items()))
+    if op == '$literal':
+        return arg
+
+    def ev(item):
+        return evaluate(item, doc, variables)
+
+    def args(count_: Optional[int] = None) -> List[Any]:
+        items = arg if isinstance(arg, list) else [arg]
+        if count_ is not None and len(items) != count_:
+            raise OperationFailure(f"Expression {op} takes exactly {count_} arguments. {len(items)} were passed in.", code=16020)
+        return [ev(item) for item in items]
+
+    if op == '$ifNull':
+        items = arg if isinstance(arg, list) else [arg]
+        for item in items[:-1]:
+            value = ev(item)
+            if _value(value) is not None:
+                return value
+        return ev(items[-1])
+    if op == '$cond':
+        if isinstance(arg, dict):
+            condition, then, otherwise = arg['if'], arg['then'], arg['else']
+        else:
+            condition, then, otherwise = arg
+        return ev(then) if _truthy(ev(condition)) else ev(otherwise)
+    if op == '$switch':
+        for branch in arg['branches']:
+            if _truthy(ev(branch['case'])):
+                return ev(branch['then'])
+        if 'default' not in arg:
+            raise OperationFailure("$switch could not find a matching branch for an input", code=40066)
+        return ev(arg['default'])
+    if op in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$cmp'):
+        a, b = (_value(value) for value in args(2))
+        result = _compare(a, b)
+        return {
+            '$eq': result == 0, '$ne': result != 0, '$gt': result > 0, '$gte': result >= 0,
+            '$lt': result < 0, '$lte': result <= 0, '$cmp': result
+        }[op]
+    if op == '$and':
+        return all(_truthy(value) for value in args())
+    if op == '$or':
+        return any(_truthy(value) for value in args())
+    if op == '$not':
+        return not _truthy(args()[0])
+    if op in ('$add', '$subtract', '$multiply', '$divide', '$mod'):
+        return _arith(op, args())
+    if op in ('$abs', '$floor', '$ceil', '$sqrt'):
+        value = _value(args(1)[0])
+        if value is None:
+            return None
+        import math
+        return {'$abs': abs, '$floor': math.floor, '$ceil': math.ceil, '$sqrt': math.sqrt}[op](value)
+    if op == '$round':
+        items = args()
+        value, places = _value(items[0]), (items[1] if len(items) > 1 else 0)
+        return None if value is None else round(value, places) if places else int(round(value))
+    if op in ('$sum', '$avg', '$max', '$min') and not isinstance(arg, list):
+        value = _value(ev(arg))
+        values = value if isinstance(value, list) else [value]
+    elif op in ('$sum', '$avg', '$max', '$min'):
+        values = [_value(value) for value in args()]
+    else:
+        values = None
+    if values is not None:
+        if op == '$sum':
+            return sum(_numbers(values))
+        if op == '$avg':
+            numbers = _numbers(values)
+            return sum(numbers) / len(numbers) if numbers else None
+        present = [value for value in values if value is not None]
+        if not present:
+            return None
+        return (max if op == '$max' else min)(present, key=sort_key)
+    if op == '$size':
+        value = _value(args(1)[0])
+        if not isinstance(value, list):
+            raise OperationFailure("The argument to $size must be an array", code=17124)
+        return len(value)
+    if op == '$slice':
+        items = args()
+        array = _value(items[0])
+        if array is None:
+            return None
+        if len(items) == 2:
+            n = items[1]
+            return array[:n] if n >= 0 else array[n:]
+        position, n = items[1], items[2]
+        return array[position:position + n]
+    if op == '$arrayElemAt':
+        array, index = args(2)
+        array = _value(array)
+        if array is None:
+            return None
+        return array[index] if -len(array) <= index < len(array) else _MISSING
+    if op in ('$first', '$last'):
+        array = _value(args(1)[0])
+        if not array:
+            return _MISSING if array == [] else None
+        return array[0] if op == '$first' else array[-1]
+    if op == '$in':
+        value, array = args(2)
+        return any(_equal(_value(value), item) for item in array)
+    if op == '$concat':
+        items = [_value(value) for value in args()]
+        return None if any(item is None for item in items) else ''.join(items)
+    if op == '$concatArrays':
+        items = [_value(value) for value in args()]
+        return None if any(item is None for item in items) else [x for item in items for x in item]
+    if op in ('$toLower', '$toUpper'):
+        value = _value(args(1)[0])
+        value = '' if value is None else str(value)
+        return value.lower() if op == '$toLower' else value.upper()
+    if op == '$toString':
+        value = _value(args(1)[0])
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, datetime):
+            return _date_to_string(value, '%Y-%m-%dT%H:%M:%S.%LZ')
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+    if op in ('$toInt', '$toLong'):
+        value = _value(args(1)[0])
+        return None if value is None else int(value)
+    if op in ('$toDouble', '$toDecimal'):
+        value = _value(args(1)[0])
+        return None if value is None else float(value)
+    if op == '$toBool':
+        value = _value(args(1)[0])
+        return None if value is None else _truthy(value)
+    if op == '$toObjectId':
+        value = _value(args(1)[0])
+        return None if value is None else ObjectId(value)
+    if op == '$toDate':
+        return _to_date(args(1)[0])
+    if op == '$type':
+        value = args(1)[0]
+        if value is _MISSING:
+            return 'missing'
+        code = _bson_type(value)
+        return next((name for name, number in _TYPE_ALIASES.items() if number == code), 'unknown')
+    if op in _DATE_PARTS:
+        value = _value(ev(arg['date'] if isinstance(arg, dict) else arg))
+        if value is None:
+            return None
+        if not isinstance(value, datetime):
+            raise OperationFailure(f"can't convert from BSON type {type(value).__name__} to Date", code=16006)
+        return _DATE_PARTS[op](value)
+    if op == '$dateToString':
+        value = _value(ev(arg['date']))
+        if value is None:
+            return ev(arg['onNull']) if 'onNull' in arg else None
+        if not isinstance(value, datetime):
+            raise OperationFailure(f"can't convert from BSON type {type(value).__name__} to Date", code=16006)
+        return _date_to_string(value, arg.get('format', '%Y-%m-%dT%H:%M:%S.%LZ'))
+    if op == '$dateFromString':
+        text = _value(ev(arg['dateString']))
+        if text is None:
+            return ev(arg['onNull']) if 'onNull' in arg else None
+        try:
+            return _parse_date(text)
+        except OperationFailure:
+            if 'onError' in arg:
+                return ev(arg['onError'])
+            raise
+    if op == '$mergeObjects':
+        merged = {}
+        for value in args():
+            if isinstance(value, dict):
+                merged.update(value)
+        return merged
+    if op in ('$filter', '$map'):
+        array = _value(ev(arg['input']))
+        if array is None:
+            return None
+        name = arg.get('as', 'this')
+        if op == '$map':
+            return [_value(evaluate(arg['in'], doc, {**(variables or {}), name: item})) for item in array]
+        return [item for item in array if _truthy(evaluate(arg['cond'], doc, {**(variables or {}), name: item}))]
+    raise OperationFailure(f"Unrecognized expression '{op}'", code=168)
+
+
+# ---------------- aggregation pipeline ----------------
+
+_N_ACCUMULATORS = ('$firstN', '$lastN', '$topN', '$bottomN')
+
+
+class _Accumulator:
+    def __init__(self, op: str, expr: Any):
+        if op not in ('$sum', '$avg', '$min', '$max', '$first', '$last', '$push', '$addToSet', '$count') + _N_ACCUMULATORS:
+            raise OperationFailure(f"unknown group operator '{op}'", code=15952)
+        self.op = op
+        self.expr = expr
+        self.values: List[Any] = []
+        self.seen = set()
+        self.first = _MISSING
+
+    def add(self, doc: Dict[str, Any]):
+        if self.op == '$count':
+            self.values.append(1)
+            return
+        if self.op in _N_ACCUMULATORS:
+            output = self.expr['output'] if self.op in ('$topN', '$bottomN') else self.expr['input']
+            self.values.append((doc, _value(evaluate(output, doc))))
+            return
+        value = evaluate(self.expr, doc)
+        if self.op == '$first':
+            if self.first is _MISSING:
+                self.first = _value(value)
+        elif self.op == '$last':
+            self.first = _value(value)
+        elif self.op == '$addToSet':
+            if value is not _MISSING and sort_key(value) not in self.seen:
+                self.seen.add(sort_key(value))
+                self.values.append(value)
+        elif self.op == '$push':
+            if value is not _MISSING:
+                self.values.append(value)
+        else:
+            self.values.append(_value(value))
+
+    def _n_result(self) -> List[Any]:
+        n = self.expr['n']
+        entries = list(self.values)
+        if self.op in ('$topN', '$bottomN'):
+            for field, direction in reversed(list(self.expr['sortBy'].items())):
+                entries.sort(key=lambda entry: sort_key(_value(get_field(entry[0], field))), reverse=direction == -1)
+        outputs = [output for _, output in entries]
+        return outputs[:n] if self.op in ('$firstN', '$topN') else outputs[-n:]
+
+    def result(self) -> Any:
+        if self.op in _N_ACCUMULATORS:
+            return self._n_result()
+        if self.op in ('$first', '$last'):
+            return _value(self.first)
+        if self.op in ('$push', '$addToSet'):
+            return self.values
+        if self.op == '$count':
+            return len(self.values)
+        if self.op == '$sum':
+            return sum(_numbers(self.values))
+        if self.op == '$avg':
+            numbers = _numbers(self.values)
+            return sum(numbers) / len(numbers) if numbers else None
+        present = [value for value in self.values if value is not None]
+        if not present:
+            return None
+        return (max if self.op == '$max' else min)(present, key=sort_key)
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if '_id' not in spec:
+        raise OperationFailure("a group specification must include an _id", code=15955)
+    groups: Dict[Tuple, Tuple[Any, Dict[str, _Accumulator]]] = {}
+    fields = {name: next(iter(acc.items())) for name, acc in spec.items() if name != '_id'}
+    for doc in docs:
+        key = _value(evaluate(spec['_id'], doc))
+        frozen = sort_key(key)
+        if frozen not in groups:
+            groups[frozen] = (key, {name: _Accumulator(op, expr) for name, (op, expr) in fields.items()})
+        for accumulator in groups[frozen][1].values():
+            accumulator.add(doc)
+    return [{'_id': key, **{name: acc.result() for name, acc in accs.items()}} for key, accs in groups.values()]
+
+
+def _project_stage(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    exclusions = [key for key, value in spec.items()
+                  if key != '_id' and not isinstance(value, (dict, str, list)) and not value]
+    if exclusions:
+        return [project(doc, spec) for doc in docs]
+    out = []
+    for doc in docs:
+        result: Dict[str, Any] = {}
+        if spec.get('_id', 1) not in (0, False) and '_id' in doc:
+            result['_id'] = doc['_id'] if not isinstance(spec.get('_id'), (dict, str)) else _value(evaluate(spec['_id'], doc))
+        for key, value in spec.items():
+            if key == '_id':
+                continue
+            if isinstance(value, bool) or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+                _copy_path(doc, result, key.split('.'))
+            else:
+                computed = evaluate(value, doc)
+                if computed is not _MISSING:
+                    set_field(result, key, computed)
+        out.append(result)
+    return out
+
+
+def _unwind(docs: List[Dict[str, Any]], spec: Any) -> List[Dict[str, Any]]:
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    path = spec['path'].lstrip('$')
+    preserve = spec.get('preserveNullAndEmptyArrays', False)
+    index_field = spec.get('includeArrayIndex')
+    out = []
+    for doc in docs:
+        value = get_field(doc, path)
+        if isinstance(value, list) and value:
+            for index, item in enumerate(value):
+                unwound = copy.deepcopy(doc)
+                set_field(unwound, path, item)
+                if index_field:
+                    unwound[index_field] = index
+                out.append(unwound)
+        elif isinstance(value, list) or value is _MISSING or value is None:
+            if preserve:
+                kept = copy.deepcopy(doc)
+                if isinstance(value, list):
+                    unset_field(kept, path)
+                if index_field:
+                    kept[index_field] = None
+                out.append(kept)
+        else:
+            unwound = copy.deepcopy(doc)
+            if index_field:
+                unwound[index_field] = None
+            out.append(unwound)
+    return out
+
+
+def sort_documents(docs: List[Dict[str, Any]], spec: List[Tuple[str, int]], paths: Callable = resolve,
+                   collation: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Stable multi-key sort; array fields sort by their smallest (ascending) or largest (descending) element"""
+    docs = list(docs)
+    for field, direction in reversed(spec):
+        descending = direction in (-1, '-1', 'desc', 'descending')
+
+        def key(doc, field=field, descending=descending):
+            values = list(_expand(paths(doc, field))) if paths is resolve else [_value(paths(doc, field))]
+            values = [value for value in values if not isinstance(value, list)] or values or [None]
+            keys = [sort_key(_collate(value, collation)) for value in values]
+            return max(keys) if descending else min(keys)
+
+        docs.sort(key=key, reverse=descending)
+    return docs
+
+
+def _aggregation_path(doc: Dict[str, Any], path: str) -> Any:
+    return get_field(doc, path)
+
+
+def run_pipeline(database: 'MemoryDatabase', docs: List[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for stage in pipeline:
+        if len(stage) != 1:
+            raise OperationFailure("A pipeline stage specification object must contain exactly one field.", code=40323)
+        name, spec = next(iter(stage.items()))
+        if name == '$match':
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == '$group':
+            docs = _group(docs, spec)
+        elif name == '$sort':
+            docs = sort_documents(docs, list(spec.items()), _aggregation_path)
+        elif name == '$limit':
+            docs = docs[:spec]
+        elif name == '$skip':
+            docs = docs[spec:]
+        elif name == '$project':
+            docs = _project_stage(docs, spec)
+        elif name in ('$addFields', '$set'):
+            updated = []
+            for doc in docs:
+                doc = copy.deepcopy(doc)
+                for key, expr in spec.items():
+                    value = evaluate(expr, doc)
+                    if value is _MISSING:
+                        unset_field(doc, key)
+                    else:
+                        set_field(doc, key, value)
+                updated.append(doc)
+            docs = updated
+        elif name == '$unset':
+            fields = [spec] if isinstance(spec, str) else spec
+            docs = [project(doc, {field: 0 for field in fields}) for doc in docs]
+        elif name == '$unwind':
+            docs = _unwind(docs, spec)
+        elif name == '$count':
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == '$facet':
+            docs = [{key: run_pipeline(database, [copy.deepcopy(doc) for doc in docs], sub) for key, sub in spec.items()}]
+        elif name == '$replaceRoot' or name == '$replaceWith':
+            new_root = spec['newRoot'] if name == '$replaceRoot' else spec
+            docs = [evaluate(new_root, doc) for doc in docs]
+        elif name == '$sortByCount':
+            docs = sort_documents(_group(docs, {'_id': spec, 'count': {'$sum': 1}}), [('count', -1)], _aggregation_path)
+        elif name == '$lookup':
+            foreign = database[spec['from']]._all()
+            joined = []
+            for doc in docs:
+                local = get_field(doc, spec['localField'])
+                local_values = local if isinstance(local, list) else [_value(local)]
+                doc = copy.deepcopy(doc)
+                doc[spec['as']] = [copy.deepcopy(other) for other in foreign
+                                   if any(_match_op(resolve(other, spec['foreignField']), '$eq', value) for value in local_values)]
+                joined.append(doc)
+            docs = joined
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+    return docs
+
+
+# ---------------- projections ----------------
+
+def _copy_path(src: Any, dst: Dict[str, Any], parts: List[str]):
+    if not isinstance(src, dict) or parts[0] not in src:
+        return
+    value = src[parts[0]]
+    if len(parts) == 1:
+        dst[parts[0]] = copy.deepcopy(value)
+    elif isinstance(value, dict):
+        _copy_path(value, dst.setdefault(parts[0], {}), parts[1:])
+    elif isinstance(value, list):
+        items = dst.setdefault(parts[0], [])
+        for item in value:
+            if isinstance(item, dict):
+                sub: Dict[str, Any] = {}
+                _copy_path(item, sub, parts[1:])
+                items.append(sub)
+
+
+def project(doc: Dict[str, Any], projection: Any) -> Dict[str, Any]:
+    """A copy of ``doc`` with a find() projection applied"""
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    fields = {key: value for key, value in projection.items() if key != '_id'}
+    include_id = projection.get('_id', 1) not in (0, False)
+    inclusion = [key for key, value in fields.items() if value not in (0, False)]
+    exclusion = [key for key, value in fields.items() if value in (0, False)]
+    if inclusion and exclusion:
+        raise OperationFailure("Cannot do exclusion on field in inclusion projection", code=31254)
+
+    if inclusion:
+        result: Dict[str, Any] = {}
+        if include_id and '_id' in doc:
+            result['_id'] = copy.deepcopy(doc['_id'])
+        for key in inclusion:
+            _copy_path(doc, result, key.split('.'))
+        return result
+
+    result = copy.deepcopy(doc)
+    for key in exclusion:
+        _unset_everywhere(result, key.split('.'))
+    if not include_id:
+        result.pop('_id', None)
+    return result
+
+
+def _unset_everywhere(value: Any, parts: List[str]):
+    if isinstance(value, dict):
+        if len(parts) == 1:
+            value.pop(parts[0], None)
+        elif parts[0] in value:
+            _unset_everywhere(value[parts[0]], parts[1:])
+    elif isinstance(value, list):
+        for item in value:
+            _unset_everywhere(item, parts)
+
+
+# ---------------- updates ----------------
+
+def _push_values(arg: Any) -> Tuple[List[Any], Dict[str, Any]]:
+    if isinstance(arg, dict) and '$each' in arg:
+        return list(arg['$each']), arg
+    return [arg], {}
+
+
+def apply_update(doc: Dict[str, Any], update: Any, is_insert: bool = False) -> Dict[str, Any]:
+    """Return a copy of ``doc`` with update operators (or an update pipeline) applied"""
+    doc = copy.deepcopy(doc)
+    original_id = doc.get('_id', _MISSING)
+
+    if isinstance(update, list):
+        doc = run_pipeline(None, [doc], update)[0]
+    else:
+        for op, fields in update.items():
+            if not isinstance(fields, dict):
+                raise WriteError(f"Modifiers operate on fields but we found type {type(fields).__name__} instead.", code=9)
+            for path, arg in fields.items():
+                _apply_operator(doc, op, path, _encode(arg), is_insert)
+
+    if original_id is not _MISSING and not _equal(doc.get('_id'), original_id):
+        raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", code=66)
+    return doc
+
+
+def _apply_operator(doc: Dict[str, Any], op: str, path: str, arg: Any, is_insert: bool):
+    current = get_field(doc, path)
+    if op == '$set':
+        set_field(doc, path, arg)
+    elif op == '$setOnInsert':
+        if is_insert:
+            set_field(doc, path, arg)
+    elif op == '$unset':
+        unset_field(doc, path)
+    elif op in ('$inc', '$mul'):
+        if _type_rank(arg) != 2 or isinstance(arg, bool):
+            raise WriteError(f"Cannot {op[1:]} with non-numeric argument: {{{path}: {arg!r}}}", code=14)
+        if current is _MISSING:
+            set_field(doc, path, arg if op == '$inc' else arg * 0)
+        elif _type_rank(current) != 2 or isinstance(current, bool):
+            raise WriteError(f"Cannot apply {op} to a value of non-numeric type. {{_id: {doc.get('_id')!r}}} "
+                             f"has the field '{path}' of non-numeric type {type(current).__name__}", code=14)
+        else:
+            set_field(doc, path, current + arg if op == '$inc' else current * arg)
+    elif op in ('$min', '$max'):
+        if current is _MISSING or (_compare(arg, current) < 0 if op == '$min' else _compare(arg, current) > 0):
+            set_field(doc, path, arg)
+    elif op in ('$push', '$addToSet'):
+        if current is _MISSING:
+            current = []
+        elif not isinstance(current, list):
+            raise WriteError(f"The field '{path}' must be an array but is of type {type(current).__name__}", code=2)
+        else:
+            current = list(current)
+        values, modifiers = _push_values(arg)
+        if op == '$addToSet':
+            for value in values:
+                if not any(_equal(value, item) for item in current):
+                    current.append(value)
+        else:
+            position = modifiers.get('$position')
+            if position is None:
+                current.extend(values)
+            else:
+                current[position:position] = values
+            if '$sort' in modifiers:
+                sort_spec = modifiers['$sort']
+                if isinstance(sort_spec, dict):
+                    current = sort_documents(current, list(sort_spec.items()))
+                else:
+                    current.sort(key=sort_key, reverse=sort_spec == -1)
+            if '$slice' in modifiers:
+                n = modifiers['$slice']
+                current = current[:n] if n >= 0 else current[n:]
+        set_field(doc, path, current)
+    elif op == '$pull':
+        if isinstance(current, list):
+            def pulled(item):
+                if _is_operator_dict(arg):
+                    return all(_match_op([item], sub_op, sub_arg, arg) for sub_op, sub_arg in arg.items())
+                if isinstance(arg, dict) and isinstance(item, dict):
+                    return matches(item, arg)
+                return _equal(item, arg)
+            set_field(doc, path, [item for item in current if not pulled(item)])
+    elif op == '$pop':
+        if isinstance(current, list) and current:
+            set_field(doc, path, current[1:] if arg == -1 else current[:-1])
+    elif op == '$rename':
+        if current is not _MISSING:
+            unset_field(doc, path)
+            set_field(doc, arg, current)
+    elif op == '$currentDate':
+        set_field(doc, path, _encode(datetime.utcnow()))
+    else:
+        raise WriteError(f"Unknown modifier: {op}. Expected a valid update modifier or pipeline-style update "
+                         f"specified as an array", code=9)
+
+
+def _validate_update(update: Any):
+    if isinstance(update, list):
+        return
+    if not update or not all(key.startswith('$') for key in update):
+        raise ValueError("update only works with $ operators")
+
+
+def _validate_replacement(replacement: Dict[str, Any]):
+    if replacement and next(iter(replacement)).startswith('$'):
+        raise ValueError("replacement can not include $ operators")
+
+
+def _upsert_seed(query: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fields an upsert copies from the equality conditions of its filter"""
+    seed: Dict[str, Any] = {}
+    for key, cond in (query or {}).items():
+        if key == '$and':
+            for sub in cond:
+                for sub_key, sub_value in _upsert_seed(sub).items():
+                    set_field(seed, sub_key, sub_value)
+        elif key.startswith('$'):
+            continue
+        elif _is_operator_dict(cond):
+            if '$eq' in cond:
+                set_field(seed, key, _encode(cond['$eq']))
+        elif not isinstance(cond, (re.Pattern, Regex)):
+            set_field(seed, key, _encode(cond))
+    return seed
+
+
+# ---------------- indexes ----------------
+
+def _normalize_keys(keys: Any, direction: Any = None) -> List[Tuple[str, Any]]:
+    if isinstance(keys, str):
+        return [(keys, direction if direction is not None else 1)]
+    if isinstance(keys, dict):
+        return list(keys.items())
+    return [(key, value) if not isinstance(key, str) or value is not None else (key, 1) for key, value in keys]
+
+
+def _index_name(keys: List[Tuple[str, Any]]) -> str:
+    return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+
+class MemoryIndex:
+    """A secondary index: a hash and a sorted list over its leading field's values"""
+
+    def __init__(self, name: str, keys: List[Tuple[str, Any]], unique: bool = False, sparse: bool = False,
+                 partial: Optional[Dict[str, Any]] = None, ttl: Optional[float] = None,
+                 collation: Optional[Dict[str, Any]] = None, options=None):
+        self.name = name
+        self.keys = keys
+        self.field = keys[0][0]
+        self.unique = unique
+        self.sparse = sparse
+        self.partial = partial
+        self.ttl = ttl
+        self.collation = collation
+        self.options = options or {}
+        self.hashed: Dict[Tuple, set] = {}
+        self.sorted: List[Tuple[Tuple, int]] = []
+        self.unique_keys: Dict[Tuple, int] = {}
+
+    def covers(self, doc: Dict[str, Any]) -> bool:
+        if self.partial is not None and not matches(doc, self.partial):
+            return False
+        if self.sparse and not any(resolve(doc, field) for field, _ in self.keys):
+            return False
+        return True
+
+    def _key(self, value: Any) -> Tuple:
+        return sort_key(_collate(value, self.collation))
+
+    def _leading_keys(self, doc: Dict[str, Any]) -> set:
+        values = resolve(doc, self.field)
+        if not values:
+            return {self._key(None)}
+        keys = set()
+        for value in values:
+            if isinstance(value, list):
+                keys.update(self._key(item) for item in value)
+                if not value:
+                    keys.add(self._key(None))
+            else:
+                keys.add(self._key(value))
+        return keys
+
+    def unique_key(self, doc: Dict[str, Any]) -> Tuple:
+        parts = []
+        for field, _ in self.keys:
+            values = resolve(doc, field)
+            parts.append(self._key(values[0] if len(values) == 1 else values if values else None))
+        return tuple(parts)
+
+    def conflict(self, doc: Dict[str, Any], seq: Optional[int] = None) -> bool:
+        if not self.unique or not self.covers(doc):
+            return False
+        holder = self.unique_keys.get(self.unique_key(doc))
+        return holder is not None and holder != seq
+
+    def add(self, seq: int, doc: Dict[str, Any]):
+        if not self.covers(doc):
+            return
+        for key in self._leading_keys(doc):
+            self.hashed.setdefault(key, set()).add(seq)
+            bisect.insort(self.sorted, (key, seq))
+        if self.unique:
+            self.unique_keys[self.unique_key(doc)] = seq
+
+    def remove(self, seq: int, doc: Dict[str, Any]):
+        if not self.covers(doc):
+            return
+        for key in self._leading_keys(doc):
+            bucket = self.hashed.get(key)
+            if bucket is not None:
+                bucket.discard(seq)
+                if not bucket:
+                    del self.hashed[key]
+            position = bisect.bisect_left(self.sorted, (key, seq))
+            if position < len(self.sorted) and self.sorted[position] == (key, seq):
+                del self.sorted[position]
+        if self.unique and self.unique_keys.get(self.unique_key(doc)) == seq:
+            del self.unique_keys[self.unique_key(doc)]
+
+    def lookup(self, cond: Any) -> Optional[set]:
+        """Sequence numbers that may match a condition on the leading field (None if it cannot help)"""
+        if self.partial is not None or self.sparse:
+            return None
+        if not _is_operator_dict(cond):
+            if isinstance(cond, (list, dict, re.Pattern, Regex)):
+                return None
+            return set(self.hashed.get(self._key(cond), ()))
+        ops = set(cond)
+        if ops == {'$eq'}:
+            return self.lookup(cond['$eq'])
+        if ops == {'$in'}:
+            if any(isinstance(item, (list, dict, re.Pattern, Regex)) for item in cond['$in']):
+                return None
+            found = set()
+            for item in cond['$in']:
+                found |= self.hashed.get(self._key(item), set())
+            return found
+        ranges = ops & {'$gt', '$gte', '$lt', '$lte'}
+        if ranges and ops <= {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin'}:
+            bounds = [cond[op] for op in ranges]
+            rank = _type_rank(bounds[0])
+            if any(_type_rank(bound) != rank for bound in bounds):
+                return set()
+            low = bisect.bisect_left(self.sorted, ((rank,),))
+            high = bisect.bisect_left(self.sorted, ((rank + 1,),))
+            for op in ranges:
+                key = self._key(cond[op])
+                if op == '$gt':
+                    low = max(low, bisect.bisect_right(self.sorted, (key, float('inf'))))
+                elif op == '$gte':
+                    low = max(low, bisect.bisect_left(self.sorted, (key, -1)))
+                elif op == '$lt':
+                    high = min(high, bisect.bisect_left(self.sorted, (key, -1)))
+                else:
+                    high = min(high, bisect.bisect_right(self.sorted, (key, float('inf'))))
+            return {seq for _, seq in self.sorted[low:high]}
+        return None
+
+    def info(self) -> Dict[str, Any]:
+        info: Dict[str, Any] = {'key': list(self.keys), 'v': 2}
+        if self.unique:
+            info['unique'] = True
+        if self.sparse:
+            info['sparse'] = True
+        if self.partial is not None:
+            info['partialFilterExpression'] = self.partial
+        if self.ttl is not None:
+            info['expireAfterSeconds'] = self.ttl
+        if self.collation is not None:
+            info['collation'] = self.collation
+        info.update(self.options)
+        return info
+
+
+# ---------------- cursors ----------------
+
+class MemoryCommandCursor:
+    """Cursor over precomputed results (aggregate)"""
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+        self._position = 0
+
+    def batch_size(self, size: int) -> 'MemoryCommandCursor':
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        return self._docs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        docs = self._results()
+        if self._position >= len(docs):
+            raise StopAsyncIteration
+        doc = docs[self._position]
+        self._position += 1
+        return doc
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = self._results()
+        end = len(docs) if length is None else min(len(docs), self._position + length)
+        batch = docs[self._position:end]
+        self._position = end
+        return batch
+
+
+class MemoryCursor(MemoryCommandCursor):
+    """A find() cursor; the query runs when it is first read"""
+
+    def __init__(self, collection: 'MemoryCollection', query: Optional[Dict[str, Any]], projection: Any = None,
+                 sort: Any = None, skip: int = 0, limit: int = 0, collation: Optional[Dict[str, Any]] = None):
+        super().__init__([])
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, Any]] = _normalize_keys(sort) if sort else []
+        self._skip = skip
+        self._limit = limit
+        self._collation = collation
+        self._executed = False
+
+    def _check_unused(self):
+        if self._executed:
+            raise RuntimeError("cannot set options after executing query")
+
+    def sort(self, key_or_list: Any, direction: Any = None) -> 'MemoryCursor':
+        self._check_unused()
+        self._sort = _normalize_keys(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> 'MemoryCursor':
+        self._check_unused()
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> 'MemoryCursor':
+        self._check_unused()
+        self._limit = abs(limit)
+        return self
+
+    def collation(self, collation: Optional[Dict[str, Any]]) -> 'MemoryCursor':
+        self._check_unused()
+        self._collation = collation
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        if not self._executed:
+            self._executed = True
+            # Without a sort only the first skip + limit matches are needed
+            limit = self._skip + self._limit if self._limit and not self._sort else 0
+            docs = self._collection._query(self._query, limit, self._collation)
+            if self._sort:
+                docs = sort_documents(docs, self._sort, collation=self._collation)
+            if self._skip:
+                docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._docs = [project(doc, self._projection) for doc in docs]
+        return self._docs
+
+    async def explain(self) -> Dict[str, Any]:
+        index = self._collection._plan(self._query, self._collation)[0]
+        if index is None:
+            plan = {'stage': 'COLLSCAN', 'filter': self._query}
+        else:
+            plan = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': index, 'keyPattern': dict(
+                self._collection._index_keys(index))}}
+        if self._sort:
+            plan = {'stage': 'SORT', 'sortPattern': dict(self._sort), 'inputStage': plan}
+        return {'queryPlanner': {'namespace': self._collection.full_name, 'winningPlan': plan}, 'ok': 1.0}
+
+
+# ---------------- collections ----------------
+
+class MemoryCollection:
+    def __init__(self, database: 'MemoryDatabase', name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[int, Dict[str, Any]] = {}
+        self._ids: Dict[Tuple, int] = {}
+        self._indexes: Dict[str, MemoryIndex] = {}
+        self._seq = count()
+        self._next_ttl_sweep = 0.0
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    def __repr__(self):
+        return f"MemoryCollection({self.full_name!r})"
+
+    # ---------------- storage ----------------
+
+    def _all(self) -> List[Dict[str, Any]]:
+        self._expire()
+        return list(self._docs.values())
+
+    def _index_keys(self, name: str) -> List[Tuple[str, Any]]:
+        return [('_id', 1)] if name == '_id_' else self._indexes[name].keys
+
+    def _plan(self, query: Dict[str, Any], collation: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], Optional[set]]:
+        """(index name, candidate sequence numbers) for a query, or (None, None) for a collection scan
+
+        Only indexes with the query's collation can answer it, and _id_ has the simple collation.
+        """
+        if not isinstance(query, dict):
+            return None, None
+        collation = _collation_key(collation)
+        ranged = None
+        for field, cond in query.items():
+            if field.startswith('$'):
+                continue
+            if field == '_id' and collation is None:
+                seqs = self._id_candidates(cond)
+                if seqs is not None:
+                    return '_id_', seqs
+            for index in self._indexes.values():
+                if index.field != field or _collation_key(index.collation) != collation:
+                    continue
+                seqs = index.lookup(cond)
+                if seqs is None:
+                    continue
+                if not _is_operator_dict(cond) or set(cond) <= {'$eq', '$in'}:
+                    return index.name, seqs
+                if ranged is None:
+                    ranged = (index.name, seqs)
+        return ranged or (None, None)
+
+    def _id_candidates(self, cond: Any) -> Optional[set]:
+        if not _is_operator_dict(cond):
+            if isinstance(cond, (dict, list, re.Pattern, Regex)):
+                return None
+            seq = self._ids.get(sort_key(cond))
+            return {seq} if seq is not None else set()
+        if set(cond) == {'$eq'}:
+            return self._id_candidates(cond['$eq'])
+        if set(cond) == {'$in'}:
+            found = set()
+            for item in cond['$in']:
+                if isinstance(item, (dict, list, re.Pattern, Regex)):
+                    return None
+                seq = self._ids.get(sort_key(item))
+                if seq is not None:
+                    found.add(seq)
+            return found
+        return None
+
+    def _matching(self, query: Optional[Dict[str, Any]], limit: int = 0,
+                  collation: Optional[Dict[str, Any]] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """Stored (sequence number, document) pairs matching a query, in insertion order (the first ``limit``)"""
+        self._expire()
+        if query is not None and not isinstance(query, dict):
+            query = {'_id': query}
+        query = query or {}
+        _, seqs = self._plan(query, collation)
+        if seqs is None:
+            self.database.client._collection_scans += 1
+            candidates = self._docs.items()
+        else:
+            candidates = ((seq, self._docs[seq]) for seq in sorted(seqs) if seq in self._docs)
+        found = []
+        for seq, doc in candidates:
+            if matches(doc, query, collation):
+                found.append((seq, doc))
+                if len(found) == limit:
+                    break
+        return found
+
+    def _query(self, query: Optional[Dict[str, Any]], limit: int = 0,
+               collation: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return [doc for _, doc in self._matching(query, limit, collation)]
+
+    def _check_unique(self, doc: Dict[str, Any], seq: Optional[int] = None):
+        key = sort_key(doc['_id'])
+        holder = self._ids.get(key)
+        if holder is not None and holder != seq:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{ _id: {doc['_id']!r} }}",
+                DUPLICATE_KEY_ERROR, {'keyPattern': {'_id': 1}, 'keyValue': {'_id': doc['_id']}}
+            )
+        for index in self._indexes.values():
+            if index.conflict(doc, seq):
+                key_value = {field: _value(get_field(doc, field)) for field, _ in index.keys}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {index.name} dup key: {key_value!r}",
+                    DUPLICATE_KEY_ERROR, {'keyPattern': dict(index.keys), 'keyValue': key_value}
+                )
+
+    def _store(self, doc: Dict[str, Any]) -> int:
+        self._check_unique(doc)
+        seq = next(self._seq)
+        self._docs[seq] = doc
+        self._ids[sort_key(doc['_id'])] = seq
+        for index in self._indexes.values():
+            index.add(seq, doc)
+        return seq
+
+    def _unstore(self, seq: int):
+        doc = self._docs.pop(seq)
+        self._ids.pop(sort_key(doc['_id']), None)
+        for index in self._indexes.values():
+            index.remove(seq, doc)
+
+    def _replace_stored(self, seq: int, doc: Dict[str, Any]):
+        # Unique checks run before the old version is unindexed, so a failed write changes nothing
+        self._check_unique(doc, seq)
+        old = self._docs[seq]
+        for index in self._indexes.values():
+            index.remove(seq, old)
+        # Assigning to an existing key keeps the document's natural (insertion) position
+        self._docs[seq] = doc
+        for index in self._indexes.values():
+            index.add(seq, doc)
+
+    def _expire(self):
+        if not self._indexes or time.monotonic() < self._next_ttl_sweep:
+            return
+        self._next_ttl_sweep = time.monotonic() + TTL_MONITOR_INTERVAL
+        now = datetime.utcnow()
+        for index in self._indexes.values():
+            if index.ttl is None:
+                continue
+            cutoff = now - timedelta(seconds=index.ttl)
+            expired = []
+            for seq, doc in self._docs.items():
+                if not index.covers(doc):
+                    continue
+                dates = [value for value in _expand(resolve(doc, index.field)) if isinstance(value, datetime)]
+                if dates and min(dates) <= cutoff:
+                    expired.append(seq)
+            for seq in expired:
+                self._unstore(seq)
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        if not isinstance(document, dict):
+            raise TypeError("document must be an instance of dict")
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        self._store(_encode(document))
+        return document['_id']
+
+    # ---------------- reads ----------------
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, skip: int = 0,
+             limit: int = 0, sort: Any = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, filter, projection, sort=sort, skip=skip, limit=limit,
+                            collation=kwargs.get('collation'))
+
+    async def find_one(self, filter: Any = None, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        docs = await self.find(filter, *args, **kwargs).limit(1).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: Dict[str, Any], skip: int = 0, limit: int = 0, **kwargs) -> int:
+        total = max(len(self._matching(filter, collation=kwargs.get('collation'))) - skip, 0)
+        return min(total, limit) if limit else total
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        self._expire()
+        return len(self._docs)
+
+    async def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        seen, values = set(), []
+        collation = kwargs.get('collation')
+        for doc in self._query(filter, collation=collation):
+            for value in _expand(resolve(doc, key)):
+                if isinstance(value, list) or sort_key(_collate(value, collation)) in seen:
+                    continue
+                seen.add(sort_key(_collate(value, collation)))
+                values.append(copy.deepcopy(value))
+        return values
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> MemoryCommandCursor:
+        docs = self._query(pipeline[0]['$match']) if pipeline and '$match' in pipeline[0] else self._all()
+        if not pipeline or '$match' not in pipeline[0]:
+            self.database.client._collection_scans += 1
+        return MemoryCommandCursor(run_pipeline(self.database, [copy.deepcopy(doc) for doc in docs], pipeline))
+
+    # ---------------- writes ----------------
+
+    async def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        documents = list(documents)
+        if not documents:
+            raise TypeError("documents must be a non-empty list")
+        ids, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({'index': index, 'code': DUPLICATE_KEY_ERROR, 'errmsg': str(e), 'op': document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(ids), 'nUpserted': 0,
+                'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []
+            })
+        return InsertManyResult(ids, True)
+
+    def _update(self, filter: Dict[str, Any], update: Any, upsert: bool, multi: bool,
+                replacement: bool = False, sort: Any = None) -> Tuple[int, int, Any, Optional[int]]:
+        """(matched, modified, upserted id, sequence number of the last document written)"""
+        if multi:
+            found = self._matching(filter)
+        else:
+            first = self._first(filter, sort)
+            found = [first] if first else []
+
+        if not found:
+            if not upsert:
+                return 0, 0, None, None
+            if replacement:
+                doc = _encode(update)
+                seed = _upsert_seed(filter)
+                if '_id' not in doc and '_id' in seed:
+                    doc['_id'] = seed['_id']
+            else:
+                doc = apply_update(_upsert_seed(filter), update, is_insert=True)
+            doc.setdefault('_id', ObjectId())
+            seq = self._store(doc)
+            return 0, 0, doc['_id'], seq
+
+        modified, last = 0, None
+        for seq, current in found:
+            if replacement:
+                new = _encode(update)
+                if '_id' in new and not _equal(new['_id'], current['_id']):
+                    raise WriteError("After applying the update, the (immutable) field '_id' was found to have been altered",
+                                     code=66)
+                new = {'_id': current['_id'], **{key: value for key, value in new.items() if key != '_id'}}
+            else:
+                new = apply_update(current, update)
+            last = seq
+            if new != current:
+                self._replace_stored(seq, new)
+                modified += 1
+        return len(found), modified, None, last
+
+    @staticmethod
+    def _update_result(matched: int, modified: int, upserted: Any) -> UpdateResult:
+        raw = {'n': matched if upserted is None else 1, 'nModified': modified, 'ok': 1.0,
+               'updatedExisting': matched > 0}
+        if upserted is not None:
+            raw['upserted'] = upserted
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter: Dict[str, Any], update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        _validate_update(update)
+        matched, modified, upserted, _ = self._update(filter, update, upsert, multi=False, sort=kwargs.get('sort'))
+        return self._update_result(matched, modified, upserted)
+
+    async def update_many(self, filter: Dict[str, Any], update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        _validate_update(update)
+        matched, modified, upserted, _ = self._update(filter, update, upsert, multi=True)
+        return self._update_result(matched, modified, upserted)
+
+    async def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False,
+                          **kwargs) -> UpdateResult:
+        _validate_replacement(replacement)
+        matched, modified, upserted, _ = self._update(filter, replacement, upsert, multi=False, replacement=True)
+        return self._update_result(matched, modified, upserted)
+
+    async def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        found = self._matching(filter, limit=1)
+        for seq, _ in found:
+            self._unstore(seq)
+        return DeleteResult({'n': len(found), 'ok': 1.0}, True)
+
+    async def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        found = self._matching(filter)
+        for seq, _ in found:
+            self._unstore(seq)
+        return DeleteResult({'n': len(found), 'ok': 1.0}, True)
+
+    async def find_one_and_update(self, filter: Dict[str, Any], update: Any, projection: Any = None, sort: Any = None,
+                                  upsert: bool = False, return_document: bool = ReturnDocument.BEFORE,
+                                  **kwargs) -> Optional[Dict[str, Any]]:
+        _validate_update(update)
+        return self._find_and_modify(filter, update, projection, sort, upsert, return_document)
+
+    async def find_one_and_replace(self, filter: Dict[str, Any], replacement: Dict[str, Any], projection: Any = None,
+                                   sort: Any = None, upsert: bool = False,
+                                   return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[Dict[str, Any]]:
+        _validate_replacement(replacement)
+        return self._find_and_modify(filter, replacement, projection, sort, upsert, return_document, replacement=True)
+
+    def _first(self, filter: Dict[str, Any], sort: Any = None) -> Optional[Tuple[int, Dict[str, Any]]]:
+        found = self._matching(filter, limit=0 if sort else 1)
+        if not found:
+            return None
+        if sort:
+            first = sort_documents([doc for _, doc in found], _normalize_keys(sort))[0]
+            return next((seq, doc) for seq, doc in found if doc is first)
+        return found[0]
+
+    def _find_and_modify(self, filter, update, projection, sort, upsert, return_document, replacement=False):
+        first = self._first(filter, sort)
+        before = first[1] if first else None
+        if before is not None:
+            filter = {'_id': before['_id']}
+        _, _, upserted, seq = self._update(filter, update, upsert, multi=False, replacement=replacement)
+        if return_document == ReturnDocument.AFTER:
+            after = self._docs.get(seq) if seq is not None else None
+            return project(after, projection) if after is not None else None
+        return project(before, projection) if before is not None else None
+
+    async def find_one_and_delete(self, filter: Dict[str, Any], projection: Any = None, sort: Any = None,
+                                  **kwargs) -> Optional[Dict[str, Any]]:
+        first = self._first(filter, sort)
+        if first is None:
+            return None
+        seq, doc = first
+        self._unstore(seq)
+        return project(doc, projection)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+                  'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        for index, request in enumerate(requests):
+            kind = type(request).__name__
+            try:
+                if kind == 'InsertOne':
+                    self._insert(request._doc)
+                    result['nInserted'] += 1
+                elif kind in ('UpdateOne', 'UpdateMany', 'ReplaceOne'):
+                    if kind == 'ReplaceOne':
+                        _validate_replacement(request._doc)
+                    else:
+                        _validate_update(request._doc)
+                    matched, modified, upserted, _ = self._update(
+                        request._filter, request._doc, bool(request._upsert), multi=kind == 'UpdateMany',
+                        replacement=kind == 'ReplaceOne'
+                    )
+                    result['nMatched'] += matched
+                    result['nModified'] += modified
+                    if upserted is not None:
+                        result['nUpserted'] += 1
+                        result['upserted'].append({'index': index, '_id': upserted})
+                elif kind in ('DeleteOne', 'DeleteMany'):
+                    found = self._matching(request._filter, limit=1 if kind == 'DeleteOne' else 0)
+                    for seq, _ in found:
+                        self._unstore(seq)
+                    result['nRemoved'] += len(found)
+                else:
+                    raise TypeError(f"{request!r} is not a valid request")
+            except (DuplicateKeyError, WriteError) as e:
+                result['writeErrors'].append({'index': index, 'code': e.code, 'errmsg': str(e)})
+                if ordered:
+                    break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # ---------------- indexes ----------------
+
+    async def create_index(self, keys: Any, **kwargs) -> str:
+        return self._create_index(_normalize_keys(keys), kwargs)
+
+    async def create_indexes(self, indexes: List[IndexModel], **kwargs) -> List[str]:
+        names = []
+        for model in indexes:
+            document = dict(model.document)
+            keys = _normalize_keys(document.pop('key'))
+            names.append(self._create_index(keys, document))
+        return names
+
+    def _create_index(self, keys: List[Tuple[str, Any]], options: Dict[str, Any]) -> str:
+        options = dict(options)
+        options.pop('background', None)
+        name = options.pop('name', None) or _index_name(keys)
+        index = MemoryIndex(
+            name, keys,
+            unique=bool(options.pop('unique', False)),
+            sparse=bool(options.pop('sparse', False)),
+            partial=options.pop('partialFilterExpression', None),
+            ttl=options.pop('expireAfterSeconds', None),
+            collation=options.pop('collation', None),
+            options=options
+        )
+        if name == '_id_' or keys == [('_id', 1)]:
+            return '_id_'
+
+        # Indexes may share a key pattern when their collations differ
+        existing = self._indexes.get(name) or next(
+            (other for other in self._indexes.values()
+             if other.keys == keys and _collation_key(other.collation) == _collation_key(index.collation)), None)
+        if existing is not None:
+            if existing.info() == index.info() and existing.name == name:
+                return name
+            code = 86 if existing.name == name else 85
+            raise OperationFailure(f"An existing index has the same name or key pattern as the requested index but "
+                                   f"different options. Requested index: {index.info()}, existing index: {existing.info()}",
+                                   code=code)
+
+        for seq, doc in self._docs.items():
+            if index.conflict(doc, seq):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: {name}",
+                                        DUPLICATE_KEY_ERROR)
+            index.add(seq, doc)
+        self._indexes[name] = index
+        return name
+
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        information = {'_id_': {'key': [('_id', 1)], 'v': 2}}
+        information.update({name: index.info() for name, index in self._indexes.items()})
+        return information
+
+    async def drop_index(self, index_or_name: Any):
+        name = index_or_name if isinstance(index_or_name, str) else _index_name(_normalize_keys(index_or_name))
+        if name not in self._indexes:
+            raise OperationFailure(f"index not found with name [{name}]", code=27)
+        del self._indexes[name]
+
+    async def drop_indexes(self):
+        self._indexes.clear()
+
+    async def drop(self):
+        await self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    def __init__(self, client: 'MemoryClient', name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._profile = {'was': 0, 'slowms': 100}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        # Database methods this stand-in lacks must not turn into collections
+        if name.startswith('_') or hasattr(Database, name):
+            raise AttributeError(f"'MemoryDatabase' object has no attribute '{name}'")
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return [name for name, collection in self._collections.items() if collection._docs or collection._indexes]
+
+    async def drop_collection(self, name: Any):
+        self._collections.pop(name if isinstance(name, str) else name.name, None)
+
+    async def command(self, command: Any, value: Any = 1, **kwargs) -> Dict[str, Any]:
+        if isinstance(command, str):
+            command = {command: value, **kwargs}
+        name = next(iter(command))
+        if name == 'ping':
+            return {'ok': 1.0}
+        if name == 'profile':
+            previous = dict(self._profile)
+            if command['profile'] >= 0:
+                self._profile = {'was': command['profile'], 'slowms': command.get('slowms', previous['slowms'])}
+            return {**previous, 'ok': 1.0}
+        if name == 'dbStats':
+            return {
+                'db': self.name,
+                'collections': len(self._collections),
+                'objects': sum(len(collection._docs) for collection in self._collections.values()),
+                'indexes': sum(len(collection._indexes) + 1 for collection in self._collections.values()),
+                'ok': 1.0
+            }
+        if name == 'serverStatus':
+            return self.client.server_status()
+        raise OperationFailure(f"no such command: '{name}'", code=59)
+
+
+class MemoryTransaction:
+    """``async with session.start_transaction()``; commits and aborts are no-ops"""
+
+    def __init__(self, session: 'MemorySession'):
+        self.session = session
+
+    async def __aenter__(self) -> 'MemorySession':
+        return self.session
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session.in_transaction:
+            if exc_type is None:
+                await self.session.commit_transaction()
+            else:
+                await self.session.abort_transaction()
+
+
+class MemorySession:
+    """Stand-in for ``AsyncIOMotorClientSession``; operations ignore it and apply immediately"""
+
+    def __init__(self, client: 'MemoryClient'):
+        self.client = client
+        self.in_transaction = False
+        self.has_ended = False
+
+    async def __aenter__(self) -> 'MemorySession':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.end_session()
+
+    def start_transaction(self, *args, **kwargs) -> MemoryTransaction:
+        if self.in_transaction:
+            raise InvalidOperation("Transaction already in progress")
+        self.in_transaction = True
+        return MemoryTransaction(self)
+
+    async def commit_transaction(self):
+        self.in_transaction = False
+
+    async def abort_transaction(self):
+        self.in_transaction = False
+
+    async def with_transaction(self, callback, *args, **kwargs):
+        async with self.start_transaction():
+            return await callback(self)
+
+    async def end_session(self):
+        self.in_transaction = False
+        self.has_ended = True
+
+
+class MemoryClient:
+    """Stand-in for ``AsyncIOMotorClient`` backed by :class:`MemoryDatabase`"""
+
+    def __init__(self, *args, **kwargs):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._collection_scans = 0
+        self._started = time.monotonic()
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    def __getattr__(self, name: str) -> MemoryDatabase:
+        # Client methods this stand-in lacks must not turn into databases
+        if name.startswith('_') or hasattr(MongoClient, name):
+            raise AttributeError(f"'MemoryClient' object has no attribute '{name}'")
+        return self[name]
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    async def start_session(self, *args, **kwargs) -> MemorySession:
+        return MemorySession(self)
+
+    def server_status(self) -> Dict[str, Any]:
+        return {
+            'host': 'memory',
+            'version': 'memory',
+            'uptime': time.monotonic() - self._started,
+            'metrics': {'queryExecutor': {'collectionScans': {
+                'total': self._collection_scans, 'nonTailable': self._collection_scans
+            }}},
+            'ok': 1.0
+        }
+
+    async def server_info(self) -> Dict[str, Any]:
+        return {'version': 'memory', 'ok': 1.0}
+
+    async def list_database_names(self) -> List[str]:
+        return list(self._databases)
+
+    def close(self):
+        pass
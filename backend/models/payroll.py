@@ -103,6 +103,9 @@ class JournalEntry(BaseModel):
     approvedAt: Optional[datetime] = None
     postedAt: Optional[datetime] = None
 
+    # Payroll journal batch that posted this entry
+    batchId: Optional[str] = None
+
     # Audit
     createdBy: Optional[str] = None
     createdAt: Optional[datetime] = None
@@ -128,9 +131,18 @@ class PayrollJournalBatch(BaseModel):
     status: str = "Draft"  # Draft, Processing, Posted, Error
     journalEntries: List[str] = []  # List of JournalEntry IDs
     errorLog: List[str] = []
+    # Posting progress, checkpointed after every chunk so a failed run can resume
+    processedEntries: int = 0
+    lastCheckpoint: Optional[str] = None  # _id of the last payroll entry in the last posted chunk
+    # Lease held by the run posting the batch; renewed on every checkpoint
+    leaseOwner: Optional[str] = None
+    leaseExpiresAt: Optional[datetime] = None
     createdBy: Optional[str] = None
     createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
     postedAt: Optional[datetime] = None
+    approvedBy: Optional[str] = None
+    approvedAt: Optional[datetime] = None
 
 class PayrollTaxInfo(BaseModel):
     id: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 from enum import Enum
 
@@ -42,6 +42,15 @@ class PredictiveMaintenanceAlert(BaseModel):
     priority: MaintenancePriority = MaintenancePriority.MEDIUM
     status: MaintenanceStatus = MaintenanceStatus.PREDICTED
 
+    # Generator of the alert, e.g. "mileage_prediction" for engine predictions; unset for manual alerts
+    source: Optional[str] = None
+
+    # Rule-based alert details (maintenance alert service)
+    alertType: Optional[str] = None  # mileage_based, time_based, condition_based
+    severity: Optional[str] = None  # critical, high, medium, low
+    title: Optional[str] = None
+    description: Optional[str] = None
+
     # Scheduling
     scheduledDate: Optional[date] = None
     assignedTechnician: Optional[str] = None
@@ -157,9 +166,14 @@ class AssetHealthScore(BaseModel):
     recommendations: List[str] = []
     nextMaintenanceDue: Optional[date] = None
 
+    # Component scores (mileage, age, maintenance)
+    components: Dict[str, float] = {}
+
     # Status
     healthStatus: str = "Good"  # Excellent, Good, Fair, Poor, Critical
     riskLevel: str = "Low"  # Low, Medium, High
+    trend: str = "stable"  # improving, stable, declining (from the score history)
+    trendSlope: Optional[float] = None  # score points per 30 days
 
     calculatedAt: Optional[datetime] = None
     createdAt: Optional[datetime] = None
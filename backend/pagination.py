@@ -0,0 +1,167 @@
+"""Shared pagination, projection and streaming for list endpoints.
+
+List handlers take a ``PageParams`` dependency and hand their collection to
+``paginate``. Without any query parameters the response is the same JSON list
+as before. ``limit`` switches to keyset pagination on ``(sort field, _id)`` and
+returns the token for the next page in the ``X-Next-Cursor`` header,
+``fields`` projects documents server-side, ``sort`` picks the ordering and
+``format=ndjson`` streams documents straight off the Motor cursor.
+"""
+import base64
+import json
+from typing import Any, Callable, Dict, Optional
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """Query parameters shared by every paginated list endpoint"""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables cursor pagination"),
+        cursor: Optional[str] = Query(None, description="Opaque token from the X-Next-Cursor header of the previous page"),
+        fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+        sort: Optional[str] = Query(None, description="Sort field, prefix with '-' for descending"),
+        format: Optional[str] = Query(None, description="Set to 'ndjson' to stream the results"),
+    ):
+        if format not in (None, "json", "ndjson"):
+            raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+        self.sort = sort
+        self.stream = format == "ndjson"
+
+
+def _parse_sort(sort: str):
+    if sort.startswith("-"):
+        return sort[1:], -1
+    return sort, 1
+
+
+def encode_cursor(sort_field: str, direction: int, doc: Dict[str, Any]) -> str:
+    """Build the opaque keyset token pointing just after ``doc``"""
+    payload = {"f": sort_field, "d": direction, "v": doc.get(sort_field), "id": doc["_id"]}
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode()
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def _keyset_filter(sort_field: str, direction: int, cursor: Dict[str, Any]) -> Dict[str, Any]:
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: cursor["id"]}}
+    # Null and missing values sort before everything else, and range operators never match them
+    if cursor["v"] is None:
+        rest = [{sort_field: None, "_id": {op: cursor["id"]}}]
+        if direction == 1:
+            rest.append({sort_field: {"$ne": None}})
+        return {"$or": rest}
+    rest = [
+        {sort_field: {op: cursor["v"]}},
+        {sort_field: cursor["v"], "_id": {op: cursor["id"]}},
+    ]
+    if direction == -1:
+        rest.append({sort_field: None})
+    return {"$or": rest}
+
+
+def model_transform(model) -> Callable[[Dict[str, Any]], Any]:
+    """Default per-document conversion used by the CRUD routers"""
+    def transform(item):
+        item["_id"] = str(item["_id"])
+        item["id"] = item["_id"]
+        item_copy = item.copy()
+        item_copy.pop("_id", None)
+        return model(**item_copy)
+    return transform
+
+
+def _stringify_ids(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _stringify_ids(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_stringify_ids(item) for item in value]
+    return value
+
+
+def _projected(item):
+    # Projected documents may miss required model fields, so return them raw
+    item["id"] = str(item.pop("_id"))
+    return _stringify_ids(item)
+
+
+async def paginate(
+    collection,
+    page: PageParams,
+    model=None,
+    query: Optional[Dict[str, Any]] = None,
+    default_sort: str = "_id",
+    transform: Optional[Callable[[Dict[str, Any]], Any]] = None,
+):
+    """Run a list query for ``collection`` according to ``page``"""
+    sort_field, direction = _parse_sort(page.sort or default_sort)
+    query = dict(query or {})
+
+    if page.cursor:
+        cursor = decode_cursor(page.cursor)
+        if cursor.get("f") != sort_field or cursor.get("d") != direction:
+            raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+        keyset = _keyset_filter(sort_field, direction, cursor)
+        query = {"$and": [query, keyset]} if query else keyset
+
+    projection = None
+    if page.fields:
+        projection = {field: 1 for field in page.fields}
+        projection[sort_field] = 1
+
+    if page.fields or model is None:
+        convert = _projected
+    else:
+        convert = transform or model_transform(model)
+
+    sort_spec = [(sort_field, direction)]
+    if sort_field != "_id":
+        sort_spec.append(("_id", direction))
+    db_cursor = collection.find(query, projection).sort(sort_spec)
+
+    if page.stream:
+        if page.limit:
+            db_cursor = db_cursor.limit(page.limit)
+        db_cursor = db_cursor.batch_size(STREAM_BATCH_SIZE)
+
+        async def generate():
+            async for item in db_cursor:
+                yield json.dumps(jsonable_encoder(convert(item))) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    if page.limit:
+        db_cursor = db_cursor.limit(page.limit + 1)
+
+    items = []
+    next_cursor = None
+    async for item in db_cursor:
+        if page.limit and len(items) == page.limit:
+            next_cursor = encode_cursor(sort_field, direction, last)
+            break
+        last = {"_id": item["_id"], sort_field: item.get(sort_field)}
+        items.append(convert(item))
+
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.abroad_staff import AbroadStaff
 
 router = APIRouter()
 collection = db.abroad_staff
 
 @router.get("/")
-async def get_abroad_staff():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(AbroadStaff(**item))
-    return items
+async def get_abroad_staff(page: PageParams = Depends()):
+    return await paginate(collection, page, AbroadStaff)
 
 @router.post("/")
 async def create_abroad_staff(item: AbroadStaff):
@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.accounts_payable import AccountsPayable
 
 router = APIRouter()
 collection = db.accounts_payable
 
 @router.get("/")
-async def get_accounts_payable():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(AccountsPayable(**item))
-    return items
+async def get_accounts_payable(page: PageParams = Depends()):
+    return await paginate(collection, page, AccountsPayable)
 
 @router.post("/")
 async def create_accounts_payable(item: AccountsPayable):
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
+from services.index_registry import index_registry
 from models.accounts_receivable import AccountsReceivable, AccountsReceivablePayment
 from datetime import datetime
 
@@ -8,18 +10,17 @@ router = APIRouter()
 accounts_receivable_collection = db.accounts_receivable
 payments_collection = db.accounts_receivable_payments
 
+# Overdue receivables are filtered and paged on (dueDate, _id)
+index_registry.declare('accounts_receivable', [("dueDate", 1), ("_id", 1)])
+index_registry.declare_query(
+    'accounts_receivable.overdue', 'accounts_receivable',
+    {"dueDate": {"$lt": "9999-12-31"}, "status": {"$ne": "Paid"}}, sort=[("dueDate", 1), ("_id", 1)]
+)
+
 # Accounts Receivable CRUD
 @router.get("/")
-async def get_accounts_receivable():
-    items = []
-    async for item in accounts_receivable_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        # Remove the MongoDB _id field from the item dict before creating AccountsReceivable
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(AccountsReceivable(**item_copy))
-    return items
+async def get_accounts_receivable(page: PageParams = Depends()):
+    return await paginate(accounts_receivable_collection, page, AccountsReceivable)
 
 @router.post("/")
 async def create_accounts_receivable(item: AccountsReceivable):
@@ -60,15 +61,8 @@ async def delete_accounts_receivable(item_id: str):
 
 # Payments CRUD
 @router.get("/payments/")
-async def get_payments():
-    items = []
-    async for item in payments_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(AccountsReceivablePayment(**item_copy))
-    return items
+async def get_payments(page: PageParams = Depends()):
+    return await paginate(payments_collection, page, AccountsReceivablePayment)
 
 @router.post("/payments/")
 async def create_payment(item: AccountsReceivablePayment):
@@ -107,16 +101,8 @@ async def get_receivable_aging_summary():
     return result
 
 @router.get("/overdue")
-async def get_overdue_receivables():
+async def get_overdue_receivables(page: PageParams = Depends()):
     """Get overdue accounts receivable"""
     current_date = datetime.now().strftime("%Y-%m-%d")
-    overdue_items = []
-
-    async for item in accounts_receivable_collection.find({"dueDate": {"$lt": current_date}, "status": {"$ne": "Paid"}}):
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        overdue_items.append(AccountsReceivable(**item_copy))
-
-    return overdue_items
\ No newline at end of file
+    query = {"dueDate": {"$lt": current_date}, "status": {"$ne": "Paid"}}
+    return await paginate(accounts_receivable_collection, page, AccountsReceivable, query=query, default_sort="dueDate")
\ No newline at end of file
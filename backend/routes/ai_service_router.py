@@ -3,13 +3,18 @@ AI Service Router for UniverserERP
 Exposes all AI features through REST API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, File, Form, UploadFile
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 from datetime import datetime, date
 import json
+import os
+import uuid
 
 from services.ai_service import ai_service
+from services.ai_dashboard import ai_dashboard_service
+from services.document_extraction import document_extraction_engine, ExtractionBacklogFull
+from services.document_ingestion import document_ingestion_pipeline
 
 router = APIRouter()
 
@@ -23,6 +28,7 @@ class CashFlowForecastRequest(BaseModel):
 
 class VendorScoringRequest(BaseModel):
     vendor_id: Optional[str] = None
+    limit: Optional[int] = None
 
 class AssetMaintenanceRequest(BaseModel):
     asset_type: str = 'vehicle'
@@ -36,6 +42,13 @@ class DocumentProcessingRequest(BaseModel):
     file_path: str
     document_type: str = 'auto'
 
+class DocumentManifestRequest(BaseModel):
+    directory: Optional[str] = None
+    file_paths: Optional[List[str]] = None
+    pattern: str = '*'
+    recursive: bool = False
+    document_type: str = 'auto'
+
 class AutomationTriggerRequest(BaseModel):
     name: str
     trigger_type: str
@@ -97,11 +110,38 @@ async def forecast_cash_flow(request: CashFlowForecastRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error forecasting cash flow: {str(e)}")
 
+@router.get("/forecasting/status")
+async def get_forecasting_status():
+    """Get the state of the persisted cash flow and budget forecasting models"""
+    try:
+        return {
+            "status": "success",
+            "data": await ai_service.forecasting.status(),
+            "timestamp": datetime.utcnow()
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting forecasting status: {str(e)}")
+
+@router.post("/forecasting/retrain")
+async def retrain_forecasting_models():
+    """Refit the forecasting models now instead of waiting for new transactions"""
+    try:
+        await ai_service.forecasting.get_models(force=True)
+        return {
+            "status": "success",
+            "data": await ai_service.forecasting.status(),
+            "timestamp": datetime.utcnow()
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retraining forecasting models: {str(e)}")
+
 @router.post("/score-vendor-reliability")
 async def score_vendor_reliability(request: VendorScoringRequest):
     """Score vendor reliability based on transaction history and patterns"""
     try:
-        result = await ai_service.score_vendor_reliability(vendor_id=request.vendor_id)
+        result = await ai_service.score_vendor_reliability(vendor_id=request.vendor_id, limit=request.limit)
 
         if result['success']:
             return {
@@ -115,6 +155,26 @@ async def score_vendor_reliability(request: VendorScoringRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error scoring vendor reliability: {str(e)}")
 
+@router.get("/vendor-scores")
+async def get_vendor_scores(
+    limit: int = Query(default=50, ge=1, le=1000),
+    recommendation: Optional[str] = None,
+    min_score: Optional[float] = None
+):
+    """Get materialized vendor reliability rankings, most reliable first"""
+    try:
+        rankings = await ai_service.get_vendor_rankings(limit=limit, recommendation=recommendation, min_score=min_score)
+
+        return {
+            "status": "success",
+            "scores": rankings,
+            "count": len(rankings),
+            "timestamp": datetime.utcnow()
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting vendor scores: {str(e)}")
+
 @router.post("/predict-asset-maintenance")
 async def predict_asset_maintenance(request: AssetMaintenanceRequest):
     """Predict when assets need maintenance"""
@@ -194,6 +254,110 @@ async def process_document(request: DocumentProcessingRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
+@router.post("/process-document/jobs", status_code=202)
+async def submit_document_job(request: DocumentProcessingRequest):
+    """Queue a document for background OCR/extraction and return a job ID to poll"""
+    try:
+        job_id = ai_service.submit_document_job(
+            file_path=request.file_path,
+            document_type=request.document_type
+        )
+
+        return {
+            "status": "accepted",
+            "job_id": job_id,
+            "timestamp": datetime.utcnow()
+        }
+
+    except ExtractionBacklogFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing document: {str(e)}")
+
+@router.get("/process-document/jobs/{job_id}")
+async def get_document_job(job_id: str):
+    """Get the status, and once finished the result, of a document processing job"""
+    job = ai_service.get_document_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Document job not found")
+
+    return {
+        "status": "success",
+        "job": job,
+        "timestamp": datetime.utcnow()
+    }
+
+@router.post("/ingest-documents", status_code=202)
+async def ingest_documents(
+    files: List[UploadFile] = File(...),
+    document_type: str = Form('auto')
+):
+    """Upload a batch of documents and ingest them in the background, skipping already processed content"""
+    try:
+        batch_id = uuid.uuid4().hex
+        items = await document_ingestion_pipeline.save_uploads(files, batch_id)
+        try:
+            job_id = document_ingestion_pipeline.submit(items, document_type, batch_id)
+        except Exception:
+            # The batch will not run, so nothing else removes its files
+            document_ingestion_pipeline.discard_uploads(batch_id)
+            raise
+
+        return {
+            "status": "accepted",
+            "job_id": job_id,
+            "batch_id": batch_id,
+            "documents": len(items),
+            "timestamp": datetime.utcnow()
+        }
+
+    except ExtractionBacklogFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting documents: {str(e)}")
+
+@router.post("/ingest-directory", status_code=202)
+async def ingest_directory(request: DocumentManifestRequest):
+    """Ingest every supported document in a server-side directory or file list in the background"""
+    try:
+        if not request.directory and not request.file_paths:
+            raise HTTPException(status_code=400, detail="Provide a directory or a list of file paths")
+        if request.directory and not os.path.isdir(request.directory):
+            raise HTTPException(status_code=400, detail="Directory not found")
+
+        items = document_ingestion_pipeline.resolve_manifest(
+            directory=request.directory,
+            file_paths=request.file_paths,
+            pattern=request.pattern,
+            recursive=request.recursive
+        )
+        batch_id = uuid.uuid4().hex
+        job_id = document_ingestion_pipeline.submit(items, request.document_type, batch_id)
+
+        return {
+            "status": "accepted",
+            "job_id": job_id,
+            "batch_id": batch_id,
+            "documents": len(items),
+            "timestamp": datetime.utcnow()
+        }
+
+    except HTTPException:
+        raise
+    except ExtractionBacklogFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting directory: {str(e)}")
+
+@router.get("/process-document/stats")
+async def get_document_processing_stats():
+    """Get extraction engine capacity and job counts"""
+    return {
+        "status": "success",
+        "data": document_extraction_engine.stats(),
+        "timestamp": datetime.utcnow()
+    }
+
 @router.get("/document-types")
 async def get_supported_document_types():
     """Get list of supported document types"""
@@ -383,69 +547,17 @@ async def get_analysis_types():
 # ==================== COMPREHENSIVE AI DASHBOARD ====================
 
 @router.get("/ai-dashboard-summary")
-async def get_ai_dashboard_summary():
+async def get_ai_dashboard_summary(refresh: bool = Query(default=False, description="Bypass the cached summary")):
     """Get comprehensive AI dashboard summary"""
     try:
-        # Get summary data from all AI features
-        summary = {
-            "predictive_analytics": {},
-            "automation_status": {},
-            "document_processing": {},
-            "travel_insights": {},
-            "historical_insights": {}
-        }
-
-        # Budget predictions summary
-        budget_data = await ai_service.predict_budget_variance(months_ahead=1)
-        if budget_data['success']:
-            summary["predictive_analytics"]["budget_alerts"] = len(budget_data.get('alerts', []))
-
-        # Cash flow summary
-        cash_flow_data = await ai_service.forecast_cash_flow(days_ahead=7)
-        if cash_flow_data['success']:
-            summary["predictive_analytics"]["cash_flow_alerts"] = len(cash_flow_data.get('alerts', []))
-
-        # Vendor scoring summary
-        vendor_data = await ai_service.score_vendor_reliability()
-        if vendor_data['success']:
-            summary["predictive_analytics"]["vendor_insights"] = vendor_data['summary']
-
-        # Maintenance predictions summary
-        maintenance_data = await ai_service.predict_asset_maintenance()
-        if maintenance_data['success']:
-            summary["predictive_analytics"]["maintenance_alerts"] = maintenance_data['summary']
-
-        # Automation triggers summary
-        triggers_data = await ai_service.check_automation_triggers()
-        if triggers_data['success']:
-            summary["automation_status"] = {
-                "triggers_checked": triggers_data['triggers_checked'],
-                "triggers_executed": triggers_data['triggers_executed']
-            }
-
-        # Document processing summary (mock data for now)
-        summary["document_processing"] = {
-            "documents_processed_today": 0,
-            "pending_classifications": 0
-        }
-
-        # Travel suggestions summary (mock data for now)
-        summary["travel_insights"] = {
-            "active_suggestions": 0,
-            "budget_optimizations": 0
-        }
-
-        # Historical patterns summary
-        patterns_data = await ai_service.analyze_historical_patterns()
-        if patterns_data['success']:
-            summary["historical_insights"] = {
-                "patterns_identified": len(patterns_data.get('insights', [])),
-                "analysis_coverage": "12_months"
-            }
+        result = await ai_dashboard_service.get_summary(force_refresh=refresh)
 
         return {
             "status": "success",
-            "summary": summary,
+            "summary": result["summary"],
+            "sections": result["sections"],
+            "cache": result["cache"],
+            "generated_at": result["generated_at"],
             "timestamp": datetime.utcnow()
         }
 
@@ -49,11 +49,8 @@ async def get_payroll_journal_batch(batch_id: str):
 async def post_payroll_journal_batch(batch_id: str, approved_by: str = "System"):
     """Post/approve a payroll journal batch"""
     try:
-        success = await payroll_journal_service.post_payroll_journal_batch(batch_id, approved_by)
-        if success:
-            return {"message": "Journal batch posted successfully"}
-        else:
-            raise HTTPException(status_code=400, detail="Failed to post journal batch")
+        metrics = await payroll_journal_service.approve_payroll_journal_batch(batch_id, approved_by)
+        return {"message": "Journal batch posted successfully", "metrics": metrics}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
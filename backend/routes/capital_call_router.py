@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
+from services.index_registry import index_registry
 from models.capital_call import CapitalCall, CapitalCallStatus, InvestmentType
 from models.email_approval import ApprovalType
 from typing import Dict, Any, List
@@ -10,19 +12,17 @@ import uuid
 router = APIRouter()
 collection = db.capital_calls
 
+index_registry.declare('capital_calls', 'status')
+index_registry.declare('capital_calls', 'investor_commitments.investor_id')
+
 @router.get("/")
-async def get_capital_calls(status: str = None):
+async def get_capital_calls(status: str = None, page: PageParams = Depends()):
     """Get all capital calls, optionally filtered by status"""
     query = {}
     if status:
         query["status"] = status
 
-    items = []
-    async for item in collection.find(query).sort("created_at", -1):
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(CapitalCall(**item))
-    return items
+    return await paginate(collection, page, CapitalCall, query=query, default_sort="-created_at")
 
 @router.post("/")
 async def create_capital_call(capital_call: CapitalCall):
@@ -160,14 +160,9 @@ async def send_capital_call_alerts(call_id: str, background_tasks: BackgroundTas
     return {"message": "Capital call alerts sent to investors"}
 
 @router.get("/investor/{investor_id}")
-async def get_investor_capital_calls(investor_id: str):
+async def get_investor_capital_calls(investor_id: str, page: PageParams = Depends()):
     """Get capital calls for a specific investor"""
-    items = []
-    async for item in collection.find({"investor_commitments.investor_id": investor_id}):
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(CapitalCall(**item))
-    return items
+    return await paginate(collection, page, CapitalCall, query={"investor_commitments.investor_id": investor_id})
 
 @router.get("/stats/summary")
 async def get_capital_call_stats():
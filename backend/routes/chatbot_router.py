@@ -1,14 +1,20 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
-import requests
+import httpx
 import json
 import os
 import traceback
 from datetime import datetime
 import re
+import time
+import numpy as np
 from fuzzywuzzy import fuzz, process
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
 from database import db
+from services.index_registry import index_registry
+from services.ollama_client import ollama_client, OllamaUnavailable, OLLAMA_BASE_URL, DEFAULT_MODEL
 
 router = APIRouter()
 
@@ -21,9 +27,11 @@ class ChatResponse(BaseModel):
     conversation_id: str
     timestamp: datetime
 
-# Ollama configuration
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+# Seconds to cache aggregate answers (counts, status and balance totals); 0 disables
+QUERY_CACHE_TTL = float(os.getenv("CHATBOT_QUERY_CACHE_TTL", "30"))
+
+# Status values are stored with inconsistent casing ("Active", "active", "inProgress"); strength 2 ignores case
+STATUS_COLLATION = {'locale': 'en', 'strength': 2}
 
 # Load ERP training data
 def load_erp_training_data():
@@ -94,6 +102,27 @@ class DataQueryService:
             'travel_trips': ['travel', 'trip', 'journey']
         }
 
+        self._cache = {}
+
+        # The count/status aggregations filter and group on status; status queries need the collated index
+        for name in self.collection_mapping:
+            index_registry.declare(name, 'status')
+            index_registry.declare(name, 'status', collation=STATUS_COLLATION, name='status_1_ci')
+
+    async def _cached(self, key, compute):
+        """Return a cached aggregate result, computing it when missing or expired"""
+        if QUERY_CACHE_TTL <= 0:
+            return await compute()
+
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+        value = await compute()
+        self._cache[key] = (now + QUERY_CACHE_TTL, value)
+        return value
+
     def identify_entity_type(self, query: str) -> str:
         """Identify which entity type the query is about"""
         query_lower = query.lower()
@@ -177,18 +206,18 @@ class DataQueryService:
     async def _handle_count_query(self, collection, entity_type: str, query: str) -> Dict[str, Any]:
         """Handle count queries"""
         try:
-            # Get total count
-            total_count = 0
-            async for _ in collection.find():
-                total_count += 1
+            total_count = await self._cached(
+                (entity_type, 'count'),
+                lambda: collection.count_documents({})
+            )
 
             # Try to get status-based counts if applicable
             status_counts = {}
             if 'status' in query.lower():
-                status_field = 'status'
-                async for item in collection.find():
-                    status = item.get(status_field, 'unknown')
-                    status_counts[status] = status_counts.get(status, 0) + 1
+                status_counts = await self._cached(
+                    (entity_type, 'status_breakdown'),
+                    lambda: self._status_breakdown(collection, entity_type)
+                )
 
             return {
                 'success': True,
@@ -206,6 +235,14 @@ class DataQueryService:
                 'data': None
             }
 
+    async def _status_breakdown(self, collection, entity_type: str) -> Dict[str, int]:
+        """Count documents per status with a single $group"""
+        pipeline = [{"$group": {"_id": {"$ifNull": ["$status", "unknown"]}, "count": {"$sum": 1}}}]
+        status_counts = {}
+        async for row in collection.aggregate(pipeline):
+            status_counts[str(row["_id"])] = row["count"]
+        return status_counts
+
     async def _handle_list_query(self, collection, entity_type: str, query: str) -> Dict[str, Any]:
         """Handle list queries - return limited results"""
         try:
@@ -213,7 +250,8 @@ class DataQueryService:
             count = 0
             limit = 5  # Limit results for chat display
 
-            async for item in collection.find():
+            # Fetch one extra document to know whether the list was truncated
+            async for item in collection.find().limit(limit + 1):
                 if count >= limit:
                     break
 
@@ -255,25 +293,25 @@ class DataQueryService:
             if not found_status:
                 found_status = 'active'  # Default to active
 
-            items = []
-            count = 0
+            status_filter = {'status': found_status}
 
-            async for item in collection.find():
-                item_status = item.get('status', '').lower()
-                if item_status == found_status.lower():
-                    display_item = self._format_item_for_display(item, entity_type)
-                    items.append(display_item)
-                    count += 1
-                    if count >= 5:  # Limit results
-                        break
+            total_count = await self._cached(
+                (entity_type, 'status', found_status),
+                lambda: collection.count_documents(status_filter, collation=STATUS_COLLATION)
+            )
+
+            items = []
+            async for item in collection.find(status_filter, collation=STATUS_COLLATION).limit(5):  # Limit results
+                items.append(self._format_item_for_display(item, entity_type))
 
             return {
                 'success': True,
-                'message': f'Found {count} {found_status} {entity_type.replace("_", " ")}',
+                'message': f'Found {total_count} {found_status} {entity_type.replace("_", " ")}',
                 'data': {
                     'items': items,
                     'status': found_status,
-                    'count': count,
+                    'count': len(items),
+                    'total_count': total_count,
                     'entity_type': entity_type
                 }
             }
@@ -288,26 +326,23 @@ class DataQueryService:
         """Handle recent/latest queries"""
         try:
             items = []
-            all_items = []
 
-            # Collect all items first
-            async for item in collection.find():
-                all_items.append(item)
-
-            # Sort by creation date if available
+            # Sort by creation date if available, probing a single document for the field
             date_fields = ['createdAt', 'created_at', 'date', 'timestamp']
             sort_field = None
 
+            sample = await collection.find_one({}, {field: 1 for field in date_fields})
             for field in date_fields:
-                if all_items and field in all_items[0]:
+                if sample and field in sample:
                     sort_field = field
                     break
 
+            cursor = collection.find()
             if sort_field:
-                all_items.sort(key=lambda x: x.get(sort_field, ''), reverse=True)
+                cursor = cursor.sort(sort_field, -1)
 
             # Take the most recent 5 items
-            recent_items = all_items[:5]
+            recent_items = await cursor.limit(5).to_list(length=5)
 
             for item in recent_items:
                 display_item = self._format_item_for_display(item, entity_type)
@@ -339,15 +374,22 @@ class DataQueryService:
                     'data': None
                 }
 
-            total_balance = 0
-            card_count = 0
-            cards_info = []
+            async def compute_totals():
+                pipeline = [{"$group": {
+                    "_id": None,
+                    "total": {"$sum": "$currentBalance"},
+                    "count": {"$sum": 1}
+                }}]
+                rows = await collection.aggregate(pipeline).to_list(length=1)
+                return (rows[0]["total"], rows[0]["count"]) if rows else (0, 0)
 
-            async for card in collection.find():
-                balance = card.get('currentBalance', 0)
-                total_balance += balance
-                card_count += 1
+            total_balance, card_count = await self._cached((entity_type, 'balance'), compute_totals)
 
+            # The per-card breakdown is for chat display, so only the largest balances are listed
+            cards_info = []
+            projection = {'bankName': 1, 'cardType': 1, 'currentBalance': 1, 'currency': 1}
+            async for card in collection.find({}, projection).sort('currentBalance', -1).limit(10):
+                balance = card.get('currentBalance', 0)
                 cards_info.append({
                     'bank': card.get('bankName', 'Unknown'),
                     'type': card.get('cardType', 'Unknown'),
@@ -379,7 +421,7 @@ class DataQueryService:
             count = 0
             limit = 3  # Smaller limit for general queries
 
-            async for item in collection.find():
+            async for item in collection.find().limit(limit):
                 if count >= limit:
                     break
 
@@ -471,12 +513,92 @@ class DataQueryService:
 # Initialize the data query service
 data_query_service = DataQueryService()
 
+class ModuleMatchIndex:
+    """Prebuilt fuzzy-match index over module names, features and common questions.
+
+    All candidate strings are scored against a message in one batched rapidfuzz
+    ``cdist`` call. rapidfuzz searches every alignment, so its partial ratio is an
+    upper bound on the block-aligned ``fuzz.partial_ratio`` the chatbot has always
+    used. Candidates are then confirmed with the original scorer in order of that
+    bound, and the scan stops once none of the remaining ones can beat the current
+    best. The result is identical to scoring every candidate in training-data order.
+    """
+
+    MODULE_THRESHOLD = 60
+    FEATURE_THRESHOLD = 50
+    QUESTION_THRESHOLD = 60
+
+    def __init__(self, module_keywords: Dict[str, Dict[str, Any]]):
+        texts, thresholds, modules, is_module_name = [], [], [], []
+
+        for module_name in module_keywords.keys():
+            texts.append(module_name)
+            thresholds.append(self.MODULE_THRESHOLD)
+            modules.append(module_name)
+            is_module_name.append(True)
+
+        for module_name, data in module_keywords.items():
+            for feature in data['features']:
+                texts.append(feature)
+                thresholds.append(self.FEATURE_THRESHOLD)
+                modules.append(module_name)
+                is_module_name.append(False)
+            for question in data['questions']:
+                texts.append(question)
+                thresholds.append(self.QUESTION_THRESHOLD)
+                modules.append(module_name)
+                is_module_name.append(False)
+
+        self.texts = texts
+        self.modules = modules
+        self.thresholds = np.array(thresholds, dtype=np.int64)
+        self.module_positions = np.flatnonzero(np.array(is_module_name, dtype=bool))
+        self.detail_positions = np.flatnonzero(~np.array(is_module_name, dtype=bool))
+
+    def _upper_bounds(self, query: str) -> np.ndarray:
+        scores = rf_process.cdist([query], self.texts, scorer=rf_fuzz.partial_ratio, dtype=np.float64)[0]
+        # Round up with a little slack so float noise can never prune the real best match
+        return np.ceil(scores + 1e-6).astype(np.int64)
+
+    def _search(self, query: str, bounds: np.ndarray, positions: np.ndarray, best_score: int, best_match):
+        """Return the best (score, module) exactly as a sequential strict-``>`` scan would"""
+        candidate_bounds = bounds[positions]
+        eligible = candidate_bounds > np.maximum(self.thresholds[positions], best_score - 1)
+        positions = positions[eligible]
+        order = np.lexsort((positions, -candidate_bounds[eligible]))
+
+        best_pos = -1  # anything found earlier (e.g. a module-name match) wins ties
+        for pos in positions[order].tolist():
+            bound = bounds[pos]
+            if bound < best_score:
+                break
+            if bound == best_score and pos > best_pos:
+                continue
+            score = fuzz.partial_ratio(query, self.texts[pos])
+            if score > self.thresholds[pos] and (score > best_score or (score == best_score and pos < best_pos)):
+                best_score, best_match, best_pos = score, self.modules[pos], pos
+        return best_score, best_match
+
+    def best_match(self, user_lower: str):
+        if not self.texts or not user_lower:
+            return None
+
+        bounds = self._upper_bounds(user_lower)
+        best_score, best_match = self._search(user_lower, bounds, self.module_positions, 0, None)
+
+        # Check features and questions if no good module match
+        if best_score < 70:
+            best_score, best_match = self._search(user_lower, bounds, self.detail_positions, best_score, best_match)
+
+        return best_match
+
 class ERPChatbot:
     """Enhanced ERP chatbot with intelligent response capabilities and data integration"""
 
     def __init__(self, training_data):
         self.training_data = training_data
         self.module_keywords = self._extract_module_keywords()
+        self.match_index = ModuleMatchIndex(self.module_keywords)
         self.data_service = data_query_service
 
     def _extract_module_keywords(self):
@@ -501,33 +623,7 @@ class ERPChatbot:
         if not self.training_data or not self.module_keywords:
             return None
 
-        user_lower = user_message.lower()
-        best_match = None
-        best_score = 0
-
-        # Check module names first
-        for module_name in self.module_keywords.keys():
-            score = fuzz.partial_ratio(user_lower, module_name)
-            if score > best_score and score > 60:  # Threshold for module matching
-                best_score = score
-                best_match = module_name
-
-        # Check features and questions if no good module match
-        if best_score < 70:
-            for module_name, data in self.module_keywords.items():
-                for feature in data['features']:
-                    score = fuzz.partial_ratio(user_lower, feature)
-                    if score > best_score and score > 50:
-                        best_score = score
-                        best_match = module_name
-
-                for question in data['questions']:
-                    score = fuzz.partial_ratio(user_lower, question)
-                    if score > best_score and score > 60:
-                        best_score = score
-                        best_match = module_name
-
-        return best_match
+        return self.match_index.best_match(user_message.lower())
 
     async def get_contextual_response(self, user_message, module_match=None):
         """Generate contextual response based on user message and module match"""
@@ -774,135 +870,86 @@ class ERPChatbot:
 # Initialize the ERP chatbot
 erp_chatbot = ERPChatbot(ERP_TRAINING_DATA) if ERP_TRAINING_DATA else None
 
-@router.post("/message", response_model=ChatResponse)
-async def chat_message(chat_message: ChatMessage):
-    """Send a message to the chatbot and get a response"""
+async def get_erp_response(message: str) -> str:
+    """Answer from the built-in ERP knowledge base and live data, without the LLM"""
+    response_text = "I have comprehensive knowledge about UniverserERP and can help you with questions about any module or feature."
+
     try:
-        # Check if Ollama is available
-        try:
-            test_response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
-            ollama_available = test_response.status_code == 200
-        except:
-            ollama_available = False
+        if erp_chatbot:
+            # Find best module match
+            module_match = erp_chatbot.find_best_module_match(message)
 
-        if ollama_available:
+            # Generate intelligent response (now async)
             try:
-                # Use Ollama if available
-                ollama_payload = {
-                    "model": DEFAULT_MODEL,
-                    "prompt": chat_message.message,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "num_predict": 512
-                    }
-                }
-
-                response = requests.post(
-                    f"{OLLAMA_BASE_URL}/api/generate",
-                    json=ollama_payload,
-                    timeout=30
-                )
+                response_text = await erp_chatbot.get_contextual_response(message, module_match)
+                print(f"DEBUG: Got response from chatbot: {response_text[:50]}...")
+            except Exception as chatbot_error:
+                print(f"ERROR in get_contextual_response: {chatbot_error}")
+                traceback.print_exc()
+                # Fallback to basic response
+                response_text = f"I'm having trouble processing your request right now. However, I can help you with UniverserERP modules. You asked about: {message}"
 
-                if response.status_code == 404:
-                    # Model not found, fall back to enhanced response system
-                    ollama_available = False
-                elif response.status_code != 200:
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Ollama API error: {response.status_code} - {response.text}"
-                    )
-
-                try:
-                    result = response.json()
-
-                    if 'response' not in result:
-                        # Invalid response format, fall back to enhanced system
-                        ollama_available = False
-                    else:
-                        response_text = result['response'].strip()
-                        return ChatResponse(
-                            response=response_text,
-                            conversation_id=chat_message.conversation_id,
-                            timestamp=datetime.now()
-                        )
-                except json.JSONDecodeError:
-                    # Invalid JSON response, fall back to enhanced system
-                    ollama_available = False
-
-                # If we reach here, it means Ollama had issues, continue to fallback system
-
-            except HTTPException:
-                # Re-raise HTTP exceptions (like model not found)
-                raise
-            except Exception as e:
-                # If Ollama request fails for any other reason, fall back to enhanced response system
-                print(f"Ollama request failed: {str(e)}")
-                ollama_available = False
-                response_text = "I have comprehensive knowledge about UniverserERP and can help you with questions about any module or feature."
+            # Add helpful tip if module was identified
+            if module_match:
+                response_text += "\n\n💡 Tip: You can access this module through the main navigation sidebar in your UniverserERP dashboard."
         else:
-            # Enhanced contextual response system
-            response_text = "I have comprehensive knowledge about UniverserERP and can help you with questions about any module or feature."
+            # Fallback if training data is not available
+            user_message = message.lower()
+
+            # Enhanced fallback responses with more ERP context
+            if any(word in user_message for word in ['financial', 'accounting', 'money', 'payment', 'invoice', 'bill']):
+                response_text = "I can help you with financial and accounting questions in UniverserERP. The Financial Management module includes dashboards, reporting, cost center tracking, and budget management. You can access it through the main navigation."
+            elif any(word in user_message for word in ['hr', 'human resources', 'employee', 'payroll', 'staff']):
+                response_text = "For HR and employee management questions, UniverserERP's HR module handles employee data, payroll processing, leave management, and performance tracking. Access it through the HR Dashboard in the main navigation."
+            elif any(word in user_message for word in ['fleet', 'vehicle', 'car', 'truck', 'driver']):
+                response_text = "The Fleet Management module in UniverserERP handles vehicle tracking, maintenance scheduling, fuel monitoring, and driver assignments. You can access fleet features through the Operations section."
+            elif any(word in user_message for word in ['maintenance', 'repair', 'fix']):
+                response_text = "UniverserERP includes comprehensive maintenance management with request tracking, scheduling, cost management, and predictive maintenance alerts. Access maintenance features through the Operations > Maintenance section."
+            elif any(word in user_message for word in ['inventory', 'stock', 'warehouse']):
+                response_text = "Inventory management in UniverserERP includes stock tracking, purchase orders, supplier management, and warehouse operations. Access inventory features through the Operations > Inventory section."
+            elif any(word in user_message for word in ['help', 'support', 'assist', 'guide']):
+                response_text = "I'm here to help with your UniverserERP system! I can provide guidance on Financial Management, HR, Fleet Operations, Maintenance, Inventory, and all other modules. What specific area would you like to know about?"
+            elif any(word in user_message for word in ['dashboard', 'main', 'home', 'overview']):
+                response_text = "The UniverserERP dashboard provides a comprehensive overview of all your business operations with real-time metrics, quick access to key modules, and personalized insights based on your role and permissions."
+            elif any(word in user_message for word in ['report', 'analytics', 'data', 'kpi']):
+                response_text = "UniverserERP provides comprehensive reporting and analytics across all modules including financial reports, HR analytics, fleet performance data, maintenance insights, and custom dashboards tailored to your business needs."
+    except Exception as e:
+        # Log the error for debugging
+        print(f"ERROR in chatbot processing: {str(e)}")
+        print(f"Error type: {type(e)}")
+        import traceback
+        traceback.print_exc()
 
-            try:
-                if erp_chatbot:
-                    # Find best module match
-                    module_match = erp_chatbot.find_best_module_match(chat_message.message)
-
-                    # Generate intelligent response (now async)
-                    try:
-                        response_text = await erp_chatbot.get_contextual_response(chat_message.message, module_match)
-                        print(f"DEBUG: Got response from chatbot: {response_text[:50]}...")
-                    except Exception as chatbot_error:
-                        print(f"ERROR in get_contextual_response: {chatbot_error}")
-                        traceback.print_exc()
-                        # Fallback to basic response
-                        response_text = f"I'm having trouble processing your request right now. However, I can help you with UniverserERP modules. You asked about: {chat_message.message}"
-
-                    # Add helpful tip if module was identified
-                    if module_match:
-                        response_text += "\n\n💡 Tip: You can access this module through the main navigation sidebar in your UniverserERP dashboard."
-                else:
-                    # Fallback if training data is not available
-                    user_message = chat_message.message.lower()
-
-                    # Enhanced fallback responses with more ERP context
-                    if any(word in user_message for word in ['financial', 'accounting', 'money', 'payment', 'invoice', 'bill']):
-                        response_text = "I can help you with financial and accounting questions in UniverserERP. The Financial Management module includes dashboards, reporting, cost center tracking, and budget management. You can access it through the main navigation."
-                    elif any(word in user_message for word in ['hr', 'human resources', 'employee', 'payroll', 'staff']):
-                        response_text = "For HR and employee management questions, UniverserERP's HR module handles employee data, payroll processing, leave management, and performance tracking. Access it through the HR Dashboard in the main navigation."
-                    elif any(word in user_message for word in ['fleet', 'vehicle', 'car', 'truck', 'driver']):
-                        response_text = "The Fleet Management module in UniverserERP handles vehicle tracking, maintenance scheduling, fuel monitoring, and driver assignments. You can access fleet features through the Operations section."
-                    elif any(word in user_message for word in ['maintenance', 'repair', 'fix']):
-                        response_text = "UniverserERP includes comprehensive maintenance management with request tracking, scheduling, cost management, and predictive maintenance alerts. Access maintenance features through the Operations > Maintenance section."
-                    elif any(word in user_message for word in ['inventory', 'stock', 'warehouse']):
-                        response_text = "Inventory management in UniverserERP includes stock tracking, purchase orders, supplier management, and warehouse operations. Access inventory features through the Operations > Inventory section."
-                    elif any(word in user_message for word in ['help', 'support', 'assist', 'guide']):
-                        response_text = "I'm here to help with your UniverserERP system! I can provide guidance on Financial Management, HR, Fleet Operations, Maintenance, Inventory, and all other modules. What specific area would you like to know about?"
-                    elif any(word in user_message for word in ['dashboard', 'main', 'home', 'overview']):
-                        response_text = "The UniverserERP dashboard provides a comprehensive overview of all your business operations with real-time metrics, quick access to key modules, and personalized insights based on your role and permissions."
-                    elif any(word in user_message for word in ['report', 'analytics', 'data', 'kpi']):
-                        response_text = "UniverserERP provides comprehensive reporting and analytics across all modules including financial reports, HR analytics, fleet performance data, maintenance insights, and custom dashboards tailored to your business needs."
-            except Exception as e:
-                # Log the error for debugging
-                print(f"ERROR in chatbot processing: {str(e)}")
-                print(f"Error type: {type(e)}")
-                import traceback
-                traceback.print_exc()
+        # Ensure we always have a response
+        response_text = f"I apologize, but I encountered an error processing your request: {str(e)}. Please try asking about UniverserERP modules like Financial Management, HR, Fleet Management, or Maintenance."
 
-                # Ensure we always have a response
-                response_text = f"I apologize, but I encountered an error processing your request: {str(e)}. Please try asking about UniverserERP modules like Financial Management, HR, Fleet Management, or Maintenance."
+    # Ensure response_text is never None or empty
+    if not response_text or response_text.strip() == "":
+        response_text = "I have comprehensive knowledge about UniverserERP and can help you with questions about any module or feature. Please ask me about specific modules like Financial Management, HR, Fleet Operations, or Maintenance."
 
-            # Ensure response_text is never None or empty
-            if not response_text or response_text.strip() == "":
-                response_text = "I have comprehensive knowledge about UniverserERP and can help you with questions about any module or feature. Please ask me about specific modules like Financial Management, HR, Fleet Operations, or Maintenance."
+    return response_text
 
-            return ChatResponse(
-                response=response_text,
-                conversation_id=chat_message.conversation_id,
-                timestamp=datetime.now()
-            )
+@router.post("/message", response_model=ChatResponse)
+async def chat_message(chat_message: ChatMessage):
+    """Send a message to the chatbot and get a response"""
+    try:
+        response_text = None
+
+        if await ollama_client.is_available():
+            try:
+                response_text = await ollama_client.generate(chat_message.message)
+            except OllamaUnavailable as e:
+                # Model missing or server trouble, fall back to enhanced response system
+                print(f"Ollama request failed: {str(e)}")
+
+        if not response_text:
+            response_text = await get_erp_response(chat_message.message)
+
+        return ChatResponse(
+            response=response_text,
+            conversation_id=chat_message.conversation_id,
+            timestamp=datetime.now()
+        )
 
     except HTTPException:
         raise
@@ -912,20 +959,42 @@ async def chat_message(chat_message: ChatMessage):
             detail=f"Chatbot error: {str(e)}"
         )
 
+def _sse_event(data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+@router.post("/message/stream")
+async def chat_message_stream(chat_message: ChatMessage):
+    """Stream the chatbot response as server-sent events, token by token when Ollama is available"""
+    async def events():
+        streamed = False
+        if await ollama_client.is_available():
+            try:
+                async for token in ollama_client.stream_generate(chat_message.message):
+                    streamed = True
+                    yield _sse_event({"token": token})
+            except OllamaUnavailable as e:
+                print(f"Ollama streaming failed: {str(e)}")
+
+        if not streamed:
+            yield _sse_event({"token": await get_erp_response(chat_message.message)})
+
+        yield _sse_event({
+            "done": True,
+            "conversation_id": chat_message.conversation_id,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/models")
 async def get_available_models():
     """Get list of available Ollama models"""
     try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=10)
-
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to fetch models: {response.status_code}"
-            )
-
-        data = response.json()
-        models = [model['name'] for model in data.get('models', [])]
+        models = await ollama_client.list_models()
 
         return {
             "models": models,
@@ -933,7 +1002,7 @@ async def get_available_models():
             "ollama_status": "connected"
         }
 
-    except requests.exceptions.RequestException:
+    except OllamaUnavailable:
         return {
             "models": [],
             "default_model": DEFAULT_MODEL,
@@ -951,7 +1020,7 @@ async def test_ollama_connection():
     """Test connection to Ollama server"""
     try:
         # Try to get models list as a connection test
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
+        response = await ollama_client.client.get("/api/tags", timeout=5.0)
 
         if response.status_code == 200:
             return {
@@ -966,7 +1035,7 @@ async def test_ollama_connection():
                 "base_url": OLLAMA_BASE_URL
             }
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return {
             "status": "disconnected",
             "message": f"Cannot connect to Ollama server: {str(e)}",
@@ -977,4 +1046,4 @@ async def test_ollama_connection():
             "status": "error",
             "message": f"Unexpected error: {str(e)}",
             "base_url": OLLAMA_BASE_URL
-        }
\ No newline at end of file
+        }
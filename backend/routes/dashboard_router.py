@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from database import db
 from datetime import datetime, timedelta
 from bson import ObjectId
+from services.index_registry import index_registry
 
 router = APIRouter()
 
@@ -19,6 +20,17 @@ racing_payment_collection = db.racing_payments
 team_member_collection = db.team_members
 inventory_collection = db.inventory
 
+# Submitted-invoice totals and recent lists, monthly charts and consultant counts
+for invoice_collection in ('sales_invoices', 'purchase_invoices'):
+    index_registry.declare(invoice_collection, [("status", 1), ("date", -1)])
+    index_registry.declare(invoice_collection, 'date')
+    index_registry.declare_query(f'dashboard.{invoice_collection}.recent_submitted', invoice_collection,
+                                 {"status": "Submitted"}, sort=[("date", -1)])
+    index_registry.declare_query(f'dashboard.{invoice_collection}.since', invoice_collection,
+                                 {"date": {"$gte": "1970-01-01"}})
+index_registry.declare('team_members', 'status')
+index_registry.declare_query('dashboard.active_team_members', 'team_members', {"status": "Active"})
+
 @router.get("/accounting")
 async def get_accounting_dashboard():
     # Get total revenue from sales invoices
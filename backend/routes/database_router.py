@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime
+
+from services.index_registry import index_registry
+
+router = APIRouter()
+
+@router.get("/indexes")
+async def get_indexes():
+    """Get every declared index and whether it exists, was created, is building or conflicts"""
+    try:
+        return {**index_registry.summary(), "timestamp": datetime.utcnow()}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting indexes: {str(e)}")
+
+@router.get("/collection-scans")
+async def get_collection_scans(
+    minutes: int = Query(default=60, ge=1, le=10080),
+    limit: int = Query(default=20, ge=1, le=200)
+):
+    """Get queries that scan whole collections, from the profiler, server counters and explain"""
+    try:
+        return {**await index_registry.collection_scans(minutes, limit), "timestamp": datetime.utcnow()}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting collection scans: {str(e)}")
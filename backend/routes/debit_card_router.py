@@ -1,29 +1,36 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Header, Query
 from bson import ObjectId
+from pymongo import ReturnDocument
 from database import db
+from pagination import PageParams, paginate
 from models.debit_card import DebitCard, DebitCardAlert, DebitCardSettings
+from services.card_balance import card_balance_service
+from services.job_scheduler import changed_since
+from services.index_registry import index_registry
 from datetime import datetime
-import asyncio
+from typing import Any, Dict, Optional
 
 router = APIRouter()
 debit_cards_collection = db.debit_cards
 alerts_collection = db.debit_card_alerts
 settings_collection = db.debit_card_settings
 
+# Cards at or below their alert threshold (500 when unset)
+LOW_BALANCE_FILTER = {"$expr": {"$lte": ["$currentBalance", {"$ifNull": ["$alertThreshold", 500]}]}}
+ALERT_WRITE_BATCH = 1000
+
+# Incremental alert sweeps select cards changed since the last run, then their unread alerts
+index_registry.declare('debit_cards', 'updatedAt')
+index_registry.declare('debit_cards', 'createdAt')
+index_registry.declare('debit_card_alerts', [("debitCardId", 1), ("alertType", 1)])
+
 # Debit Cards CRUD
 @router.get("/")
-async def get_debit_cards():
+async def get_debit_cards(page: PageParams = Depends()):
     try:
-        items = []
-        async for item in debit_cards_collection.find():
-            # Convert ObjectId to string and set both _id and id fields
-            item["_id"] = str(item["_id"])
-            item["id"] = str(item["_id"])
-            # Remove the MongoDB _id field from the item dict before creating DebitCard
-            item_copy = item.copy()
-            item_copy.pop("_id", None)  # Remove _id to avoid conflicts
-            items.append(DebitCard(**item_copy))
-        return items
+        return await paginate(debit_cards_collection, page, DebitCard)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching debit cards: {e}")
         import traceback
@@ -37,6 +44,7 @@ async def create_debit_card(item: DebitCard, background_tasks: BackgroundTasks):
     item_dict = item.dict(exclude_unset=True)
     result = await debit_cards_collection.insert_one(item_dict)
     item.id = str(result.inserted_id)
+    await card_balance_service.card_created(item_dict)
 
     # Check for alerts after creation
     background_tasks.add_task(check_card_alerts, item.id)
@@ -57,32 +65,49 @@ async def get_debit_card(item_id: str):
 @router.put("/{item_id}")
 async def update_debit_card(item_id: str, item: DebitCard, background_tasks: BackgroundTasks):
     item.updatedAt = datetime.utcnow()
-    item_dict = item.dict(exclude_unset=True)
-    result = await debit_cards_collection.replace_one({"_id": ObjectId(item_id)}, item_dict)
-    if result.matched_count == 0:
+    # The balance only moves through the ledger (refill, spend), so a balance in the body is ignored
+    item_dict = item.dict(exclude_unset=True, exclude={"id", "currentBalance"})
+    card = await debit_cards_collection.find_one_and_update(
+        {"_id": ObjectId(item_id)}, {"$set": item_dict},
+        return_document=ReturnDocument.AFTER
+    )
+    if card is None:
         raise HTTPException(status_code=404, detail="Debit card not found")
-    item.id = item_id
+    card["id"] = str(card.pop("_id"))
 
     # Check for alerts after update
     background_tasks.add_task(check_card_alerts, item_id)
-    return item
+    return DebitCard(**card)
 
 @router.delete("/{item_id}")
 async def delete_debit_card(item_id: str):
-    result = await debit_cards_collection.delete_one({"_id": ObjectId(item_id)})
-    if result.deleted_count == 0:
+    card = await debit_cards_collection.find_one_and_delete(
+        {"_id": ObjectId(item_id)}, projection={"currentBalance": 1}
+    )
+    if card is None:
         raise HTTPException(status_code=404, detail="Debit card not found")
+    await card_balance_service.card_deleted(card)
     return {"message": "Debit card deleted"}
 
+# Balances
+@router.get("/balances/snapshot")
+async def get_balance_snapshot():
+    return await card_balance_service.get_snapshot()
+
+@router.post("/balances/snapshot/rebuild")
+async def rebuild_balance_snapshot():
+    try:
+        return await card_balance_service.rebuild_snapshot()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding balance snapshot: {str(e)}")
+
 # Alerts
 @router.get("/alerts/")
-async def get_alerts():
+async def get_alerts(page: PageParams = Depends()):
     try:
-        items = []
-        async for item in alerts_collection.find():
-            item["_id"] = str(item["_id"])
-            items.append(DebitCardAlert(**item))
-        return items
+        return await paginate(alerts_collection, page, DebitCardAlert)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching alerts: {e}")
         import traceback
@@ -142,7 +167,7 @@ async def update_settings(item: DebitCardSettings):
 
 # Auto-refill endpoint
 @router.post("/{card_id}/refill")
-async def auto_refill_card(card_id: str):
+async def auto_refill_card(card_id: str, idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
     card = await debit_cards_collection.find_one({"_id": ObjectId(card_id)})
     if not card:
         raise HTTPException(status_code=404, detail="Debit card not found")
@@ -151,19 +176,18 @@ async def auto_refill_card(card_id: str):
         raise HTTPException(status_code=400, detail="Auto-refill not enabled for this card")
 
     refill_amount = card.get("autoRefillAmount", 1000)
-    new_balance = card["currentBalance"] + refill_amount
 
-    # Update balance and last refill date
-    await debit_cards_collection.update_one(
-        {"_id": ObjectId(card_id)},
-        {
-            "$set": {
-                "currentBalance": new_balance,
-                "lastRefillDate": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
-            }
-        }
+    # Atomically add to the balance and stamp the refill date; a replayed key is not applied again
+    result = await card_balance_service.credit(
+        card_id, refill_amount, kind="refill",
+        idempotency_key=idempotency_key,
+        set_fields={"lastRefillDate": datetime.utcnow()}
     )
+    if not result["applied"]:
+        raise HTTPException(status_code=409, detail=f"Refill not applied: {result['reason']}")
+    new_balance = result["balance"]
+    if result["duplicate"]:
+        return {"message": f"Card refilled with ₹{refill_amount}", "new_balance": new_balance}
 
     # Create refill alert
     alert = DebitCardAlert(
@@ -175,48 +199,115 @@ async def auto_refill_card(card_id: str):
 
     return {"message": f"Card refilled with ₹{refill_amount}", "new_balance": new_balance}
 
-# Background task to check alerts
-async def check_card_alerts(card_id: str):
-    await asyncio.sleep(1)  # Small delay to ensure update is processed
+@router.post("/{card_id}/spend")
+async def spend_from_card(card_id: str, amount: float = Query(..., gt=0), description: Optional[str] = None,
+                          idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
+    result = await card_balance_service.debit(
+        card_id, amount, kind="spend",
+        idempotency_key=idempotency_key,
+        details={"description": description} if description else None
+    )
+    if result["reason"] == "card_not_found":
+        raise HTTPException(status_code=404, detail="Debit card not found")
+    if not result["applied"]:
+        raise HTTPException(status_code=409, detail="Insufficient balance")
+    return result
 
-    card = await debit_cards_collection.find_one({"_id": ObjectId(card_id)})
-    if not card:
-        return
+@router.get("/{card_id}/transactions")
+async def get_card_transactions(card_id: str, limit: int = Query(default=50, le=500)):
+    return await card_balance_service.transactions(card_id, limit)
+
+# Low-balance alert sweep
+async def raise_low_balance_alerts(query: Dict[str, Any]) -> Dict[str, int]:
+    """Alert (and auto-refill) every card matching ``query`` that is at or below its threshold.
+
+    Low cards are selected in one query, existing unread alerts are prefetched in
+    one query, and new alerts and refills are written in bulk.
+    """
+    low_cards = []
+    async for card in debit_cards_collection.find({"$and": [query, LOW_BALANCE_FILTER]}):
+        low_cards.append(card)
 
-    balance = card["currentBalance"]
-    threshold = card.get("alertThreshold", 500)
+    if not low_cards:
+        return {"low_balance_cards": 0, "alerts_created": 0, "cards_refilled": 0}
 
-    if balance <= threshold:
-        # Check if alert already exists
-        existing_alert = await alerts_collection.find_one({
-            "debitCardId": card_id,
+    # Cards that already have an unread low-balance alert
+    alerted = set()
+    async for alert in alerts_collection.find(
+        {
+            "debitCardId": {"$in": [str(card["_id"]) for card in low_cards]},
             "alertType": "low_balance",
-            "isRead": False
-        })
+            "isRead": {"$ne": True}
+        },
+        {"debitCardId": 1}
+    ):
+        alerted.add(alert["debitCardId"])
 
-        if not existing_alert:
-            alert = DebitCardAlert(
-                debitCardId=card_id,
-                alertType="low_balance",
-                message=f"Low balance alert: Card {card['cardNumber']} has ₹{balance} remaining (threshold: ₹{threshold})"
-            )
-            await create_alert(alert)
+    now = datetime.utcnow()
+    low_balance_alerts, refills = [], []
+    for card in low_cards:
+        card_id = str(card["_id"])
+        if card_id in alerted:
+            continue
 
-            # Send notification (console log for now, can be extended to email/SMS)
-            print(f"🚨 ALERT: {alert.message}")
+        balance = card["currentBalance"]
+        threshold = card.get("alertThreshold", 500)
+        alert = DebitCardAlert(
+            debitCardId=card_id,
+            alertType="low_balance",
+            message=f"Low balance alert: Card {card['cardNumber']} has ₹{balance} remaining (threshold: ₹{threshold})",
+            isRead=False,
+            createdAt=now
+        )
+        low_balance_alerts.append(alert.dict(exclude_unset=True))
 
-            # Auto-refill if enabled
-            if card.get("autoRefillEnabled", False):
-                await auto_refill_card(card_id)
+        # Send notification (console log for now, can be extended to email/SMS)
+        print(f"🚨 ALERT: {alert.message}")
 
-# Periodic alert check (could be called by a scheduler)
-@router.post("/check-all-alerts")
-async def check_all_alerts():
-    cards = []
-    async for card in debit_cards_collection.find():
-        cards.append(card)
+        # Auto-refill if enabled
+        if card.get("autoRefillEnabled", False):
+            refills.append((card, low_balance_alerts[-1]))
+
+    for start in range(0, len(low_balance_alerts), ALERT_WRITE_BATCH):
+        await alerts_collection.insert_many(low_balance_alerts[start:start + ALERT_WRITE_BATCH], ordered=False)
 
-    for card in cards:
-        await check_card_alerts(str(card["_id"]))
+    # Each refill is keyed by the alert that triggered it, so a retried sweep never refills twice
+    refilled = 0
+    for start in range(0, len(refills), ALERT_WRITE_BATCH):
+        chunk = {
+            f"auto_refill:{alert['_id']}": (card, card.get("autoRefillAmount", 1000))
+            for card, alert in refills[start:start + ALERT_WRITE_BATCH]
+        }
+        applied = await card_balance_service.credit_many(
+            [(card["_id"], amount, key) for key, (card, amount) in chunk.items()],
+            kind="auto_refill",
+            set_fields={"lastRefillDate": now}
+        )
+        refill_alerts = [DebitCardAlert(
+            debitCardId=str(card["_id"]),
+            alertType="auto_refill",
+            message=f"Card {card['cardNumber']} auto-refilled with ₹{amount}. New balance: ₹{applied[key]}",
+            isRead=False,
+            createdAt=now
+        ).dict(exclude_unset=True) for key, (card, amount) in ((key, chunk[key]) for key in applied)]
+        if refill_alerts:
+            await alerts_collection.insert_many(refill_alerts, ordered=False)
+        refilled += len(applied)
+
+    return {"low_balance_cards": len(low_cards), "alerts_created": len(low_balance_alerts), "cards_refilled": refilled}
+
+# Background task to check alerts
+async def check_card_alerts(card_id: str):
+    await raise_low_balance_alerts({"_id": ObjectId(card_id)})
+
+async def sweep_card_alerts(since: Optional[datetime] = None) -> Dict[str, Any]:
+    """Check alerts for every card, or only cards changed since ``since`` (scheduled job)"""
+    query = changed_since(since)
+    result = await raise_low_balance_alerts(query)
+    return {"cards_checked": await debit_cards_collection.count_documents(query), **result}
 
-    return {"message": f"Checked alerts for {len(cards)} cards"}
\ No newline at end of file
+# Periodic alert check (also run by the job scheduler)
+@router.post("/check-all-alerts")
+async def check_all_alerts():
+    result = await sweep_card_alerts()
+    return {"message": f"Checked alerts for {result['cards_checked']} cards"}
\ No newline at end of file
@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.driver import Driver
 
 router = APIRouter()
 collection = db.drivers
 
 @router.get("/")
-async def get_drivers():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(Driver(**item))
-    return items
+async def get_drivers(page: PageParams = Depends()):
+    return await paginate(collection, page, Driver)
 
 @router.post("/")
 async def create_driver(item: Driver):
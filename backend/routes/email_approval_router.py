@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.email_approval import EmailApproval, ApprovalStatus, ApprovalType
 from typing import Dict, Any, Optional
 import secrets
 import string
 from datetime import datetime, timedelta
 from email_service import send_approval_email
+from services.approval_store import approval_store
 
 router = APIRouter()
 collection = db.email_approvals
@@ -17,18 +19,13 @@ def generate_approval_token(length: int = 32) -> str:
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 @router.get("/")
-async def get_email_approvals(status: Optional[str] = None):
+async def get_email_approvals(status: Optional[str] = None, page: PageParams = Depends()):
     """Get all email approvals, optionally filtered by status"""
     query = {}
     if status:
         query["status"] = status
 
-    items = []
-    async for item in collection.find(query):
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(EmailApproval(**item))
-    return items
+    return await paginate(collection, page, EmailApproval, query=query)
 
 @router.post("/")
 async def create_email_approval(
@@ -51,7 +48,7 @@ async def create_email_approval(
     )
 
     approval_dict = approval.dict(exclude_unset=True)
-    result = await collection.insert_one(approval_dict)
+    approval_id = await approval_store.create(approval_dict)
 
     # Send approval email in background
     background_tasks.add_task(
@@ -61,46 +58,32 @@ async def create_email_approval(
         approval.approver_name,
         approval.reference_title,
         approval.approval_type,
-        str(result.inserted_id),
+        approval_id,
         approval_token,
         approval.description
     )
 
-    return {"message": "Approval request created and email sent", "id": str(result.inserted_id)}
+    return {"message": "Approval request created and email sent", "id": approval_id}
 
-@router.get("/approve/{token}")
-async def approve_by_token(token: str):
-    """One-click approval via email link"""
-    # Find approval by token
-    approval = await collection.find_one({"approval_token": token})
+async def decide_by_token(token: str, status: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a decision to the pending approval behind a token"""
+    outcome, approval = await approval_store.decide(token, status, fields)
 
-    if not approval:
+    if outcome == "not_found":
         raise HTTPException(status_code=404, detail="Invalid or expired approval token")
-
-    # Check if expired
-    expires_at = datetime.fromisoformat(approval["expires_at"].replace('Z', '+00:00'))
-    if datetime.utcnow() > expires_at:
-        await collection.update_one(
-            {"_id": approval["_id"]},
-            {"$set": {"status": ApprovalStatus.EXPIRED.value}}
-        )
+    if outcome == "expired":
         raise HTTPException(status_code=400, detail="Approval token has expired")
-
-    # Check if already processed
-    if approval["status"] != ApprovalStatus.PENDING.value:
+    if outcome == "processed":
         raise HTTPException(status_code=400, detail=f"Approval already {approval['status']}")
+    return approval
 
-    # Update approval status
-    await collection.update_one(
-        {"_id": approval["_id"]},
-        {
-            "$set": {
-                "status": ApprovalStatus.APPROVED.value,
-                "approved_at": datetime.utcnow(),
-                "approved_by": "email_approval"
-            }
-        }
-    )
+@router.get("/approve/{token}")
+async def approve_by_token(token: str):
+    """One-click approval via email link"""
+    approval = await decide_by_token(token, ApprovalStatus.APPROVED.value, {
+        "approved_at": datetime.utcnow(),
+        "approved_by": "email_approval"
+    })
 
     # Here you would trigger the actual approval action based on approval_type
     # For example, update the related maintenance request, leave request, etc.
@@ -117,24 +100,7 @@ async def approve_with_details(
     approval_details: Dict[str, Any]
 ):
     """Approve with additional details/notes"""
-    # Find approval by token
-    approval = await collection.find_one({"approval_token": token})
-
-    if not approval:
-        raise HTTPException(status_code=404, detail="Invalid or expired approval token")
-
-    # Check if expired
-    expires_at = datetime.fromisoformat(approval["expires_at"].replace('Z', '+00:00'))
-    if datetime.utcnow() > expires_at:
-        await collection.update_one(
-            {"_id": approval["_id"]},
-            {"$set": {"status": ApprovalStatus.EXPIRED.value}}
-        )
-        raise HTTPException(status_code=400, detail="Approval token has expired")
-
-    # Update approval status with details
     update_data = {
-        "status": ApprovalStatus.APPROVED.value,
         "approved_at": datetime.utcnow(),
         "approved_by": "email_approval"
     }
@@ -142,10 +108,7 @@ async def approve_with_details(
     if "notes" in approval_details:
         update_data["approval_notes"] = approval_details["notes"]
 
-    await collection.update_one(
-        {"_id": approval["_id"]},
-        {"$set": update_data}
-    )
+    approval = await decide_by_token(token, ApprovalStatus.APPROVED.value, update_data)
 
     return {
         "message": "Approval successful",
@@ -159,33 +122,11 @@ async def reject_by_token(
     rejection_data: Dict[str, Any]
 ):
     """Reject approval via email link"""
-    # Find approval by token
-    approval = await collection.find_one({"approval_token": token})
-
-    if not approval:
-        raise HTTPException(status_code=404, detail="Invalid or expired approval token")
-
-    # Check if expired
-    expires_at = datetime.fromisoformat(approval["expires_at"].replace('Z', '+00:00'))
-    if datetime.utcnow() > expires_at:
-        await collection.update_one(
-            {"_id": approval["_id"]},
-            {"$set": {"status": ApprovalStatus.EXPIRED.value}}
-        )
-        raise HTTPException(status_code=400, detail="Approval token has expired")
-
-    # Update approval status
-    await collection.update_one(
-        {"_id": approval["_id"]},
-        {
-            "$set": {
-                "status": ApprovalStatus.REJECTED.value,
-                "approved_at": datetime.utcnow(),
-                "approved_by": "email_approval",
-                "rejection_reason": rejection_data.get("reason", "")
-            }
-        }
-    )
+    approval = await decide_by_token(token, ApprovalStatus.REJECTED.value, {
+        "approved_at": datetime.utcnow(),
+        "approved_by": "email_approval",
+        "rejection_reason": rejection_data.get("reason", "")
+    })
 
     return {
         "message": "Rejection recorded",
@@ -227,6 +168,7 @@ async def update_email_approval(approval_id: str, updates: Dict[str, Any]):
         update_dict["$set"]["updated_at"] = datetime.utcnow()
 
     result = await collection.update_one({"_id": object_id}, update_dict)
+    approval_store.forget(existing_approval.get("approval_token"))
 
     # Get updated approval
     updated_approval = await collection.find_one({"_id": object_id})
@@ -243,9 +185,10 @@ async def delete_email_approval(approval_id: str):
     except:
         raise HTTPException(status_code=400, detail="Invalid approval ID")
 
-    result = await collection.delete_one({"_id": object_id})
-    if result.deleted_count == 0:
+    deleted = await collection.find_one_and_delete({"_id": object_id}, projection={"approval_token": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Email approval not found")
+    approval_store.forget(deleted.get("approval_token"))
 
     return {"message": "Email approval deleted"}
 
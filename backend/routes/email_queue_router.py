@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Query
+from bson import ObjectId
+from datetime import datetime
+
+from services.email_queue import email_queue
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_email_queue_stats():
+    """Get outbound email counts by status and the number of dead letters"""
+    try:
+        return {**await email_queue.stats(), "timestamp": datetime.utcnow()}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting email queue stats: {str(e)}")
+
+@router.get("/dead-letters")
+async def get_dead_letters(limit: int = Query(default=50, ge=1, le=500)):
+    """Get the most recent emails that could not be delivered"""
+    try:
+        return {"dead_letters": await email_queue.list_dead_letters(limit)}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting dead letters: {str(e)}")
+
+@router.post("/dead-letters/{letter_id}/retry")
+async def retry_dead_letter(letter_id: str):
+    """Queue a dead letter for delivery again"""
+    if not ObjectId.is_valid(letter_id):
+        raise HTTPException(status_code=400, detail="Invalid dead letter ID")
+    try:
+        message_id = await email_queue.retry_dead_letter(letter_id)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrying dead letter: {str(e)}")
+
+    if message_id is None:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    return {"message": "Email queued for delivery", "message_id": message_id}
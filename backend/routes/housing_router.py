@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.housing import Property, HousingStaff, HousingMaintenance, HousingPurchase
 from datetime import datetime
 
@@ -14,15 +15,8 @@ housing_purchases_collection = db.housing_purchases
 
 # Properties CRUD
 @router.get("/properties/")
-async def get_properties():
-    items = []
-    async for item in properties_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(Property(**item_copy))
-    return items
+async def get_properties(page: PageParams = Depends()):
+    return await paginate(properties_collection, page, Property)
 
 @router.post("/properties/")
 async def create_property(item: Property):
@@ -63,15 +57,8 @@ async def delete_property(item_id: str):
 
 # Housing Staff CRUD
 @router.get("/staff/")
-async def get_housing_staff():
-    items = []
-    async for item in housing_staff_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(HousingStaff(**item_copy))
-    return items
+async def get_housing_staff(page: PageParams = Depends()):
+    return await paginate(housing_staff_collection, page, HousingStaff)
 
 @router.post("/staff/")
 async def create_housing_staff(item: HousingStaff):
@@ -112,15 +99,8 @@ async def delete_housing_staff(item_id: str):
 
 # Housing Maintenance CRUD
 @router.get("/maintenance/")
-async def get_housing_maintenance():
-    items = []
-    async for item in housing_maintenance_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(HousingMaintenance(**item_copy))
-    return items
+async def get_housing_maintenance(page: PageParams = Depends()):
+    return await paginate(housing_maintenance_collection, page, HousingMaintenance)
 
 @router.post("/maintenance/")
 async def create_housing_maintenance(item: HousingMaintenance):
@@ -161,15 +141,8 @@ async def delete_housing_maintenance(item_id: str):
 
 # Housing Purchases CRUD
 @router.get("/purchases/")
-async def get_housing_purchases():
-    items = []
-    async for item in housing_purchases_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(HousingPurchase(**item_copy))
-    return items
+async def get_housing_purchases(page: PageParams = Depends()):
+    return await paginate(housing_purchases_collection, page, HousingPurchase)
 
 @router.post("/purchases/")
 async def create_housing_purchase(item: HousingPurchase):
@@ -236,38 +209,17 @@ async def get_housing_dashboard_summary():
     }
 
 @router.get("/properties/by-location/{location}")
-async def get_properties_by_location(location: str):
+async def get_properties_by_location(location: str, page: PageParams = Depends()):
     """Get properties filtered by location"""
-    items = []
     query = {"location": {"$regex": location, "$options": "i"}} if location != "all" else {}
-    async for item in properties_collection.find(query):
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(Property(**item_copy))
-    return items
+    return await paginate(properties_collection, page, Property, query=query)
 
 @router.get("/staff/by-property/{property_id}")
-async def get_staff_by_property(property_id: str):
+async def get_staff_by_property(property_id: str, page: PageParams = Depends()):
     """Get staff members for a specific property"""
-    items = []
-    async for item in housing_staff_collection.find({"propertyId": property_id}):
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(HousingStaff(**item_copy))
-    return items
+    return await paginate(housing_staff_collection, page, HousingStaff, query={"propertyId": property_id})
 
 @router.get("/maintenance/by-property/{property_id}")
-async def get_maintenance_by_property(property_id: str):
+async def get_maintenance_by_property(property_id: str, page: PageParams = Depends()):
     """Get maintenance records for a specific property"""
-    items = []
-    async for item in housing_maintenance_collection.find({"propertyId": property_id}):
-        item["_id"] = str(item["_id"])
-        item["id"] = str(item["_id"])
-        item_copy = item.copy()
-        item_copy.pop("_id", None)
-        items.append(HousingMaintenance(**item_copy))
-    return items
\ No newline at end of file
+    return await paginate(housing_maintenance_collection, page, HousingMaintenance, query={"propertyId": property_id})
@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.inventory import Inventory
 
 router = APIRouter()
 collection = db.inventory
 
 @router.get("/")
-async def get_inventory():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(Inventory(**item))
-    return items
+async def get_inventory(page: PageParams = Depends()):
+    return await paginate(collection, page, Inventory)
 
 @router.post("/")
 async def create_inventory(item: Inventory):
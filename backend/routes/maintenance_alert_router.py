@@ -1,28 +1,44 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.predictive_maintenance import PredictiveMaintenanceAlert, MaintenancePrediction, AssetHealthScore
-from models.vehicle import Vehicle
-from models.maintenance_schedule import MaintenanceSchedule
-from services.maintenance_alert_service import maintenance_alert_service
-from email_service import send_maintenance_alert_email
+from services.maintenance_alert_service import maintenance_alert_service, index_schedules_by_plate
+from services.asset_health import asset_health_service
+from services.index_registry import index_registry
+from email_service import send_maintenance_alert_emails
+from pymongo.errors import BulkWriteError
+from datetime import datetime
 import asyncio
 from typing import List
 
 router = APIRouter()
+
+DEFAULT_ALERT_RECIPIENTS = ["fleet.manager@universererp.com"]
 alert_collection = db.predictive_maintenance_alerts
 prediction_collection = db.maintenance_predictions
 health_collection = db.asset_health_scores
 
+# Vehicle fields read by the alert rules
+VEHICLE_ANALYSIS_FIELDS = {"make": 1, "model": 1, "plate": 1, "mileage": 1, "nextPM": 1, "purchaseDate": 1}
+ALERT_INSERT_BATCH = 1000
+# Alerts written by analyze_fleet; a rule keeps at most one open alert per asset and component
+RULE_ALERT_SOURCE = "maintenance_rules"
+# Generated alerts stored before status was persisted have no status and count as open
+OPEN_ALERT_STATUSES = ["Predicted", "Scheduled", None]
+DUPLICATE_KEY_ERROR = 11000
+
+# Repeated or concurrent analyses must not store the same open alert twice
+index_registry.declare(
+    'predictive_maintenance_alerts', [("assetId", 1), ("alertType", 1), ("failureComponent", 1)],
+    unique=True,
+    partialFilterExpression={"status": "Predicted", "source": RULE_ALERT_SOURCE}
+)
+
 @router.get("/alerts")
-async def get_maintenance_alerts():
+async def get_maintenance_alerts(page: PageParams = Depends()):
     """Get all maintenance alerts"""
-    items = []
-    async for item in alert_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(PredictiveMaintenanceAlert(**item))
-    return items
+    return await paginate(alert_collection, page, PredictiveMaintenanceAlert)
 
 @router.post("/alerts")
 async def create_maintenance_alert(alert: PredictiveMaintenanceAlert):
@@ -60,40 +76,87 @@ async def delete_maintenance_alert(alert_id: str):
         raise HTTPException(status_code=404, detail="Maintenance alert not found")
     return {"message": "Maintenance alert deleted"}
 
+async def analyze_fleet() -> List[PredictiveMaintenanceAlert]:
+    """Analyze all vehicles against their maintenance schedules and save the alerts"""
+    # Schedules indexed by plate once, so each vehicle only sees its own
+    schedules = []
+    async for schedule in db.maintenance_schedules.find({}, {"property": 1, "task": 1, "nextDue": 1, "cost": 1}):
+        schedules.append(schedule)
+    schedules_by_plate = index_schedules_by_plate(schedules)
+
+    vehicles = []
+    async for vehicle in db.vehicles.find({}, VEHICLE_ANALYSIS_FIELDS):
+        vehicle["id"] = str(vehicle.pop("_id"))
+        vehicles.append(vehicle)
+
+    # Analyze and generate alerts
+    alert_dicts = await maintenance_alert_service.evaluate_vehicles(vehicles, schedules_by_plate)
+
+    # Save alerts to database in bulk, skipping alerts that are already open
+    created_at = datetime.utcnow()
+    saved_alerts = []
+    for start in range(0, len(alert_dicts), ALERT_INSERT_BATCH):
+        chunk = alert_dicts[start:start + ALERT_INSERT_BATCH]
+        open_keys = await _open_alert_keys({alert["assetId"] for alert in chunk})
+
+        alerts, documents = [], []
+        for alert_data in chunk:
+            key = _alert_key(alert_data)
+            if key in open_keys:
+                continue
+            open_keys.add(key)
+            alert = PredictiveMaintenanceAlert(**alert_data, source=RULE_ALERT_SOURCE, createdAt=created_at)
+            alert_dict = alert.dict(exclude_unset=True)
+            alert_dict["predictedFailureDate"] = alert.predictedFailureDate.isoformat()
+            alerts.append(alert)
+            documents.append(alert_dict)
+        if not documents:
+            continue
+
+        rejected = set()
+        try:
+            await alert_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything but the reported alerts was written
+            for error in e.details.get("writeErrors", []):
+                rejected.add(error["index"])
+                if error.get("code") != DUPLICATE_KEY_ERROR:
+                    print(f"Error saving maintenance alert: {error.get('errmsg')}")
+
+        # insert_many sets _id on the documents it was given
+        for index, (alert, document) in enumerate(zip(alerts, documents)):
+            if index in rejected:
+                continue
+            alert.id = str(document["_id"])
+            saved_alerts.append(alert)
+
+    return saved_alerts
+
+def _alert_key(alert: dict) -> tuple:
+    return alert.get("assetId"), alert.get("alertType"), alert.get("failureComponent")
+
+async def _open_alert_keys(asset_ids: set) -> set:
+    """Keys of the open rule-based alerts for these assets, in one query"""
+    keys = set()
+    async for alert in alert_collection.find(
+        {"assetId": {"$in": list(asset_ids)}, "alertType": {"$ne": None}, "status": {"$in": OPEN_ALERT_STATUSES}},
+        {"assetId": 1, "alertType": 1, "failureComponent": 1}
+    ):
+        keys.add(_alert_key(alert))
+    return keys
+
 @router.post("/analyze-vehicles")
 async def analyze_vehicles(background_tasks: BackgroundTasks):
     """Analyze all vehicles and generate maintenance alerts"""
     try:
-        # Get all vehicles and maintenance schedules
-        vehicles = []
-        async for vehicle in db.vehicles.find():
-            vehicle["_id"] = str(vehicle["_id"])
-            vehicle["id"] = vehicle["_id"]
-            vehicles.append(Vehicle(**vehicle))
-
-        schedules = []
-        async for schedule in db.maintenance_schedules.find():
-            schedule["_id"] = str(schedule["_id"])
-            schedule["id"] = schedule["_id"]
-            schedules.append(MaintenanceSchedule(**schedule))
-
-        # Analyze and generate alerts
-        alerts = await maintenance_alert_service.analyze_vehicle_maintenance(vehicles, schedules)
-
-        # Save alerts to database
-        saved_alerts = []
-        for alert in alerts:
-            alert_dict = alert.dict(exclude_unset=True)
-            result = await alert_collection.insert_one(alert_dict)
-            alert.id = str(result.inserted_id)
-            saved_alerts.append(alert)
+        saved_alerts = await analyze_fleet()
 
         # Send email notifications in background
         if saved_alerts:
             background_tasks.add_task(
                 send_alert_notifications,
                 saved_alerts,
-                ["fleet.manager@universererp.com"]  # Default recipients
+                DEFAULT_ALERT_RECIPIENTS
             )
 
         return {
@@ -105,53 +168,52 @@ async def analyze_vehicles(background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=f"Error analyzing vehicles: {str(e)}")
 
 @router.get("/health-scores")
-async def get_asset_health_scores():
+async def get_asset_health_scores(page: PageParams = Depends()):
     """Get all asset health scores"""
-    items = []
-    async for item in health_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(AssetHealthScore(**item))
-    return items
+    return await paginate(health_collection, page, AssetHealthScore)
+
+@router.get("/health-scores/fleet-summary")
+async def get_fleet_health_summary():
+    """Fleet average, percentiles and status distribution from the precomputed rollup"""
+    try:
+        return await asset_health_service.get_fleet_summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting fleet health summary: {str(e)}")
+
+@router.post("/health-scores/refresh")
+async def refresh_health_scores():
+    """Rescore vehicles whose health inputs changed or whose score went stale"""
+    try:
+        return await asset_health_service.refresh()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing health scores: {str(e)}")
+
+@router.post("/health-scores/rollups/rebuild")
+async def rebuild_health_rollups():
+    """Recompute the fleet health rollup from the stored scores"""
+    try:
+        return await asset_health_service.rebuild_rollups()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding health rollups: {str(e)}")
 
 @router.post("/health-scores/{asset_id}")
 async def calculate_health_score(asset_id: str):
     """Calculate health score for a specific asset"""
     try:
-        # Get vehicle data
-        vehicle_data = await db.vehicles.find_one({"_id": ObjectId(asset_id)})
-        if not vehicle_data:
+        health_score = await asset_health_service.score_vehicle(asset_id)
+        if health_score is None:
             raise HTTPException(status_code=404, detail="Vehicle not found")
+        return AssetHealthScore(**health_score)
 
-        vehicle_data["_id"] = str(vehicle_data["_id"])
-        vehicle_data["id"] = vehicle_data["_id"]
-        vehicle = Vehicle(**vehicle_data)
-
-        # Calculate health score
-        health_score = await maintenance_alert_service.calculate_asset_health_score(vehicle)
-
-        # Save to database
-        health_dict = health_score.dict(exclude_unset=True)
-        result = await health_collection.replace_one(
-            {"assetId": asset_id},
-            health_dict,
-            upsert=True
-        )
-
-        return health_score
-
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating health score: {str(e)}")
 
 @router.get("/predictions")
-async def get_maintenance_predictions():
+async def get_maintenance_predictions(page: PageParams = Depends()):
     """Get all maintenance predictions"""
-    items = []
-    async for item in prediction_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(MaintenancePrediction(**item))
-    return items
+    return await paginate(prediction_collection, page, MaintenancePrediction)
 
 @router.post("/predictions")
 async def create_maintenance_prediction(prediction: MaintenancePrediction):
@@ -187,30 +249,21 @@ async def get_maintenance_dashboard_summary():
             alert["id"] = alert["_id"]
             recent_alerts.append(PredictiveMaintenanceAlert(**alert))
 
-        # Get average health scores
-        health_stats = await health_collection.aggregate([
-            {"$group": {"_id": None, "avg_score": {"$avg": "$overallScore"}}}
-        ]).to_list(None)
+        # Fleet health from the precomputed rollup
+        fleet_health = await asset_health_service.get_fleet_summary()
 
         return {
             "alert_counts": {item["_id"]: item["count"] for item in alert_counts},
             "status_counts": {item["_id"]: item["count"] for item in status_counts},
             "recent_alerts": recent_alerts,
-            "average_health_score": health_stats[0]["avg_score"] if health_stats else 0,
-            "total_assets": await health_collection.count_documents({})
+            "average_health_score": fleet_health["average_score"],
+            "health_percentiles": fleet_health["percentiles"],
+            "total_assets": fleet_health["assets"]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting dashboard summary: {str(e)}")
 
 async def send_alert_notifications(alerts: List[PredictiveMaintenanceAlert], recipients: List[str]):
-    """Send email notifications for alerts (background task)"""
-    for alert in alerts:
-        for recipient in recipients:
-            try:
-                await send_maintenance_alert_email(
-                    recipient_email=recipient,
-                    alert=alert
-                )
-            except Exception as e:
-                print(f"Failed to send alert email: {str(e)}")
\ No newline at end of file
+    """Queue email notifications for alerts (background task)"""
+    await send_maintenance_alert_emails(alerts, recipients)
\ No newline at end of file
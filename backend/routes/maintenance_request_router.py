@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.maintenance_request import MaintenanceRequest
 from typing import Dict, Any
 
@@ -8,13 +9,8 @@ router = APIRouter()
 collection = db.maintenance_requests
 
 @router.get("/")
-async def get_maintenance_requests():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(MaintenanceRequest(**item))
-    return items
+async def get_maintenance_requests(page: PageParams = Depends()):
+    return await paginate(collection, page, MaintenanceRequest)
 
 @router.post("/")
 async def create_maintenance_request(item: MaintenanceRequest):
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
 from bson import ObjectId
+from pymongo import ReturnDocument
 from database import db
+from pagination import PageParams, paginate
 from models.payroll import (
     Employee, PayrollPeriod, PayrollEntry, JournalEntry, JournalLine,
     PayrollJournalBatch, PayrollTaxInfo, PayrollDeduction
 )
 from services.payroll_journal_service import payroll_journal_service
+from services.payroll_rollups import payroll_rollup_service
+import uuid
 import asyncio
 from typing import List
 from datetime import datetime
@@ -16,14 +20,9 @@ router = APIRouter()
 employee_collection = db.employees
 
 @router.get("/employees")
-async def get_employees():
+async def get_employees(page: PageParams = Depends()):
     """Get all employees"""
-    items = []
-    async for item in employee_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(Employee(**item))
-    return items
+    return await paginate(employee_collection, page, Employee)
 
 @router.post("/employees")
 async def create_employee(employee: Employee):
@@ -31,6 +30,7 @@ async def create_employee(employee: Employee):
     employee_dict = employee.dict(exclude_unset=True)
     result = await employee_collection.insert_one(employee_dict)
     employee.id = str(result.inserted_id)
+    await payroll_rollup_service.employee_created()
     return employee
 
 @router.get("/employees/{employee_id}")
@@ -57,14 +57,9 @@ async def update_employee(employee_id: str, employee: Employee):
 period_collection = db.payroll_periods
 
 @router.get("/periods")
-async def get_payroll_periods():
+async def get_payroll_periods(page: PageParams = Depends()):
     """Get all payroll periods"""
-    items = []
-    async for item in period_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(PayrollPeriod(**item))
-    return items
+    return await paginate(period_collection, page, PayrollPeriod)
 
 @router.post("/periods")
 async def create_payroll_period(period: PayrollPeriod):
@@ -84,18 +79,23 @@ async def get_payroll_period(period_id: str):
     item["id"] = item["_id"]
     return PayrollPeriod(**item)
 
+@router.get("/periods/{period_id}/totals")
+async def get_payroll_period_totals(period_id: str):
+    """Get the rolled-up pay, approval and journal totals for a payroll period"""
+    try:
+        totals = await payroll_rollup_service.get_period_totals(period_id)
+        return {"period_id": period_id, "totals": totals}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting payroll period totals: {str(e)}")
+
 # Payroll Entry endpoints
 entry_collection = db.payroll_entries
 
 @router.get("/entries")
-async def get_payroll_entries():
+async def get_payroll_entries(page: PageParams = Depends()):
     """Get all payroll entries"""
-    items = []
-    async for item in entry_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(PayrollEntry(**item))
-    return items
+    return await paginate(entry_collection, page, PayrollEntry)
 
 @router.post("/entries")
 async def create_payroll_entry(entry: PayrollEntry):
@@ -103,6 +103,7 @@ async def create_payroll_entry(entry: PayrollEntry):
     entry_dict = entry.dict(exclude_unset=True)
     result = await entry_collection.insert_one(entry_dict)
     entry.id = str(result.inserted_id)
+    await payroll_rollup_service.entry_created(entry_dict)
     return entry
 
 @router.get("/entries/{entry_id}")
@@ -118,23 +119,22 @@ async def get_payroll_entry(entry_id: str):
 @router.put("/entries/{entry_id}/approve")
 async def approve_payroll_entry(entry_id: str, approved_by: str):
     """Approve a payroll entry"""
-    entry = await entry_collection.find_one({"_id": ObjectId(entry_id)})
-    if not entry:
-        raise HTTPException(status_code=404, detail="Payroll entry not found")
-
-    # Update entry status
-    result = await entry_collection.update_one(
-        {"_id": ObjectId(entry_id)},
+    # Only the request that flips the status moves the entry in the rollups
+    previous = await entry_collection.find_one_and_update(
+        {"_id": ObjectId(entry_id), "status": {"$ne": "Approved"}},
         {
             "$set": {
                 "status": "Approved",
                 "approvedBy": approved_by,
                 "approvedAt": datetime.now()
             }
-        }
+        },
+        return_document=ReturnDocument.BEFORE
     )
 
-    if result.matched_count == 0:
+    if previous is not None:
+        await payroll_rollup_service.entry_approved(previous)
+    elif not await entry_collection.find_one({"_id": ObjectId(entry_id)}, {"_id": 1}):
         raise HTTPException(status_code=404, detail="Payroll entry not found")
 
     return {"message": "Payroll entry approved"}
@@ -143,14 +143,9 @@ async def approve_payroll_entry(entry_id: str, approved_by: str):
 journal_collection = db.journal_entries
 
 @router.get("/journals")
-async def get_journal_entries():
+async def get_journal_entries(page: PageParams = Depends()):
     """Get all journal entries"""
-    items = []
-    async for item in journal_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(JournalEntry(**item))
-    return items
+    return await paginate(journal_collection, page, JournalEntry)
 
 @router.post("/journals")
 async def create_journal_entry(journal_entry: JournalEntry):
@@ -191,15 +186,40 @@ async def process_payroll_journal(period_id: str, background_tasks: BackgroundTa
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting journal processing: {str(e)}")
 
+@router.post("/journal-batches/{batch_id}/resume")
+async def resume_payroll_journal(batch_id: str, background_tasks: BackgroundTasks, processed_by: str):
+    """Resume a failed payroll journal batch from its last checkpoint"""
+    # Claim the batch before scheduling so two resumes cannot post it twice
+    lease_owner = uuid.uuid4().hex
+    item = await payroll_journal_service.claim_journal_batch(batch_id, lease_owner)
+    if not item:
+        current = await db.payroll_journal_batches.find_one({"_id": ObjectId(batch_id)}, {"status": 1})
+        if not current:
+            raise HTTPException(status_code=404, detail="Journal batch not found")
+        if current.get("status") == "Processing":
+            raise HTTPException(status_code=409, detail="Journal batch is still being processed")
+        raise HTTPException(status_code=400, detail=f"Journal batch is {current.get('status')} and cannot be resumed")
+
+    background_tasks.add_task(
+        process_journal_background,
+        item["payrollPeriodId"],
+        processed_by,
+        batch_id,
+        lease_owner
+    )
+
+    return {
+        "message": "Payroll journal processing resumed",
+        "batch_id": batch_id,
+        "processed_entries": item.get("processedEntries", 0),
+        "total_entries": item.get("totalEntries", 0),
+        "status": "Processing"
+    }
+
 @router.get("/journal-batches")
-async def get_journal_batches():
+async def get_journal_batches(page: PageParams = Depends()):
     """Get all payroll journal batches"""
-    items = []
-    async for item in db.payroll_journal_batches.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(PayrollJournalBatch(**item))
-    return items
+    return await paginate(db.payroll_journal_batches, page, PayrollJournalBatch)
 
 @router.get("/journal-batches/{batch_id}")
 async def get_journal_batch(batch_id: str):
@@ -255,9 +275,6 @@ async def get_payroll_dashboard_summary():
             period["id"] = period["_id"]
             recent_periods.append(PayrollPeriod(**period))
 
-        # Get pending approvals count
-        pending_approvals = await entry_collection.count_documents({"status": "Draft"})
-
         # Get recent journal batches
         recent_batches = []
         async for batch in db.payroll_journal_batches.find().sort("createdAt", -1).limit(5):
@@ -265,35 +282,37 @@ async def get_payroll_dashboard_summary():
             batch["id"] = batch["_id"]
             recent_batches.append(PayrollJournalBatch(**batch))
 
-        # Calculate total payroll this month
-        from datetime import datetime, timedelta
-        start_of_month = datetime.now().replace(day=1)
-        end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-
-        monthly_total = 0
-        async for entry in entry_collection.find({
-            "createdAt": {
-                "$gte": start_of_month.isoformat(),
-                "$lte": end_of_month.isoformat()
-            }
-        }):
-            monthly_total += entry.get("netPay", 0)
+        # Headcount, pending approvals and this month's total from the payroll rollups
+        totals = await payroll_rollup_service.get_dashboard_totals()
 
         return {
             "recent_periods": recent_periods,
-            "pending_approvals": pending_approvals,
+            "pending_approvals": totals["pending_approvals"],
             "recent_batches": recent_batches,
-            "monthly_payroll_total": monthly_total,
-            "total_employees": await employee_collection.count_documents({})
+            "monthly_payroll_total": totals["monthly_payroll_total"],
+            "total_employees": totals["total_employees"]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting dashboard summary: {str(e)}")
 
-async def process_journal_background(period_id: str, processed_by: str):
+@router.post("/dashboard-summary/rebuild")
+async def rebuild_payroll_rollups():
+    """Recompute the payroll dashboard rollups from the payroll collections"""
+    try:
+        result = await payroll_rollup_service.rebuild()
+        return {"message": "Payroll rollups rebuilt", **result}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding payroll rollups: {str(e)}")
+
+async def process_journal_background(period_id: str, processed_by: str, resume_batch_id: str = None,
+                                     lease_owner: str = None):
     """Process payroll journal in background"""
     try:
-        batch = await payroll_journal_service.process_payroll_journal(period_id, processed_by)
+        batch = await payroll_journal_service.process_payroll_journal(
+            period_id, processed_by, resume_batch_id=resume_batch_id, lease_owner=lease_owner
+        )
         print(f"Payroll journal processed successfully: {batch.batchNumber}")
     except Exception as e:
         print(f"Error processing payroll journal: {str(e)}")
\ No newline at end of file
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.predictive_maintenance import (
     PredictiveMaintenanceAlert,
     MaintenancePredictionConfig,
@@ -9,15 +10,50 @@ from models.predictive_maintenance import (
     MaintenanceStatus,
     MaintenancePriority
 )
+from services.job_scheduler import changed_since
+from services.index_registry import index_registry
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime, date, timedelta
 from typing import List, Optional
-import random
+import os
 
 router = APIRouter()
 alerts_collection = db.predictive_maintenance_alerts
 config_collection = db.maintenance_prediction_config
 analytics_collection = db.maintenance_analytics
 
+# Prediction pipeline settings
+PREDICTION_CHUNK_SIZE = int(os.getenv("PREDICTION_CHUNK_SIZE", "1000"))
+PREDICTION_MILEAGE_THRESHOLD = 50000
+SERVICE_INTERVAL_KM = 10000
+SERVICE_INTERVAL_DAYS = 365
+DEFAULT_DAILY_KM = 50
+PREDICTION_MIN_DAYS = 30
+PREDICTION_MAX_DAYS = 90
+# Generated alerts stored before status was persisted have no status and count as open
+OPEN_ALERT_STATUSES = ["Predicted", "Scheduled", None]
+# Source of the alerts generate_predictions writes; rule-based and manual alerts carry other sources
+PREDICTION_SOURCE = "mileage_prediction"
+
+# At most one open engine prediction per asset, so concurrent or repeated runs stay idempotent
+index_registry.declare(
+    'predictive_maintenance_alerts', [("assetId", 1), ("source", 1)],
+    unique=True,
+    partialFilterExpression={"status": MaintenanceStatus.PREDICTED.value, "source": PREDICTION_SOURCE}
+)
+# Alert list and dashboard counts
+index_registry.declare('predictive_maintenance_alerts', [("status", 1), ("predictedFailureDate", 1)])
+index_registry.declare('predictive_maintenance_alerts', [("priority", 1), ("predictedFailureDate", 1)])
+index_registry.declare('predictive_maintenance_alerts', 'predictedFailureDate')
+index_registry.declare_query(
+    'predictive_maintenance.urgent_alerts', 'predictive_maintenance_alerts',
+    {"predictedFailureDate": {"$lte": "9999-12-31"}, "status": "Predicted"}
+)
+index_registry.declare_query(
+    'predictive_maintenance.critical_alerts', 'predictive_maintenance_alerts', {"priority": "Critical"}
+)
+
 # Predictive Maintenance Alerts Routes
 @router.get("/alerts")
 async def get_maintenance_alerts(
@@ -130,64 +166,157 @@ async def delete_maintenance_alert(alert_id: str):
 @router.post("/alerts/generate-predictions")
 async def generate_maintenance_predictions():
     """Generate predictive maintenance alerts based on asset data"""
-    # Get all vehicles
-    vehicles_collection = db.vehicles
-    vehicles = await vehicles_collection.find().to_list(None)
-
-    new_alerts = []
-
-    for vehicle in vehicles:
-        # Simulate predictive analysis based on mileage and last maintenance
-        current_mileage = vehicle.get("mileage", 0)
-        last_maintenance = vehicle.get("lastMaintenanceDate")
-
-        # Simple prediction logic (in real scenario, use ML models)
-        if current_mileage > 50000:  # Example threshold
-            # Check if alert already exists
-            existing_alert = await alerts_collection.find_one({
-                "assetId": str(vehicle["_id"]),
-                "status": {"$in": ["Predicted", "Scheduled"]}
-            })
-
-            if not existing_alert:
-                alert = PredictiveMaintenanceAlert(
-                    assetId=str(vehicle["_id"]),
-                    assetType=AssetType.VEHICLE,
-                    assetName=f"{vehicle.get('make', 'Unknown')} {vehicle.get('model', 'Vehicle')}",
-                    licensePlate=vehicle.get("plate"),
-                    predictedFailureDate=date.today() + timedelta(days=random.randint(30, 90)),
-                    confidenceLevel=round(random.uniform(75, 95), 2),
-                    failureComponent="Engine",
-                    failureDescription="Predicted engine maintenance based on mileage analysis",
-                    recommendedAction="Schedule engine inspection and oil change",
-                    estimatedCost=500.0,
-                    priority=MaintenancePriority.HIGH if current_mileage > 80000 else MaintenancePriority.MEDIUM,
-                    currentMileage=current_mileage,
-                    factorsConsidered=["Mileage", "Time since last service", "Vehicle age"],
-                    createdBy="System",
-                    createdAt=datetime.utcnow()
-                )
-
-                alert_dict = alert.dict(exclude_unset=True)
-                result = await alerts_collection.insert_one(alert_dict)
-                alert.id = str(result.inserted_id)
-                new_alerts.append(alert)
+    new_alerts = await generate_predictions()
 
     return {
         "message": f"Generated {len(new_alerts)} new predictive maintenance alerts",
         "alerts": new_alerts
     }
 
+def predict_vehicle_maintenance(vehicle: dict, today: date) -> Optional[dict]:
+    """Deterministic engine-service prediction from mileage and service history"""
+    current_mileage = vehicle.get("mileage") or 0
+    if current_mileage <= PREDICTION_MILEAGE_THRESHOLD:
+        return None
+
+    # Distance to the next service: the recorded next PM, else the next interval boundary
+    try:
+        remaining_km = float(vehicle.get("nextPM")) - current_mileage
+        has_service_plan = True
+    except (TypeError, ValueError):
+        remaining_km = SERVICE_INTERVAL_KM - (current_mileage % SERVICE_INTERVAL_KM)
+        has_service_plan = False
+
+    # Average daily distance since the vehicle was bought (or registered here)
+    in_service_since = _as_date(vehicle.get("purchaseDate")) or _as_date(vehicle.get("createdAt"))
+    days_in_service = (today - in_service_since).days if in_service_since else 0
+    daily_km = current_mileage / days_in_service if days_in_service > 0 else DEFAULT_DAILY_KM
+    days_until = remaining_km / max(daily_km, 1.0)
+
+    # Overdue by time since the last service
+    last_service = _as_date(vehicle.get("lastMaintenanceDate"))
+    if last_service:
+        days_until = min(days_until, SERVICE_INTERVAL_DAYS - (today - last_service).days)
+        has_service_plan = True
+
+    days_until = int(min(max(days_until, PREDICTION_MIN_DAYS), PREDICTION_MAX_DAYS))
+
+    # Confidence grows with mileage past the threshold and with known service history
+    mileage_factor = min((current_mileage - PREDICTION_MILEAGE_THRESHOLD) / PREDICTION_MILEAGE_THRESHOLD, 1.0)
+    confidence = 75.0 + 10.0 * mileage_factor + (10.0 if has_service_plan else 0.0)
+
+    return {
+        "predictedFailureDate": today + timedelta(days=days_until),
+        "confidenceLevel": round(confidence, 2),
+        "priority": MaintenancePriority.HIGH if current_mileage > 80000 else MaintenancePriority.MEDIUM,
+        "currentMileage": current_mileage
+    }
+
+def _as_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value[:10]).date()
+        except ValueError:
+            return None
+    return None
+
+async def _predict_chunk(vehicles: List[dict], today: date) -> List[PredictiveMaintenanceAlert]:
+    # Assets in this chunk that already have an open alert, in one query
+    asset_ids = [str(vehicle["_id"]) for vehicle in vehicles]
+    open_assets = set()
+    async for alert in alerts_collection.find(
+        {"assetId": {"$in": asset_ids}, "status": {"$in": OPEN_ALERT_STATUSES}},
+        {"assetId": 1}
+    ):
+        open_assets.add(alert["assetId"])
+
+    now = datetime.utcnow()
+    alerts, writes = [], []
+    for vehicle, asset_id in zip(vehicles, asset_ids):
+        if asset_id in open_assets:
+            continue
+        prediction = predict_vehicle_maintenance(vehicle, today)
+        if prediction is None:
+            continue
+
+        alert = PredictiveMaintenanceAlert(
+            assetId=asset_id,
+            assetType=AssetType.VEHICLE,
+            assetName=f"{vehicle.get('make', 'Unknown')} {vehicle.get('model', 'Vehicle')}",
+            licensePlate=vehicle.get("plate"),
+            failureComponent="Engine",
+            failureDescription="Predicted engine maintenance based on mileage analysis",
+            recommendedAction="Schedule engine inspection and oil change",
+            estimatedCost=500.0,
+            status=MaintenanceStatus.PREDICTED,
+            source=PREDICTION_SOURCE,
+            factorsConsidered=["Mileage", "Time since last service", "Vehicle age"],
+            createdBy="System",
+            createdAt=now,
+            **prediction
+        )
+        alert_dict = alert.dict(exclude_unset=True)
+        alert_dict["predictedFailureDate"] = alert.predictedFailureDate.isoformat()
+        alert_dict.pop("status")
+        alert_dict.pop("source")
+        alerts.append(alert)
+        writes.append(UpdateOne(
+            {"assetId": asset_id, "status": MaintenanceStatus.PREDICTED.value, "source": PREDICTION_SOURCE},
+            {"$setOnInsert": alert_dict},
+            upsert=True
+        ))
+
+    if not writes:
+        return []
+
+    try:
+        result = await alerts_collection.bulk_write(writes, ordered=False)
+        upserted_ids = result.upserted_ids
+    except BulkWriteError as e:
+        # Another run inserted the same predicted alert first
+        upserted_ids = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+
+    new_alerts = []
+    for index, inserted_id in sorted(upserted_ids.items()):
+        alerts[index].id = str(inserted_id)
+        new_alerts.append(alerts[index])
+    return new_alerts
+
+async def generate_predictions(since: Optional[datetime] = None) -> List[PredictiveMaintenanceAlert]:
+    """Create alerts for all vehicles, or only vehicles changed since ``since`` (scheduled job).
+
+    Vehicles over the mileage threshold are streamed in chunks; each chunk's open
+    alerts are prefetched with one ``$in`` query and its new alerts are upserted
+    with one ``bulk_write``.
+    """
+    query = {"$and": [changed_since(since), {"mileage": {"$gt": PREDICTION_MILEAGE_THRESHOLD}}]}
+    projection = {
+        "make": 1, "model": 1, "plate": 1, "mileage": 1, "nextPM": 1,
+        "purchaseDate": 1, "lastMaintenanceDate": 1, "createdAt": 1
+    }
+    today = date.today()
+
+    new_alerts = []
+    chunk = []
+    async for vehicle in db.vehicles.find(query, projection).batch_size(PREDICTION_CHUNK_SIZE):
+        chunk.append(vehicle)
+        if len(chunk) >= PREDICTION_CHUNK_SIZE:
+            new_alerts.extend(await _predict_chunk(chunk, today))
+            chunk = []
+    if chunk:
+        new_alerts.extend(await _predict_chunk(chunk, today))
+
+    return new_alerts
+
 # Configuration Routes
 @router.get("/config")
-async def get_prediction_configs():
+async def get_prediction_configs(page: PageParams = Depends()):
     """Get all prediction configurations"""
-    items = []
-    async for item in config_collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(MaintenancePredictionConfig(**item))
-    return items
+    return await paginate(config_collection, page, MaintenancePredictionConfig)
 
 @router.post("/config")
 async def create_prediction_config(config: MaintenancePredictionConfig):
@@ -199,18 +328,13 @@ async def create_prediction_config(config: MaintenancePredictionConfig):
 
 # Analytics Routes
 @router.get("/analytics")
-async def get_maintenance_analytics(asset_type: Optional[AssetType] = None):
+async def get_maintenance_analytics(asset_type: Optional[AssetType] = None, page: PageParams = Depends()):
     """Get maintenance analytics"""
     query = {}
     if asset_type:
         query["assetType"] = asset_type.value
 
-    items = []
-    async for item in analytics_collection.find(query):
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(MaintenanceAnalytics(**item))
-    return items
+    return await paginate(analytics_collection, page, MaintenanceAnalytics, query=query)
 
 @router.get("/analytics/{asset_id}")
 async def get_asset_analytics(asset_id: str, asset_type: AssetType):
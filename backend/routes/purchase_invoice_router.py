@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.purchase_invoice import PurchaseInvoice
 
 router = APIRouter()
 collection = db.purchase_invoices
 
 @router.get("/")
-async def get_purchase_invoices():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(PurchaseInvoice(**item))
-    return items
+async def get_purchase_invoices(page: PageParams = Depends()):
+    return await paginate(collection, page, PurchaseInvoice)
 
 @router.post("/")
 async def create_purchase_invoice(item: PurchaseInvoice):
@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.racing_payment import RacingPayment
 
 router = APIRouter()
 collection = db.racing_payments
 
 @router.get("/")
-async def get_racing_payments():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(RacingPayment(**item))
-    return items
+async def get_racing_payments(page: PageParams = Depends()):
+    return await paginate(collection, page, RacingPayment)
 
 @router.post("/")
 async def create_racing_payment(item: RacingPayment):
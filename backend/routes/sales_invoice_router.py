@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.sales_invoice import SalesInvoice
 
 router = APIRouter()
 collection = db.sales_invoices
 
 @router.get("/")
-async def get_sales_invoices():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(SalesInvoice(**item))
-    return items
+async def get_sales_invoices(page: PageParams = Depends()):
+    return await paginate(collection, page, SalesInvoice)
 
 @router.post("/")
 async def create_sales_invoice(item: SalesInvoice):
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime
+
+from services.job_scheduler import job_scheduler
+
+router = APIRouter()
+
+@router.get("/jobs")
+async def get_scheduled_jobs():
+    """Get every scheduled job with its schedule, last run and metrics"""
+    try:
+        return {
+            "scheduler_running": job_scheduler.running,
+            "owner": job_scheduler.owner,
+            "jobs": await job_scheduler.job_status(),
+            "timestamp": datetime.utcnow()
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting scheduled jobs: {str(e)}")
+
+@router.get("/jobs/{job_name}/runs")
+async def get_job_runs(job_name: str, limit: int = Query(default=20, ge=1, le=200)):
+    """Get the most recent runs of a job"""
+    if job_name not in job_scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        return {"job": job_name, "runs": await job_scheduler.run_history(job_name, limit)}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting job runs: {str(e)}")
+
+@router.post("/jobs/{job_name}/run")
+async def run_job_now(job_name: str, full_sweep: bool = False):
+    """Run a job immediately, unless it is already running on any replica"""
+    if job_name not in job_scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        return await job_scheduler.run_job(job_name, full_sweep=full_sweep, trigger="manual")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running job: {str(e)}")
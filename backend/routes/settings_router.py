@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Query
 from bson import ObjectId
 from database import db
+from services.index_registry import index_registry
 from models.user_settings import (
     UserProfile, SecuritySettings, NotificationSettings, 
     AccountSettings, BillingSettings, SystemSettings, PreferenceSettings
@@ -19,6 +20,11 @@ billing_settings_collection = db.billing_settings
 system_settings_collection = db.system_settings
 preference_settings_collection = db.preference_settings
 
+# Every settings document is read and upserted by userId
+for collection_name in ('user_profiles', 'security_settings', 'notification_settings',
+                        'account_settings', 'billing_settings', 'preference_settings'):
+    index_registry.declare(collection_name, 'userId')
+
 # User Profile Endpoints
 @router.get("/profile/{user_id}")
 async def get_user_profile(user_id: str):
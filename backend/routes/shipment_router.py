@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.shipment import Shipment
 
 router = APIRouter()
 collection = db.shipments
 
 @router.get("/")
-async def get_shipments():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(Shipment(**item))
-    return items
+async def get_shipments(page: PageParams = Depends()):
+    return await paginate(collection, page, Shipment)
 
 @router.post("/")
 async def create_shipment(item: Shipment):
@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.spv_company import SPVCompany
 
 router = APIRouter()
 collection = db.spv_companies
 
 @router.get("/")
-async def get_spv_companies():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(SPVCompany(**item))
-    return items
+async def get_spv_companies(page: PageParams = Depends()):
+    return await paginate(collection, page, SPVCompany)
 
 @router.post("/")
 async def create_spv_company(item: SPVCompany):
@@ -1,18 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.spv_expenditure import SPVExpenditure
 
 router = APIRouter()
 collection = db.spv_expenditures
 
 @router.get("/")
-async def get_spv_expenditures():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        items.append(SPVExpenditure(**item))
-    return items
+async def get_spv_expenditures(page: PageParams = Depends()):
+    return await paginate(collection, page, SPVExpenditure)
 
 @router.post("/")
 async def create_spv_expenditure(item: SPVExpenditure):
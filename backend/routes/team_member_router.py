@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.team_member import TeamMember
 
 router = APIRouter()
 collection = db.team_members
 
 @router.get("/")
-async def get_team_members():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(TeamMember(**item))
-    return items
+async def get_team_members(page: PageParams = Depends()):
+    return await paginate(collection, page, TeamMember)
 
 @router.post("/")
 async def create_team_member(item: TeamMember):
@@ -1,19 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
 from database import db
+from pagination import PageParams, paginate
 from models.travel_trip import TravelTrip
 
 router = APIRouter()
 collection = db.travel_trips
 
 @router.get("/")
-async def get_travel_trips():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(TravelTrip(**item))
-    return items
+async def get_travel_trips(page: PageParams = Depends()):
+    return await paginate(collection, page, TravelTrip)
 
 @router.post("/")
 async def create_travel_trip(item: TravelTrip):
@@ -1,25 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
+from pymongo import ReturnDocument
 from database import db
+from pagination import PageParams, paginate
 from models.vehicle import Vehicle
+from services.asset_health import asset_health_service, VEHICLE_FIELDS
+from datetime import datetime
 
 router = APIRouter()
 collection = db.vehicles
 
 @router.get("/")
-async def get_vehicles():
-    items = []
-    async for item in collection.find():
-        item["_id"] = str(item["_id"])
-        item["id"] = item["_id"]
-        items.append(Vehicle(**item))
-    return items
+async def get_vehicles(page: PageParams = Depends()):
+    return await paginate(collection, page, Vehicle)
 
 @router.post("/")
 async def create_vehicle(item: Vehicle):
+    item.createdAt = datetime.utcnow()
+    item.updatedAt = datetime.utcnow()
     item_dict = item.dict(exclude_unset=True)
     result = await collection.insert_one(item_dict)
     item.id = str(result.inserted_id)
+    await asset_health_service.vehicle_changed(item.id, item_dict)
     return item
 
 @router.get("/{item_id}")
@@ -33,11 +35,17 @@ async def get_vehicle(item_id: str):
 
 @router.put("/{item_id}")
 async def update_vehicle(item_id: str, item: Vehicle):
+    item.updatedAt = datetime.utcnow()
     item_dict = item.dict(exclude_unset=True)
-    result = await collection.replace_one({"_id": ObjectId(item_id)}, item_dict)
-    if result.matched_count == 0:
+    previous = await collection.find_one_and_replace(
+        {"_id": ObjectId(item_id)}, item_dict, projection=VEHICLE_FIELDS,
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     item.id = item_id
+    # Rescore health only when mileage, nextPM or purchaseDate changed
+    await asset_health_service.vehicle_changed(item_id, item_dict, previous)
     return item
 
 @router.delete("/{item_id}")
@@ -45,4 +53,5 @@ async def delete_vehicle(item_id: str):
     result = await collection.delete_one({"_id": ObjectId(item_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await asset_health_service.vehicle_deleted(item_id)
     return {"message": "Vehicle deleted"}
\ No newline at end of file
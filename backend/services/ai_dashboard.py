@@ -0,0 +1,212 @@
+"""
+AI dashboard summary for UniverserERP.
+
+The dashboard sections (budget, cash flow, vendors, maintenance, automation and
+historical patterns) run concurrently. Vendor, automation and historical
+sections share one ``TransactionSnapshot``, so the transactions collection is
+scanned once per refresh, and the vendor and automation sections share one
+vendor-scoring pass. Budget and cash flow are inferences from the persisted
+forecasting models. Vendor scores and historical patterns computed for a view
+are not persisted. Each section has its own timeout, and the assembled summary
+is cached with a TTL. Once the TTL expires, the stale summary keeps being served
+while a single background refresh rebuilds it. Automation triggers are only
+evaluated here; executing their actions is left to the scheduled sweep.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.ai_service import ai_service, TransactionSnapshot
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TTL = float(os.getenv("AI_DASHBOARD_TTL", "60"))
+# How long past the TTL a stale summary may still be served while it refreshes
+SUMMARY_STALE_TTL = float(os.getenv("AI_DASHBOARD_STALE_TTL", "600"))
+SECTION_TIMEOUT = float(os.getenv("AI_DASHBOARD_SECTION_TIMEOUT", "10"))
+
+
+class AIDashboardService:
+    def __init__(self, ttl: float = SUMMARY_TTL, stale_ttl: float = SUMMARY_STALE_TTL,
+                 section_timeout: float = SECTION_TIMEOUT):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.section_timeout = section_timeout
+
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ---------------- sections ----------------
+
+    async def _budget(self, snapshot: Awaitable[TransactionSnapshot],
+                      vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        budget_data = await ai_service.predict_budget_variance(months_ahead=1)
+        if budget_data['success']:
+            return {"budget_alerts": len(budget_data.get('alerts', []))}
+        return {}
+
+    async def _cash_flow(self, snapshot: Awaitable[TransactionSnapshot],
+                         vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        cash_flow_data = await ai_service.forecast_cash_flow(days_ahead=7)
+        if cash_flow_data['success']:
+            return {"cash_flow_alerts": len(cash_flow_data.get('alerts', []))}
+        return {}
+
+    async def _vendors(self, snapshot: Awaitable[TransactionSnapshot],
+                       vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        vendor_data = await vendor_scores
+        if vendor_data['success']:
+            return {"vendor_insights": vendor_data['summary']}
+        return {}
+
+    async def _maintenance(self, snapshot: Awaitable[TransactionSnapshot],
+                           vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        maintenance_data = await ai_service.predict_asset_maintenance()
+        if maintenance_data['success']:
+            return {"maintenance_alerts": maintenance_data['summary']}
+        return {}
+
+    async def _automation(self, snapshot: Awaitable[TransactionSnapshot],
+                          vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        triggers_data = await ai_service.evaluate_automation_triggers(
+            snapshot=await snapshot, executed_since=datetime.utcnow() - timedelta(days=1),
+            vendor_scores=vendor_scores
+        )
+        if triggers_data['success']:
+            return {
+                "triggers_checked": triggers_data['triggers_checked'],
+                "triggers_firing": triggers_data['triggers_firing'],
+                # Executed by the scheduled sweep in the last 24 hours
+                "triggers_executed": triggers_data['triggers_executed']
+            }
+        return {}
+
+    async def _historical(self, snapshot: Awaitable[TransactionSnapshot],
+                          vendor_scores: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        # Viewing the dashboard should not append a historical_patterns record
+        patterns_data = await ai_service.analyze_historical_patterns(persist=False, snapshot=await snapshot)
+        if patterns_data['success']:
+            return {
+                "patterns_identified": len(patterns_data.get('insights', [])),
+                "analysis_coverage": "12_months"
+            }
+        return {}
+
+    @staticmethod
+    async def _score_vendors(snapshot: asyncio.Task) -> Dict[str, Any]:
+        # Viewing the dashboard should not rewrite vendor_scores
+        return await ai_service.score_vendor_reliability(snapshot=await snapshot, persist=False)
+
+    async def _run_section(self, name: str, section: Callable, snapshot: asyncio.Task,
+                           vendor_scores: asyncio.Task) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            # Shield the shared tasks so one section timing out does not cancel them for the others
+            data = await asyncio.wait_for(
+                section(asyncio.shield(snapshot), asyncio.shield(vendor_scores)), timeout=self.section_timeout
+            )
+            status = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"AI dashboard section '{name}' timed out after {self.section_timeout}s")
+            data, status = {}, "timeout"
+        except Exception as e:
+            logger.error(f"AI dashboard section '{name}' failed: {str(e)}")
+            data, status = {}, "error"
+        return {"data": data, "status": status, "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def build_summary(self) -> Dict[str, Any]:
+        """Compute every dashboard section concurrently over one transactions snapshot"""
+        snapshot = asyncio.create_task(ai_service.build_transaction_snapshot())
+        vendor_scores = asyncio.create_task(self._score_vendors(snapshot))
+        sections = {
+            "budget": self._budget,
+            "cash_flow": self._cash_flow,
+            "vendors": self._vendors,
+            "maintenance": self._maintenance,
+            "automation": self._automation,
+            "historical": self._historical,
+        }
+
+        try:
+            results = await asyncio.gather(*(
+                self._run_section(name, section, snapshot, vendor_scores) for name, section in sections.items()
+            ))
+        finally:
+            for label, task in (("Transactions snapshot", snapshot), ("Vendor scoring", vendor_scores)):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception():
+                    logger.error(f"{label} failed: {str(task.exception())}")
+        results = dict(zip(sections, results))
+
+        predictive_analytics = {}
+        for name in ("budget", "cash_flow", "vendors", "maintenance"):
+            predictive_analytics.update(results[name]["data"])
+
+        summary = {
+            "predictive_analytics": predictive_analytics,
+            "automation_status": results["automation"]["data"],
+            # Document processing summary (mock data for now)
+            "document_processing": {
+                "documents_processed_today": 0,
+                "pending_classifications": 0
+            },
+            # Travel suggestions summary (mock data for now)
+            "travel_insights": {
+                "active_suggestions": 0,
+                "budget_optimizations": 0
+            },
+            "historical_insights": results["historical"]["data"]
+        }
+
+        return {
+            "summary": summary,
+            "sections": {name: {"status": r["status"], "duration_ms": r["duration_ms"]} for name, r in results.items()},
+            "generated_at": datetime.utcnow()
+        }
+
+    # ---------------- cache ----------------
+
+    async def _refresh(self) -> Dict[str, Any]:
+        result = await self.build_summary()
+        self._cached = result
+        self._cached_at = time.monotonic()
+        return result
+
+    def _start_refresh(self) -> asyncio.Task:
+        # Single flight: concurrent requests share one in-progress refresh
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"AI dashboard refresh failed: {str(task.exception())}")
+
+    async def get_summary(self, force_refresh: bool = False) -> Dict[str, Any]:
+        """Return the cached summary, refreshing it in the background once it goes stale"""
+        age = time.monotonic() - self._cached_at
+        if self._cached is not None and not force_refresh:
+            if age < self.ttl:
+                return {**self._cached, "cache": {"hit": True, "stale": False, "age_seconds": round(age, 1)}}
+            if age < self.ttl + self.stale_ttl:
+                self._start_refresh()
+                return {**self._cached, "cache": {"hit": True, "stale": True, "age_seconds": round(age, 1)}}
+
+        result = await asyncio.shield(self._start_refresh())
+        return {**result, "cache": {"hit": False, "stale": False, "age_seconds": 0.0}}
+
+    def invalidate(self):
+        self._cached = None
+        self._cached_at = 0.0
+
+
+# Global dashboard instance
+ai_dashboard_service = AIDashboardService()
@@ -7,9 +7,10 @@ conversational AI, automation triggers, and intelligent insights.
 import os
 import json
 import asyncio
+import hashlib
 import logging
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Awaitable, Dict, List, Any, Optional, Tuple
 import re
 import random
 import math
@@ -22,13 +23,6 @@ from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 import joblib
 
-# Document processing
-import fitz  # PyMuPDF for PDF processing
-import docx
-from PIL import Image
-import pytesseract
-import cv2
-
 # Email processing
 import email
 from email.mime.text import MIMEText
@@ -44,10 +38,77 @@ from nltk.stem import WordNetLemmatizer
 
 # Database
 from database import db
+from pymongo import UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+# Off-loop document text extraction
+from services.document_extraction import (
+    document_extraction_engine, PDF_EXTENSIONS, DOCX_EXTENSIONS, IMAGE_EXTENSIONS
+)
+from services.document_fields import document_field_extractor, KeywordIndex
+from services.forecasting import ForecastingEngine
+from services.card_balance import card_balance_service
+from services.trigger_engine import TriggerEngine
+from services.index_registry import index_registry
 
 # Models
 from models.predictive_maintenance import AssetType, MaintenanceStatus, MaintenancePriority
 
+# Vendor scoring: vendors per email aggregation, aggregations in flight, score upserts per bulk_write
+VENDOR_TONE_BATCH = int(os.getenv("VENDOR_TONE_BATCH", "200"))
+VENDOR_TONE_CONCURRENCY = int(os.getenv("VENDOR_TONE_CONCURRENCY", "4"))
+VENDOR_SCORE_WRITE_BATCH = int(os.getenv("VENDOR_SCORE_WRITE_BATCH", "1000"))
+EMAILS_PER_VENDOR = 10
+
+index_registry.declare('vendor_scores', 'vendor', unique=True)
+index_registry.declare('vendor_scores', [('reliability_score', DESCENDING)])
+index_registry.declare('automation_triggers', 'is_active')
+index_registry.declare('emails', 'sender')
+# Forecasting fingerprints transactions by their newest edit
+index_registry.declare('transactions', 'updatedAt')
+index_registry.declare('ai_insights', [('type', ASCENDING), ('created_at', DESCENDING)])
+
+POSITIVE_WORDS = frozenset(['good', 'excellent', 'satisfied', 'pleased', 'happy', 'thank', 'appreciate'])
+NEGATIVE_WORDS = frozenset(['problem', 'issue', 'delay', 'error', 'wrong', 'bad', 'terrible', 'disappointed'])
+
+def email_tone_score(emails: List[str]) -> float:
+    """Simple sentiment score of a vendor's emails (in production, use proper NLP)"""
+    positive_count = negative_count = total_words = 0
+    for email_text in emails:
+        total_words += len(email_text.split())
+        for word in email_text.lower().split():
+            if word in POSITIVE_WORDS:
+                positive_count += 1
+            elif word in NEGATIVE_WORDS:
+                negative_count += 1
+
+    if total_words == 0:
+        return 0
+
+    sentiment_score = (positive_count - negative_count) / total_words * 100
+    return round(sentiment_score, 2)
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, used to recognise documents that were already processed"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TransactionSnapshot:
+    """Aggregates of the transactions collection computed in one ``$facet`` pass.
+
+    The analytics methods accept a snapshot in place of running their own
+    transactions query, so several of them can share a single collection scan.
+    """
+
+    def __init__(self, facets: Dict[str, List[Dict[str, Any]]], pattern_months: int):
+        self.vendor_stats = facets.get('vendors', [])
+        self.pattern_records = facets.get('patterns', [])
+        self.pattern_months = pattern_months
+        self.built_at = datetime.utcnow()
+
 class AIService:
     """Main AI service class that orchestrates all AI features"""
 
@@ -55,6 +116,7 @@ class AIService:
         self.logger = logging.getLogger(__name__)
         self.models_path = os.path.join(os.path.dirname(__file__), '..', 'models')
         os.makedirs(self.models_path, exist_ok=True)
+        self.forecasting = ForecastingEngine(db.transactions, self.models_path)
 
         # Initialize NLP components
         try:
@@ -103,73 +165,105 @@ class AIService:
             'travel_suggestions': db.travel_suggestions,
             'historical_patterns': db.historical_patterns
         }
+        self.trigger_engine = TriggerEngine(self)
 
     # ==================== PREDICTIVE & ANALYTICAL INTELLIGENCE ====================
 
+    # ---------------- shared transaction aggregates ----------------
+
+    def _vendor_stats_pipeline(self, vendor_id: str = None) -> List[Dict[str, Any]]:
+        pipeline = [
+            {
+                '$group': {
+                    '_id': {'$ifNull': ['$vendor', 'Unknown']},
+                    'total_transactions': {'$sum': 1},
+                    'completed_transactions': {
+                        '$sum': {'$cond': [{'$eq': [{'$ifNull': ['$status', 'completed']}, 'completed']}, 1, 0]}
+                    },
+                    'on_time_transactions': {
+                        '$sum': {'$cond': [{'$lte': [{'$ifNull': ['$delay_days', 0]}, 0]}, 1, 0]}
+                    },
+                    'total_value': {'$sum': {'$abs': '$amount'}}
+                }
+            },
+            {'$sort': {'total_transactions': -1, '_id': 1}}
+        ]
+
+        if vendor_id:
+            pipeline.insert(0, {'$match': {'vendorId': vendor_id}})
+        return pipeline
+
+    def _transaction_pattern_pipeline(self, start_date: datetime) -> List[Dict[str, Any]]:
+        return [
+            {
+                '$match': {
+                    'date': {'$gte': start_date}
+                }
+            },
+            {
+                '$group': {
+                    '_id': {
+                        'month': {'$month': '$date'},
+                        'year': {'$year': '$date'},
+                        'type': '$type'
+                    },
+                    'total_amount': {'$sum': '$amount'},
+                    'count': {'$sum': 1},
+                    'avg_amount': {'$avg': '$amount'}
+                }
+            },
+            {'$sort': {'_id.year': 1, '_id.month': 1}}
+        ]
+
+    async def build_transaction_snapshot(self, pattern_months: int = 12) -> TransactionSnapshot:
+        """Compute every transactions aggregate used by the analytics in a single collection pass"""
+        now = datetime.utcnow()
+        pipeline = [{
+            '$facet': {
+                'vendors': self._vendor_stats_pipeline(),
+                'patterns': self._transaction_pattern_pipeline(now - timedelta(days=pattern_months * 30))
+            }
+        }]
+
+        facets = {}
+        async for result in self.collections['transactions'].aggregate(pipeline):
+            facets = result
+        return TransactionSnapshot(facets, pattern_months)
+
+    async def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [record async for record in self.collections['transactions'].aggregate(pipeline)]
+
     async def predict_budget_variance(self, department: str = None, months_ahead: int = 3) -> Dict[str, Any]:
         """Predict budget variance based on historical spending patterns"""
         try:
-            # Get historical transaction data
-            pipeline = [
-                {
-                    '$group': {
-                        '_id': {
-                            'month': {'$month': '$date'},
-                            'year': {'$year': '$date'},
-                            'department': '$department'
-                        },
-                        'total_amount': {'$sum': '$amount'},
-                        'transaction_count': {'$sum': 1}
-                    }
-                },
-                {'$sort': {'_id.year': 1, '_id.month': 1}}
-            ]
-
-            if department:
-                pipeline.insert(0, {'$match': {'department': department}})
+            # Monthly trend from the persisted forecasting models
+            budget = await self.forecasting.forecast_budget(department, months_ahead)
 
-            historical_data = []
-            async for record in self.collections['transactions'].aggregate(pipeline):
-                historical_data.append({
-                    'period': f"{record['_id']['year']}-{record['_id']['month']:02d}",
-                    'amount': record['total_amount'],
-                    'count': record['transaction_count']
-                })
-
-            if len(historical_data) < 3:
+            if budget is None:
                 return {
                     'success': False,
                     'message': 'Insufficient historical data for budget prediction',
                     'predictions': []
                 }
 
-            # Prepare data for linear regression
-            periods = list(range(len(historical_data)))
-            amounts = [record['amount'] for record in historical_data]
-
-            # Simple linear regression for trend analysis
-            if len(periods) > 1:
-                slope = (amounts[-1] - amounts[0]) / len(amounts) if len(amounts) > 1 else 0
-            else:
-                slope = 0
+            amounts = budget['history']
+            slope = budget['slope']
 
             # Generate predictions
             predictions = []
-            last_period = len(historical_data)
 
-            for i in range(1, months_ahead + 1):
-                predicted_amount = amounts[-1] + (slope * i)
-                variance = predicted_amount - amounts[-1] if amounts else 0
+            for i, predicted_amount in enumerate(budget['predicted'], start=1):
+                variance = predicted_amount - amounts[-1]
 
                 predictions.append({
                     'period': f"Month +{i}",
-                    'predicted_amount': round(predicted_amount, 2),
-                    'expected_variance': round(variance, 2),
+                    'predicted_amount': round(float(predicted_amount), 2),
+                    'expected_variance': round(float(variance), 2),
                     'confidence': max(60, 90 - (i * 5))  # Decreasing confidence over time
                 })
 
             # Calculate variance alerts
-            current_avg = statistics.mean(amounts[-3:]) if len(amounts) >= 3 else amounts[-1]
+            current_avg = float(amounts[-3:].mean())
             alerts = []
 
             for pred in predictions:
@@ -185,7 +279,8 @@ class AIService:
                 'predictions': predictions,
                 'alerts': alerts,
                 'trend': 'increasing' if slope > 0 else 'decreasing',
-                'confidence': 85
+                'confidence': 85,
+                'model_trained_at': budget['trained_at']
             }
 
         except Exception as e:
@@ -199,64 +294,35 @@ class AIService:
     async def forecast_cash_flow(self, days_ahead: int = 30) -> Dict[str, Any]:
         """Forecast cash flow based on historical transactions and patterns"""
         try:
-            # Get recent transactions (last 90 days)
-            start_date = datetime.utcnow() - timedelta(days=90)
-
-            inflow_query = {'amount': {'$gt': 0}, 'date': {'$gte': start_date}}
-            outflow_query = {'amount': {'$lt': 0}, 'date': {'$gte': start_date}}
-
-            inflows = []
-            outflows = []
-
-            async for txn in self.collections['transactions'].find(inflow_query):
-                inflows.append({
-                    'date': txn['date'],
-                    'amount': abs(txn['amount']),
-                    'type': txn.get('type', 'unknown')
-                })
-
-            async for txn in self.collections['transactions'].find(outflow_query):
-                outflows.append({
-                    'date': txn['date'],
-                    'amount': abs(txn['amount']),
-                    'type': txn.get('type', 'unknown')
-                })
+            # Daily inflow/outflow predictions from the persisted forecasting models
+            cash_flow = await self.forecasting.forecast_cash_flow(days_ahead)
 
-            if not inflows and not outflows:
+            if cash_flow is None:
                 return {
                     'success': False,
                     'message': 'Insufficient transaction data for cash flow forecasting',
                     'forecast': []
                 }
 
-            # Calculate daily averages
-            inflow_avg = statistics.mean([t['amount'] for t in inflows]) if inflows else 0
-            outflow_avg = statistics.mean([t['amount'] for t in outflows]) if outflows else 0
+            inflow_avg = cash_flow['avg_daily_inflow']
+            outflow_avg = cash_flow['avg_daily_outflow']
 
-            # Generate forecast
-            forecast = []
+            # Running balance over the predicted daily net flow
             current_balance = await self._get_current_cash_balance()
+            balances = current_balance + np.cumsum(cash_flow['inflow'] - cash_flow['outflow'])
 
-            for i in range(1, days_ahead + 1):
-                forecast_date = datetime.utcnow() + timedelta(days=i)
-
-                # Add some variance based on day of week and historical patterns
-                day_variance = 1 + (0.1 * math.sin(i * 0.5))  # Weekly pattern
-                inflow_pred = inflow_avg * day_variance
-                outflow_pred = outflow_avg * (1 + (0.05 * (i / 30)))  # Slight increase over time
-
-                daily_balance = current_balance + inflow_pred - outflow_pred
-
+            forecast = []
+            for i, (forecast_date, inflow_pred, outflow_pred, daily_balance) in enumerate(
+                zip(cash_flow['dates'], cash_flow['inflow'], cash_flow['outflow'], balances), start=1
+            ):
                 forecast.append({
                     'date': forecast_date.strftime('%Y-%m-%d'),
-                    'predicted_inflow': round(inflow_pred, 2),
-                    'predicted_outflow': round(outflow_pred, 2),
-                    'predicted_balance': round(daily_balance, 2),
+                    'predicted_inflow': round(float(inflow_pred), 2),
+                    'predicted_outflow': round(float(outflow_pred), 2),
+                    'predicted_balance': round(float(daily_balance), 2),
                     'confidence': max(70, 95 - (i * 2))
                 })
 
-                current_balance = daily_balance
-
             # Generate alerts for low balance predictions
             alerts = []
             for entry in forecast:
@@ -276,7 +342,9 @@ class AIService:
                 'summary': {
                     'avg_daily_inflow': round(inflow_avg, 2),
                     'avg_daily_outflow': round(outflow_avg, 2),
-                    'projected_trend': 'positive' if inflow_avg > outflow_avg else 'negative'
+                    'projected_trend': 'positive' if inflow_avg > outflow_avg else 'negative',
+                    'model_trained_at': cash_flow['trained_at'],
+                    'training_days': cash_flow['training_days']
                 }
             }
 
@@ -288,82 +356,43 @@ class AIService:
                 'forecast': []
             }
 
-    async def score_vendor_reliability(self, vendor_id: str = None) -> Dict[str, Any]:
+    async def score_vendor_reliability(self, vendor_id: str = None, snapshot: TransactionSnapshot = None,
+                                       persist: bool = True, limit: Optional[int] = None) -> Dict[str, Any]:
         """Score vendor reliability based on transaction history, email tone, and delay patterns"""
         try:
-            # Get vendor transaction history
-            query = {}
-            if vendor_id:
-                query['vendorId'] = vendor_id
-
-            transactions = []
-            async for txn in self.collections['transactions'].find(query):
-                transactions.append({
-                    'date': txn['date'],
-                    'amount': txn['amount'],
-                    'status': txn.get('status', 'completed'),
-                    'vendor': txn.get('vendor', 'Unknown')
-                })
+            scored_at = datetime.utcnow()
 
-            if not transactions:
+            # Per-vendor transaction counts and totals from one grouped aggregation
+            if snapshot is not None and not vendor_id:
+                vendor_stats = snapshot.vendor_stats
+            else:
+                vendor_stats = await self._aggregate(self._vendor_stats_pipeline(vendor_id))
+
+            if not vendor_stats:
                 return {
                     'success': False,
                     'message': 'No transaction data found for vendor scoring',
                     'scores': []
                 }
 
-            # Calculate reliability metrics
-            scores = []
-            vendors = list(set([t['vendor'] for t in transactions]))
-
-            for vendor in vendors[:10]:  # Limit to top 10 vendors
-                vendor_txns = [t for t in transactions if t['vendor'] == vendor]
-
-                # Calculate metrics
-                total_txns = len(vendor_txns)
-                completed_txns = len([t for t in vendor_txns if t['status'] == 'completed'])
-                on_time_txns = len([t for t in vendor_txns if t.get('delay_days', 0) <= 0])
-
-                # Calculate scores
-                completion_rate = (completed_txns / total_txns) * 100 if total_txns > 0 else 0
-                on_time_rate = (on_time_txns / total_txns) * 100 if total_txns > 0 else 0
-
-                # Calculate average transaction value
-                avg_value = statistics.mean([abs(t['amount']) for t in vendor_txns]) if vendor_txns else 0
-
-                # Overall reliability score (weighted average)
-                reliability_score = (completion_rate * 0.4) + (on_time_rate * 0.4) + (min(avg_value / 10000, 1) * 20)
+            # Email tone for every vendor, fetched in concurrent batches
+            email_tones = await self._analyze_vendor_email_tones([stats['_id'] for stats in vendor_stats])
 
-                # Analyze email tone (simplified)
-                email_tone = await self._analyze_vendor_email_tone(vendor)
-
-                # Generate insights
-                insights = []
-                if completion_rate < 80:
-                    insights.append("Low completion rate detected")
-                if on_time_rate < 70:
-                    insights.append("Frequent delays observed")
-                if email_tone < 0:
-                    insights.append("Negative communication patterns")
-
-                scores.append({
-                    'vendor': vendor,
-                    'reliability_score': round(reliability_score, 2),
-                    'completion_rate': round(completion_rate, 2),
-                    'on_time_rate': round(on_time_rate, 2),
-                    'total_transactions': total_txns,
-                    'average_value': round(avg_value, 2),
-                    'email_tone': email_tone,
-                    'insights': insights,
-                    'recommendation': 'RECOMMENDED' if reliability_score > 80 else 'CAUTION' if reliability_score > 60 else 'NOT_RECOMMENDED'
-                })
+            scores = [
+                self._vendor_score(stats, email_tones.get(stats['_id'], 0))
+                for stats in vendor_stats
+            ]
 
             # Sort by reliability score
             scores.sort(key=lambda x: x['reliability_score'], reverse=True)
 
+            if persist:
+                # A full run also drops vendors that no longer have transactions
+                await self._materialize_vendor_scores(scores, scored_at, prune=not vendor_id)
+
             return {
                 'success': True,
-                'scores': scores,
+                'scores': scores[:limit] if limit else scores,
                 'summary': {
                     'total_vendors_analyzed': len(scores),
                     'highly_reliable': len([s for s in scores if s['reliability_score'] > 80]),
@@ -379,6 +408,77 @@ class AIService:
                 'scores': []
             }
 
+    def _vendor_score(self, stats: Dict[str, Any], email_tone: float) -> Dict[str, Any]:
+        """Reliability score for one vendor from its grouped transaction stats"""
+        # Calculate metrics
+        total_txns = stats['total_transactions']
+        completed_txns = stats['completed_transactions']
+        on_time_txns = stats['on_time_transactions']
+
+        # Calculate scores
+        completion_rate = (completed_txns / total_txns) * 100 if total_txns > 0 else 0
+        on_time_rate = (on_time_txns / total_txns) * 100 if total_txns > 0 else 0
+
+        # Calculate average transaction value
+        avg_value = stats['total_value'] / total_txns if total_txns else 0
+
+        # Overall reliability score (weighted average)
+        reliability_score = (completion_rate * 0.4) + (on_time_rate * 0.4) + (min(avg_value / 10000, 1) * 20)
+
+        # Generate insights
+        insights = []
+        if completion_rate < 80:
+            insights.append("Low completion rate detected")
+        if on_time_rate < 70:
+            insights.append("Frequent delays observed")
+        if email_tone < 0:
+            insights.append("Negative communication patterns")
+
+        return {
+            'vendor': stats['_id'],
+            'reliability_score': round(reliability_score, 2),
+            'completion_rate': round(completion_rate, 2),
+            'on_time_rate': round(on_time_rate, 2),
+            'total_transactions': total_txns,
+            'average_value': round(avg_value, 2),
+            'email_tone': email_tone,
+            'insights': insights,
+            'recommendation': 'RECOMMENDED' if reliability_score > 80 else 'CAUTION' if reliability_score > 60 else 'NOT_RECOMMENDED'
+        }
+
+    async def _materialize_vendor_scores(self, scores: List[Dict[str, Any]], scored_at: datetime, prune: bool = False):
+        """Upsert scores into vendor_scores so rankings are a single indexed query"""
+        collection = self.collections['vendor_scores']
+
+        for start in range(0, len(scores), VENDOR_SCORE_WRITE_BATCH):
+            chunk = scores[start:start + VENDOR_SCORE_WRITE_BATCH]
+            await collection.bulk_write([
+                UpdateOne({'vendor': score['vendor']}, {'$set': {**score, 'scored_at': scored_at}}, upsert=True)
+                for score in chunk
+            ], ordered=False)
+
+        if prune:
+            # Only vendors this run did not score; rows written by a newer concurrent run are newer than scored_at
+            await collection.delete_many({
+                'vendor': {'$nin': [score['vendor'] for score in scores]},
+                'scored_at': {'$lt': scored_at}
+            })
+
+    async def get_vendor_rankings(self, limit: int = 50, recommendation: str = None,
+                                  min_score: float = None) -> List[Dict[str, Any]]:
+        """Read materialized vendor scores, most reliable first"""
+        query = {}
+        if recommendation:
+            query['recommendation'] = recommendation
+        if min_score is not None:
+            query['reliability_score'] = {'$gte': min_score}
+
+        rankings = []
+        cursor = self.collections['vendor_scores'].find(query, {'_id': 0}).sort([('reliability_score', DESCENDING), ('vendor', ASCENDING)]).limit(limit)
+        async for score in cursor:
+            rankings.append(score)
+        return rankings
+
     async def predict_asset_maintenance(self, asset_type: str = 'vehicle', asset_id: str = None) -> Dict[str, Any]:
         """Predict when assets need maintenance using usage patterns and historical data"""
         try:
@@ -490,44 +590,52 @@ class AIService:
             }
 
     async def _get_current_cash_balance(self) -> float:
-        """Get current cash balance from all accounts"""
+        """Get current cash balance from all accounts (materialized balance snapshot)"""
         try:
-            total_balance = 0
-            async for card in self.collections['debit_cards'].find():
-                total_balance += card.get('currentBalance', 0)
-            return total_balance
+            return await card_balance_service.get_total_balance()
         except:
             return 0
 
     async def _analyze_vendor_email_tone(self, vendor: str) -> float:
         """Analyze email tone for vendor (simplified implementation)"""
-        try:
-            # Get recent emails for vendor
-            emails = []
-            async for email_doc in self.collections['emails'].find({'sender': vendor}).limit(10):
-                emails.append(email_doc.get('content', ''))
-
-            if not emails:
-                return 0  # Neutral
-
-            # Simple sentiment analysis (in production, use proper NLP)
-            positive_words = ['good', 'excellent', 'satisfied', 'pleased', 'happy', 'thank', 'appreciate']
-            negative_words = ['problem', 'issue', 'delay', 'error', 'wrong', 'bad', 'terrible', 'disappointed']
-
-            positive_count = sum(sum(1 for word in email.lower().split() if word in positive_words) for email in emails)
-            negative_count = sum(sum(1 for word in email.lower().split() if word in negative_words) for email in emails)
-
-            total_words = sum(len(email.split()) for email in emails)
-
-            if total_words == 0:
-                return 0
-
-            sentiment_score = (positive_count - negative_count) / total_words * 100
-            return round(sentiment_score, 2)
-
-        except Exception as e:
-            self.logger.error(f"Error analyzing email tone: {str(e)}")
-            return 0
+        tones = await self._analyze_vendor_email_tones([vendor])
+        return tones.get(vendor, 0)
+
+    async def _fetch_vendor_emails(self, vendors: List[str]) -> Dict[str, List[str]]:
+        """Recent email bodies for a batch of vendors in one aggregation"""
+        pipeline = [
+            {'$match': {'sender': {'$in': vendors}}},
+            # $topN keeps at most EMAILS_PER_VENDOR bodies per sender in the group (MongoDB 5.2+)
+            {'$group': {'_id': '$sender', 'contents': {'$topN': {
+                'n': EMAILS_PER_VENDOR,
+                'sortBy': {'_id': -1},
+                'output': {'$ifNull': ['$content', '']}
+            }}}}
+        ]
+        emails = {}
+        async for record in self.collections['emails'].aggregate(pipeline, allowDiskUse=True):
+            emails[record['_id']] = record['contents']
+        return emails
+
+    async def _analyze_vendor_email_tones(self, vendors: List[str]) -> Dict[str, float]:
+        """Email tone for many vendors, batching the email lookups and running batches concurrently"""
+        semaphore = asyncio.Semaphore(VENDOR_TONE_CONCURRENCY)
+
+        async def analyze_batch(batch: List[str]) -> Dict[str, float]:
+            async with semaphore:
+                try:
+                    emails = await self._fetch_vendor_emails(batch)
+                except Exception as e:
+                    self.logger.error(f"Error analyzing email tone: {str(e)}")
+                    return {}
+            # Vendors without emails are neutral
+            return {vendor: email_tone_score(contents) for vendor, contents in emails.items()}
+
+        batches = [vendors[i:i + VENDOR_TONE_BATCH] for i in range(0, len(vendors), VENDOR_TONE_BATCH)]
+        tones = {}
+        for result in await asyncio.gather(*(analyze_batch(batch) for batch in batches)):
+            tones.update(result)
+        return tones
 
     # ==================== NATURAL LANGUAGE & CONVERSATIONAL AI ====================
 
@@ -895,12 +1003,18 @@ class AIService:
 
             file_extension = os.path.splitext(file_path)[1].lower()
 
+            # Skip OCR entirely when the same content has already been processed
+            content_hash = await asyncio.to_thread(hash_file, file_path)
+            existing = await self.collections['documents'].find_one({'content_hash': content_hash})
+            if existing:
+                return self._duplicate_document_result(existing)
+
             # Extract text based on file type
-            if file_extension == '.pdf':
+            if file_extension in PDF_EXTENSIONS:
                 text_content = await self._extract_pdf_text(file_path)
-            elif file_extension in ['.docx', '.doc']:
+            elif file_extension in DOCX_EXTENSIONS:
                 text_content = await self._extract_docx_text(file_path)
-            elif file_extension in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
+            elif file_extension in IMAGE_EXTENSIONS:
                 text_content = await self._extract_image_text(file_path)
             else:
                 return {
@@ -916,24 +1030,16 @@ class AIService:
                     'data': None
                 }
 
-            # Classify document type if auto-detected
-            if document_type == 'auto':
-                document_type = self._classify_document(text_content)
-
-            # Extract structured data based on document type
-            extracted_data = await self._extract_structured_data(text_content, document_type)
+            document_record = await self.build_document_record(file_path, text_content, document_type, content_hash)
+            document_type = document_record['document_type']
+            extracted_data = document_record['structured_data']
 
-            # Store document in database
-            document_record = {
-                'file_path': file_path,
-                'document_type': document_type,
-                'extracted_text': text_content[:5000],  # Limit stored text
-                'structured_data': extracted_data,
-                'processed_at': datetime.utcnow(),
-                'file_size': os.path.getsize(file_path)
-            }
-
-            result = await self.collections['documents'].insert_one(document_record)
+            try:
+                result = await self.collections['documents'].insert_one(document_record)
+            except DuplicateKeyError:
+                # Processed concurrently by another request since the check above
+                existing = await self.collections['documents'].find_one({'content_hash': content_hash})
+                return self._duplicate_document_result(existing)
 
             return {
                 'success': True,
@@ -952,54 +1058,68 @@ class AIService:
                 'data': None
             }
 
-    async def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF files"""
-        try:
-            doc = fitz.open(file_path)
-            text_content = ""
+    @staticmethod
+    def _duplicate_document_result(existing: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'document_id': str(existing['_id']),
+            'document_type': existing.get('document_type'),
+            'extracted_data': existing.get('structured_data', {}),
+            'text_preview': existing.get('extracted_text', '')[:500],
+            'duplicate': True,
+            'message': f"Document already processed as {existing.get('document_type')}"
+        }
 
-            for page_num in range(min(10, doc.page_count)):  # Limit to first 10 pages
-                page = doc.load_page(page_num)
-                text_content += page.get_text()
+    async def build_document_record(self, file_path: str, text_content: str, document_type: str, content_hash: str) -> Dict[str, Any]:
+        """Classify and extract fields from document text and build its db.documents record"""
+        # Classification and field extraction share one keyword index over the text
+        extracted_data = await self._extract_structured_data(text_content, document_type)
 
-            doc.close()
-            return text_content
+        return {
+            'file_path': file_path,
+            'content_hash': content_hash,
+            'document_type': extracted_data['document_type'],
+            'extracted_text': text_content[:5000],  # Limit stored text
+            'structured_data': extracted_data,
+            'processed_at': datetime.utcnow(),
+            'file_size': os.path.getsize(file_path)
+        }
+
+    def submit_document_job(self, file_path: str, document_type: str = 'auto') -> str:
+        """Queue document processing in the extraction engine and return the job ID"""
+        return document_extraction_engine.submit(
+            lambda: self.process_document(file_path, document_type),
+            description=os.path.basename(file_path)
+        )
+
+    def get_document_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return document_extraction_engine.get_job(job_id)
+
+    async def _extract_pdf_text(self, file_path: str) -> str:
+        """Extract text from PDF files, page ranges in parallel in the process pool"""
+        try:
+            async with document_extraction_engine.slots:
+                return await document_extraction_engine.extract_pdf_text(file_path)
 
         except Exception as e:
             self.logger.error(f"Error extracting PDF text: {str(e)}")
             return ""
 
     async def _extract_docx_text(self, file_path: str) -> str:
-        """Extract text from DOCX files"""
+        """Extract text from DOCX files in the process pool"""
         try:
-            doc = docx.Document(file_path)
-            text_content = ""
-
-            for paragraph in doc.paragraphs:
-                text_content += paragraph.text + "\n"
-
-            return text_content
+            async with document_extraction_engine.slots:
+                return await document_extraction_engine.extract_docx_text(file_path)
 
         except Exception as e:
             self.logger.error(f"Error extracting DOCX text: {str(e)}")
             return ""
 
     async def _extract_image_text(self, file_path: str) -> str:
-        """Extract text from images using OCR"""
+        """Extract text from images using OCR in the process pool"""
         try:
-            # Read image
-            image = cv2.imread(file_path)
-            if image is None:
-                return ""
-
-            # Preprocess image for better OCR
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-            # Extract text using pytesseract
-            text = pytesseract.image_to_string(binary)
-
-            return text
+            async with document_extraction_engine.slots:
+                return await document_extraction_engine.extract_image_text(file_path)
 
         except Exception as e:
             self.logger.error(f"Error extracting image text: {str(e)}")
@@ -1007,228 +1127,33 @@ class AIService:
 
     def _classify_document(self, text_content: str) -> str:
         """Classify document type based on content"""
-        text_lower = text_content.lower()
-
-        # Invoice patterns
-        invoice_keywords = ['invoice', 'bill to', 'ship to', 'total amount', 'due date', 'invoice number']
-        if sum(1 for keyword in invoice_keywords if keyword in text_lower) >= 3:
-            return 'invoice'
-
-        # Contract patterns
-        contract_keywords = ['agreement', 'contract', 'party', 'terms and conditions', 'effective date']
-        if sum(1 for keyword in contract_keywords if keyword in text_lower) >= 2:
-            return 'contract'
-
-        # Receipt patterns
-        receipt_keywords = ['receipt', 'payment received', 'amount paid', 'transaction id']
-        if sum(1 for keyword in receipt_keywords if keyword in text_lower) >= 2:
-            return 'receipt'
-
-        # Maintenance record patterns
-        maintenance_keywords = ['maintenance', 'service record', 'repair', 'inspection', 'work order']
-        if sum(1 for keyword in maintenance_keywords if keyword in text_lower) >= 2:
-            return 'maintenance_record'
-
-        # Default classification
-        return 'general_document'
+        return document_field_extractor.classify(KeywordIndex(text_content))
 
     async def _extract_structured_data(self, text_content: str, document_type: str) -> Dict[str, Any]:
         """Extract structured data from document based on type"""
-        data = {
-            'document_type': document_type,
+        extraction = document_field_extractor.extract(text_content, document_type)
+        return {
+            'document_type': extraction['document_type'],
             'raw_text': text_content[:1000],
-            'extracted_fields': {}
+            'extracted_fields': extraction['extracted_fields'],
+            'timing_ms': extraction['timing_ms']
         }
 
-        if document_type == 'invoice':
-            data['extracted_fields'] = self._extract_invoice_data(text_content)
-        elif document_type == 'contract':
-            data['extracted_fields'] = self._extract_contract_data(text_content)
-        elif document_type == 'receipt':
-            data['extracted_fields'] = self._extract_receipt_data(text_content)
-        elif document_type == 'maintenance_record':
-            data['extracted_fields'] = self._extract_maintenance_data(text_content)
-
-        return data
-
     def _extract_invoice_data(self, text: str) -> Dict[str, Any]:
         """Extract structured data from invoice text"""
-        fields = {}
-
-        # Extract invoice number
-        invoice_patterns = [
-            r'invoice\s*#?:?\s*([A-Z0-9\-]+)',
-            r'inv\s*#?:?\s*([A-Z0-9\-]+)',
-            r'invoice\s*number:?\s*([A-Z0-9\-]+)'
-        ]
-
-        for pattern in invoice_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['invoice_number'] = match.group(1)
-                break
-
-        # Extract amounts
-        amount_patterns = [
-            r'total\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'amount\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'₹(\d+(?:,\d{3})*(?:\.\d{2})?)'
-        ]
-
-        for pattern in amount_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                fields['amounts'] = [float(m.replace(',', '')) for m in matches]
-                break
-
-        # Extract dates
-        date_patterns = [
-            r'date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'invoice\s*date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'due\s*date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        ]
-
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['date'] = match.group(1)
-                break
-
-        # Extract vendor information
-        vendor_patterns = [
-            r'from\s*:?\s*([^\n\r]+)',
-            r'vendor\s*:?\s*([^\n\r]+)',
-            r'bill\s*from:?\s*([^\n\r]+)'
-        ]
-
-        for pattern in vendor_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['vendor'] = match.group(1).strip()
-                break
-
-        return fields
+        return document_field_extractor.fields_for(text, 'invoice')
 
     def _extract_contract_data(self, text: str) -> Dict[str, Any]:
         """Extract structured data from contract text"""
-        fields = {}
-
-        # Extract contract type
-        contract_types = ['service agreement', 'lease agreement', 'purchase agreement', 'employment contract']
-        for contract_type in contract_types:
-            if contract_type in text.lower():
-                fields['contract_type'] = contract_type
-                break
-
-        # Extract parties
-        party_patterns = [
-            r'between\s+([^\n\r]+?)\s+and\s+([^\n\r]+)',
-            r'party.*?([^\n\r]+).*?party.*?([^\n\r]+)'
-        ]
-
-        for pattern in party_patterns:
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                fields['parties'] = [match.group(1).strip(), match.group(2).strip()]
-                break
-
-        # Extract effective date
-        date_patterns = [
-            r'effective\s*date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'start\s*date:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'commencement:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        ]
-
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['effective_date'] = match.group(1)
-                break
-
-        return fields
+        return document_field_extractor.fields_for(text, 'contract')
 
     def _extract_receipt_data(self, text: str) -> Dict[str, Any]:
         """Extract structured data from receipt text"""
-        fields = {}
-
-        # Extract receipt number
-        receipt_patterns = [
-            r'receipt\s*#?:?\s*([A-Z0-9\-]+)',
-            r'transaction\s*#?:?\s*([A-Z0-9\-]+)',
-            r'ref\s*#?:?\s*([A-Z0-9\-]+)'
-        ]
-
-        for pattern in receipt_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['receipt_number'] = match.group(1)
-                break
-
-        # Extract amount
-        amount_patterns = [
-            r'amount\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'total\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'₹(\d+(?:,\d{3})*(?:\.\d{2})?)'
-        ]
-
-        for pattern in amount_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['amount'] = float(match.group(1).replace(',', ''))
-                break
-
-        # Extract date
-        date_patterns = [
-            r'date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        ]
-
-        for pattern in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['date'] = match.group(1)
-                break
-
-        return fields
+        return document_field_extractor.fields_for(text, 'receipt')
 
     def _extract_maintenance_data(self, text: str) -> Dict[str, Any]:
         """Extract structured data from maintenance record text"""
-        fields = {}
-
-        # Extract asset information
-        asset_patterns = [
-            r'vehicle\s*:?\s*([^\n\r]+)',
-            r'equipment\s*:?\s*([^\n\r]+)',
-            r'asset\s*:?\s*([^\n\r]+)'
-        ]
-
-        for pattern in asset_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['asset'] = match.group(1).strip()
-                break
-
-        # Extract maintenance type
-        maintenance_types = ['repair', 'service', 'inspection', 'replacement', 'calibration']
-        for maint_type in maintenance_types:
-            if maint_type in text.lower():
-                fields['maintenance_type'] = maint_type
-                break
-
-        # Extract cost
-        cost_patterns = [
-            r'cost\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'amount\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'total\s*:?\s*₹?(\d+(?:,\d{3})*(?:\.\d{2})?)'
-        ]
-
-        for pattern in cost_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                fields['cost'] = float(match.group(1).replace(',', ''))
-                break
-
-        return fields
+        return document_field_extractor.fields_for(text, 'maintenance_record')
 
     # ==================== SMART AUTOMATION TRIGGERS ====================
 
@@ -1262,40 +1187,43 @@ class AIService:
                 'message': f'Error creating automation trigger: {str(e)}'
             }
 
-    async def check_automation_triggers(self) -> Dict[str, Any]:
-        """Check all active automation triggers and execute if conditions are met"""
+    async def check_automation_triggers(self, snapshot: TransactionSnapshot = None) -> Dict[str, Any]:
+        """Check all active automation triggers and execute if conditions are met.
+
+        Each prediction the triggers depend on is computed once per check and
+        shared by every trigger (see ``services.trigger_engine``).
+        """
         try:
-            active_triggers = []
-            async for trigger in self.collections['automation_triggers'].find({'is_active': True}):
-                trigger['_id'] = str(trigger['_id'])
-                active_triggers.append(trigger)
-
-            executed_triggers = []
-
-            for trigger in active_triggers:
-                should_execute = await self._evaluate_trigger_conditions(trigger)
-
-                if should_execute:
-                    execution_result = await self._execute_trigger_actions(trigger)
-                    executed_triggers.append({
-                        'trigger_id': trigger['_id'],
-                        'trigger_name': trigger['name'],
-                        'executed_at': datetime.utcnow(),
-                        'result': execution_result
-                    })
+            return await self.trigger_engine.sweep(snapshot)
 
+        except Exception as e:
+            self.logger.error(f"Error checking automation triggers: {str(e)}")
+            return {
+                'success': False,
+                'message': f'Error checking automation triggers: {str(e)}'
+            }
+
+    async def evaluate_automation_triggers(self, snapshot: TransactionSnapshot = None,
+                                           executed_since: Optional[datetime] = None,
+                                           vendor_scores: Optional[Awaitable[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Report which active triggers' conditions currently hold without executing their actions"""
+        try:
+            compiled, fired, _ = await self.trigger_engine.evaluate(snapshot, vendor_scores=vendor_scores)
+            executed = [item for item in compiled
+                        if executed_since and item.trigger.get('last_executed_at')
+                        and item.trigger['last_executed_at'] >= executed_since]
             return {
                 'success': True,
-                'triggers_checked': len(active_triggers),
-                'triggers_executed': len(executed_triggers),
-                'executed_triggers': executed_triggers
+                'triggers_checked': len(compiled),
+                'triggers_firing': len(fired),
+                'triggers_executed': len(executed)
             }
 
         except Exception as e:
-            self.logger.error(f"Error checking automation triggers: {str(e)}")
+            self.logger.error(f"Error evaluating automation triggers: {str(e)}")
             return {
                 'success': False,
-                'message': f'Error checking automation triggers: {str(e)}'
+                'message': f'Error evaluating automation triggers: {str(e)}'
             }
 
     async def _generate_trigger_insights(self, trigger_config: Dict[str, Any]) -> Dict[str, Any]:
@@ -1332,188 +1260,6 @@ class AIService:
 
         return insights
 
-    async def _evaluate_trigger_conditions(self, trigger: Dict[str, Any]) -> bool:
-        """Evaluate if trigger conditions are met"""
-        try:
-            conditions = trigger.get('conditions', {})
-            trigger_type = trigger.get('trigger_type')
-
-            if trigger_type == 'budget_threshold':
-                # Check if spending exceeds threshold
-                department = conditions.get('department')
-                threshold_percentage = conditions.get('threshold_percentage', 20)
-
-                budget_data = await self.predict_budget_variance(department=department, months_ahead=1)
-
-                if budget_data['success']:
-                    for prediction in budget_data['predictions']:
-                        if abs(prediction.get('expected_variance', 0)) > threshold_percentage:
-                            return True
-
-            elif trigger_type == 'vendor_performance':
-                # Check vendor performance scores
-                min_score = conditions.get('min_score', 60)
-
-                vendor_data = await self.score_vendor_reliability()
-
-                if vendor_data['success']:
-                    low_performers = [v for v in vendor_data['scores'] if v['reliability_score'] < min_score]
-                    if low_performers:
-                        return True
-
-            elif trigger_type == 'maintenance_prediction':
-                # Check maintenance predictions
-                days_ahead = conditions.get('days_ahead', 30)
-                priority = conditions.get('priority', 'MEDIUM')
-
-                maintenance_data = await self.predict_asset_maintenance()
-
-                if maintenance_data['success']:
-                    urgent_maintenance = [
-                        p for p in maintenance_data['predictions']
-                        if p['days_until_maintenance'] <= days_ahead and p['priority'] == priority
-                    ]
-                    if urgent_maintenance:
-                        return True
-
-            return False
-
-        except Exception as e:
-            self.logger.error(f"Error evaluating trigger conditions: {str(e)}")
-            return False
-
-    async def _execute_trigger_actions(self, trigger: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute actions for triggered automation"""
-        try:
-            actions = trigger.get('actions', [])
-            results = []
-
-            for action in actions:
-                action_type = action.get('type')
-
-                if action_type == 'send_notification':
-                    result = await self._send_trigger_notification(action, trigger)
-                    results.append({'action': 'notification', 'result': result})
-
-                elif action_type == 'create_alert':
-                    result = await self._create_trigger_alert(action, trigger)
-                    results.append({'action': 'alert', 'result': result})
-
-                elif action_type == 'generate_report':
-                    result = await self._generate_trigger_report(action, trigger)
-                    results.append({'action': 'report', 'result': result})
-
-            return {
-                'success': True,
-                'actions_executed': len(results),
-                'results': results
-            }
-
-        except Exception as e:
-            self.logger.error(f"Error executing trigger actions: {str(e)}")
-            return {
-                'success': False,
-                'message': f'Error executing trigger actions: {str(e)}'
-            }
-
-    async def _send_trigger_notification(self, action: Dict[str, Any], trigger: Dict[str, Any]) -> Dict[str, Any]:
-        """Send notification for trigger"""
-        try:
-            recipients = action.get('recipients', ['admin'])
-            message = action.get('message', f'Automation trigger "{trigger["name"]}" has been activated')
-
-            # In a real implementation, this would send actual notifications
-            # For now, we'll just log and store the notification
-
-            notification = {
-                'trigger_id': trigger['_id'],
-                'trigger_name': trigger['name'],
-                'message': message,
-                'recipients': recipients,
-                'sent_at': datetime.utcnow(),
-                'status': 'sent'
-            }
-
-            await self.collections['ai_insights'].insert_one({
-                'type': 'trigger_notification',
-                'data': notification,
-                'created_at': datetime.utcnow()
-            })
-
-            return {'success': True, 'message': 'Notification sent successfully'}
-
-        except Exception as e:
-            return {'success': False, 'message': f'Error sending notification: {str(e)}'}
-
-    async def _create_trigger_alert(self, action: Dict[str, Any], trigger: Dict[str, Any]) -> Dict[str, Any]:
-        """Create alert for trigger"""
-        try:
-            alert = {
-                'type': 'automation_trigger',
-                'trigger_id': trigger['_id'],
-                'trigger_name': trigger['name'],
-                'title': action.get('title', f'Automation Alert: {trigger["name"]}'),
-                'message': action.get('message', 'An automation trigger has been activated'),
-                'priority': action.get('priority', 'MEDIUM'),
-                'created_at': datetime.utcnow(),
-                'status': 'active'
-            }
-
-            result = await self.collections['ai_insights'].insert_one(alert)
-
-            return {
-                'success': True,
-                'alert_id': str(result.inserted_id),
-                'message': 'Alert created successfully'
-            }
-
-        except Exception as e:
-            return {'success': False, 'message': f'Error creating alert: {str(e)}'}
-
-    async def _generate_trigger_report(self, action: Dict[str, Any], trigger: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate report for trigger"""
-        try:
-            report_type = action.get('report_type', 'summary')
-
-            # Generate report data based on trigger type
-            report_data = await self._generate_trigger_report_data(trigger, report_type)
-
-            report = {
-                'trigger_id': trigger['_id'],
-                'trigger_name': trigger['name'],
-                'report_type': report_type,
-                'data': report_data,
-                'generated_at': datetime.utcnow()
-            }
-
-            result = await self.collections['ai_insights'].insert_one({
-                'type': 'trigger_report',
-                'data': report,
-                'created_at': datetime.utcnow()
-            })
-
-            return {
-                'success': True,
-                'report_id': str(result.inserted_id),
-                'message': 'Report generated successfully'
-            }
-
-        except Exception as e:
-            return {'success': False, 'message': f'Error generating report: {str(e)}'}
-
-    async def _generate_trigger_report_data(self, trigger: Dict[str, Any], report_type: str) -> Dict[str, Any]:
-        """Generate data for trigger report"""
-        trigger_type = trigger.get('trigger_type')
-
-        if trigger_type == 'budget_threshold':
-            return await self.predict_budget_variance(months_ahead=3)
-        elif trigger_type == 'vendor_performance':
-            return await self.score_vendor_reliability()
-        elif trigger_type == 'maintenance_prediction':
-            return await self.predict_asset_maintenance()
-        else:
-            return {'message': 'No specific data available for this trigger type'}
-
     # ==================== TRAVEL & EVENT PLANNING AUTOMATION ====================
 
     async def generate_travel_suggestions(self, requirements: Dict[str, Any]) -> Dict[str, Any]:
@@ -1726,12 +1472,13 @@ class AIService:
 
     # ==================== HISTORICAL DATA INTELLIGENCE ====================
 
-    async def analyze_historical_patterns(self, data_type: str = 'transactions', months_back: int = 12) -> Dict[str, Any]:
+    async def analyze_historical_patterns(self, data_type: str = 'transactions', months_back: int = 12,
+                                          persist: bool = True, snapshot: TransactionSnapshot = None) -> Dict[str, Any]:
         """Analyze historical data patterns to build intelligence"""
         try:
             # Get historical data based on type
             if data_type == 'transactions':
-                return await self._analyze_transaction_patterns(months_back)
+                return await self._analyze_transaction_patterns(months_back, persist, snapshot)
             elif data_type == 'maintenance':
                 return await self._analyze_maintenance_patterns(months_back)
             elif data_type == 'vendor_performance':
@@ -1749,35 +1496,19 @@ class AIService:
                 'message': f'Error analyzing historical patterns: {str(e)}'
             }
 
-    async def _analyze_transaction_patterns(self, months_back: int) -> Dict[str, Any]:
+    async def _analyze_transaction_patterns(self, months_back: int, persist: bool = True,
+                                            snapshot: TransactionSnapshot = None) -> Dict[str, Any]:
         """Analyze transaction patterns for insights"""
         try:
-            start_date = datetime.utcnow() - timedelta(days=months_back * 30)
-
             # Get monthly transaction patterns
-            pipeline = [
-                {
-                    '$match': {
-                        'date': {'$gte': start_date}
-                    }
-                },
-                {
-                    '$group': {
-                        '_id': {
-                            'month': {'$month': '$date'},
-                            'year': {'$year': '$date'},
-                            'type': '$type'
-                        },
-                        'total_amount': {'$sum': '$amount'},
-                        'count': {'$sum': 1},
-                        'avg_amount': {'$avg': '$amount'}
-                    }
-                },
-                {'$sort': {'_id.year': 1, '_id.month': 1}}
-            ]
+            if snapshot is not None and snapshot.pattern_months == months_back:
+                records = snapshot.pattern_records
+            else:
+                start_date = datetime.utcnow() - timedelta(days=months_back * 30)
+                records = await self._aggregate(self._transaction_pattern_pipeline(start_date))
 
             monthly_data = []
-            async for record in self.collections['transactions'].aggregate(pipeline):
+            for record in records:
                 monthly_data.append({
                     'period': f"{record['_id']['year']}-{record['_id']['month']:02d}",
                     'type': record['_id']['type'],
@@ -1829,7 +1560,9 @@ class AIService:
                 'analyzed_at': datetime.utcnow()
             }
 
-            await self.collections['historical_patterns'].insert_one(pattern_record)
+            # Read-only callers such as the dashboard skip recording the analysis
+            if persist:
+                await self.collections['historical_patterns'].insert_one(pattern_record)
 
             return {
                 'success': True,
@@ -0,0 +1,196 @@
+"""
+Email approval token store.
+
+One-click links resolve their token through a unique index on
+``approval_token``, so a click costs one index lookup however large
+``email_approvals`` grows. Token lookups (including misses) are cached in
+memory for ``EMAIL_APPROVAL_CACHE_SECONDS``; approval links are clicked
+repeatedly and prefetched by mail scanners. A decision is an atomic
+``find_one_and_update`` on a still-pending, unexpired approval, so a stale
+cache entry can never apply two decisions.
+
+Expiry does not wait for clicks: the ``email_approval_expiry`` job expires
+every pending approval past ``expires_at`` with one ``update_many`` served by
+the (status, expires_at) index. A partial TTL index removes expired approvals
+``EMAIL_APPROVAL_RETENTION_DAYS`` after they lapse; approved and rejected ones
+are kept. Before the indexes are built at startup, ``normalize_legacy`` converts
+``expires_at`` values stored as ISO strings to dates and marks approvals saved
+without a status as pending.
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from database import db
+from services.index_registry import index_registry
+from models.email_approval import ApprovalStatus
+
+logger = logging.getLogger(__name__)
+
+EMAIL_APPROVAL_RETENTION_DAYS = int(os.getenv("EMAIL_APPROVAL_RETENTION_DAYS", "90"))
+EMAIL_APPROVAL_CACHE_SIZE = int(os.getenv("EMAIL_APPROVAL_CACHE_SIZE", "10000"))
+EMAIL_APPROVAL_CACHE_SECONDS = float(os.getenv("EMAIL_APPROVAL_CACHE_SECONDS", "60"))
+NORMALIZE_BATCH = 1000
+
+PENDING = ApprovalStatus.PENDING.value
+EXPIRED = ApprovalStatus.EXPIRED.value
+
+# What a click needs to validate a token and answer
+SUMMARY_FIELDS = {'status': 1, 'expires_at': 1, 'reference_id': 1, 'approval_type': 1}
+
+_MISSING = object()
+
+index_registry.declare('email_approvals', 'approval_token', unique=True)
+index_registry.declare('email_approvals', [('status', ASCENDING), ('expires_at', ASCENDING)])
+index_registry.declare(
+    'email_approvals', 'expires_at',
+    expireAfterSeconds=EMAIL_APPROVAL_RETENTION_DAYS * 86400,
+    partialFilterExpression={'status': EXPIRED}
+)
+
+
+def parse_expiry(value: Any) -> Optional[datetime]:
+    """expires_at as a naive UTC datetime (it may have been stored as an ISO string)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ApprovalTokenStore:
+    def __init__(self):
+        self.approvals = db.email_approvals
+        self._cache: 'OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]' = OrderedDict()
+
+    async def normalize_legacy(self):
+        """Bring approvals written by older versions in line with the indexes; run before they are built"""
+        try:
+            # Approvals created from a model dump without the default status
+            await self.approvals.update_many({'status': {'$exists': False}}, {'$set': {'status': PENDING}})
+
+            # Range queries, the sweep and the TTL index only see BSON dates
+            updates = []
+            async for approval in self.approvals.find({'expires_at': {'$type': 'string'}}, {'expires_at': 1}):
+                try:
+                    updates.append(UpdateOne({'_id': approval['_id']},
+                                             {'$set': {'expires_at': parse_expiry(approval['expires_at'])}}))
+                except ValueError:
+                    logger.warning(f"Email approval {approval['_id']} has an unparseable expires_at")
+                if len(updates) >= NORMALIZE_BATCH:
+                    await self.approvals.bulk_write(updates, ordered=False)
+                    updates = []
+            if updates:
+                await self.approvals.bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.warning(f"Could not normalize legacy email approvals: {str(e)}")
+
+    # ---------------- cache ----------------
+
+    def _cached(self, token: str) -> Any:
+        entry = self._cache.get(token)
+        if entry is None:
+            return _MISSING
+        stored_at, approval = entry
+        if time.monotonic() - stored_at > EMAIL_APPROVAL_CACHE_SECONDS:
+            del self._cache[token]
+            return _MISSING
+        self._cache.move_to_end(token)
+        return approval
+
+    def _remember(self, token: str, approval: Optional[Dict[str, Any]]):
+        self._cache[token] = (time.monotonic(), approval)
+        self._cache.move_to_end(token)
+        while len(self._cache) > EMAIL_APPROVAL_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def forget(self, token: Optional[str]):
+        """Drop a token after its approval was edited or deleted outside the store"""
+        if token:
+            self._cache.pop(token, None)
+
+    # ---------------- tokens ----------------
+
+    async def create(self, approval: Dict[str, Any]) -> str:
+        approval.setdefault('status', PENDING)
+        result = await self.approvals.insert_one(approval)
+        self._remember(approval['approval_token'], {
+            '_id': result.inserted_id,
+            'status': approval.get('status', PENDING),
+            'expires_at': parse_expiry(approval.get('expires_at')),
+            'reference_id': approval.get('reference_id'),
+            'approval_type': approval.get('approval_type')
+        })
+        return str(result.inserted_id)
+
+    async def lookup(self, token: str) -> Optional[Dict[str, Any]]:
+        """Status, expiry and reference of the approval behind a token (None if there is none)"""
+        approval = self._cached(token)
+        if approval is _MISSING:
+            approval = await self.approvals.find_one({'approval_token': token}, SUMMARY_FIELDS)
+            if approval is not None:
+                approval['expires_at'] = parse_expiry(approval.get('expires_at'))
+            self._remember(token, approval)
+        return dict(approval) if approval is not None else None
+
+    async def decide(self, token: str, status: str, fields: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Apply a decision to a pending approval.
+
+        Returns (outcome, approval) where outcome is "decided", "not_found",
+        "expired" or "processed" (already approved or rejected).
+        """
+        approval = await self.lookup(token)
+        if approval is None:
+            return 'not_found', None
+        if approval['status'] == EXPIRED:
+            return 'expired', approval
+        if approval['status'] != PENDING:
+            return 'processed', approval
+
+        now = datetime.utcnow()
+        if approval['expires_at'] is None or approval['expires_at'] <= now:
+            await self.approvals.update_one(
+                {'_id': approval['_id'], 'status': PENDING},
+                {'$set': {'status': EXPIRED, 'expired_at': now}}
+            )
+            approval['status'] = EXPIRED
+            self._remember(token, approval)
+            return 'expired', approval
+
+        updated = await self.approvals.find_one_and_update(
+            {'_id': approval['_id'], 'status': PENDING, 'expires_at': {'$gt': now}},
+            {'$set': {**fields, 'status': status}},
+            projection=SUMMARY_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            # Decided, expired or edited elsewhere since it was cached
+            self.forget(token)
+            current = await self.lookup(token)
+            if current is None:
+                return 'not_found', None
+            return ('processed' if current['status'] not in (PENDING, EXPIRED) else 'expired'), current
+
+        updated['expires_at'] = parse_expiry(updated.get('expires_at'))
+        self._remember(token, updated)
+        return 'decided', dict(updated)
+
+    async def expire_stale(self) -> Dict[str, Any]:
+        """Expire every pending approval whose link has lapsed"""
+        now = datetime.utcnow()
+        result = await self.approvals.update_many(
+            {'status': PENDING, 'expires_at': {'$lte': now}},
+            {'$set': {'status': EXPIRED, 'expired_at': now}}
+        )
+        if result.modified_count:
+            logger.info(f"Expired {result.modified_count} email approvals")
+        return {'approvals_expired': result.modified_count}
+
+
+# Global approval store instance
+approval_store = ApprovalTokenStore()
@@ -0,0 +1,302 @@
+"""
+Materialized asset health scores.
+
+A vehicle's health score depends only on its mileage, ``nextPM`` and
+``purchaseDate``. Scores are stored in ``asset_health_scores`` together with
+those inputs and are recomputed only when one of them changes: the vehicle
+routes call ``vehicle_changed`` on writes, and the scheduled sweep skips
+vehicles whose stored inputs still match (except for a periodic age refresh,
+since the age component moves with the calendar).
+
+Every recomputation that changes a score is appended to
+``asset_health_history``; the trend is the least-squares slope of the recent
+history rather than a threshold on the current score.
+
+Fleet-wide statistics come from the ``asset_health_rollups`` document, which
+holds a histogram of whole-point scores kept current with ``$inc``, so
+percentiles are read from 101 buckets instead of aggregating every score.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from database import db
+from services.job_scheduler import changed_since
+from services.index_registry import index_registry
+from services.maintenance_alert_service import HEALTH_INPUT_FIELDS, compute_health_score, health_status
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHUNK_SIZE = int(os.getenv("HEALTH_SCORE_CHUNK_SIZE", "1000"))
+# History points used for the trend, and how long history is kept
+HEALTH_TREND_POINTS = int(os.getenv("HEALTH_TREND_POINTS", "6"))
+HEALTH_HISTORY_DAYS = int(os.getenv("HEALTH_HISTORY_DAYS", "730"))
+# Scores older than this are recomputed by the sweep even if their inputs are unchanged
+HEALTH_MAX_AGE_DAYS = int(os.getenv("HEALTH_MAX_AGE_DAYS", "7"))
+# Slope (score points per 30 days) beyond which the trend is improving/declining
+HEALTH_TREND_SLOPE = 2.0
+HEALTH_TREND_MIN_DAYS = 1.0
+
+FLEET_KEY = 'fleet'
+PERCENTILES = (10, 25, 50, 75, 90)
+VEHICLE_FIELDS = {'make': 1, 'model': 1, 'plate': 1, **{field: 1 for field in HEALTH_INPUT_FIELDS}}
+
+index_registry.declare('asset_health_scores', 'assetId', unique=True)
+index_registry.declare('asset_health_history', [('assetId', ASCENDING), ('calculatedAt', DESCENDING)])
+index_registry.declare('asset_health_history', 'calculatedAt', expireAfterSeconds=HEALTH_HISTORY_DAYS * 86400)
+# Incremental sweeps select vehicles changed since the last run (changed_since)
+index_registry.declare('vehicles', 'updatedAt')
+index_registry.declare('vehicles', 'createdAt')
+
+
+def health_inputs(vehicle: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: vehicle.get(field) for field in HEALTH_INPUT_FIELDS}
+
+
+def score_trend(history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trend from (calculatedAt, overallScore) points: least-squares slope per 30 days"""
+    if len(history) < 2:
+        return {'trend': 'stable', 'trendSlope': None}
+
+    origin = history[0]['calculatedAt']
+    xs = [(point['calculatedAt'] - origin).total_seconds() / 86400 for point in history]
+    ys = [point['overallScore'] for point in history]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    # Scores recomputed minutes apart say nothing about a trend
+    if xs[-1] - xs[0] < HEALTH_TREND_MIN_DAYS or spread == 0:
+        return {'trend': 'stable', 'trendSlope': None}
+
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread * 30
+    trend = 'stable'
+    if slope <= -HEALTH_TREND_SLOPE:
+        trend = 'declining'
+    elif slope >= HEALTH_TREND_SLOPE:
+        trend = 'improving'
+    return {'trend': trend, 'trendSlope': round(slope, 2)}
+
+
+def bucket(score: float) -> str:
+    return str(int(round(score)))
+
+
+class AssetHealthService:
+    def __init__(self, chunk_size: int = HEALTH_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.vehicles = db.vehicles
+        self.scores = db.asset_health_scores
+        self.history = db.asset_health_history
+        self.rollups = db.asset_health_rollups
+
+        self._rollups_built = False
+        self._rebuild_lock = asyncio.Lock()
+
+    # ---------------- scoring ----------------
+
+    async def _trends(self, scored: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Trend per asset over its recent history plus the new score, with one history query"""
+        pipeline = [
+            {'$match': {'assetId': {'$in': list(scored)}}},
+            {'$sort': {'calculatedAt': -1}},
+            {'$group': {'_id': '$assetId', 'points': {'$push': {
+                'calculatedAt': '$calculatedAt', 'overallScore': '$overallScore'
+            }}}},
+            {'$project': {'points': {'$slice': ['$points', HEALTH_TREND_POINTS - 1]}}}
+        ]
+        history = {asset_id: [] for asset_id in scored}
+        async for row in self.history.aggregate(pipeline):
+            history[row['_id']] = row['points']
+
+        trends = {}
+        for asset_id, score in scored.items():
+            points = list(reversed(history[asset_id])) + [score]
+            trends[asset_id] = score_trend(points)
+        return trends
+
+    async def _score_chunk(self, vehicles: List[Dict[str, Any]], force: bool = False) -> List[Dict[str, Any]]:
+        """Recompute the chunk's scores whose inputs changed (or that went stale) and write them in bulk"""
+        now = datetime.now()
+        asset_ids = [str(vehicle['_id']) for vehicle in vehicles]
+        current = {}
+        async for score in self.scores.find(
+            {'assetId': {'$in': asset_ids}},
+            {'assetId': 1, 'inputs': 1, 'overallScore': 1, 'calculatedAt': 1}
+        ):
+            current[score['assetId']] = score
+
+        stale_before = now - timedelta(days=HEALTH_MAX_AGE_DAYS)
+        scored: Dict[str, Dict[str, Any]] = {}
+        for vehicle, asset_id in zip(vehicles, asset_ids):
+            inputs = health_inputs(vehicle)
+            previous = current.get(asset_id)
+            if (not force and previous and previous.get('inputs') == inputs
+                    and previous.get('calculatedAt') and previous['calculatedAt'] >= stale_before):
+                continue
+            score = compute_health_score({**vehicle, 'id': asset_id}, now)
+            score['inputs'] = inputs
+            scored[asset_id] = score
+
+        if not scored:
+            return []
+
+        trends = await self._trends(scored)
+        writes, history, buckets = [], [], {}
+        for asset_id, score in scored.items():
+            score.update(trends[asset_id])
+            writes.append(ReplaceOne({'assetId': asset_id}, score, upsert=True))
+
+            previous = current.get(asset_id)
+            if previous is None or previous.get('overallScore') != score['overallScore']:
+                history.append({'assetId': asset_id, 'overallScore': score['overallScore'], 'calculatedAt': now})
+
+            # Move the asset between histogram buckets
+            new_bucket = bucket(score['overallScore'])
+            buckets[new_bucket] = buckets.get(new_bucket, 0) + 1
+            if previous is not None:
+                old_bucket = bucket(previous.get('overallScore', 0))
+                buckets[old_bucket] = buckets.get(old_bucket, 0) - 1
+
+        await self.scores.bulk_write(writes, ordered=False)
+        if history:
+            await self.history.insert_many(history, ordered=False)
+
+        total_delta = sum(score['overallScore'] - current[asset_id].get('overallScore', 0)
+                          if asset_id in current else score['overallScore']
+                          for asset_id, score in scored.items())
+        await self._inc_rollup(buckets, total_delta, sum(1 for asset_id in scored if asset_id not in current))
+        return list(scored.values())
+
+    async def vehicle_changed(self, vehicle_id: str, vehicle: Dict[str, Any],
+                              previous: Optional[Dict[str, Any]] = None):
+        """Change-tracking hook for vehicle writes; rescores only when a health input changed"""
+        if previous is not None and health_inputs(previous) == health_inputs(vehicle):
+            return
+        # A failed rescore must not fail the vehicle write; the sweep picks it up
+        try:
+            await self._score_chunk([{**vehicle, '_id': vehicle_id}], force=True)
+        except Exception as e:
+            logger.warning(f"Could not update health score for vehicle {vehicle_id}: {str(e)}")
+
+    async def vehicle_deleted(self, vehicle_id: str):
+        try:
+            score = await self.scores.find_one_and_delete({'assetId': vehicle_id}, {'overallScore': 1})
+            if score:
+                await self._inc_rollup({bucket(score.get('overallScore', 0)): -1}, -score.get('overallScore', 0), -1)
+        except Exception as e:
+            logger.warning(f"Could not remove health score for vehicle {vehicle_id}: {str(e)}")
+
+    async def score_vehicle(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
+        """Recompute one vehicle's score now; None if the vehicle does not exist"""
+        vehicle = await self.vehicles.find_one({'_id': ObjectId(vehicle_id)}, VEHICLE_FIELDS)
+        if vehicle is None:
+            return None
+        scores = await self._score_chunk([vehicle], force=True)
+        return scores[0]
+
+    async def refresh(self, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Sweep vehicles (changed since ``since``) in chunks, rescoring only changed or stale ones"""
+        await self._ensure_rollups()
+        checked, rescored = 0, 0
+        chunk = []
+        async for vehicle in self.vehicles.find(changed_since(since), VEHICLE_FIELDS).batch_size(self.chunk_size):
+            chunk.append(vehicle)
+            if len(chunk) >= self.chunk_size:
+                rescored += len(await self._score_chunk(chunk))
+                checked += len(chunk)
+                chunk = []
+        if chunk:
+            rescored += len(await self._score_chunk(chunk))
+            checked += len(chunk)
+        return {'vehicles_checked': checked, 'scores_updated': rescored}
+
+    # ---------------- fleet rollups ----------------
+
+    async def _inc_rollup(self, buckets: Dict[str, int], total_delta: float, count_delta: int):
+        # A failed rollup update must not fail the scoring it follows; rebuild_rollups() repairs drift
+        fields = {f'buckets.{key}': value for key, value in buckets.items() if value}
+        if total_delta:
+            fields['total'] = total_delta
+        if count_delta:
+            fields['count'] = count_delta
+        if not fields:
+            return
+        try:
+            await self.rollups.update_one(
+                {'_id': FLEET_KEY},
+                {'$inc': fields, '$set': {'updatedAt': datetime.now()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not update asset health rollup: {str(e)}")
+
+    async def rebuild_rollups(self) -> Dict[str, Any]:
+        """Recompute the fleet histogram from the stored scores"""
+        async with self._rebuild_lock:
+            started = datetime.now()
+            buckets, total, count = {}, 0.0, 0
+            pipeline = [{'$group': {
+                '_id': '$overallScore',
+                'assets': {'$sum': 1},
+                'total': {'$sum': '$overallScore'}
+            }}]
+            async for row in self.scores.aggregate(pipeline):
+                buckets[bucket(row['_id'] or 0)] = buckets.get(bucket(row['_id'] or 0), 0) + row['assets']
+                total += row['total']
+                count += row['assets']
+
+            await self.rollups.replace_one(
+                {'_id': FLEET_KEY},
+                {'buckets': buckets, 'total': total, 'count': count, 'updatedAt': started, 'rebuiltAt': started},
+                upsert=True
+            )
+            self._rollups_built = True
+            logger.info(f"Rebuilt asset health rollup over {count} scores")
+            return {'assets': count, 'rebuilt_at': started}
+
+    async def _ensure_rollups(self):
+        if self._rollups_built:
+            return
+        if await self.rollups.find_one({'_id': FLEET_KEY}, {'_id': 1}):
+            self._rollups_built = True
+        else:
+            await self.rebuild_rollups()
+
+    async def get_fleet_summary(self) -> Dict[str, Any]:
+        """Fleet average, percentiles and status counts from the score histogram"""
+        await self._ensure_rollups()
+        rollup = await self.rollups.find_one({'_id': FLEET_KEY}) or {}
+        buckets = sorted((int(key), assets) for key, assets in rollup.get('buckets', {}).items() if assets > 0)
+        count = sum(assets for _, assets in buckets)
+
+        percentiles = {}
+        if count:
+            for p in PERCENTILES:
+                rank = max(1, -(-p * count // 100))  # nearest-rank
+                seen = 0
+                for score, assets in buckets:
+                    seen += assets
+                    if seen >= rank:
+                        percentiles[f'p{p}'] = score
+                        break
+
+        distribution: Dict[str, int] = {}
+        for score, assets in buckets:
+            status = health_status(score)[0]
+            distribution[status] = distribution.get(status, 0) + assets
+
+        return {
+            'assets': count,
+            'average_score': round(rollup.get('total', 0) / count, 2) if count else 0,
+            'percentiles': percentiles,
+            'status_distribution': distribution,
+            'updated_at': rollup.get('updatedAt')
+        }
+
+
+# Global health score instance
+asset_health_service = AssetHealthService()
@@ -1,11 +1,20 @@
 from database import db
 from models.payroll import JournalEntry, JournalLine, PayrollEntry, PayrollJournalBatch
+from services.payroll_rollups import payroll_rollup_service
 from datetime import datetime, date
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
+from bson import ObjectId
+import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Journal entry ids per approval update_many
+APPROVAL_CHUNK_SIZE = int(os.getenv("PAYROLL_APPROVAL_CHUNK_SIZE", "5000"))
+# Approve entries and the batch inside one Mongo transaction (needs a replica set)
+APPROVAL_USE_TRANSACTION = os.getenv("PAYROLL_APPROVAL_USE_TRANSACTION", "false").lower() == "true"
+
 class AutomatedPayrollJournalService:
     """Service for automated payroll journal posting"""
 
@@ -82,6 +91,8 @@ class AutomatedPayrollJournalService:
                 batch.dict(exclude_unset=True)
             )
 
+            await payroll_rollup_service.journal_posted(payroll_period_id, len(batch.journalEntries), total_amount)
+
             logger.info(f"Successfully generated {len(journal_entries)} journal entries for payroll period {payroll_period_id}")
 
         except Exception as e:
@@ -221,6 +232,18 @@ class AutomatedPayrollJournalService:
 
     async def post_payroll_journal_batch(self, batch_id: str, approved_by: str) -> bool:
         """Post/approve a payroll journal batch"""
+        await self.approve_payroll_journal_batch(batch_id, approved_by)
+        return True
+
+    async def approve_payroll_journal_batch(self, batch_id: str, approved_by: str,
+                                            use_transaction: Optional[bool] = None) -> Dict[str, Any]:
+        """Approve every journal entry of a batch with chunked ``update_many`` calls.
+
+        The entries and the batch status are written together, inside a
+        transaction when ``use_transaction`` is set. Without one, the entry
+        updates are idempotent, so approving a batch again after a crash
+        finishes the entries that were left behind. Returns throughput metrics.
+        """
         batch = await self.batch_collection.find_one({"_id": ObjectId(batch_id)})
         if not batch:
             raise ValueError(f"Batch {batch_id} not found")
@@ -228,34 +251,73 @@ class AutomatedPayrollJournalService:
         if batch["status"] != "Posted":
             raise ValueError("Can only post batches with 'Posted' status")
 
-        # Update all journal entries in the batch
-        if "journalEntries" in batch and batch["journalEntries"]:
-            for entry_id in batch["journalEntries"]:
-                await self.journal_collection.update_one(
-                    {"_id": ObjectId(entry_id)},
-                    {
-                        "$set": {
-                            "status": "Approved",
-                            "approvedBy": approved_by,
-                            "approvedAt": datetime.utcnow(),
-                            "postedAt": datetime.utcnow()
-                        }
+        if use_transaction is None:
+            use_transaction = APPROVAL_USE_TRANSACTION
+
+        started = time.perf_counter()
+        if use_transaction:
+            async with await db.client.start_session() as session:
+                async with session.start_transaction():
+                    metrics = await self._approve_batch_entries(batch, approved_by, session)
+        else:
+            metrics = await self._approve_batch_entries(batch, approved_by)
+
+        await payroll_rollup_service.journal_approved(batch.get("payrollPeriodId"), metrics["approved"])
+
+        elapsed = time.perf_counter() - started
+        metrics.update({
+            "batch_id": batch_id,
+            "transaction": use_transaction,
+            "duration_seconds": round(elapsed, 3),
+            "entries_per_second": round(metrics["entries"] / elapsed, 1) if elapsed > 0 else None
+        })
+
+        logger.info(
+            f"Successfully posted payroll journal batch {batch_id}: {metrics['approved']} of {metrics['entries']} "
+            f"entries approved in {metrics['duration_seconds']}s ({metrics['entries_per_second']} entries/s)"
+        )
+        return metrics
+
+    async def _approve_batch_entries(self, batch: Dict, approved_by: str, session=None) -> Dict[str, Any]:
+        approved_at = datetime.utcnow()
+        entry_ids = [ObjectId(entry_id) for entry_id in batch.get("journalEntries") or []]
+
+        # Update all journal entries in the batch, skipping ones a previous run already approved
+        approved = chunks = 0
+        for start in range(0, len(entry_ids), APPROVAL_CHUNK_SIZE):
+            result = await self.journal_collection.update_many(
+                {"_id": {"$in": entry_ids[start:start + APPROVAL_CHUNK_SIZE]}, "status": {"$ne": "Approved"}},
+                {
+                    "$set": {
+                        "status": "Approved",
+                        "approvedBy": approved_by,
+                        "approvedAt": approved_at,
+                        "postedAt": approved_at
                     }
-                )
+                },
+                session=session
+            )
+            approved += result.modified_count
+            chunks += 1
+
+        metrics = {"entries": len(entry_ids), "approved": approved, "chunks": chunks}
 
         # Update batch status
         await self.batch_collection.update_one(
-            {"_id": ObjectId(batch_id)},
+            {"_id": batch["_id"]},
             {
                 "$set": {
                     "status": "Posted",
-                    "postedAt": datetime.utcnow()
+                    "postedAt": approved_at,
+                    "approvedBy": approved_by,
+                    "approvedAt": approved_at,
+                    "approvalMetrics": metrics
                 }
-            }
+            },
+            session=session
         )
 
-        logger.info(f"Successfully posted payroll journal batch {batch_id}")
-        return True
+        return dict(metrics)
 
     async def get_payroll_journal_batches(self, status: Optional[str] = None) -> List[PayrollJournalBatch]:
         """Get all payroll journal batches with optional status filter"""
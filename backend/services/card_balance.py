@@ -0,0 +1,261 @@
+"""
+Atomic debit-card balance engine.
+
+Balances are only moved with ``$inc``. Debits carry a conditional filter
+(``currentBalance >= amount``), so concurrent refills and spends on a hot card
+never lose updates and never overdraw it, and no read-modify-write round trip
+is needed.
+
+Every movement is first appended to the ``card_transactions`` ledger under a
+unique idempotency key. A retried request with the same key finds the existing
+ledger entry and is not applied twice. Entries move from "pending" to "applied"
+(with the resulting balance) or "rejected"; an entry left "pending" by a crash
+between the two writes is in doubt and can be checked against the card.
+
+The total balance across all cards is kept in the ``card_balance_snapshots``
+collection and updated with ``$inc`` alongside every movement and card
+create/delete, so cash forecasts read one document instead of summing
+every card. The snapshot is rebuilt from the cards the first time it is read
+(until a rebuild has stamped ``rebuiltAt`` on it), and on demand.
+"""
+
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from database import db
+from services.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+TOTAL_KEY = 'total'
+DUPLICATE_KEY_ERROR = 11000
+
+index_registry.declare('card_transactions', 'idempotencyKey', unique=True)
+index_registry.declare('card_transactions', [('cardId', 1), ('createdAt', -1)])
+
+
+def new_idempotency_key(kind: str) -> str:
+    return f"{kind}:{uuid.uuid4().hex}"
+
+
+class CardBalanceService:
+    def __init__(self):
+        self.cards = db.debit_cards
+        self.ledger = db.card_transactions
+        self.snapshots = db.card_balance_snapshots
+
+        self._snapshot_built = False
+        self._rebuild_lock = asyncio.Lock()
+
+    # ---------------- movements ----------------
+
+    async def _record(self, card_id: str, kind: str, amount: float, key: str,
+                      details: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Append a pending ledger entry; returns (entry, created) and the existing entry on a replay"""
+        entry = {
+            'cardId': card_id,
+            'type': kind,
+            'amount': amount,
+            'idempotencyKey': key,
+            'status': 'pending',
+            'createdAt': datetime.utcnow(),
+            **(details or {})
+        }
+        try:
+            await self.ledger.insert_one(entry)
+            return entry, True
+        except DuplicateKeyError:
+            return await self.ledger.find_one({'idempotencyKey': key}), False
+
+    @staticmethod
+    def _result(entry: Dict[str, Any], duplicate: bool) -> Dict[str, Any]:
+        return {
+            'applied': entry.get('status') == 'applied',
+            'duplicate': duplicate,
+            'status': entry.get('status'),
+            'reason': entry.get('reason'),
+            'amount': entry.get('amount'),
+            'balance': entry.get('balanceAfter'),
+            'transaction_id': str(entry['_id'])
+        }
+
+    async def apply(self, card_id: str, amount: float, kind: str,
+                    idempotency_key: Optional[str] = None,
+                    set_fields: Optional[Dict[str, Any]] = None,
+                    details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Move ``amount`` (negative for debits) on one card, at most once per idempotency key.
+
+        Debits only apply while the card holds at least ``-amount``. Returns the
+        ledger outcome with the card balance after the movement.
+        """
+        card_oid = ObjectId(card_id)
+        key = idempotency_key or new_idempotency_key(kind)
+        entry, created = await self._record(card_id, kind, amount, key, details)
+        if not created:
+            return self._result(entry, duplicate=True)
+
+        now = datetime.utcnow()
+        card_filter: Dict[str, Any] = {'_id': card_oid}
+        if amount < 0:
+            card_filter['currentBalance'] = {'$gte': -amount}
+
+        card = await self.cards.find_one_and_update(
+            card_filter,
+            {'$inc': {'currentBalance': amount}, '$set': {'updatedAt': now, **(set_fields or {})}},
+            projection={'currentBalance': 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if card is None:
+            exists = await self.cards.count_documents({'_id': card_oid}, limit=1)
+            entry.update(status='rejected', reason='insufficient_funds' if exists else 'card_not_found')
+            await self.ledger.update_one(
+                {'_id': entry['_id']},
+                {'$set': {'status': entry['status'], 'reason': entry['reason'], 'resolvedAt': now}}
+            )
+            return self._result(entry, duplicate=False)
+
+        entry.update(status='applied', balanceAfter=card['currentBalance'])
+        await self.ledger.update_one(
+            {'_id': entry['_id']},
+            {'$set': {'status': 'applied', 'balanceAfter': card['currentBalance'], 'resolvedAt': now}}
+        )
+        await self._inc_total(amount)
+        return self._result(entry, duplicate=False)
+
+    async def credit(self, card_id: str, amount: float, kind: str = 'refill', **kwargs) -> Dict[str, Any]:
+        return await self.apply(card_id, abs(amount), kind, **kwargs)
+
+    async def debit(self, card_id: str, amount: float, kind: str = 'spend', **kwargs) -> Dict[str, Any]:
+        return await self.apply(card_id, -abs(amount), kind, **kwargs)
+
+    async def credit_many(self, credits: List[Tuple[ObjectId, float, str]], kind: str,
+                          set_fields: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        """Credit many cards with one ledger insert_many and one bulk_write.
+
+        ``credits`` holds (card _id, amount, idempotency key) tuples. Keys that are
+        already in the ledger are skipped, and credits to cards that no longer
+        exist are rejected; returns the applied keys with the card balance after.
+        """
+        if not credits:
+            return {}
+
+        now = datetime.utcnow()
+        entries = [{
+            'cardId': str(card_id),
+            'type': kind,
+            'amount': amount,
+            'idempotencyKey': key,
+            'status': 'pending',
+            'createdAt': now
+        } for card_id, amount, key in credits]
+
+        replayed = set()
+        try:
+            await self.ledger.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                if error.get('code') != DUPLICATE_KEY_ERROR:
+                    raise
+                replayed.add(error['index'])
+
+        fresh = [(credit, entry) for i, (credit, entry) in enumerate(zip(credits, entries)) if i not in replayed]
+        if not fresh:
+            return {}
+
+        await self.cards.bulk_write([
+            UpdateOne(
+                {'_id': card_id},
+                {'$inc': {'currentBalance': amount}, '$set': {'updatedAt': now, **(set_fields or {})}}
+            )
+            for (card_id, amount, _), _ in fresh
+        ], ordered=False)
+
+        # Balances after the credits, in one query; a card missing here was not credited
+        balances = {}
+        async for card in self.cards.find(
+            {'_id': {'$in': [card_id for (card_id, _, _), _ in fresh]}}, {'currentBalance': 1}
+        ):
+            balances[card['_id']] = card['currentBalance']
+
+        applied, resolutions = {}, []
+        for (card_id, amount, key), entry in fresh:
+            if card_id in balances:
+                applied[key] = balances[card_id]
+                resolution = {'status': 'applied', 'balanceAfter': balances[card_id], 'resolvedAt': now}
+            else:
+                resolution = {'status': 'rejected', 'reason': 'card_not_found', 'resolvedAt': now}
+            resolutions.append(UpdateOne({'_id': entry['_id']}, {'$set': resolution}))
+        await self.ledger.bulk_write(resolutions, ordered=False)
+
+        await self._inc_total(sum(amount for (card_id, amount, _), _ in fresh if card_id in balances))
+        return applied
+
+    async def transactions(self, card_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        entries = []
+        async for entry in self.ledger.find({'cardId': card_id}).sort('createdAt', -1).limit(limit):
+            entry['_id'] = str(entry['_id'])
+            entries.append(entry)
+        return entries
+
+    # ---------------- balance snapshot ----------------
+
+    async def _inc_total(self, amount: float, cards: int = 0):
+        # A failed snapshot update must not fail the movement it follows; rebuild_snapshot() repairs drift
+        try:
+            await self.snapshots.update_one(
+                {'_id': TOTAL_KEY},
+                {'$inc': {'balance': amount, 'cards': cards}, '$set': {'updatedAt': datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not update card balance snapshot: {str(e)}")
+
+    async def card_created(self, card: Dict[str, Any]):
+        await self._inc_total(card.get('currentBalance', 0), cards=1)
+
+    async def card_deleted(self, card: Dict[str, Any]):
+        await self._inc_total(-card.get('currentBalance', 0), cards=-1)
+
+    async def rebuild_snapshot(self) -> Dict[str, Any]:
+        """Recompute the total balance from the cards"""
+        async with self._rebuild_lock:
+            started = datetime.utcnow()
+            totals = {'balance': 0, 'cards': 0}
+            pipeline = [{'$group': {'_id': None, 'balance': {'$sum': '$currentBalance'}, 'cards': {'$sum': 1}}}]
+            async for row in self.cards.aggregate(pipeline):
+                totals = {'balance': row['balance'], 'cards': row['cards']}
+
+            await self.snapshots.replace_one(
+                {'_id': TOTAL_KEY},
+                {**totals, 'updatedAt': started, 'rebuiltAt': started},
+                upsert=True
+            )
+            self._snapshot_built = True
+            logger.info(f"Rebuilt card balance snapshot over {totals['cards']} cards")
+            return {**totals, 'rebuilt_at': started}
+
+    async def get_snapshot(self) -> Dict[str, Any]:
+        if not self._snapshot_built:
+            # Movements upsert the snapshot too, so only rebuild_snapshot()'s marker proves a build
+            snapshot = await self.snapshots.find_one({'_id': TOTAL_KEY, 'rebuiltAt': {'$exists': True}})
+            if snapshot is None:
+                return await self.rebuild_snapshot()
+            self._snapshot_built = True
+        else:
+            snapshot = await self.snapshots.find_one({'_id': TOTAL_KEY}) or {}
+        snapshot.pop('_id', None)
+        return snapshot
+
+    async def get_total_balance(self) -> float:
+        return (await self.get_snapshot()).get('balance', 0)
+
+
+# Global balance engine instance
+card_balance_service = CardBalanceService()
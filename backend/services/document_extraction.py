@@ -0,0 +1,232 @@
+"""
+Document text extraction engine for UniverserERP.
+
+PyMuPDF, python-docx, OpenCV and Tesseract are CPU-bound, so extraction runs in
+a bounded process pool instead of on the event loop. Multi-page PDFs are split
+into page ranges that are extracted in parallel, and long-running extractions
+can be submitted as jobs and polled by ID.
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import fitz  # PyMuPDF for PDF processing
+import docx
+import pytesseract
+import cv2
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("DOC_EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+MAX_PENDING_JOBS = int(os.getenv("DOC_EXTRACTION_MAX_PENDING", "100"))
+PDF_PAGES_PER_TASK = int(os.getenv("DOC_PDF_PAGES_PER_TASK", "8"))
+PDF_MAX_PAGES = int(os.getenv("DOC_PDF_MAX_PAGES", "500"))
+FINISHED_JOBS_KEPT = int(os.getenv("DOC_EXTRACTION_JOBS_KEPT", "1000"))
+
+PDF_EXTENSIONS = ['.pdf']
+DOCX_EXTENSIONS = ['.docx', '.doc']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']
+SUPPORTED_EXTENSIONS = PDF_EXTENSIONS + DOCX_EXTENSIONS + IMAGE_EXTENSIONS
+
+# The job whose work is running in the current task, if any
+_current_job: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('current_job', default=None)
+
+
+# ==================== WORKER FUNCTIONS ====================
+# These run inside the pool processes, so they must stay top-level and picklable.
+
+def pdf_page_count(file_path: str) -> int:
+    doc = fitz.open(file_path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> str:
+    """Extract text from pages [start, end) of a PDF"""
+    doc = fitz.open(file_path)
+    try:
+        return "".join(doc.load_page(page_num).get_text() for page_num in range(start, end))
+    finally:
+        doc.close()
+
+
+def extract_docx_text(file_path: str) -> str:
+    doc = docx.Document(file_path)
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+
+def extract_image_text(file_path: str) -> str:
+    image = cv2.imread(file_path)
+    if image is None:
+        return ""
+
+    # Preprocess image for better OCR
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    return pytesseract.image_to_string(binary)
+
+
+# ==================== ENGINE ====================
+
+class ExtractionBacklogFull(Exception):
+    """Raised when too many extraction jobs are already queued"""
+
+
+class DocumentExtractionEngine:
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_pending_jobs: int = MAX_PENDING_JOBS,
+        pdf_pages_per_task: int = PDF_PAGES_PER_TASK,
+        pdf_max_pages: int = PDF_MAX_PAGES
+    ):
+        self.max_workers = max(1, max_workers)
+        self.max_pending_jobs = max_pending_jobs
+        self.pdf_pages_per_task = max(1, pdf_pages_per_task)
+        self.pdf_max_pages = pdf_max_pages
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Caps the number of documents extracting at once; further callers wait here
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished_order: List[str] = []
+        # Job tasks are referenced until done so they cannot be garbage-collected mid-run
+        self._tasks = set()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        return self._slots
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    # ---------------- extraction ----------------
+
+    async def extract_pdf_text(self, file_path: str) -> str:
+        """Extract PDF text with page ranges spread across the pool"""
+        page_count = await self._run(pdf_page_count, file_path)
+        if self.pdf_max_pages > 0:
+            page_count = min(page_count, self.pdf_max_pages)
+
+        ranges = [
+            (start, min(start + self.pdf_pages_per_task, page_count))
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        ]
+        parts = await asyncio.gather(*(self._run(extract_pdf_pages, file_path, start, end) for start, end in ranges))
+        return "".join(parts)
+
+    async def extract_docx_text(self, file_path: str) -> str:
+        return await self._run(extract_docx_text, file_path)
+
+    async def extract_image_text(self, file_path: str) -> str:
+        return await self._run(extract_image_text, file_path)
+
+    async def extract_text(self, file_path: str) -> str:
+        """Extract text from any supported document, waiting for a free slot first"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        async with self.slots:
+            self._mark_running()
+            if file_extension in PDF_EXTENSIONS:
+                return await self.extract_pdf_text(file_path)
+            if file_extension in DOCX_EXTENSIONS:
+                return await self.extract_docx_text(file_path)
+            if file_extension in IMAGE_EXTENSIONS:
+                return await self.extract_image_text(file_path)
+
+        raise ValueError(f'Unsupported file type: {file_extension}')
+
+    # ---------------- jobs ----------------
+
+    def pending_jobs(self) -> int:
+        return sum(1 for job in self.jobs.values() if job['status'] in ('queued', 'running'))
+
+    def submit(self, work: Callable[[], Awaitable[Dict[str, Any]]], description: str = None) -> str:
+        """Queue ``work`` as a background job and return its ID"""
+        if self.pending_jobs() >= self.max_pending_jobs:
+            raise ExtractionBacklogFull(
+                f'Document extraction backlog is full ({self.max_pending_jobs} jobs pending)'
+            )
+
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            'job_id': job_id,
+            'description': description,
+            'status': 'queued',
+            'submitted_at': datetime.utcnow(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        task = asyncio.create_task(self._run_job(job_id, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    @staticmethod
+    def _mark_running():
+        """A job stays 'queued' until its work gets its first extraction slot"""
+        job = _current_job.get()
+        if job is not None and job['status'] == 'queued':
+            job['status'] = 'running'
+            job['started_at'] = datetime.utcnow()
+
+    async def _run_job(self, job_id: str, work: Callable[[], Awaitable[Dict[str, Any]]]):
+        job = self.jobs[job_id]
+        _current_job.set(job)
+        try:
+            job['result'] = await work()
+            job['status'] = 'completed'
+        except Exception as e:
+            logger.error(f"Document job {job_id} failed: {str(e)}")
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished_at'] = datetime.utcnow()
+            # Work that never needed a slot (e.g. only duplicates) started when it finished
+            job['started_at'] = job['started_at'] or job['finished_at']
+            self._finished_order.append(job_id)
+            # Drop the oldest finished jobs so the registry stays bounded
+            while len(self._finished_order) > FINISHED_JOBS_KEPT:
+                self.jobs.pop(self._finished_order.pop(0), None)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'max_workers': self.max_workers,
+            'max_pending_jobs': self.max_pending_jobs,
+            'jobs': counts
+        }
+
+
+# Global engine instance
+document_extraction_engine = DocumentExtractionEngine()
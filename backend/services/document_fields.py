@@ -0,0 +1,301 @@
+"""
+Compiled field extraction engine for document understanding.
+
+Every pattern used to pull invoice, contract, receipt and maintenance fields is
+compiled once per process. Each pattern starts with a literal keyword, so a
+document is lowercased once and each keyword is located at most once in a
+shared ``KeywordIndex``. Classification and all field patterns read from that
+index, and patterns are only tried at their own keyword positions instead of
+being searched across the whole text. The results match running
+``re.search``/``re.findall`` over the whole text for each pattern in turn.
+"""
+
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+AMOUNT = r'(\d+(?:,\d{3})*(?:\.\d{2})?)'
+DATE = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
+REST_OF_LINE = r'([^\n\r]+)'
+CODE = r'([A-Z0-9\-]+)'
+
+# Anchor name used for patterns that start with a bare date instead of a keyword
+DATE_ANCHOR = '<date>'
+
+# (anchor keyword, pattern) pairs, in priority order for each field
+FIELD_PATTERNS = {
+    'invoice_number': [
+        ('invoice', r'invoice\s*#?:?\s*' + CODE),
+        ('inv', r'inv\s*#?:?\s*' + CODE),
+        ('invoice', r'invoice\s*number:?\s*' + CODE),
+    ],
+    'invoice_amounts': [
+        ('total', r'total\s*:?\s*₹?' + AMOUNT),
+        ('amount', r'amount\s*:?\s*₹?' + AMOUNT),
+        ('₹', r'₹' + AMOUNT),
+    ],
+    'invoice_date': [
+        ('date', r'date\s*:?\s*' + DATE),
+        ('invoice', r'invoice\s*date:?\s*' + DATE),
+        ('due', r'due\s*date:?\s*' + DATE),
+    ],
+    'vendor': [
+        ('from', r'from\s*:?\s*' + REST_OF_LINE),
+        ('vendor', r'vendor\s*:?\s*' + REST_OF_LINE),
+        ('bill', r'bill\s*from:?\s*' + REST_OF_LINE),
+    ],
+    'parties': [
+        ('between', r'between\s+([^\n\r]+?)\s+and\s+([^\n\r]+)'),
+        ('party', r'party.*?([^\n\r]+).*?party.*?([^\n\r]+)'),
+    ],
+    'effective_date': [
+        ('effective', r'effective\s*date:?\s*' + DATE),
+        ('start', r'start\s*date:?\s*' + DATE),
+        ('commencement', r'commencement:?\s*' + DATE),
+    ],
+    'receipt_number': [
+        ('receipt', r'receipt\s*#?:?\s*' + CODE),
+        ('transaction', r'transaction\s*#?:?\s*' + CODE),
+        ('ref', r'ref\s*#?:?\s*' + CODE),
+    ],
+    'receipt_amount': [
+        ('amount', r'amount\s*:?\s*₹?' + AMOUNT),
+        ('total', r'total\s*:?\s*₹?' + AMOUNT),
+        ('₹', r'₹' + AMOUNT),
+    ],
+    'receipt_date': [
+        ('date', r'date\s*:?\s*' + DATE),
+        (DATE_ANCHOR, DATE),
+    ],
+    'asset': [
+        ('vehicle', r'vehicle\s*:?\s*' + REST_OF_LINE),
+        ('equipment', r'equipment\s*:?\s*' + REST_OF_LINE),
+        ('asset', r'asset\s*:?\s*' + REST_OF_LINE),
+    ],
+    'cost': [
+        ('cost', r'cost\s*:?\s*₹?' + AMOUNT),
+        ('amount', r'amount\s*:?\s*₹?' + AMOUNT),
+        ('total', r'total\s*:?\s*₹?' + AMOUNT),
+    ],
+}
+
+# Fields whose patterns span lines
+DOTALL_FIELDS = {'parties'}
+
+# Patterns that need their anchor keyword to occur again at least this many
+# characters after the match start. Checking the index first avoids the
+# quadratic backtracking of ``party.*?...party`` when "party" appears only once.
+REPEATED_ANCHOR_GAP = {('parties', 'party'): len('party') + 1}
+
+# Classification rules in priority order: (document type, keywords, minimum hits)
+CLASSIFICATION_RULES = [
+    ('invoice', ['invoice', 'bill to', 'ship to', 'total amount', 'due date', 'invoice number'], 3),
+    ('contract', ['agreement', 'contract', 'party', 'terms and conditions', 'effective date'], 2),
+    ('receipt', ['receipt', 'payment received', 'amount paid', 'transaction id'], 2),
+    ('maintenance_record', ['maintenance', 'service record', 'repair', 'inspection', 'work order'], 2),
+]
+
+CONTRACT_TYPES = ['service agreement', 'lease agreement', 'purchase agreement', 'employment contract']
+MAINTENANCE_TYPES = ['repair', 'service', 'inspection', 'replacement', 'calibration']
+
+
+class KeywordIndex:
+    """Lazily built keyword positions over one lowercased copy of a document"""
+
+    _date_anchor = re.compile(r'(?=\d{1,2}[/-]\d)')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lowered = text.lower()
+        # A few characters change length when lowercased, which would shift positions
+        self.aligned = len(self.lowered) == len(text)
+        self._positions: Dict[str, List[int]] = {}
+
+    def __contains__(self, keyword: str) -> bool:
+        if keyword in self._positions:
+            return bool(self._positions[keyword])
+        return keyword in self.lowered
+
+    def positions(self, keyword: str) -> List[int]:
+        """Ascending start positions of ``keyword`` in the original text, overlaps included"""
+        found = self._positions.get(keyword)
+        if found is not None:
+            return found
+
+        if keyword == DATE_ANCHOR:
+            found = [m.start() for m in self._date_anchor.finditer(self.text)]
+        elif self.aligned:
+            found = []
+            find = self.lowered.find
+            pos = find(keyword)
+            while pos >= 0:
+                found.append(pos)
+                pos = find(keyword, pos + 1)
+        else:
+            found = [m.start() for m in re.finditer('(?=' + re.escape(keyword) + ')', self.text, re.IGNORECASE)]
+
+        self._positions[keyword] = found
+        return found
+
+
+class DocumentFieldExtractor:
+    """Keyword-anchored field extraction over a precompiled pattern bank"""
+
+    def __init__(self):
+        self.patterns: Dict[str, List[Tuple[str, re.Pattern]]] = {}
+        for field, entries in FIELD_PATTERNS.items():
+            flags = re.IGNORECASE | (re.DOTALL if field in DOTALL_FIELDS else 0)
+            self.patterns[field] = [(anchor, re.compile(pattern, flags)) for anchor, pattern in entries]
+
+        self.extractors = {
+            'invoice': self.invoice_fields,
+            'contract': self.contract_fields,
+            'receipt': self.receipt_fields,
+            'maintenance_record': self.maintenance_fields,
+        }
+
+    # ---------------- matching helpers ----------------
+
+    def _search(self, field: str, index: KeywordIndex):
+        """First pattern of ``field`` that matches, at its leftmost position (``re.search`` order)"""
+        for anchor, pattern in self.patterns[field]:
+            anchor_positions = index.positions(anchor)
+            gap = REPEATED_ANCHOR_GAP.get((field, anchor))
+            for pos in anchor_positions:
+                if gap and anchor_positions[-1] < pos + gap:
+                    break
+                match = pattern.match(index.text, pos)
+                if match:
+                    return match
+        return None
+
+    def _findall(self, field: str, index: KeywordIndex) -> List[str]:
+        """All non-overlapping matches of the first pattern of ``field`` that matches (``re.findall`` order)"""
+        for anchor, pattern in self.patterns[field]:
+            matches, end = [], -1
+            for pos in index.positions(anchor):
+                if pos < end:
+                    continue
+                match = pattern.match(index.text, pos)
+                if match:
+                    matches.append(match.group(1))
+                    end = match.end()
+            if matches:
+                return matches
+        return []
+
+    # ---------------- classification ----------------
+
+    def classify(self, index: KeywordIndex) -> str:
+        for document_type, keywords, minimum in CLASSIFICATION_RULES:
+            if sum(1 for keyword in keywords if keyword in index) >= minimum:
+                return document_type
+        return 'general_document'
+
+    # ---------------- field extraction ----------------
+
+    def invoice_fields(self, index: KeywordIndex) -> Dict[str, Any]:
+        fields = {}
+
+        match = self._search('invoice_number', index)
+        if match:
+            fields['invoice_number'] = match.group(1)
+
+        amounts = self._findall('invoice_amounts', index)
+        if amounts:
+            fields['amounts'] = [float(m.replace(',', '')) for m in amounts]
+
+        match = self._search('invoice_date', index)
+        if match:
+            fields['date'] = match.group(1)
+
+        match = self._search('vendor', index)
+        if match:
+            fields['vendor'] = match.group(1).strip()
+
+        return fields
+
+    def contract_fields(self, index: KeywordIndex) -> Dict[str, Any]:
+        fields = {}
+
+        for contract_type in CONTRACT_TYPES:
+            if contract_type in index:
+                fields['contract_type'] = contract_type
+                break
+
+        match = self._search('parties', index)
+        if match:
+            fields['parties'] = [match.group(1).strip(), match.group(2).strip()]
+
+        match = self._search('effective_date', index)
+        if match:
+            fields['effective_date'] = match.group(1)
+
+        return fields
+
+    def receipt_fields(self, index: KeywordIndex) -> Dict[str, Any]:
+        fields = {}
+
+        match = self._search('receipt_number', index)
+        if match:
+            fields['receipt_number'] = match.group(1)
+
+        match = self._search('receipt_amount', index)
+        if match:
+            fields['amount'] = float(match.group(1).replace(',', ''))
+
+        match = self._search('receipt_date', index)
+        if match:
+            fields['date'] = match.group(1)
+
+        return fields
+
+    def maintenance_fields(self, index: KeywordIndex) -> Dict[str, Any]:
+        fields = {}
+
+        match = self._search('asset', index)
+        if match:
+            fields['asset'] = match.group(1).strip()
+
+        for maint_type in MAINTENANCE_TYPES:
+            if maint_type in index:
+                fields['maintenance_type'] = maint_type
+                break
+
+        match = self._search('cost', index)
+        if match:
+            fields['cost'] = float(match.group(1).replace(',', ''))
+
+        return fields
+
+    def fields_for(self, text: str, document_type: str) -> Dict[str, Any]:
+        extractor = self.extractors.get(document_type)
+        return extractor(KeywordIndex(text)) if extractor else {}
+
+    def extract(self, text: str, document_type: str = 'auto') -> Dict[str, Any]:
+        """Classify (when ``document_type`` is 'auto') and extract fields from one shared keyword index"""
+        started = time.perf_counter()
+        index = KeywordIndex(text)
+
+        if document_type == 'auto':
+            document_type = self.classify(index)
+        classified = time.perf_counter()
+
+        extractor = self.extractors.get(document_type)
+        fields = extractor(index) if extractor else {}
+        finished = time.perf_counter()
+
+        return {
+            'document_type': document_type,
+            'extracted_fields': fields,
+            'timing_ms': {
+                'classify': round((classified - started) * 1000, 3),
+                'fields': round((finished - classified) * 1000, 3),
+                'total': round((finished - started) * 1000, 3),
+                'text_length': len(text)
+            }
+        }
+
+
+# Compiled once per process
+document_field_extractor = DocumentFieldExtractor()
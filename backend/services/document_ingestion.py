@@ -0,0 +1,235 @@
+"""
+Bulk document ingestion pipeline for UniverserERP.
+
+Batches of documents (uploaded files or a server-side directory manifest) go
+through pipelined stages: content hashing and de-duplication against
+``db.documents``, text extraction in the process pool, classification and field
+extraction, and chunked ``insert_many`` writes. Stages are connected by bounded
+queues so extraction of one document overlaps with the writing of others.
+A unique index on ``content_hash`` catches content stored by a concurrent batch
+after the de-duplication check; those records count as duplicates. Uploaded
+files are removed once their batch has run.
+"""
+
+import os
+import glob
+import uuid
+import shutil
+import hashlib
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import UploadFile
+from pymongo.errors import BulkWriteError
+
+from database import db
+from services.ai_service import ai_service, hash_file
+from services.document_extraction import document_extraction_engine, SUPPORTED_EXTENSIONS
+from services.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("DOCUMENT_UPLOAD_DIR", os.path.join(os.path.dirname(__file__), '..', 'uploads'))
+INSERT_BATCH_SIZE = int(os.getenv("DOC_INGEST_INSERT_BATCH", "200"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_STOP = object()
+DUPLICATE_KEY_ERROR = 11000
+
+# De-duplication looks documents up by content hash; the unique index settles concurrent batches
+index_registry.declare('documents', 'content_hash', unique=True, sparse=True)
+
+
+class DocumentIngestionPipeline:
+    def __init__(self, insert_batch_size: int = INSERT_BATCH_SIZE):
+        self.documents = db.documents
+        self.insert_batch_size = insert_batch_size
+
+    # ---------------- inputs ----------------
+
+    async def save_uploads(self, files: List[UploadFile], batch_id: str) -> List[Dict[str, Any]]:
+        """Stream uploads to disk in chunks, hashing them on the way"""
+        batch_dir = os.path.join(UPLOAD_DIR, batch_id)
+        os.makedirs(batch_dir, exist_ok=True)
+
+        saved = []
+        for index, upload in enumerate(files):
+            file_name = os.path.basename(upload.filename or f'upload_{index}')
+            file_path = os.path.join(batch_dir, f'{index:05d}_{file_name}')
+            digest = hashlib.sha256()
+            with open(file_path, 'wb') as out:
+                while True:
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            await upload.close()
+            saved.append({'file_path': file_path, 'content_hash': digest.hexdigest(), 'uploaded': True})
+        return saved
+
+    def discard_uploads(self, batch_id: str):
+        """Remove the files saved for an upload batch"""
+        shutil.rmtree(os.path.join(UPLOAD_DIR, batch_id), ignore_errors=True)
+
+    def resolve_manifest(self, directory: Optional[str] = None, file_paths: Optional[List[str]] = None,
+                         pattern: str = '*', recursive: bool = False) -> List[Dict[str, Any]]:
+        """Expand a directory manifest into the supported files it contains"""
+        paths = list(file_paths or [])
+        if directory:
+            search = os.path.join(directory, '**', pattern) if recursive else os.path.join(directory, pattern)
+            paths.extend(sorted(p for p in glob.glob(search, recursive=recursive) if os.path.isfile(p)))
+
+        return [
+            {'file_path': path, 'content_hash': None}
+            for path in paths
+            if os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+        ]
+
+    # ---------------- pipeline ----------------
+
+    async def _hash_and_dedupe(self, items: List[Dict[str, Any]], stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+        for item in items:
+            if not item['content_hash']:
+                try:
+                    item['content_hash'] = await asyncio.to_thread(hash_file, item['file_path'])
+                except OSError as e:
+                    item['error'] = str(e)
+
+        readable = []
+        for item in items:
+            if item.get('error'):
+                stats['failed'].append({'file_path': item['file_path'], 'error': item['error']})
+            else:
+                readable.append(item)
+
+        # One query for every hash in the batch
+        hashes = list({item['content_hash'] for item in readable})
+        known = set()
+        async for doc in self.documents.find({'content_hash': {'$in': hashes}}, {'content_hash': 1}):
+            known.add(doc['content_hash'])
+
+        pending, seen = [], set()
+        for item in readable:
+            if item['content_hash'] in known or item['content_hash'] in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(item['content_hash'])
+            pending.append(item)
+        return pending
+
+    async def _extract_worker(self, inbox: asyncio.Queue, outbox: asyncio.Queue, document_type: str,
+                              batch_id: str, stats: Dict[str, Any]):
+        while True:
+            item = await inbox.get()
+            if item is _STOP:
+                break
+            try:
+                text_content = await document_extraction_engine.extract_text(item['file_path'])
+                if not text_content.strip():
+                    raise ValueError('No text content could be extracted from the document')
+
+                record = await ai_service.build_document_record(
+                    item['file_path'], text_content, document_type, item['content_hash']
+                )
+                record['batch_id'] = batch_id
+                await outbox.put(record)
+            except Exception as e:
+                stats['failed'].append({'file_path': item['file_path'], 'error': str(e)})
+
+    async def _writer(self, outbox: asyncio.Queue, stats: Dict[str, Any]):
+        buffer = []
+
+        async def flush():
+            if not buffer:
+                return
+            rejected = {}
+            try:
+                await self.documents.insert_many(buffer, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported records was written
+                rejected = {error['index']: error for error in e.details.get('writeErrors', [])}
+            except Exception as e:
+                logger.error(f"Failed to write ingestion chunk: {str(e)}")
+                rejected = {index: {'errmsg': str(e)} for index in range(len(buffer))}
+
+            for index, record in enumerate(buffer):
+                error = rejected.get(index)
+                if error is None:
+                    stats['processed'] += 1
+                    stats['document_types'][record['document_type']] = stats['document_types'].get(record['document_type'], 0) + 1
+                elif error.get('code') == DUPLICATE_KEY_ERROR:
+                    # Another batch stored the same content after our de-duplication check
+                    stats['duplicates'] += 1
+                else:
+                    stats['failed'].append({'file_path': record['file_path'], 'error': error.get('errmsg')})
+            buffer.clear()
+
+        while True:
+            record = await outbox.get()
+            if record is _STOP:
+                break
+            buffer.append(record)
+            if len(buffer) >= self.insert_batch_size:
+                await flush()
+        await flush()
+
+    async def run(self, items: List[Dict[str, Any]], document_type: str = 'auto', batch_id: str = None) -> Dict[str, Any]:
+        """Ingest a batch of documents and return a summary"""
+        batch_id = batch_id or uuid.uuid4().hex
+        started_at = datetime.utcnow()
+        stats = {
+            'batch_id': batch_id,
+            'submitted': len(items),
+            'duplicates': 0,
+            'processed': 0,
+            'failed': [],
+            'document_types': {}
+        }
+
+        try:
+            await self._ingest(items, document_type, batch_id, stats)
+        finally:
+            if any(item.get('uploaded') for item in items):
+                self.discard_uploads(batch_id)
+
+        stats['started_at'] = started_at
+        stats['finished_at'] = datetime.utcnow()
+        stats['duration_seconds'] = (stats['finished_at'] - started_at).total_seconds()
+        return stats
+
+    async def _ingest(self, items: List[Dict[str, Any]], document_type: str, batch_id: str, stats: Dict[str, Any]):
+        pending = await self._hash_and_dedupe(items, stats)
+
+        workers = document_extraction_engine.max_workers
+        inbox = asyncio.Queue(maxsize=workers * 2)
+        outbox = asyncio.Queue(maxsize=self.insert_batch_size * 2)
+
+        writer = asyncio.create_task(self._writer(outbox, stats))
+        extractors = [
+            asyncio.create_task(self._extract_worker(inbox, outbox, document_type, batch_id, stats))
+            for _ in range(workers)
+        ]
+
+        for item in pending:
+            await inbox.put(item)
+        for _ in extractors:
+            await inbox.put(_STOP)
+
+        await asyncio.gather(*extractors)
+        await outbox.put(_STOP)
+        await writer
+
+    def submit(self, items: List[Dict[str, Any]], document_type: str = 'auto', batch_id: str = None) -> str:
+        """Run a batch in the background through the extraction engine's job registry"""
+        batch_id = batch_id or uuid.uuid4().hex
+        return document_extraction_engine.submit(
+            lambda: self.run(items, document_type, batch_id),
+            description=f'ingestion batch {batch_id} ({len(items)} documents)'
+        )
+
+
+# Global pipeline instance
+document_ingestion_pipeline = DocumentIngestionPipeline()
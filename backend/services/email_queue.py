@@ -0,0 +1,446 @@
+"""
+Durable outbound email queue.
+
+Callers only enqueue: messages are inserted into the ``email_queue``
+collection and delivered by async workers, so request handlers never wait on
+SMTP. Workers:
+
+- claim batches of due messages with a claim token and a lease, so several
+  API replicas or ``worker.py`` processes can drain the same queue and a
+  message held by a crashed worker is picked up again once its lease expires;
+- send through a pool of authenticated SMTP sessions that are reused across
+  messages (connect, STARTTLS and login happen once per session, not per
+  message); the blocking ``smtplib`` calls run in threads;
+- throttle per recipient domain with token buckets;
+- serialize a body shared by many recipients (``enqueue_shared``, stored once
+  in ``email_bodies``) a single time and only add each recipient's header;
+- retry transient failures with exponential backoff and move messages that
+  fail permanently, or run out of attempts, to ``email_dead_letters``.
+
+``EMAIL_DELIVERY=log`` (the default) records messages as delivered without
+contacting an SMTP server; set ``EMAIL_DELIVERY=smtp`` to send for real. Any
+SMTP server works for local testing, e.g. ``python -m aiosmtpd -n -l
+localhost:1025`` with ``SMTP_SERVER=localhost SMTP_PORT=1025``.
+"""
+
+import os
+import time
+import uuid
+import random
+import smtplib
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from email.mime.multipart import MIMEMultipart
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from database import db
+from services.email_templates import SharedMimeBody
+from services.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+# Email configuration
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "your-email@gmail.com")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "your-app-password")
+FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@universererp.com")
+
+# Delivery: "smtp" sends, "log" only records the message as delivered
+EMAIL_DELIVERY = os.getenv("EMAIL_DELIVERY", "log").lower()
+EMAIL_QUEUE_WORKERS = int(os.getenv("EMAIL_QUEUE_WORKERS", "2"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Idle sessions older than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK", "60"))
+
+# Messages per second (and burst) per recipient domain
+EMAIL_DOMAIN_RATE = float(os.getenv("EMAIL_DOMAIN_RATE", "10"))
+EMAIL_DOMAIN_BURST = int(os.getenv("EMAIL_DOMAIN_BURST", "20"))
+
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "30"))
+EMAIL_RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX", "3600"))
+
+EMAIL_CLAIM_BATCH = int(os.getenv("EMAIL_CLAIM_BATCH", "50"))
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "300"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "2"))
+EMAIL_SENT_RETENTION_DAYS = int(os.getenv("EMAIL_SENT_RETENTION_DAYS", "30"))
+# Serialized shared bodies kept per worker process
+EMAIL_BODY_CACHE_SIZE = int(os.getenv("EMAIL_BODY_CACHE_SIZE", "256"))
+ENQUEUE_BATCH = 1000
+
+index_registry.declare('email_queue', [('status', ASCENDING), ('nextAttemptAt', ASCENDING)])
+index_registry.declare('email_queue', 'claimToken', sparse=True)
+index_registry.declare('email_queue', 'sentAt', expireAfterSeconds=EMAIL_SENT_RETENTION_DAYS * 86400)
+index_registry.declare('email_dead_letters', 'deadAt')
+index_registry.declare('email_bodies', 'createdAt', expireAfterSeconds=EMAIL_SENT_RETENTION_DAYS * 86400)
+
+
+def recipient_domain(address: str) -> str:
+    return address.rsplit('@', 1)[-1].strip().lower() if '@' in address else ''
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """5xx replies, refused recipients and missing bodies will not succeed on retry"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, LookupError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+def build_mime(message: Dict[str, Any], shared: Optional[SharedMimeBody] = None) -> Tuple[str, List[str], str]:
+    """(from, recipients, wire text) for a queued message"""
+    if message.get('raw'):
+        return message['from'], [message['to']], message['raw']
+    if shared is None:
+        shared = SharedMimeBody(message['subject'], message['html'], message['from'])
+    return message['from'], [message['to']], shared.for_recipient(message['to'])
+
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain"""
+
+    def __init__(self, rate: float = EMAIL_DOMAIN_RATE, burst: int = EMAIL_DOMAIN_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, domain: str):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(domain, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[domain] = (tokens - 1, now)
+                return
+            self._buckets[domain] = (tokens, now)
+            await asyncio.sleep((1 - tokens) / self.rate)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of connected, authenticated ``smtplib`` sessions"""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE, host: str = SMTP_SERVER, port: int = SMTP_PORT,
+                 username: str = SMTP_USERNAME, password: str = SMTP_PASSWORD):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        server.ehlo()
+        if server.has_extn('starttls'):
+            server.starttls()
+            server.ehlo()
+        if self.username and self.password and server.has_extn('auth'):
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    async def acquire(self) -> smtplib.SMTP:
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if time.monotonic() - last_used < SMTP_IDLE_CHECK or await asyncio.to_thread(self._alive, server):
+                    return server
+                await asyncio.to_thread(self._quit, server)
+            return await asyncio.to_thread(self._connect)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, server: smtplib.SMTP):
+        self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    async def discard(self, server: smtplib.SMTP):
+        await asyncio.to_thread(self._quit, server)
+        self._slots.release()
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for server, _ in idle:
+            await asyncio.to_thread(self._quit, server)
+
+
+class EmailQueue:
+    def __init__(self, delivery: str = EMAIL_DELIVERY, pool: Optional[SMTPConnectionPool] = None,
+                 limiter: Optional[DomainRateLimiter] = None):
+        self.queue = db.email_queue
+        self.dead_letters = db.email_dead_letters
+        self.bodies = db.email_bodies
+        self.delivery = delivery
+        self.pool = pool or SMTPConnectionPool()
+        self.limiter = limiter or DomainRateLimiter()
+
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._body_cache: 'OrderedDict[ObjectId, SharedMimeBody]' = OrderedDict()
+
+    # ---------------- enqueue ----------------
+
+    async def enqueue_many(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """Queue messages ({to, subject, html, category, from}) for delivery; returns their ids"""
+        now = datetime.utcnow()
+        documents = [{
+            'to': message['to'],
+            'from': message.get('from') or FROM_EMAIL,
+            'subject': message.get('subject'),
+            'html': message.get('html'),
+            'raw': message.get('raw'),
+            'bodyId': message.get('bodyId'),
+            'category': message.get('category', 'general'),
+            'domain': recipient_domain(message['to']),
+            'status': 'queued',
+            'attempts': 0,
+            'nextAttemptAt': now,
+            'createdAt': now
+        } for message in messages]
+
+        ids = []
+        for start in range(0, len(documents), ENQUEUE_BATCH):
+            result = await self.queue.insert_many(documents[start:start + ENQUEUE_BATCH])
+            ids.extend(str(inserted_id) for inserted_id in result.inserted_ids)
+        self._wakeup.set()
+        return ids
+
+    async def enqueue_shared_many(self, mailings: List[Dict[str, Any]]) -> List[str]:
+        """Queue mailings ({recipients, subject, html, category, from}) whose recipients share one body.
+
+        Each body is stored once in ``email_bodies``; the queued messages only
+        reference it. Returns the ids of all queued messages.
+        """
+        mailings = [mailing for mailing in mailings if mailing['recipients']]
+        if not mailings:
+            return []
+
+        now = datetime.utcnow()
+        bodies = [{
+            'subject': mailing['subject'],
+            'html': mailing['html'],
+            'from': mailing.get('from') or FROM_EMAIL,
+            'recipients': len(mailing['recipients']),
+            'createdAt': now
+        } for mailing in mailings]
+        await self.bodies.insert_many(bodies)
+
+        return await self.enqueue_many([
+            {'to': to, 'subject': body['subject'], 'from': body['from'],
+             'bodyId': body['_id'], 'category': mailing.get('category', 'general')}
+            for mailing, body in zip(mailings, bodies)
+            for to in mailing['recipients']
+        ])
+
+    async def enqueue_shared(self, recipients: List[str], subject: str, html: str,
+                             category: str = 'general', from_addr: Optional[str] = None) -> List[str]:
+        return await self.enqueue_shared_many([{
+            'recipients': recipients, 'subject': subject, 'html': html, 'category': category, 'from': from_addr
+        }])
+
+    async def enqueue(self, to: str, subject: str, html: str, category: str = 'general',
+                      from_addr: Optional[str] = None) -> str:
+        ids = await self.enqueue_many([{
+            'to': to, 'subject': subject, 'html': html, 'category': category, 'from': from_addr
+        }])
+        return ids[0]
+
+    async def enqueue_mime(self, msg: MIMEMultipart, category: str = 'general') -> str:
+        ids = await self.enqueue_many([{
+            'to': msg['To'], 'from': msg['From'], 'subject': msg['Subject'],
+            'raw': msg.as_string(), 'category': category
+        }])
+        return ids[0]
+
+    # ---------------- delivery ----------------
+
+    async def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        claimable = {'$or': [
+            {'status': 'queued', 'nextAttemptAt': {'$lte': now}},
+            # Held by a worker that died mid-batch
+            {'status': 'sending', 'leaseUntil': {'$lt': now}}
+        ]}
+        ids = [doc['_id'] async for doc in self.queue.find(claimable, {'_id': 1}).sort('nextAttemptAt', 1).limit(limit)]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        await self.queue.update_many(
+            {'_id': {'$in': ids}, **claimable},
+            {'$set': {'status': 'sending', 'claimToken': token,
+                      'leaseUntil': now + timedelta(seconds=EMAIL_LEASE_SECONDS)}}
+        )
+        return [doc async for doc in self.queue.find({'claimToken': token})]
+
+    async def _send(self, message: Dict[str, Any]):
+        if self.delivery != 'smtp':
+            logger.info(f"Email to {message['to']} recorded without sending (EMAIL_DELIVERY={self.delivery})")
+            return
+
+        shared = None
+        if message.get('bodyId'):
+            shared = self._body_cache.get(message['bodyId'])
+            if shared is None:
+                raise LookupError(f"Email body {message['bodyId']} not found")
+        sender, recipients, text = build_mime(message, shared)
+        server = await self.pool.acquire()
+        try:
+            await asyncio.to_thread(server.sendmail, sender, recipients, text)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+            # The server rejected this message; unless it is closing (421) the session is still usable
+            if getattr(e, 'smtp_code', None) == 421:
+                await self.pool.discard(server)
+            else:
+                self.pool.release(server)
+            raise
+        except BaseException:
+            # Dropped connection or socket error (SMTPException is an OSError too)
+            await self.pool.discard(server)
+            raise
+        self.pool.release(server)
+
+    async def _deliver(self, message: Dict[str, Any]) -> Tuple[UpdateOne, Optional[Dict[str, Any]]]:
+        """Send one message; returns its queue update and, if it failed for good, its dead letter"""
+        await self.limiter.acquire(message.get('domain', ''))
+        attempts = message.get('attempts', 0) + 1
+        now = datetime.utcnow()
+        try:
+            await self._send(message)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if is_permanent_failure(e) or attempts >= EMAIL_MAX_ATTEMPTS:
+                logger.error(f"Email to {message['to']} moved to dead letters after {attempts} attempt(s): {error}")
+                dead = {key: value for key, value in message.items()
+                        if key not in ('_id', 'claimToken', 'leaseUntil', 'nextAttemptAt')}
+                dead.update(status='dead', attempts=attempts, lastError=error, deadAt=now, queueId=message['_id'])
+                return UpdateOne({'_id': message['_id']}, {'$set': {
+                    'status': 'dead', 'attempts': attempts, 'lastError': error, 'updatedAt': now
+                }, '$unset': {'claimToken': '', 'leaseUntil': ''}}), dead
+
+            delay = min(EMAIL_RETRY_MAX, EMAIL_RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            logger.warning(f"Email to {message['to']} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+            return UpdateOne({'_id': message['_id']}, {'$set': {
+                'status': 'queued', 'attempts': attempts, 'lastError': error,
+                'nextAttemptAt': now + timedelta(seconds=delay), 'updatedAt': now
+            }, '$unset': {'claimToken': '', 'leaseUntil': ''}}), None
+
+        return UpdateOne({'_id': message['_id']}, {'$set': {
+            'status': 'sent', 'attempts': attempts, 'sentAt': now, 'updatedAt': now
+        }, '$unset': {'claimToken': '', 'leaseUntil': '', 'html': '', 'raw': ''}}), None
+
+    async def process_batch(self, limit: int = EMAIL_CLAIM_BATCH) -> int:
+        """Claim and deliver one batch of due messages; returns how many were claimed"""
+        batch = await self._claim(limit)
+        if not batch:
+            return 0
+        if self.delivery == 'smtp':
+            await self._load_bodies(batch)
+
+        outcomes = await asyncio.gather(*(self._deliver(message) for message in batch))
+        await self.queue.bulk_write([update for update, _ in outcomes], ordered=False)
+        dead = [letter for _, letter in outcomes if letter is not None]
+        if dead:
+            await self.dead_letters.insert_many(dead)
+        return len(batch)
+
+    async def _load_bodies(self, batch: List[Dict[str, Any]]):
+        """Serialize the shared bodies a batch needs, once each"""
+        needed = {message['bodyId'] for message in batch if message.get('bodyId')}
+        for body_id in needed & self._body_cache.keys():
+            self._body_cache.move_to_end(body_id)
+        missing = needed - self._body_cache.keys()
+        if missing:
+            async for body in self.bodies.find({'_id': {'$in': list(missing)}}):
+                self._body_cache[body['_id']] = SharedMimeBody(body['subject'], body['html'], body['from'])
+
+        # Least recently used first; never evict what this batch needs
+        while len(self._body_cache) > max(EMAIL_BODY_CACHE_SIZE, len(needed)):
+            self._body_cache.popitem(last=False)
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                if await self.process_batch():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email worker {number} failed: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EMAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, workers: int = EMAIL_QUEUE_WORKERS):
+        if self._workers or workers <= 0:
+            return
+        self._workers = [asyncio.create_task(self._worker(number)) for number in range(workers)]
+        logger.info(f"Started {workers} email queue worker(s), delivery={self.delivery}")
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await self.pool.close()
+
+    # ---------------- status ----------------
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = {}
+        async for row in self.queue.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return {
+            'delivery': self.delivery,
+            'workers': len(self._workers),
+            'status_counts': counts,
+            'dead_letters': await self.dead_letters.count_documents({})
+        }
+
+    async def list_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        letters = []
+        async for letter in self.dead_letters.find({}, {'html': 0, 'raw': 0}).sort('deadAt', -1).limit(limit):
+            letter['_id'] = str(letter['_id'])
+            letter['queueId'] = str(letter.get('queueId'))
+            letters.append(letter)
+        return letters
+
+    async def retry_dead_letter(self, letter_id: str) -> Optional[str]:
+        """Requeue a dead letter as a fresh message; None if it does not exist"""
+        letter = await self.dead_letters.find_one_and_delete({'_id': ObjectId(letter_id)})
+        if letter is None:
+            return None
+        return (await self.enqueue_many([letter]))[0]
+
+
+# Global email queue instance
+email_queue = EmailQueue()
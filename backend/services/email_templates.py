@@ -0,0 +1,114 @@
+"""
+Compiled email templates.
+
+Templates use ``str.format`` syntax with plain field names; conditional
+blocks and derived values are computed by the calling view function and passed
+in as fields. A template is parsed once (``compile_template`` caches it per
+source) into its static text and its fields, so rendering only formats the
+fields and joins the pieces; the inline CSS and markup are never rebuilt.
+
+For mass mailings:
+
+- ``CompiledTemplate.bind()`` renders the variables every recipient shares
+  into the static text and returns a template over the remaining
+  per-recipient variables;
+- ``SharedMimeBody`` serializes a MIME message once and only adds each
+  recipient's ``To`` header, for mailings where everyone gets the same body.
+
+``python benchmark_email_templates.py`` (repository root) measures both.
+"""
+
+from string import Formatter
+from functools import lru_cache
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# A compiled template is a list of static strings and (field, format spec, conversion) slots
+Part = Union[str, Tuple[str, str, Optional[str]]]
+
+_formatter = Formatter()
+
+
+def _format(value: Any, spec: str, conversion: Optional[str]) -> str:
+    if conversion == 's':
+        value = str(value)
+    elif conversion == 'r':
+        value = repr(value)
+    elif conversion == 'a':
+        value = ascii(value)
+    return format(value, spec)
+
+
+class CompiledTemplate:
+    def __init__(self, parts: List[Part], name: Optional[str] = None):
+        self.name = name
+
+        # Adjacent static text is merged so rendering joins as few pieces as possible
+        merged: List[Part] = []
+        for part in parts:
+            if isinstance(part, str):
+                if not part:
+                    continue
+                if merged and isinstance(merged[-1], str):
+                    merged[-1] += part
+                    continue
+            merged.append(part)
+
+        self._parts = merged
+        self._slots = [(i, *part) for i, part in enumerate(merged) if not isinstance(part, str)]
+        self.fields = frozenset(field for _, field, _, _ in self._slots)
+
+    @classmethod
+    def parse(cls, source: str, name: Optional[str] = None) -> 'CompiledTemplate':
+        parts: List[Part] = []
+        for literal, field, spec, conversion in _formatter.parse(source):
+            parts.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or '{' in (spec or ''):
+                raise ValueError(f"Template {name!r}: field {{{field}}} must be a plain name with a literal format spec")
+            parts.append((field, spec or '', conversion))
+        return cls(parts, name)
+
+    def render(self, values: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        values = {**values, **kwargs} if values else kwargs
+        out = self._parts.copy()
+        try:
+            for i, field, spec, conversion in self._slots:
+                value = values[field]
+                out[i] = format(value, spec) if conversion is None else _format(value, spec, conversion)
+        except KeyError as e:
+            raise KeyError(f"Template {self.name!r} is missing variable {e.args[0]!r}") from None
+        return ''.join(out)
+
+    def bind(self, **values) -> 'CompiledTemplate':
+        """Render the given variables into the static text; the result takes only the rest"""
+        return CompiledTemplate([
+            _format(values[part[0]], part[1], part[2])
+            if not isinstance(part, str) and part[0] in values else part
+            for part in self._parts
+        ], self.name)
+
+
+@lru_cache(maxsize=None)
+def compile_template(source: str, name: Optional[str] = None) -> CompiledTemplate:
+    return CompiledTemplate.parse(source, name)
+
+
+class SharedMimeBody:
+    """An HTML email serialized once and addressed to any number of recipients"""
+
+    def __init__(self, subject: str, html: str, from_addr: str):
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = from_addr
+        msg.attach(MIMEText(html, 'html'))
+
+        self.from_addr = from_addr
+        self._wire = msg.as_string()
+
+    def for_recipient(self, to: str) -> str:
+        if '\n' in to or '\r' in to:
+            raise ValueError(f"Invalid recipient address {to!r}")
+        return f"To: {to}\n{self._wire}"
@@ -0,0 +1,312 @@
+"""
+Forecasting engine for cash flow and budget variance.
+
+Transactions are reduced to daily inflow/outflow/net sums per department with
+a single aggregation, and every model is fitted on NumPy arrays built from
+those daily series:
+
+- cash flow: one multi-output ``LinearRegression`` over daily inflows and
+  outflows with a linear trend and day-of-week seasonality;
+- budget variance: monthly net spend per department (plus the overall total)
+  with linear trends for every column solved in one batched least-squares pass.
+
+Fitted models are persisted with joblib under ``models_path`` together with a
+fingerprint of the transactions collection (document count, newest ``_id`` and
+newest ``updatedAt``). They are refitted only when that fingerprint changes, so
+forecast requests are cheap inferences. Writers that change transactions
+without setting ``updatedAt`` should call ``invalidate()``.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+import joblib
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "1095"))
+CASH_FLOW_TRAIN_DAYS = int(os.getenv("FORECAST_CASH_FLOW_DAYS", "180"))
+# Seconds between fingerprint checks of the transactions collection
+REFRESH_INTERVAL = float(os.getenv("FORECAST_REFRESH_INTERVAL", "60"))
+MIN_BUDGET_MONTHS = 3
+
+MODEL_FILE = 'forecasting_models.joblib'
+MODEL_VERSION = 1
+TOTAL = '__total__'
+
+
+def _day_of_week_features(days: np.ndarray) -> np.ndarray:
+    """Day-of-week dummies (Monday dropped) for ordinal day numbers"""
+    dow = days % 7
+    return (dow[:, None] == np.arange(1, 7)[None, :]).astype(np.float64)
+
+
+def _cash_flow_features(days: np.ndarray, origin: int) -> np.ndarray:
+    return np.column_stack([(days - origin).astype(np.float64), _day_of_week_features(days)])
+
+
+def fit_cash_flow_model(days: np.ndarray, inflow: np.ndarray, outflow: np.ndarray) -> Dict[str, Any]:
+    """Fit daily inflow and outflow together on trend plus weekly seasonality"""
+    X = _cash_flow_features(days, days[0])
+    Y = np.column_stack([inflow, outflow])
+    model = LinearRegression().fit(X, Y)
+    residuals = Y - model.predict(X)
+    return {
+        'model': model,
+        'origin': int(days[0]),
+        'last_day': int(days[-1]),
+        'training_days': int(len(days)),
+        'active_days': int(np.count_nonzero((inflow > 0) | (outflow > 0))),
+        'avg_daily_inflow': float(inflow.mean()),
+        'avg_daily_outflow': float(outflow.mean()),
+        'residual_std': residuals.std(axis=0).tolist()
+    }
+
+
+def fit_budget_trends(monthly: np.ndarray, active: np.ndarray) -> Dict[str, np.ndarray]:
+    """Least-squares trend lines for every column of ``monthly`` in one batched pass.
+
+    ``monthly`` is months x columns; ``active`` masks the months from each
+    column's first transaction onwards so leading empty months are ignored.
+    """
+    months = np.arange(monthly.shape[0], dtype=np.float64)[:, None]
+    weights = active.astype(np.float64)
+    n = weights.sum(axis=0)
+    safe_n = np.where(n > 0, n, 1)
+
+    mean_x = (weights * months).sum(axis=0) / safe_n
+    mean_y = (weights * monthly).sum(axis=0) / safe_n
+    dx = (months - mean_x) * weights
+    var_x = (dx * (months - mean_x)).sum(axis=0)
+    cov_xy = (dx * (monthly - mean_y)).sum(axis=0)
+
+    slope = np.where(var_x > 0, cov_xy / np.where(var_x > 0, var_x, 1), 0.0)
+    intercept = mean_y - slope * mean_x
+    return {'slope': slope, 'intercept': intercept, 'months_observed': n.astype(int)}
+
+
+class ForecastingEngine:
+    def __init__(self, collection, models_path: str, refresh_interval: float = REFRESH_INTERVAL):
+        self.collection = collection
+        self.model_file = os.path.join(models_path, MODEL_FILE)
+        self.refresh_interval = refresh_interval
+
+        self._models: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    # ---------------- freshness ----------------
+
+    async def _fingerprint(self) -> Dict[str, Any]:
+        latest = await self.collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        # Edits to existing transactions only show up in updatedAt
+        updated = await self.collection.find_one({'updatedAt': {'$ne': None}}, {'updatedAt': 1}, sort=[('updatedAt', -1)])
+        return {
+            'count': await self.collection.estimated_document_count(),
+            'latest_id': str(latest['_id']) if latest else None,
+            'latest_update': updated['updatedAt'].isoformat() if updated and isinstance(updated.get('updatedAt'), datetime) else None,
+            # The daily and monthly windows are anchored on the training date
+            'day': datetime.utcnow().date().isoformat()
+        }
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            models = joblib.load(self.model_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable forecasting models: {str(e)}")
+            return None
+        return models if models.get('version') == MODEL_VERSION else None
+
+    def invalidate(self):
+        """Force a refit on the next forecast, e.g. after bulk-loading transactions"""
+        self._models = None
+        self._checked_at = 0.0
+        try:
+            os.remove(self.model_file)
+        except FileNotFoundError:
+            pass
+
+    async def get_models(self, force: bool = False) -> Dict[str, Any]:
+        """Fitted models for the current data, refitting only when the transactions changed"""
+        if not force and self._models is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return self._models
+
+        async with self._lock:
+            if not force and self._models is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._models
+
+            fingerprint = await self._fingerprint()
+            if not force:
+                if self._models is None:
+                    self._models = await asyncio.to_thread(self._load)
+                if self._models is not None and self._models['fingerprint'] == fingerprint:
+                    self._checked_at = time.monotonic()
+                    return self._models
+
+            self._models = await self._train(fingerprint)
+            self._checked_at = time.monotonic()
+            return self._models
+
+    # ---------------- training ----------------
+
+    async def _daily_series(self, start: datetime) -> List[Dict[str, Any]]:
+        pipeline = [
+            {'$match': {'date': {'$gte': start}}},
+            {
+                '$group': {
+                    '_id': {
+                        'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$date'}},
+                        'department': '$department'
+                    },
+                    'inflow': {'$sum': {'$cond': [{'$gt': ['$amount', 0]}, '$amount', 0]}},
+                    'outflow': {'$sum': {'$cond': [{'$lt': ['$amount', 0]}, {'$abs': '$amount'}, 0]}},
+                    'net': {'$sum': '$amount'}
+                }
+            }
+        ]
+        return [record async for record in self.collection.aggregate(pipeline, allowDiskUse=True)]
+
+    async def _train(self, fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        today = datetime.utcnow().date()
+        records = await self._daily_series(datetime.utcnow() - timedelta(days=HISTORY_DAYS))
+        models = await asyncio.to_thread(self._fit, records, today)
+        models['fingerprint'] = fingerprint
+        models['training_seconds'] = round(time.perf_counter() - started, 3)
+
+        try:
+            await asyncio.to_thread(joblib.dump, models, self.model_file)
+        except Exception as e:
+            logger.warning(f"Could not persist forecasting models: {str(e)}")
+
+        logger.info(f"Forecasting models refitted on {len(records)} daily groups in {models['training_seconds']}s")
+        return models
+
+    def _fit(self, records: List[Dict[str, Any]], today: date) -> Dict[str, Any]:
+        models = {'version': MODEL_VERSION, 'trained_at': datetime.utcnow(), 'cash_flow': None, 'budget': None}
+        if not records:
+            return models
+
+        day_numbers = np.array([date.fromisoformat(r['_id']['day']).toordinal() for r in records])
+        inflow = np.array([r['inflow'] for r in records], dtype=np.float64)
+        outflow = np.array([r['outflow'] for r in records], dtype=np.float64)
+        net = np.array([r['net'] for r in records], dtype=np.float64)
+
+        # Cash flow: dense daily series over the training window, empty days count as zero
+        end = today.toordinal()
+        origin = end - CASH_FLOW_TRAIN_DAYS + 1
+        window = day_numbers >= origin
+        if window.any():
+            days = np.arange(origin, end + 1)
+            daily_in = np.zeros(len(days))
+            daily_out = np.zeros(len(days))
+            np.add.at(daily_in, day_numbers[window] - origin, inflow[window])
+            np.add.at(daily_out, day_numbers[window] - origin, outflow[window])
+            models['cash_flow'] = fit_cash_flow_model(days, daily_in, daily_out)
+
+        # Budget: complete months only, one column per department plus the overall total
+        month_numbers = np.array([
+            d.year * 12 + d.month - 1 for d in (date.fromordinal(int(n)) for n in day_numbers)
+        ])
+        current_month = today.year * 12 + today.month - 1
+        complete = month_numbers < current_month
+        if complete.any():
+            departments = sorted({r['_id'].get('department') for r in records if r['_id'].get('department')})
+            columns = {name: i for i, name in enumerate(departments)}
+            columns[TOTAL] = len(departments)
+            first_month = int(month_numbers[complete].min())
+            n_months = current_month - first_month
+
+            monthly = np.zeros((n_months, len(columns)))
+            rows = month_numbers[complete] - first_month
+            column_index = np.array([
+                columns.get(records[i]['_id'].get('department'), -1) for i in np.flatnonzero(complete)
+            ])
+            has_department = column_index >= 0
+            np.add.at(monthly, (rows[has_department], column_index[has_department]), net[complete][has_department])
+            np.add.at(monthly[:, columns[TOTAL]], rows, net[complete])
+
+            # Months from each column's first transaction onwards
+            seen = np.zeros(monthly.shape, dtype=bool)
+            seen[rows[has_department], column_index[has_department]] = True
+            seen[rows, columns[TOTAL]] = True
+            active = np.maximum.accumulate(seen, axis=0)
+
+            trends = fit_budget_trends(monthly, active)
+            models['budget'] = {
+                'columns': columns,
+                'first_month': first_month,
+                'n_months': n_months,
+                'monthly': monthly,
+                'active': active,
+                **trends
+            }
+
+        return models
+
+    # ---------------- inference ----------------
+
+    async def forecast_cash_flow(self, days_ahead: int) -> Optional[Dict[str, Any]]:
+        """Daily inflow/outflow predictions for the next ``days_ahead`` days, or None without data"""
+        models = await self.get_models()
+        cash_flow = models.get('cash_flow')
+        if not cash_flow or not cash_flow['active_days']:
+            return None
+
+        start = datetime.utcnow().date().toordinal() + 1
+        days = np.arange(start, start + days_ahead)
+        predicted = cash_flow['model'].predict(_cash_flow_features(days, cash_flow['origin']))
+        predicted = np.clip(predicted, 0, None)
+
+        return {
+            'dates': [date.fromordinal(int(d)) for d in days],
+            'inflow': predicted[:, 0],
+            'outflow': predicted[:, 1],
+            'avg_daily_inflow': cash_flow['avg_daily_inflow'],
+            'avg_daily_outflow': cash_flow['avg_daily_outflow'],
+            'trained_at': models['trained_at'],
+            'training_days': cash_flow['training_days']
+        }
+
+    async def forecast_budget(self, department: Optional[str], months_ahead: int) -> Optional[Dict[str, Any]]:
+        """Trend forecast of monthly net spend for a department (or overall), or None without enough history"""
+        models = await self.get_models()
+        budget = models.get('budget')
+        if not budget:
+            return None
+
+        column = budget['columns'].get(department or TOTAL)
+        if column is None or budget['months_observed'][column] < MIN_BUDGET_MONTHS:
+            return None
+
+        history = budget['monthly'][budget['active'][:, column], column]
+        future = np.arange(budget['n_months'], budget['n_months'] + months_ahead, dtype=np.float64)
+        predicted = budget['intercept'][column] + budget['slope'][column] * future
+
+        return {
+            'history': history,
+            'predicted': predicted,
+            'slope': float(budget['slope'][column]),
+            'trained_at': models['trained_at']
+        }
+
+    async def status(self) -> Dict[str, Any]:
+        models = await self.get_models()
+        budget = models.get('budget') or {}
+        cash_flow = models.get('cash_flow') or {}
+        return {
+            'trained_at': models.get('trained_at'),
+            'training_seconds': models.get('training_seconds'),
+            'fingerprint': models.get('fingerprint'),
+            'cash_flow_training_days': cash_flow.get('training_days', 0),
+            'budget_months': budget.get('n_months', 0),
+            'departments': sorted(c for c in budget.get('columns', {}) if c != TOTAL)
+        }
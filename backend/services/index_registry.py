@@ -0,0 +1,308 @@
+"""
+Index registry.
+
+Routers and services declare the indexes their queries need with
+``index_registry.declare(collection, keys, **options)`` at import time, next
+to the queries themselves. ``ensure_all()`` runs once at startup: for each
+collection it reads the existing indexes and creates only the declared ones
+that are missing, so restarts cost one ``listIndexes`` per collection. An
+existing index with the same name, or the same keys and collation, but
+different options is reported as a conflict and left alone; indexes are never
+dropped here.
+
+Collections holding at least ``INDEX_BACKGROUND_THRESHOLD`` documents are
+indexed from a background task so startup does not wait on the build (on
+MongoDB 4.2+ builds only hold exclusive locks at their start and end, and the
+``background`` option is ignored).
+
+Dashboard queries are registered with ``declare_query``. ``collection_scans()``
+reports queries that scan whole collections from three sources: the profiler
+(``system.profile`` entries whose plan is a COLLSCAN, when
+``DB_PROFILE_SLOW_MS`` enables it), the server's collection-scan counters, and
+``explain`` of every declared query.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from pymongo import ASCENDING, IndexModel
+from database import db
+
+logger = logging.getLogger(__name__)
+
+INDEX_BACKGROUND_THRESHOLD = int(os.getenv("INDEX_BACKGROUND_THRESHOLD", "100000"))
+# Profile operations slower than this many milliseconds (unset leaves the profiler alone)
+DB_PROFILE_SLOW_MS = os.getenv("DB_PROFILE_SLOW_MS")
+
+Keys = Union[str, Sequence[Tuple[str, Any]]]
+
+# Options that change what an index is; anything else (e.g. background) is build-time only
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression', 'collation')
+
+
+def normalize_keys(keys: Keys) -> List[Tuple[str, Any]]:
+    if isinstance(keys, str):
+        return [(keys, ASCENDING)]
+    return [(field, direction) for field, direction in keys]
+
+
+def index_name(keys: List[Tuple[str, Any]]) -> str:
+    """The name the server gives an index that was created without one"""
+    return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _collation(options: Dict[str, Any]) -> Tuple:
+    """An index's collation without the defaults the server fills in when listing it"""
+    collation = options.get('collation') or {}
+    if collation.get('locale', 'simple') == 'simple':
+        return ()
+    return collation['locale'], collation.get('strength', 3)
+
+
+def _is_collscan(plan: Dict[str, Any]) -> bool:
+    if plan.get('stage') == 'COLLSCAN':
+        return True
+    children = [plan[key] for key in ('inputStage', 'queryPlan') if isinstance(plan.get(key), dict)]
+    children += plan.get('inputStages') or []
+    return any(_is_collscan(child) for child in children)
+
+
+class IndexSpec:
+    def __init__(self, collection: str, keys: Keys, **options):
+        self.collection = collection
+        self.keys = normalize_keys(keys)
+        self.name = options.pop('name', None) or index_name(self.keys)
+        self.options = options
+        self.status = 'declared'
+        self.error: Optional[str] = None
+
+    def model(self, background: bool = False) -> IndexModel:
+        options = dict(self.options)
+        if background:
+            options['background'] = True
+        return IndexModel(self.keys, name=self.name, **options)
+
+    def differs_from(self, existing: Dict[str, Any]) -> bool:
+        if [(field, direction) for field, direction in existing.get('key', [])] != self.keys:
+            return True
+        if _collation(existing) != _collation(self.options):
+            return True
+        # An option left unset matches one set to False
+        return any(existing.get(option) != self.options.get(option)
+                   and (existing.get(option) or self.options.get(option))
+                   for option in INDEX_OPTIONS if option != 'collation')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'collection': self.collection,
+            'name': self.name,
+            'keys': [[field, direction] for field, direction in self.keys],
+            'options': self.options,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+class IndexRegistry:
+    def __init__(self, database=db):
+        self.db = database
+        self.specs: Dict[Tuple[str, str], IndexSpec] = {}
+        self.queries: Dict[str, Dict[str, Any]] = {}
+        self._builds: Dict[str, asyncio.Task] = {}
+        self.ensured_at: Optional[datetime] = None
+
+    # ---------------- declarations ----------------
+
+    def declare(self, collection: str, keys: Keys, **options) -> IndexSpec:
+        """Declare an index; declaring the same index twice is harmless, a different one under the same name is not"""
+        spec = IndexSpec(collection, keys, **options)
+        existing = self.specs.get((collection, spec.name))
+        if existing is not None:
+            if existing.keys != spec.keys or existing.options != spec.options:
+                raise ValueError(f"Index {collection}.{spec.name} is already declared with different keys or options")
+            return existing
+        self.specs[(collection, spec.name)] = spec
+        return spec
+
+    def declare_query(self, name: str, collection: str, filter: Dict[str, Any],
+                      sort: Optional[Keys] = None):
+        """Register a query the collection-scan report should explain"""
+        self.queries[name] = {
+            'collection': collection,
+            'filter': filter,
+            'sort': normalize_keys(sort) if sort else None
+        }
+
+    # ---------------- building ----------------
+
+    async def ensure_all(self) -> Dict[str, Any]:
+        """Create every declared index that does not exist yet"""
+        by_collection: Dict[str, List[IndexSpec]] = {}
+        for spec in self.specs.values():
+            by_collection.setdefault(spec.collection, []).append(spec)
+
+        for name, specs in by_collection.items():
+            try:
+                await self._ensure_collection(name, specs)
+            except Exception as e:
+                logger.warning(f"Could not ensure indexes on {name}: {str(e)}")
+                for spec in specs:
+                    if spec.status == 'declared':
+                        spec.status, spec.error = 'failed', str(e)
+
+        self.ensured_at = datetime.utcnow()
+        return self.summary()
+
+    async def _ensure_collection(self, name: str, specs: List[IndexSpec]):
+        collection = self.db[name]
+        existing = await collection.index_information()
+        by_keys = {(tuple(tuple(key) for key in info.get('key', [])), _collation(info)): index
+                   for index, info in existing.items()}
+
+        missing = []
+        for spec in specs:
+            current_name = spec.name if spec.name in existing else by_keys.get((tuple(spec.keys), _collation(spec.options)))
+            if current_name is None:
+                missing.append(spec)
+            elif spec.differs_from(existing[current_name]):
+                spec.status = 'conflict'
+                spec.error = f"Existing index {current_name} has different keys or options"
+                logger.warning(f"Index conflict on {name}.{spec.name}: {spec.error}")
+            else:
+                spec.status = 'exists'
+
+        if not missing:
+            return
+
+        count = await collection.estimated_document_count()
+        if count >= INDEX_BACKGROUND_THRESHOLD:
+            for spec in missing:
+                spec.status = 'building'
+            logger.info(f"Building {len(missing)} indexes on {name} ({count} documents) in the background")
+            self._builds[name] = asyncio.create_task(self._build(collection, missing, background=True))
+        else:
+            await self._build(collection, missing)
+
+    async def _build(self, collection, specs: List[IndexSpec], background: bool = False):
+        try:
+            await collection.create_indexes([spec.model(background) for spec in specs])
+            for spec in specs:
+                spec.status, spec.error = 'created', None
+            return
+        except Exception as e:
+            logger.warning(f"Batch index build on {collection.name} failed, building one at a time: {str(e)}")
+
+        # One bad declaration must not keep the others from being built
+        for spec in specs:
+            try:
+                await collection.create_indexes([spec.model(background)])
+                spec.status, spec.error = 'created', None
+            except Exception as e:
+                spec.status, spec.error = 'failed', str(e)
+                logger.warning(f"Could not create index {collection.name}.{spec.name}: {str(e)}")
+
+    async def stop(self):
+        """Stop waiting on background builds; the server finishes them on its own"""
+        builds, self._builds = list(self._builds.values()), {}
+        for task in builds:
+            task.cancel()
+        await asyncio.gather(*builds, return_exceptions=True)
+
+    def summary(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for spec in self.specs.values():
+            counts[spec.status] = counts.get(spec.status, 0) + 1
+        return {
+            'ensured_at': self.ensured_at,
+            'declared': len(self.specs),
+            'by_status': counts,
+            'indexes': [spec.to_dict() for spec in sorted(self.specs.values(), key=lambda s: (s.collection, s.name))]
+        }
+
+    # ---------------- collection scans ----------------
+
+    async def enable_profiler(self):
+        """Profile slow operations when DB_PROFILE_SLOW_MS is set"""
+        if DB_PROFILE_SLOW_MS is None:
+            return
+        try:
+            await self.db.command({'profile': 1, 'slowms': int(DB_PROFILE_SLOW_MS)})
+            logger.info(f"Database profiler enabled for operations slower than {DB_PROFILE_SLOW_MS}ms")
+        except Exception as e:
+            logger.warning(f"Could not enable the database profiler: {str(e)}")
+
+    async def _profiled_scans(self, minutes: int, limit: int) -> List[Dict[str, Any]]:
+        since = datetime.utcnow() - timedelta(minutes=minutes)
+        pipeline = [
+            {'$match': {'ts': {'$gte': since}, 'planSummary': {'$regex': '^COLLSCAN'}}},
+            {'$group': {
+                '_id': {'ns': '$ns', 'op': '$op'},
+                'count': {'$sum': 1},
+                'avg_millis': {'$avg': '$millis'},
+                'max_docs_examined': {'$max': '$docsExamined'},
+                'example_filter': {'$last': {'$ifNull': ['$command.filter', '$command.pipeline']}}
+            }},
+            {'$sort': {'count': -1}},
+            {'$limit': limit}
+        ]
+        scans = []
+        async for row in self.db['system.profile'].aggregate(pipeline):
+            scans.append({
+                'namespace': row['_id'].get('ns'),
+                'op': row['_id'].get('op'),
+                'count': row['count'],
+                'avg_millis': round(row.get('avg_millis') or 0, 1),
+                'max_docs_examined': row.get('max_docs_examined'),
+                'example_filter': row.get('example_filter')
+            })
+        return scans
+
+    async def _server_counters(self) -> Optional[Dict[str, Any]]:
+        try:
+            status = await self.db.client.admin.command('serverStatus')
+        except Exception as e:
+            logger.debug(f"serverStatus unavailable: {str(e)}")
+            return None
+        return status.get('metrics', {}).get('queryExecutor', {}).get('collectionScans')
+
+    async def _explain(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        cursor = self.db[query['collection']].find(query['filter'])
+        if query['sort']:
+            cursor = cursor.sort(query['sort'])
+        plan = await cursor.explain()
+        winning = plan.get('queryPlanner', {}).get('winningPlan', {})
+        return {'collscan': _is_collscan(winning), 'stage': winning.get('stage')}
+
+    async def explain_queries(self) -> List[Dict[str, Any]]:
+        results = []
+        for name, query in self.queries.items():
+            entry = {'query': name, 'collection': query['collection']}
+            try:
+                entry.update(await self._explain(query))
+            except Exception as e:
+                entry['error'] = str(e)
+            results.append(entry)
+        return results
+
+    async def collection_scans(self, minutes: int = 60, limit: int = 20) -> Dict[str, Any]:
+        """Collection scans seen by the profiler, the server counters and explain of declared queries"""
+        try:
+            profiled = await self._profiled_scans(minutes, limit)
+        except Exception as e:
+            logger.debug(f"Profiler data unavailable: {str(e)}")
+            profiled = None
+        explained = await self.explain_queries()
+        return {
+            'profiler_enabled': DB_PROFILE_SLOW_MS is not None,
+            'profiled': profiled,
+            'server_counters': await self._server_counters(),
+            'declared_queries': explained,
+            'scanning_queries': [entry['query'] for entry in explained if entry.get('collscan')]
+        }
+
+
+# Global index registry instance
+index_registry = IndexRegistry()
@@ -0,0 +1,379 @@
+"""
+Background job scheduler for periodic sweeps.
+
+Jobs are async callables ``func(since)`` run on an interval or cron schedule
+with random jitter. The scheduler can run inside the API process (enable it with
+``SCHEDULER_ENABLED=true``) or in the standalone ``worker.py``. Either way:
+
+- a lease in ``scheduler_locks`` makes each run single-flight across replicas;
+  the lease is renewed while the job runs and expires if its holder dies;
+- every run is recorded in ``scheduler_runs`` (kept for ``SCHEDULER_HISTORY_DAYS``)
+  and per-job state and metrics are kept in ``scheduler_jobs``;
+- incremental jobs get ``since``, the start of the last successful run, and only
+  sweep records changed after it (see ``changed_since``). They fall back to a full
+  sweep (``since=None``) on their first run and every ``full_sweep_every`` seconds.
+"""
+
+import os
+import re
+import uuid
+import random
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from database import db
+from services.index_registry import index_registry
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+LOCK_TTL = float(os.getenv("SCHEDULER_LOCK_TTL", "120"))
+JOB_TIMEOUT = float(os.getenv("SCHEDULER_JOB_TIMEOUT", "1800"))
+HISTORY_DAYS = int(os.getenv("SCHEDULER_HISTORY_DAYS", "14"))
+# Incremental sweeps look this far before the last run start to cover in-flight writes
+WATERMARK_OVERLAP = float(os.getenv("SCHEDULER_WATERMARK_OVERLAP", "30"))
+
+index_registry.declare('scheduler_runs', [('job', 1), ('started_at', DESCENDING)])
+index_registry.declare('scheduler_runs', 'started_at', expireAfterSeconds=HISTORY_DAYS * 86400, name='run_history_ttl')
+
+JobFunc = Callable[[Optional[datetime]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def changed_since(since: Optional[datetime], fields: tuple = ('updatedAt', 'createdAt')) -> Dict[str, Any]:
+    """Query for documents written after ``since`` (everything when ``since`` is None).
+
+    Documents without timestamps are matched on their ObjectId creation time.
+    """
+    if since is None:
+        return {}
+    return {'$or': [{field: {'$gte': since}} for field in fields] + [{'_id': {'$gte': ObjectId.from_datetime(since)}}]}
+
+
+# ---------------- schedules ----------------
+
+class IntervalSchedule:
+    def __init__(self, seconds: float, jitter: float = 0.0):
+        if seconds <= 0:
+            raise ValueError("Interval must be positive")
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def next_after(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+    def describe(self) -> str:
+        return f"every {self.seconds:g}s"
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week), in UTC"""
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str, jitter: float = 0.0):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.jitter = jitter
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        # Standard cron: when both day fields are restricted, either one may match
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            match = re.fullmatch(r'(\*|\d+)(?:-(\d+))?(?:/(\d+))?', part)
+            if not match:
+                raise ValueError(f"Invalid cron field: {field!r}")
+            start, end, step = match.groups()
+            if start == '*':
+                first, last = low, high
+            else:
+                first = int(start)
+                last = int(end) if end else (high if step else first)
+            # 7 is accepted as Sunday in the day-of-week field
+            values.update(v % 7 if high == 6 else v for v in range(first, last + 1, int(step or 1)))
+        if not values or min(values) < low or max(values) > high:
+            raise ValueError(f"Cron field out of range: {field!r}")
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, after: datetime) -> datetime:
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+    def describe(self) -> str:
+        return f"cron {self.expression}"
+
+
+def parse_schedule(spec: str, jitter: float = 0.0):
+    """``interval:<seconds>`` or ``cron:<expression>``"""
+    kind, _, value = spec.partition(':')
+    if kind == 'interval':
+        return IntervalSchedule(float(value), jitter)
+    if kind == 'cron':
+        return CronSchedule(value, jitter)
+    raise ValueError(f"Unknown schedule {spec!r}, expected 'interval:<seconds>' or 'cron:<expression>'")
+
+
+# ---------------- scheduler ----------------
+
+class Job:
+    def __init__(self, name: str, func: JobFunc, schedule, timeout: float = JOB_TIMEOUT,
+                 incremental: bool = False, full_sweep_every: Optional[float] = None, enabled: bool = True):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.timeout = timeout
+        self.incremental = incremental
+        self.full_sweep_every = full_sweep_every
+        self.enabled = enabled
+        self.next_run_at: Optional[datetime] = None
+
+
+class JobScheduler:
+    def __init__(self, lock_ttl: float = LOCK_TTL):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock_ttl = lock_ttl
+        self.jobs: Dict[str, Job] = {}
+
+        self.locks = db.scheduler_locks
+        self.runs = db.scheduler_runs
+        self.state = db.scheduler_jobs
+
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._active: Set[str] = set()
+
+    def register(self, job: Job) -> Job:
+        self.jobs[job.name] = job
+        self.metrics[job.name] = {'runs': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0,
+                                  'total_seconds': 0.0, 'last_duration': None, 'last_status': None}
+        return job
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # ---------------- lifecycle ----------------
+
+    async def start(self):
+        if self._tasks:
+            return
+        for job in self.jobs.values():
+            if job.enabled:
+                self._tasks[job.name] = asyncio.create_task(self._loop(job), name=f"job:{job.name}")
+        logger.info(f"Job scheduler {self.owner} started {len(self._tasks)} jobs")
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _loop(self, job: Job):
+        while True:
+            now = datetime.utcnow()
+            job.next_run_at = job.schedule.next_after(now) + timedelta(seconds=random.uniform(0, job.schedule.jitter))
+            await asyncio.sleep(max(0.0, (job.next_run_at - now).total_seconds()))
+            try:
+                await self.run_job(job.name)
+            except Exception as e:
+                logger.error(f"Scheduled job {job.name} crashed: {str(e)}")
+
+    # ---------------- locking ----------------
+
+    async def _acquire(self, name: str) -> bool:
+        now = datetime.utcnow()
+        try:
+            lock = await self.locks.find_one_and_update(
+                {'_id': name, '$or': [{'locked_until': {'$lte': now}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'locked_until': now + timedelta(seconds=self.lock_ttl), 'acquired_at': now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another replica holds an unexpired lease
+            return False
+        return lock is not None and lock.get('owner') == self.owner
+
+    async def _renew(self, name: str):
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            await self.locks.update_one(
+                {'_id': name, 'owner': self.owner},
+                {'$set': {'locked_until': datetime.utcnow() + timedelta(seconds=self.lock_ttl)}}
+            )
+
+    async def _release(self, name: str):
+        await self.locks.update_one({'_id': name, 'owner': self.owner}, {'$set': {'locked_until': datetime.utcnow()}})
+
+    # ---------------- running ----------------
+
+    async def run_job(self, name: str, full_sweep: bool = False, trigger: str = 'schedule') -> Dict[str, Any]:
+        """Run a job now if no other run of it holds the lock; returns the run record"""
+        job = self.jobs.get(name)
+        if job is None:
+            raise ValueError(f"Unknown job: {name}")
+
+        metrics = self.metrics[name]
+        if name in self._active or not await self._acquire(name):
+            metrics['skipped'] += 1
+            return {'job': name, 'status': 'skipped', 'reason': 'already running'}
+
+        self._active.add(name)
+        renew = asyncio.create_task(self._renew(name))
+        started = datetime.utcnow()
+        status, duration, since, run = 'failed', 0.0, None, None
+        try:
+            result, error = None, None
+            try:
+                # A state read that fails is recorded as a failed run like any job error
+                state = await self.state.find_one({'_id': name}) or {}
+                since = self._since(job, state, started, full_sweep)
+                result = await asyncio.wait_for(job.func(since), timeout=job.timeout)
+                status = 'succeeded'
+            except asyncio.TimeoutError:
+                status, error = 'timeout', f"Timed out after {job.timeout}s"
+            except Exception as e:
+                status, error = 'failed', str(e)
+                logger.error(f"Job {name} failed: {error}")
+
+            finished = datetime.utcnow()
+            duration = (finished - started).total_seconds()
+            run = {
+                'job': name,
+                'owner': self.owner,
+                'trigger': trigger,
+                'status': status,
+                'incremental': since is not None,
+                'since': since,
+                'started_at': started,
+                'finished_at': finished,
+                'duration_seconds': round(duration, 3),
+                'result': result,
+                'error': error
+            }
+            await self._record(job, run)
+        finally:
+            renew.cancel()
+            self._active.discard(name)
+            await self._release(name)
+
+        metrics['runs'] += 1
+        metrics['succeeded' if status == 'succeeded' else 'failed'] += 1
+        metrics['total_seconds'] += duration
+        metrics['last_duration'] = round(duration, 3)
+        metrics['last_status'] = status
+        logger.info(f"Job {name} {status} in {duration:.2f}s ({'incremental' if since else 'full'} sweep)")
+        return run
+
+    def _since(self, job: Job, state: Dict[str, Any], now: datetime, full_sweep: bool) -> Optional[datetime]:
+        if not job.incremental or full_sweep or not state.get('watermark'):
+            return None
+        last_full = state.get('last_full_sweep_at')
+        if job.full_sweep_every and (not last_full or (now - last_full).total_seconds() >= job.full_sweep_every):
+            return None
+        return state['watermark'] - timedelta(seconds=WATERMARK_OVERLAP)
+
+    async def _record(self, job: Job, run: Dict[str, Any]):
+        try:
+            await self.runs.insert_one(dict(run))
+
+            update = {
+                '$set': {
+                    'last_run_at': run['started_at'],
+                    'last_status': run['status'],
+                    'last_duration_seconds': run['duration_seconds'],
+                    'last_error': run['error'],
+                    'schedule': job.schedule.describe()
+                },
+                '$inc': {'runs': 1, 'failures': 0 if run['status'] == 'succeeded' else 1}
+            }
+            if run['status'] == 'succeeded':
+                update['$set']['watermark'] = run['started_at']
+                update['$set']['last_success_at'] = run['finished_at']
+                if not run['incremental']:
+                    update['$set']['last_full_sweep_at'] = run['started_at']
+            await self.state.update_one({'_id': job.name}, update, upsert=True)
+        except Exception as e:
+            logger.warning(f"Could not record run of job {job.name}: {str(e)}")
+
+    # ---------------- reporting ----------------
+
+    async def job_status(self) -> List[Dict[str, Any]]:
+        states = {state['_id']: state async for state in self.state.find({'_id': {'$in': list(self.jobs)}})}
+        locks = {lock['_id']: lock async for lock in self.locks.find({'_id': {'$in': list(self.jobs)}})}
+        now = datetime.utcnow()
+
+        report = []
+        for name, job in self.jobs.items():
+            state = states.get(name, {})
+            lock = locks.get(name)
+            metrics = self.metrics[name]
+            report.append({
+                'name': name,
+                'schedule': job.schedule.describe(),
+                'enabled': job.enabled,
+                'incremental': job.incremental,
+                'next_run_at': job.next_run_at if name in self._tasks else None,
+                'running': bool(lock and lock.get('locked_until') and lock['locked_until'] > now),
+                'locked_by': lock.get('owner') if lock and lock.get('locked_until') and lock['locked_until'] > now else None,
+                'last_run_at': state.get('last_run_at'),
+                'last_status': state.get('last_status'),
+                'last_duration_seconds': state.get('last_duration_seconds'),
+                'last_success_at': state.get('last_success_at'),
+                'last_error': state.get('last_error'),
+                'watermark': state.get('watermark'),
+                'total_runs': state.get('runs', 0),
+                'total_failures': state.get('failures', 0),
+                # Runs handled by this process
+                'local_metrics': {
+                    **metrics,
+                    'avg_seconds': round(metrics['total_seconds'] / metrics['runs'], 3) if metrics['runs'] else None
+                }
+            })
+        return report
+
+    async def run_history(self, name: str, limit: int = 20) -> List[Dict[str, Any]]:
+        runs = []
+        async for run in self.runs.find({'job': name}).sort('started_at', -1).limit(limit):
+            run['_id'] = str(run['_id'])
+            runs.append(run)
+        return runs
+
+
+# Global scheduler instance
+job_scheduler = JobScheduler()
@@ -1,268 +1,363 @@
+import os
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 import logging
 from models.predictive_maintenance import PredictiveMaintenanceAlert, MaintenancePrediction, AssetHealthScore
 from models.vehicle import Vehicle
 from models.maintenance_schedule import MaintenanceSchedule
-from email_service import send_maintenance_alert_email
+from email_service import send_maintenance_alert_emails
 
 logger = logging.getLogger(__name__)
 
-class MaintenanceAlertService:
-    def __init__(self):
-        self.alert_thresholds = {
-            'vehicle_mileage': {
-                'warning': 5000,  # 5,000 km before due
-                'critical': 1000  # 1,000 km before due
-            },
-            'time_based': {
-                'warning': 7,  # 7 days before due
-                'critical': 1  # 1 day before due
-            }
-        }
-
-    async def analyze_vehicle_maintenance(self, vehicles: List[Vehicle], schedules: List[MaintenanceSchedule]) -> List[PredictiveMaintenanceAlert]:
-        """Analyze vehicles and generate predictive maintenance alerts"""
-        alerts = []
-
-        for vehicle in vehicles:
-            # Check mileage-based alerts
-            if vehicle.mileage and vehicle.nextPM:
-                mileage_alerts = await self._check_mileage_based_alerts(vehicle)
-                alerts.extend(mileage_alerts)
-
-            # Check time-based alerts
-            time_alerts = await self._check_time_based_alerts(vehicle, schedules)
-            alerts.extend(time_alerts)
-
-            # Check condition-based alerts (based on vehicle age, usage patterns)
-            condition_alerts = await self._check_condition_based_alerts(vehicle)
-            alerts.extend(condition_alerts)
-
-        return alerts
-
-    async def _check_mileage_based_alerts(self, vehicle: Vehicle) -> List[PredictiveMaintenanceAlert]:
-        """Check for mileage-based maintenance alerts"""
-        alerts = []
-
+# Vehicles evaluated per chunk (and per process-pool task)
+ANALYSIS_CHUNK_SIZE = int(os.getenv("MAINTENANCE_ANALYSIS_CHUNK_SIZE", "2000"))
+# Worker processes for rule evaluation; 0 evaluates chunks in the server process
+ANALYSIS_WORKERS = int(os.getenv("MAINTENANCE_ANALYSIS_WORKERS", "0"))
+
+DEFAULT_ALERT_THRESHOLDS = {
+    'vehicle_mileage': {
+        'warning': 5000,  # 5,000 km before due
+        'critical': 1000  # 1,000 km before due
+    },
+    'time_based': {
+        'warning': 7,  # 7 days before due
+        'critical': 1  # 1 day before due
+    }
+}
+
+SEVERITY_PRIORITY = {'critical': 'Critical', 'high': 'High', 'medium': 'Medium', 'low': 'Low'}
+
+# A schedule reduced to the fields the rules read: (task, nextDue, cost)
+ScheduleFields = Tuple[str, str, str]
+
+
+# ---------------- pure alert rules ----------------
+#
+# The rules below are plain synchronous functions over vehicle dicts and
+# schedules pre-indexed by plate, so a chunk of vehicles can be evaluated in
+# one call, in this process or in a worker process. They return alert dicts
+# shaped like PredictiveMaintenanceAlert.
+
+def index_schedules_by_plate(schedules: Iterable[Any]) -> Dict[str, List[ScheduleFields]]:
+    """Group schedules (models or documents) by the vehicle plate they apply to"""
+    by_plate: Dict[str, List[ScheduleFields]] = {}
+    for schedule in schedules:
+        if not isinstance(schedule, dict):
+            schedule = schedule.dict()
+        by_plate.setdefault(schedule.get('property'), []).append(
+            (schedule.get('task'), schedule.get('nextDue'), schedule.get('cost'))
+        )
+    return by_plate
+
+
+def _alert(vehicle: Dict[str, Any], alert_type: str, severity: str, title: str, description: str,
+           component: str, predicted_date: str, confidence: float, action: str, cost: float) -> Dict[str, Any]:
+    return {
+        'assetId': vehicle.get('id') or '',
+        'assetType': 'Vehicle',
+        'assetName': f"{vehicle.get('make')} {vehicle.get('model')} ({vehicle.get('plate')})",
+        'licensePlate': vehicle.get('plate'),
+        'alertType': alert_type,
+        'severity': severity,
+        'priority': SEVERITY_PRIORITY[severity],
+        'status': 'Predicted',
+        'title': title,
+        'description': description,
+        'failureComponent': component,
+        'failureDescription': description,
+        'predictedFailureDate': predicted_date,
+        'confidenceLevel': confidence,
+        'recommendedAction': action,
+        'estimatedCost': cost
+    }
+
+
+def check_mileage_based_alerts(vehicle: Dict[str, Any], now: datetime, thresholds: Dict) -> List[Dict[str, Any]]:
+    """Check for mileage-based maintenance alerts"""
+    alerts = []
+
+    try:
+        current_mileage = float(vehicle['mileage']) if vehicle.get('mileage') else 0
+        next_maintenance_mileage = float(vehicle['nextPM']) if vehicle.get('nextPM') else 0
+
+        if next_maintenance_mileage > 0:
+            remaining_km = next_maintenance_mileage - current_mileage
+
+            if remaining_km <= thresholds['vehicle_mileage']['critical']:
+                alerts.append(_alert(
+                    vehicle, 'mileage_based', 'critical',
+                    title='Critical Maintenance Due Soon',
+                    description=f"Vehicle {vehicle.get('plate')} is due for maintenance in {remaining_km:.0f} km",
+                    component='Scheduled service',
+                    predicted_date=now.strftime('%Y-%m-%d'),
+                    confidence=95.0,
+                    action='Schedule immediate maintenance appointment',
+                    cost=500.0  # Default estimate
+                ))
+
+            elif remaining_km <= thresholds['vehicle_mileage']['warning']:
+                alerts.append(_alert(
+                    vehicle, 'mileage_based', 'high',
+                    title='Maintenance Due Soon',
+                    description=f"Vehicle {vehicle.get('plate')} will need maintenance in {remaining_km:.0f} km",
+                    component='Scheduled service',
+                    predicted_date=(now + timedelta(days=int(remaining_km / 50))).strftime('%Y-%m-%d'),  # Assuming 50km/day average
+                    confidence=85.0,
+                    action='Schedule maintenance appointment within 2 weeks',
+                    cost=500.0
+                ))
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error checking mileage alerts for vehicle {vehicle.get('id')}: {str(e)}")
+
+    return alerts
+
+
+def check_time_based_alerts(vehicle: Dict[str, Any], schedules: List[ScheduleFields], now: datetime,
+                            thresholds: Dict) -> List[Dict[str, Any]]:
+    """Check for time-based maintenance alerts against this vehicle's schedules"""
+    alerts = []
+
+    for task, next_due_value, cost in schedules:
         try:
-            current_mileage = float(vehicle.mileage) if vehicle.mileage else 0
-            next_maintenance_mileage = float(vehicle.nextPM) if vehicle.nextPM else 0
-
-            if next_maintenance_mileage > 0:
-                remaining_km = next_maintenance_mileage - current_mileage
-
-                if remaining_km <= self.alert_thresholds['vehicle_mileage']['critical']:
-                    alert = PredictiveMaintenanceAlert(
-                        assetId=vehicle.id or '',
-                        assetType='vehicle',
-                        assetName=f"{vehicle.make} {vehicle.model} ({vehicle.plate})",
-                        alertType='mileage_based',
-                        severity='critical',
-                        title='Critical Maintenance Due Soon',
-                        description=f'Vehicle {vehicle.plate} is due for maintenance in {remaining_km:.0f} km',
-                        predictedFailureDate=datetime.now().strftime('%Y-%m-%d'),
-                        confidence=95.0,
-                        recommendedAction='Schedule immediate maintenance appointment',
-                        estimatedCost=500.0  # Default estimate
-                    )
-                    alerts.append(alert)
-
-                elif remaining_km <= self.alert_thresholds['vehicle_mileage']['warning']:
-                    alert = PredictiveMaintenanceAlert(
-                        assetId=vehicle.id or '',
-                        assetType='vehicle',
-                        assetName=f"{vehicle.make} {vehicle.model} ({vehicle.plate})",
-                        alertType='mileage_based',
-                        severity='high',
-                        title='Maintenance Due Soon',
-                        description=f'Vehicle {vehicle.plate} will need maintenance in {remaining_km:.0f} km',
-                        predictedFailureDate=(datetime.now() + timedelta(days=int(remaining_km / 50))).strftime('%Y-%m-%d'),  # Assuming 50km/day average
-                        confidence=85.0,
-                        recommendedAction='Schedule maintenance appointment within 2 weeks',
-                        estimatedCost=500.0
-                    )
-                    alerts.append(alert)
+            next_due = datetime.strptime(next_due_value, '%Y-%m-%d')
+            days_until_due = (next_due - now).days
+
+            if days_until_due <= thresholds['time_based']['critical']:
+                alerts.append(_alert(
+                    vehicle, 'time_based', 'critical',
+                    title=f'Critical: {task} Due',
+                    description=f"Scheduled {task} for {vehicle.get('plate')} is overdue or due today",
+                    component=task,
+                    predicted_date=next_due_value,
+                    confidence=90.0,
+                    action=f'Complete {task} immediately',
+                    cost=float(cost) if cost else 300.0
+                ))
+
+            elif days_until_due <= thresholds['time_based']['warning']:
+                alerts.append(_alert(
+                    vehicle, 'time_based', 'medium',
+                    title=f'{task} Due Soon',
+                    description=f"Scheduled {task} for {vehicle.get('plate')} is due in {days_until_due} days",
+                    component=task,
+                    predicted_date=next_due_value,
+                    confidence=80.0,
+                    action=f'Schedule {task} appointment',
+                    cost=float(cost) if cost else 300.0
+                ))
 
         except (ValueError, TypeError) as e:
-            logger.error(f"Error checking mileage alerts for vehicle {vehicle.id}: {str(e)}")
-
-        return alerts
-
-    async def _check_time_based_alerts(self, vehicle: Vehicle, schedules: List[MaintenanceSchedule]) -> List[PredictiveMaintenanceAlert]:
-        """Check for time-based maintenance alerts"""
-        alerts = []
-
-        # Filter schedules for this vehicle
-        vehicle_schedules = [s for s in schedules if s.property == vehicle.plate]
-
-        for schedule in vehicle_schedules:
-            try:
-                next_due = datetime.strptime(schedule.nextDue, '%Y-%m-%d')
-                now = datetime.now()
-                days_until_due = (next_due - now).days
-
-                if days_until_due <= self.alert_thresholds['time_based']['critical']:
-                    alert = PredictiveMaintenanceAlert(
-                        assetId=vehicle.id or '',
-                        assetType='vehicle',
-                        assetName=f"{vehicle.make} {vehicle.model} ({vehicle.plate})",
-                        alertType='time_based',
-                        severity='critical',
-                        title=f'Critical: {schedule.task} Due',
-                        description=f'Scheduled {schedule.task} for {vehicle.plate} is overdue or due today',
-                        predictedFailureDate=schedule.nextDue,
-                        confidence=90.0,
-                        recommendedAction=f'Complete {schedule.task} immediately',
-                        estimatedCost=float(schedule.cost) if schedule.cost else 300.0
-                    )
-                    alerts.append(alert)
-
-                elif days_until_due <= self.alert_thresholds['time_based']['warning']:
-                    alert = PredictiveMaintenanceAlert(
-                        assetId=vehicle.id or '',
-                        assetType='vehicle',
-                        assetName=f"{vehicle.make} {vehicle.model} ({vehicle.plate})",
-                        alertType='time_based',
-                        severity='medium',
-                        title=f'{schedule.task} Due Soon',
-                        description=f'Scheduled {schedule.task} for {vehicle.plate} is due in {days_until_due} days',
-                        predictedFailureDate=schedule.nextDue,
-                        confidence=80.0,
-                        recommendedAction=f'Schedule {schedule.task} appointment',
-                        estimatedCost=float(schedule.cost) if schedule.cost else 300.0
-                    )
-                    alerts.append(alert)
-
-            except (ValueError, TypeError) as e:
-                logger.error(f"Error checking time alerts for vehicle {vehicle.id}: {str(e)}")
-
-        return alerts
-
-    async def _check_condition_based_alerts(self, vehicle: Vehicle) -> List[PredictiveMaintenanceAlert]:
-        """Check for condition-based alerts based on vehicle age and usage"""
-        alerts = []
+            logger.error(f"Error checking time alerts for vehicle {vehicle.get('id')}: {str(e)}")
+
+    return alerts
+
+
+def check_condition_based_alerts(vehicle: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+    """Check for condition-based alerts based on vehicle age and usage"""
+    alerts = []
+
+    try:
+        # Check vehicle age (assuming purchase date indicates age)
+        if vehicle.get('purchaseDate'):
+            purchase_date = datetime.strptime(vehicle['purchaseDate'], '%Y-%m-%d')
+            vehicle_age_years = (now - purchase_date).days / 365
+
+            # Alert for older vehicles that might need more frequent maintenance
+            if vehicle_age_years > 5:
+                alerts.append(_alert(
+                    vehicle, 'condition_based', 'medium',
+                    title='Aging Vehicle Maintenance Check',
+                    description=f'Vehicle is {vehicle_age_years:.1f} years old and may need additional maintenance',
+                    component='General',
+                    predicted_date=(now + timedelta(days=30)).strftime('%Y-%m-%d'),
+                    confidence=70.0,
+                    action='Schedule comprehensive vehicle inspection',
+                    cost=800.0
+                ))
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error checking condition alerts for vehicle {vehicle.get('id')}: {str(e)}")
+
+    return alerts
+
+
+def evaluate_vehicle_chunk(vehicles: List[Dict[str, Any]], schedules_by_plate: Dict[str, List[ScheduleFields]],
+                           now: datetime, thresholds: Dict = DEFAULT_ALERT_THRESHOLDS) -> List[Dict[str, Any]]:
+    """Run every alert rule over a chunk of vehicles"""
+    alerts = []
+    for vehicle in vehicles:
+        if vehicle.get('mileage') and vehicle.get('nextPM'):
+            alerts.extend(check_mileage_based_alerts(vehicle, now, thresholds))
+        alerts.extend(check_time_based_alerts(vehicle, schedules_by_plate.get(vehicle.get('plate'), []), now, thresholds))
+        alerts.extend(check_condition_based_alerts(vehicle, now))
+    return alerts
+
+
+# ---------------- health score ----------------
+
+# Vehicle fields the health score depends on
+HEALTH_INPUT_FIELDS = ('mileage', 'nextPM', 'purchaseDate')
+
+
+@lru_cache(maxsize=4096)
+def _parse_purchase_date(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def health_status(score: float) -> Tuple[str, str]:
+    """(healthStatus, riskLevel) for an overall score"""
+    if score >= 90:
+        return 'Excellent', 'Low'
+    if score >= 75:
+        return 'Good', 'Low'
+    if score >= 60:
+        return 'Fair', 'Medium'
+    if score >= 40:
+        return 'Poor', 'High'
+    return 'Critical', 'High'
+
+
+def compute_health_score(vehicle: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """Overall health score for a vehicle dict, shaped like AssetHealthScore"""
+    score = 100.0
+    components = {}
+    recommendations = []
+    mileage = None
+    age_years = None
+
+    try:
+        # Mileage score (lower mileage = higher score)
+        if vehicle.get('mileage'):
+            mileage = float(vehicle['mileage'])
+            if mileage > 200000:
+                score -= 30
+                components['mileage'] = 40
+                recommendations.append('High mileage - consider major service')
+            elif mileage > 100000:
+                score -= 15
+                components['mileage'] = 70
+                recommendations.append('Medium mileage - schedule maintenance')
+            else:
+                components['mileage'] = 90
+
+        # Age score
+        if vehicle.get('purchaseDate'):
+            purchase_date = _parse_purchase_date(vehicle['purchaseDate'])
+            age_years = (now - purchase_date).days / 365
+            if age_years > 7:
+                score -= 25
+                components['age'] = 50
+                recommendations.append('Older vehicle - increased maintenance frequency recommended')
+            elif age_years > 4:
+                score -= 10
+                components['age'] = 75
+            else:
+                components['age'] = 95
+
+        # Maintenance status score
+        if vehicle.get('nextPM'):
+            next_pm = float(vehicle['nextPM'])
+            current_mileage = mileage or 0
+            if next_pm > 0:
+                remaining = next_pm - current_mileage
+                if remaining < 1000:
+                    score -= 20
+                    components['maintenance'] = 60
+                    recommendations.append('Maintenance overdue - schedule immediately')
+                elif remaining < 5000:
+                    score -= 10
+                    components['maintenance'] = 80
+                else:
+                    components['maintenance'] = 95
+
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error calculating health score for vehicle {vehicle.get('id')}: {str(e)}")
+        score = 50.0
+        components = {'error': 50}
+        recommendations = ['Unable to calculate health score']
+
+    score = max(0, min(100, score))
+    status, risk = health_status(score)
+    return {
+        'assetId': vehicle.get('id') or '',
+        'assetType': 'Vehicle',
+        'assetName': f"{vehicle.get('make')} {vehicle.get('model')} ({vehicle.get('plate')})",
+        'overallScore': score,
+        'components': components,
+        'mileage': mileage,
+        'age': int(age_years) if age_years is not None else None,
+        'recommendations': recommendations,
+        'healthStatus': status,
+        'riskLevel': risk,
+        'calculatedAt': now
+    }
 
-        try:
-            # Check vehicle age (assuming purchase date indicates age)
-            if vehicle.purchaseDate:
-                purchase_date = datetime.strptime(vehicle.purchaseDate, '%Y-%m-%d')
-                vehicle_age_years = (datetime.now() - purchase_date).days / 365
-
-                # Alert for older vehicles that might need more frequent maintenance
-                if vehicle_age_years > 5:
-                    alert = PredictiveMaintenanceAlert(
-                        assetId=vehicle.id or '',
-                        assetType='vehicle',
-                        assetName=f"{vehicle.make} {vehicle.model} ({vehicle.plate})",
-                        alertType='condition_based',
-                        severity='medium',
-                        title='Aging Vehicle Maintenance Check',
-                        description=f'Vehicle is {vehicle_age_years:.1f} years old and may need additional maintenance',
-                        predictedFailureDate=(datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
-                        confidence=70.0,
-                        recommendedAction='Schedule comprehensive vehicle inspection',
-                        estimatedCost=800.0
-                    )
-                    alerts.append(alert)
 
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error checking condition alerts for vehicle {vehicle.id}: {str(e)}")
+class MaintenanceAlertService:
+    def __init__(self, chunk_size: int = ANALYSIS_CHUNK_SIZE, workers: int = ANALYSIS_WORKERS):
+        self.alert_thresholds = DEFAULT_ALERT_THRESHOLDS
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def evaluate_vehicles(self, vehicles: List[Dict[str, Any]],
+                                schedules_by_plate: Dict[str, List[ScheduleFields]]) -> List[Dict[str, Any]]:
+        """Evaluate vehicle dicts in chunks, across the process pool when one is configured"""
+        now = datetime.now()
+        chunks = [vehicles[i:i + self.chunk_size] for i in range(0, len(vehicles), self.chunk_size)]
+
+        pool = self._get_pool()
+        if pool is None:
+            alerts = []
+            for chunk in chunks:
+                alerts.extend(evaluate_vehicle_chunk(chunk, schedules_by_plate, now, self.alert_thresholds))
+                # Let other requests run between chunks
+                await asyncio.sleep(0)
+            return alerts
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                pool, evaluate_vehicle_chunk, chunk,
+                # Ship each worker only the schedules for its own vehicles
+                {v.get('plate'): schedules_by_plate[v.get('plate')] for v in chunk if v.get('plate') in schedules_by_plate},
+                now, self.alert_thresholds
+            )
+            for chunk in chunks
+        ))
+        return [alert for chunk_alerts in results for alert in chunk_alerts]
 
-        return alerts
+    async def analyze_vehicle_maintenance(self, vehicles: List[Vehicle], schedules: List[MaintenanceSchedule]) -> List[PredictiveMaintenanceAlert]:
+        """Analyze vehicles and generate predictive maintenance alerts"""
+        alerts = await self.evaluate_vehicles(
+            [vehicle.dict() for vehicle in vehicles],
+            index_schedules_by_plate(schedules)
+        )
+        return [PredictiveMaintenanceAlert(**alert) for alert in alerts]
 
     async def calculate_asset_health_score(self, vehicle: Vehicle) -> AssetHealthScore:
         """Calculate overall health score for a vehicle"""
-        score = 100.0
-        components = {}
-        recommendations = []
-
-        try:
-            # Mileage score (lower mileage = higher score)
-            if vehicle.mileage:
-                mileage = float(vehicle.mileage)
-                if mileage > 200000:
-                    score -= 30
-                    components['mileage'] = 40
-                    recommendations.append('High mileage - consider major service')
-                elif mileage > 100000:
-                    score -= 15
-                    components['mileage'] = 70
-                    recommendations.append('Medium mileage - schedule maintenance')
-                else:
-                    components['mileage'] = 90
-
-            # Age score
-            if vehicle.purchaseDate:
-                purchase_date = datetime.strptime(vehicle.purchaseDate, '%Y-%m-%d')
-                age_years = (datetime.now() - purchase_date).days / 365
-                if age_years > 7:
-                    score -= 25
-                    components['age'] = 50
-                    recommendations.append('Older vehicle - increased maintenance frequency recommended')
-                elif age_years > 4:
-                    score -= 10
-                    components['age'] = 75
-                else:
-                    components['age'] = 95
-
-            # Maintenance status score
-            if vehicle.nextPM:
-                next_pm = float(vehicle.nextPM) if vehicle.nextPM else 0
-                current_mileage = float(vehicle.mileage) if vehicle.mileage else 0
-                if next_pm > 0:
-                    remaining = next_pm - current_mileage
-                    if remaining < 1000:
-                        score -= 20
-                        components['maintenance'] = 60
-                        recommendations.append('Maintenance overdue - schedule immediately')
-                    elif remaining < 5000:
-                        score -= 10
-                        components['maintenance'] = 80
-                    else:
-                        components['maintenance'] = 95
-
-            # Determine trend
-            trend = 'stable'
-            if score < 70:
-                trend = 'declining'
-            elif score > 85:
-                trend = 'improving'
-
-            return AssetHealthScore(
-                assetId=vehicle.id or '',
-                assetType='vehicle',
-                overallScore=max(0, min(100, score)),
-                components=components,
-                lastCalculated=datetime.now(),
-                trend=trend,
-                recommendations=recommendations
-            )
-
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error calculating health score for vehicle {vehicle.id}: {str(e)}")
-            return AssetHealthScore(
-                assetId=vehicle.id or '',
-                assetType='vehicle',
-                overallScore=50.0,
-                components={'error': 50},
-                lastCalculated=datetime.now(),
-                trend='stable',
-                recommendations=['Unable to calculate health score']
-            )
+        return AssetHealthScore(**compute_health_score(vehicle.dict(), datetime.now()))
 
-    async def send_maintenance_alerts(self, alerts: List[PredictiveMaintenanceAlert], recipients: List[str]):
-        """Send maintenance alert emails to specified recipients"""
-        for alert in alerts:
-            for recipient in recipients:
-                try:
-                    await send_maintenance_alert_email(
-                        recipient_email=recipient,
-                        alert=alert
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to send maintenance alert email: {str(e)}")
+    async def send_maintenance_alerts(self, alerts: List[PredictiveMaintenanceAlert], recipients: List[str]) -> int:
+        """Queue maintenance alert emails for the specified recipients"""
+        return await send_maintenance_alert_emails(alerts, recipients)
 
 # Global service instance
 maintenance_alert_service = MaintenanceAlertService()
\ No newline at end of file
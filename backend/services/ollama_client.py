@@ -0,0 +1,198 @@
+"""
+Async Ollama client shared by the chatbot endpoints.
+
+Keeps one pooled httpx connection pool for the process, caches the result of
+the /api/tags availability probe behind a small circuit breaker, and exposes
+both a one-shot ``generate`` and a token-by-token ``stream_generate``.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+
+DEFAULT_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "num_predict": 512
+}
+
+
+class OllamaUnavailable(Exception):
+    """Raised when the Ollama server cannot serve a request"""
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        default_model: str = DEFAULT_MODEL,
+        probe_ttl: float = float(os.getenv("OLLAMA_PROBE_TTL", "30")),
+        failure_threshold: int = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3")),
+        cooldown: float = float(os.getenv("OLLAMA_COOLDOWN", "60")),
+        generate_timeout: float = float(os.getenv("OLLAMA_TIMEOUT", "120")),
+        max_connections: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.default_model = default_model
+        self.probe_ttl = probe_ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.generate_timeout = generate_timeout
+        self.max_connections = max_connections
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._probe_lock = asyncio.Lock()
+        self._available: Optional[bool] = None
+        self._probe_expires = 0.0
+        self._failures = 0
+        self._open_until = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.generate_timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------------- circuit breaker ----------------
+
+    def _record_success(self):
+        self._failures = 0
+        self._open_until = 0.0
+        self._available = True
+        self._probe_expires = time.monotonic() + self.probe_ttl
+
+    def _record_failure(self):
+        self._failures += 1
+        self._available = False
+        self._probe_expires = time.monotonic() + self.probe_ttl
+        if self._failures >= self.failure_threshold:
+            self._open_until = time.monotonic() + self.cooldown
+            logger.warning(f"Ollama circuit opened for {self.cooldown}s after {self._failures} failures")
+
+    @property
+    def circuit_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    async def is_available(self) -> bool:
+        """Return the cached availability, re-probing /api/tags once the cache expires"""
+        if self.circuit_open:
+            return False
+        if self._available is not None and time.monotonic() < self._probe_expires:
+            return self._available
+
+        async with self._probe_lock:
+            # Another request may have refreshed the probe while we waited
+            if self._available is not None and time.monotonic() < self._probe_expires:
+                return self._available
+            try:
+                response = await self.client.get("/api/tags", timeout=5.0)
+                if response.status_code == 200:
+                    self._record_success()
+                else:
+                    self._record_failure()
+            except httpx.HTTPError:
+                self._record_failure()
+            return bool(self._available)
+
+    # ---------------- API calls ----------------
+
+    def _payload(self, prompt: str, model: Optional[str], stream: bool, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "model": model or self.default_model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options or DEFAULT_OPTIONS
+        }
+
+    async def list_models(self) -> List[str]:
+        try:
+            response = await self.client.get("/api/tags", timeout=10.0)
+        except httpx.HTTPError as e:
+            self._record_failure()
+            raise OllamaUnavailable(str(e))
+
+        if response.status_code != 200:
+            raise OllamaUnavailable(f"Failed to fetch models: {response.status_code}")
+        self._record_success()
+        return [model['name'] for model in response.json().get('models', [])]
+
+    async def generate(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> str:
+        """Run a non-streaming generation and return the full response text"""
+        try:
+            response = await self.client.post("/api/generate", json=self._payload(prompt, model, False, options))
+        except httpx.HTTPError as e:
+            self._record_failure()
+            raise OllamaUnavailable(str(e))
+
+        if response.status_code != 200:
+            # 404 means the model is not pulled, which is not a server outage
+            if response.status_code != 404:
+                self._record_failure()
+            raise OllamaUnavailable(f"Ollama API error: {response.status_code} - {response.text}")
+
+        try:
+            result = response.json()
+        except json.JSONDecodeError:
+            raise OllamaUnavailable("Invalid JSON response from Ollama")
+        if 'response' not in result:
+            raise OllamaUnavailable("Unexpected response format from Ollama")
+
+        self._record_success()
+        return result['response'].strip()
+
+    async def stream_generate(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Relay tokens from a ``stream: true`` generation as they arrive"""
+        try:
+            async with self.client.stream("POST", "/api/generate", json=self._payload(prompt, model, True, options)) as response:
+                if response.status_code != 200:
+                    if response.status_code != 404:
+                        self._record_failure()
+                    await response.aread()
+                    raise OllamaUnavailable(f"Ollama API error: {response.status_code} - {response.text}")
+
+                self._record_success()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        # One garbled chunk should not cut the reply short
+                        logger.warning(f"Skipping malformed Ollama stream line: {line[:200]!r}")
+                        continue
+                    if chunk.get('error'):
+                        raise OllamaUnavailable(chunk['error'])
+                    token = chunk.get('response')
+                    if token:
+                        yield token
+                    if chunk.get('done'):
+                        break
+        except httpx.HTTPError as e:
+            self._record_failure()
+            raise OllamaUnavailable(str(e))
+
+
+# Global client instance
+ollama_client = OllamaClient()
@@ -1,14 +1,39 @@
+import os
+import uuid
 import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Awaitable, Callable, List, Dict, Optional, Set
 import logging
+from bson import ObjectId
+from pymongo import ReturnDocument
 from models.payroll import PayrollEntry, JournalEntry, JournalLine, PayrollJournalBatch, Employee
 from email_service import send_payroll_journal_notification
+from services.payroll_rollups import payroll_rollup_service
+from services.index_registry import index_registry
 
 logger = logging.getLogger(__name__)
 
+# Payroll entries posted per insert_many / checkpoint
+JOURNAL_POST_CHUNK_SIZE = int(os.getenv("PAYROLL_JOURNAL_CHUNK_SIZE", "1000"))
+# Journal entries listed in the posting notification email
+NOTIFICATION_ENTRY_LIMIT = 50
+# A "Processing" batch whose lease is older than this is treated as abandoned
+JOURNAL_LEASE_SECONDS = int(os.getenv("PAYROLL_JOURNAL_LEASE_SECONDS", "300"))
+
+index_registry.declare('journal_entries', [("batchId", 1), ("reference", 1)])
+index_registry.declare('journal_entries', 'reference')
+index_registry.declare('payroll_entries', [("payrollPeriodId", 1), ("status", 1)])
+index_registry.declare('payroll_journal_batches', 'payrollPeriodId')
+
+
+class JournalLeaseLost(Exception):
+    """Raised when another run has claimed the batch being posted"""
+
+
 class PayrollJournalService:
-    def __init__(self):
+    def __init__(self, chunk_size: int = JOURNAL_POST_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
         # Standard chart of accounts for payroll
         self.chart_of_accounts = {
             'salary_expense': '5001',
@@ -25,101 +50,286 @@ class PayrollJournalService:
             'accrued_payroll': '2101'
         }
 
-    async def process_payroll_journal(self, payroll_period_id: str, approved_by: str) -> PayrollJournalBatch:
-        """Process payroll entries and create journal entries for a payroll period"""
+    async def process_payroll_journal(self, payroll_period_id: str, approved_by: str,
+                                      resume_batch_id: Optional[str] = None,
+                                      progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+                                      lease_owner: Optional[str] = None) -> PayrollJournalBatch:
+        """Process payroll entries and create journal entries for a payroll period.
+
+        Approved entries are posted in chunks: employees for a chunk are fetched
+        with one ``$in`` query and its journal entries are written with one
+        ``insert_many``. Progress is checkpointed on the batch after every chunk,
+        so passing ``resume_batch_id`` continues a failed run from its last chunk.
+
+        A run holds a lease on its batch and renews it with every chunk. Resuming
+        claims the batch atomically, and only an "Error" batch or a "Processing"
+        batch whose lease has expired can be claimed; ``lease_owner`` is the
+        owner of a claim already made with ``claim_journal_batch``.
+        """
+        from database import db
+        batch = None
+        lease_owner = lease_owner or uuid.uuid4().hex
         try:
-            # Get all approved payroll entries for the period
-            from database import db
-            payroll_entries = []
-            async for entry in db.payroll_entries.find({
-                "payrollPeriodId": payroll_period_id,
-                "status": "Approved"
-            }):
-                entry["_id"] = str(entry["_id"])
-                entry["id"] = entry["_id"]
-                payroll_entries.append(PayrollEntry(**entry))
-
-            if not payroll_entries:
-                raise ValueError(f"No approved payroll entries found for period {payroll_period_id}")
-
-            # Create journal batch
-            batch = PayrollJournalBatch(
-                batchNumber=f"PJ-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-                payrollPeriodId=payroll_period_id,
-                description=f"Automated Payroll Journal - {payroll_period_id}",
-                totalEntries=len(payroll_entries),
-                status="Processing",
-                createdBy=approved_by
-            )
-
-            # Save batch
-            batch_dict = batch.dict(exclude_unset=True)
-            result = await db.payroll_journal_batches.insert_one(batch_dict)
-            batch.id = str(result.inserted_id)
-
-            # Process each payroll entry
-            journal_entries = []
-            total_amount = 0.0
-
-            for entry in payroll_entries:
-                journal_entry = await self._create_journal_entry(entry)
-                if journal_entry:
-                    journal_entries.append(journal_entry)
-                    total_amount += entry.netPay
-
-                    # Save journal entry
-                    entry_dict = journal_entry.dict(exclude_unset=True)
-                    entry_result = await db.journal_entries.insert_one(entry_dict)
-                    journal_entry.id = str(entry_result.inserted_id)
-                    batch.journalEntries.append(journal_entry.id)
-
-            # Update batch totals
-            batch.totalAmount = total_amount
-            batch.totalEntries = len(journal_entries)
+            if resume_batch_id:
+                batch = await self._load_resumable_batch(db, resume_batch_id, lease_owner)
+            else:
+                # Count all approved payroll entries for the period
+                total_entries = await db.payroll_entries.count_documents({
+                    "payrollPeriodId": payroll_period_id,
+                    "status": "Approved"
+                })
+
+                if not total_entries:
+                    raise ValueError(f"No approved payroll entries found for period {payroll_period_id}")
+
+                # Create journal batch
+                batch = PayrollJournalBatch(
+                    batchNumber=f"PJ-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
+                    payrollPeriodId=payroll_period_id,
+                    description=f"Automated Payroll Journal - {payroll_period_id}",
+                    totalEntries=total_entries,
+                    status="Processing",
+                    leaseOwner=lease_owner,
+                    leaseExpiresAt=self._lease_expiry(),
+                    createdBy=approved_by
+                )
 
-            if journal_entries:
+                # Save batch
+                batch_dict = batch.dict(exclude_unset=True)
+                result = await db.payroll_journal_batches.insert_one(batch_dict)
+                batch.id = str(result.inserted_id)
+
+            # Stream the approved entries after the last checkpoint in _id order
+            entry_filter = {"payrollPeriodId": batch.payrollPeriodId, "status": "Approved"}
+            if batch.lastCheckpoint:
+                entry_filter["_id"] = {"$gt": self._as_object_id(batch.lastCheckpoint)}
+
+            resuming = bool(resume_batch_id)
+            chunk = []
+            async for entry in db.payroll_entries.find(entry_filter).sort("_id", 1).batch_size(self.chunk_size):
+                chunk.append(entry)
+                if len(chunk) >= self.chunk_size:
+                    await self._post_chunk(db, batch, chunk, resuming, progress_callback)
+                    chunk = []
+            if chunk:
+                await self._post_chunk(db, batch, chunk, resuming, progress_callback)
+
+            # Update batch totals from the posted journal entries
+            batch.journalEntries = [
+                str(doc["_id"]) async for doc in db.journal_entries.find({"batchId": batch.id}, {"_id": 1})
+            ]
+            batch.totalEntries = len(batch.journalEntries)
+
+            if batch.journalEntries:
                 batch.status = "Posted"
                 batch.postedAt = datetime.now()
             else:
                 batch.status = "Error"
                 batch.errorLog.append("No journal entries were created")
-
-            # Update batch in database
-            await db.payroll_journal_batches.replace_one(
-                {"_id": result.inserted_id},
-                batch.dict(exclude_unset=True)
+            batch.updatedAt = datetime.now()
+            batch.leaseOwner = None
+            batch.leaseExpiresAt = None
+
+            # Update batch in database once with the final state, releasing the lease
+            result = await db.payroll_journal_batches.update_one(
+                {"_id": self._as_object_id(batch.id), "leaseOwner": lease_owner},
+                {"$set": batch.dict(exclude_unset=True, exclude={"id"})}
             )
+            if not result.matched_count:
+                raise JournalLeaseLost(f"Payroll journal batch {batch.batchNumber} was claimed by another run")
+
+            if batch.status == "Posted":
+                await payroll_rollup_service.journal_posted(batch.payrollPeriodId, batch.totalEntries, batch.totalAmount)
 
             # Send notification
-            await self._send_journal_notification(batch, journal_entries)
+            await self._send_journal_notification(batch, await self._notification_entries(db, batch.id))
 
             return batch
 
         except Exception as e:
             logger.error(f"Error processing payroll journal: {str(e)}")
-            # Update batch with error status
-            if 'batch' in locals():
+            # Update batch with error status, keeping its checkpoint for a resume.
+            # A run that lost its lease leaves the batch to the run that claimed it.
+            if batch is not None and batch.id:
                 batch.status = "Error"
                 batch.errorLog.append(str(e))
-                await db.payroll_journal_batches.replace_one(
-                    {"_id": batch.id} if hasattr(batch, 'id') else {},
-                    batch.dict(exclude_unset=True)
+                await db.payroll_journal_batches.update_one(
+                    {"_id": self._as_object_id(batch.id), "leaseOwner": lease_owner},
+                    {
+                        "$set": {"status": "Error", "leaseOwner": None, "leaseExpiresAt": None, "updatedAt": datetime.now()},
+                        "$push": {"errorLog": str(e)}
+                    }
                 )
             raise
 
+    @staticmethod
+    def _lease_expiry() -> datetime:
+        return datetime.now() + timedelta(seconds=JOURNAL_LEASE_SECONDS)
+
+    async def claim_journal_batch(self, batch_id: str, lease_owner: str) -> Optional[dict]:
+        """Atomically claim a failed or abandoned batch for ``lease_owner``.
+
+        Returns the claimed batch document, or None when the batch does not
+        exist, is already finished, or another run still holds its lease.
+        """
+        from database import db
+        now = datetime.now()
+        return await db.payroll_journal_batches.find_one_and_update(
+            {
+                "_id": self._as_object_id(batch_id),
+                "$or": [
+                    {"status": "Error"},
+                    {"status": "Processing", "leaseExpiresAt": {"$lt": now}},
+                    # Batches started before leases existed: fall back to the checkpoint heartbeat
+                    {
+                        "status": "Processing",
+                        "leaseExpiresAt": None,
+                        "updatedAt": {"$not": {"$gte": now - timedelta(seconds=JOURNAL_LEASE_SECONDS)}}
+                    }
+                ]
+            },
+            {"$set": {
+                "status": "Processing",
+                "leaseOwner": lease_owner,
+                "leaseExpiresAt": self._lease_expiry(),
+                "updatedAt": now
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _load_resumable_batch(self, db, batch_id: str, lease_owner: str) -> PayrollJournalBatch:
+        # Either the caller already claimed the batch for this owner, or claim it now
+        batch_data = await db.payroll_journal_batches.find_one(
+            {"_id": self._as_object_id(batch_id), "status": "Processing", "leaseOwner": lease_owner}
+        )
+        if not batch_data:
+            batch_data = await self.claim_journal_batch(batch_id, lease_owner)
+        if not batch_data:
+            current = await db.payroll_journal_batches.find_one({"_id": self._as_object_id(batch_id)}, {"status": 1})
+            if not current:
+                raise ValueError(f"Payroll journal batch not found: {batch_id}")
+            raise ValueError(
+                f"Payroll journal batch {batch_id} is {current.get('status')} and cannot be resumed"
+                + (" while another run holds its lease" if current.get("status") == "Processing" else "")
+            )
+
+        batch_data["_id"] = str(batch_data["_id"])
+        batch_data["id"] = batch_data["_id"]
+        batch = PayrollJournalBatch(**batch_data)
+        logger.info(f"Resuming payroll journal batch {batch.batchNumber} after {batch.processedEntries} entries")
+        return batch
+
+    async def _renew_lease(self, db, batch: PayrollJournalBatch, update: Optional[dict] = None):
+        """Extend the batch lease, failing if another run has taken the batch over"""
+        update = update or {}
+        update.setdefault("$set", {}).update({"leaseExpiresAt": self._lease_expiry(), "updatedAt": datetime.now()})
+        result = await db.payroll_journal_batches.update_one(
+            {"_id": self._as_object_id(batch.id), "leaseOwner": batch.leaseOwner},
+            update
+        )
+        if not result.matched_count:
+            raise JournalLeaseLost(f"Payroll journal batch {batch.batchNumber} was claimed by another run")
+
+    async def _post_chunk(self, db, batch: PayrollJournalBatch, chunk: List[dict], resuming: bool,
+                          progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None):
+        """Post one chunk of payroll entries and checkpoint the batch after it"""
+        last_id = str(chunk[-1]["_id"])
+        payroll_entries = []
+        for entry in chunk:
+            entry["_id"] = str(entry["_id"])
+            entry["id"] = entry["_id"]
+            payroll_entries.append(PayrollEntry(**entry))
+
+        employees = await self._prefetch_employees(db, {entry.employeeId for entry in payroll_entries})
+
+        # A resumed chunk may have been partly written before the failure
+        already_posted = set()
+        if resuming:
+            async for doc in db.journal_entries.find(
+                {"batchId": batch.id, "reference": {"$in": [entry.id for entry in payroll_entries]}},
+                {"reference": 1}
+            ):
+                already_posted.add(doc["reference"])
+
+        journal_docs = []
+        chunk_amount = 0.0
+        for entry in payroll_entries:
+            if entry.id in already_posted:
+                chunk_amount += entry.netPay
+                continue
+
+            employee = employees.get(entry.employeeId)
+            if employee is None:
+                logger.error(f"Employee not found: {entry.employeeId}")
+                continue
+
+            journal_entry = self._build_journal_entry(entry, employee)
+            if journal_entry:
+                journal_entry.batchId = batch.id
+                journal_docs.append(journal_entry.dict(exclude_unset=True))
+                chunk_amount += entry.netPay
+
+        if journal_docs:
+            # Make sure the lease is still ours right before writing
+            await self._renew_lease(db, batch)
+            await db.journal_entries.insert_many(journal_docs, ordered=False)
+
+        # Checkpoint: later chunks start after this one if the run fails
+        await self._renew_lease(db, batch, {
+            "$set": {"lastCheckpoint": last_id},
+            "$inc": {"processedEntries": len(chunk), "totalAmount": chunk_amount}
+        })
+        batch.processedEntries += len(chunk)
+        batch.totalAmount += chunk_amount
+        batch.lastCheckpoint = last_id
+
+        logger.info(f"Payroll journal {batch.batchNumber}: {batch.processedEntries}/{batch.totalEntries} entries processed")
+        if progress_callback:
+            await progress_callback(batch.processedEntries, batch.totalEntries)
+
+    async def _prefetch_employees(self, db, employee_ids: Set[str]) -> Dict[str, Employee]:
+        """Load every employee referenced by a chunk with a single ``$in`` query"""
+        lookup = list(employee_ids) + [ObjectId(i) for i in employee_ids if ObjectId.is_valid(i)]
+        employees = {}
+        async for employee_data in db.employees.find({"_id": {"$in": lookup}}):
+            try:
+                employee = Employee(**employee_data)
+            except Exception as e:
+                logger.error(f"Invalid employee record {employee_data['_id']}: {str(e)}")
+                continue
+            employee.id = str(employee_data["_id"])
+            employees[employee.id] = employee
+        return employees
+
+    async def _notification_entries(self, db, batch_id: str) -> List[dict]:
+        return [entry async for entry in db.journal_entries.find(
+            {"batchId": batch_id},
+            {"entryNumber": 1, "description": 1, "totalDebit": 1, "totalCredit": 1}
+        ).limit(NOTIFICATION_ENTRY_LIMIT)]
+
+    @staticmethod
+    def _as_object_id(value: str):
+        return ObjectId(value) if ObjectId.is_valid(value) else value
+
     async def _create_journal_entry(self, payroll_entry: PayrollEntry) -> Optional[JournalEntry]:
         """Create a journal entry from a payroll entry"""
         try:
             # Get employee information
             from database import db
-            employee_data = await db.employees.find_one({"_id": payroll_entry.employeeId})
-            if not employee_data:
+            employee = (await self._prefetch_employees(db, {payroll_entry.employeeId})).get(payroll_entry.employeeId)
+            if not employee:
                 logger.error(f"Employee not found: {payroll_entry.employeeId}")
                 return None
 
-            employee = Employee(**employee_data)
-            employee.id = str(employee_data["_id"])
+            return self._build_journal_entry(payroll_entry, employee)
 
+        except Exception as e:
+            logger.error(f"Error creating journal entry for payroll {payroll_entry.id}: {str(e)}")
+            return None
+
+    def _build_journal_entry(self, payroll_entry: PayrollEntry, employee: Employee) -> Optional[JournalEntry]:
+        """Build the journal entry for a payroll entry in memory"""
+        try:
             # Create journal lines
             lines = []
 
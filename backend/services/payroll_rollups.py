@@ -0,0 +1,208 @@
+"""
+Materialized payroll rollups for the payroll dashboard.
+
+Totals are kept in the ``payroll_summaries`` collection and updated with
+``$inc`` as employees and payroll entries are created, approved and posted:
+
+- ``global``: headcount and payroll entries pending approval (status "Draft");
+- ``month:YYYY-MM``: net/gross pay and entry count by the month entries were created;
+- ``period:<payrollPeriodId>``: net/gross pay, entry counts and posted journal
+  batches for one payroll period.
+
+The dashboard reads a couple of these documents instead of scanning payroll
+entries. The rollups are rebuilt from the source collections the first time
+they are read (until a rebuild has stamped ``rebuiltAt`` on the global rollup),
+and on demand.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ReplaceOne
+from database import db
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = 'global'
+
+
+def month_key(value: Any = None) -> str:
+    """Rollup key for the month of a datetime or ISO date string (now when missing)"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            value = None
+    if not isinstance(value, datetime):
+        # Same clock as the ObjectId timestamps rebuild() falls back to
+        value = datetime.utcnow()
+    return f"month:{value.strftime('%Y-%m')}"
+
+
+def period_key(payroll_period_id: str) -> str:
+    return f"period:{payroll_period_id}"
+
+
+class PayrollRollupService:
+    def __init__(self):
+        self.summaries = db.payroll_summaries
+        self.employees = db.employees
+        self.entries = db.payroll_entries
+        self.batches = db.payroll_journal_batches
+
+        self._built = False
+        self._rebuild_lock = asyncio.Lock()
+
+    # ---------------- incremental updates ----------------
+
+    async def _inc(self, key: str, fields: Dict[str, float]):
+        # A failed rollup update must not fail the write it follows; rebuild() repairs drift
+        try:
+            await self.summaries.update_one(
+                {'_id': key},
+                {'$inc': fields, '$set': {'updatedAt': datetime.now()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not update payroll rollup {key}: {str(e)}")
+
+    async def employee_created(self):
+        await self._inc(GLOBAL_KEY, {'headcount': 1})
+
+    async def entry_created(self, entry: Dict[str, Any]):
+        """Count a newly inserted payroll entry (as stored) into its month and period"""
+        net_pay = entry.get('netPay', 0.0)
+        gross_pay = entry.get('grossPay', 0.0)
+        pending = 1 if entry.get('status') == 'Draft' else 0
+        approved = 1 if entry.get('status') == 'Approved' else 0
+
+        await self._inc(month_key(entry.get('createdAt')), {'net_pay': net_pay, 'gross_pay': gross_pay, 'entries': 1})
+        await self._inc(period_key(entry.get('payrollPeriodId')), {
+            'net_pay': net_pay,
+            'gross_pay': gross_pay,
+            'entries': 1,
+            'pending_approvals': pending,
+            'approved_entries': approved
+        })
+        if pending:
+            await self._inc(GLOBAL_KEY, {'pending_approvals': 1})
+
+    async def entry_approved(self, previous: Dict[str, Any]):
+        """Move an entry from its previous status into the approved counts"""
+        status = previous.get('status')
+        if status == 'Approved':
+            return
+
+        period_fields = {'approved_entries': 1}
+        if status == 'Draft':
+            period_fields['pending_approvals'] = -1
+            await self._inc(GLOBAL_KEY, {'pending_approvals': -1})
+        await self._inc(period_key(previous.get('payrollPeriodId')), period_fields)
+
+    async def journal_posted(self, payroll_period_id: str, entries: int, amount: float):
+        await self._inc(period_key(payroll_period_id), {
+            'journal_batches_posted': 1,
+            'journal_entries_posted': entries,
+            'journal_amount_posted': amount
+        })
+
+    async def journal_approved(self, payroll_period_id: str, entries: int):
+        await self._inc(period_key(payroll_period_id), {'journal_entries_approved': entries})
+
+    # ---------------- rebuild ----------------
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """Recompute every rollup from the source collections"""
+        async with self._rebuild_lock:
+            started = datetime.now()
+            rollups: Dict[str, Dict[str, Any]] = {
+                GLOBAL_KEY: {
+                    'headcount': await self.employees.count_documents({}),
+                    'pending_approvals': await self.entries.count_documents({'status': 'Draft'})
+                }
+            }
+
+            # Entries without createdAt fall back to their _id timestamp, the incremental path uses insert time
+            created = {'$toDate': {'$ifNull': ['$createdAt', '$_id']}}
+            month_pipeline = [
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m', 'date': created}},
+                    'net_pay': {'$sum': '$netPay'},
+                    'gross_pay': {'$sum': '$grossPay'},
+                    'entries': {'$sum': 1}
+                }}
+            ]
+            async for month in self.entries.aggregate(month_pipeline, allowDiskUse=True):
+                rollups[f"month:{month.pop('_id')}"] = month
+
+            period_pipeline = [
+                {'$group': {
+                    '_id': '$payrollPeriodId',
+                    'net_pay': {'$sum': '$netPay'},
+                    'gross_pay': {'$sum': '$grossPay'},
+                    'entries': {'$sum': 1},
+                    'pending_approvals': {'$sum': {'$cond': [{'$eq': ['$status', 'Draft']}, 1, 0]}},
+                    'approved_entries': {'$sum': {'$cond': [{'$eq': ['$status', 'Approved']}, 1, 0]}}
+                }}
+            ]
+            async for period in self.entries.aggregate(period_pipeline, allowDiskUse=True):
+                rollups[period_key(period.pop('_id'))] = period
+
+            batch_pipeline = [
+                {'$match': {'status': 'Posted'}},
+                {'$group': {
+                    '_id': '$payrollPeriodId',
+                    'journal_batches_posted': {'$sum': 1},
+                    'journal_entries_posted': {'$sum': {'$size': {'$ifNull': ['$journalEntries', []]}}},
+                    'journal_amount_posted': {'$sum': '$totalAmount'},
+                    'journal_entries_approved': {'$sum': {'$ifNull': ['$approvalMetrics.entries', 0]}}
+                }}
+            ]
+            async for batch in self.batches.aggregate(batch_pipeline, allowDiskUse=True):
+                rollups.setdefault(period_key(batch.pop('_id')), {}).update(batch)
+
+            await self.summaries.bulk_write([
+                ReplaceOne({'_id': key}, {**fields, 'updatedAt': started, 'rebuiltAt': started}, upsert=True)
+                for key, fields in rollups.items()
+            ], ordered=False)
+            await self.summaries.delete_many({'_id': {'$nin': list(rollups)}})
+
+            self._built = True
+            logger.info(f"Rebuilt {len(rollups)} payroll rollups")
+            return {'rollups': len(rollups), 'rebuilt_at': started}
+
+    async def _ensure_built(self):
+        if self._built:
+            return
+        # Incremental updates upsert the global rollup too, so only rebuild()'s marker proves a build
+        if await self.summaries.find_one({'_id': GLOBAL_KEY, 'rebuiltAt': {'$exists': True}}, {'_id': 1}):
+            self._built = True
+        else:
+            await self.rebuild()
+
+    # ---------------- reads ----------------
+
+    async def get_dashboard_totals(self, month: Optional[datetime] = None) -> Dict[str, Any]:
+        """Headcount, pending approvals and the month's payroll totals from two rollup documents"""
+        await self._ensure_built()
+        totals = await self.summaries.find_one({'_id': GLOBAL_KEY}) or {}
+        monthly = await self.summaries.find_one({'_id': month_key(month)}) or {}
+        return {
+            'total_employees': totals.get('headcount', 0),
+            'pending_approvals': totals.get('pending_approvals', 0),
+            'monthly_payroll_total': monthly.get('net_pay', 0),
+            'monthly_gross_total': monthly.get('gross_pay', 0),
+            'monthly_entries': monthly.get('entries', 0)
+        }
+
+    async def get_period_totals(self, payroll_period_id: str) -> Dict[str, Any]:
+        await self._ensure_built()
+        totals = await self.summaries.find_one({'_id': period_key(payroll_period_id)}) or {}
+        totals.pop('_id', None)
+        return totals
+
+
+# Global rollup instance
+payroll_rollup_service = PayrollRollupService()
@@ -0,0 +1,105 @@
+"""
+Periodic sweeps run by the job scheduler.
+
+Each sweep's schedule comes from an environment variable holding
+``interval:<seconds>`` or ``cron:<expression>``. The alert and prediction sweeps
+are incremental and only revisit records changed since their last run, with a
+daily full sweep. Vehicle analysis depends on dates as well as on vehicle data,
+so it is a full sweep on a daily cron schedule; it only stores and emails alerts
+that are not already open. Automation triggers whose condition keeps holding
+are re-executed only after their cooldown. The health-score sweep visits
+every vehicle but only rescores those whose inputs changed or whose score went
+stale. The approval-expiry sweep expires lapsed email approval links in one
+update.
+"""
+
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from services.job_scheduler import Job, JobScheduler, parse_schedule
+
+logger = logging.getLogger(__name__)
+
+JOB_JITTER = float(os.getenv("SCHEDULER_JITTER", "30"))
+FULL_SWEEP_EVERY = float(os.getenv("SCHEDULER_FULL_SWEEP_EVERY", "86400"))
+
+DEBIT_CARD_ALERTS_SCHEDULE = os.getenv("SCHEDULE_DEBIT_CARD_ALERTS", "interval:300")
+VEHICLE_ANALYSIS_SCHEDULE = os.getenv("SCHEDULE_VEHICLE_ANALYSIS", "cron:0 6 * * *")
+MAINTENANCE_PREDICTIONS_SCHEDULE = os.getenv("SCHEDULE_MAINTENANCE_PREDICTIONS", "interval:3600")
+AUTOMATION_TRIGGERS_SCHEDULE = os.getenv("SCHEDULE_AUTOMATION_TRIGGERS", "interval:900")
+ASSET_HEALTH_SCHEDULE = os.getenv("SCHEDULE_ASSET_HEALTH", "cron:30 5 * * *")
+EMAIL_APPROVAL_EXPIRY_SCHEDULE = os.getenv("SCHEDULE_EMAIL_APPROVAL_EXPIRY", "interval:900")
+
+
+async def debit_card_alerts(since: Optional[datetime]) -> Dict[str, Any]:
+    from routes.debit_card_router import sweep_card_alerts
+    return await sweep_card_alerts(since)
+
+
+async def vehicle_maintenance_analysis(since: Optional[datetime]) -> Dict[str, Any]:
+    from routes.maintenance_alert_router import analyze_fleet, send_alert_notifications, DEFAULT_ALERT_RECIPIENTS
+    alerts = await analyze_fleet()
+    if alerts:
+        await send_alert_notifications(alerts, DEFAULT_ALERT_RECIPIENTS)
+    return {"alerts_created": len(alerts)}
+
+
+async def maintenance_predictions(since: Optional[datetime]) -> Dict[str, Any]:
+    from routes.predictive_maintenance_router import generate_predictions
+    alerts = await generate_predictions(since)
+    return {"alerts_created": len(alerts)}
+
+
+async def automation_triggers(since: Optional[datetime]) -> Dict[str, Any]:
+    from services.ai_service import ai_service
+    result = await ai_service.check_automation_triggers()
+    if not result.get('success'):
+        raise RuntimeError(result.get('message', 'Automation trigger check failed'))
+    return {
+        "triggers_checked": result['triggers_checked'],
+        "triggers_executed": result['triggers_executed'],
+        "triggers_cooling_down": result['triggers_cooling_down']
+    }
+
+
+async def asset_health_scores(since: Optional[datetime]) -> Dict[str, Any]:
+    from services.asset_health import asset_health_service
+    return await asset_health_service.refresh()
+
+
+async def email_approval_expiry(since: Optional[datetime]) -> Dict[str, Any]:
+    from services.approval_store import approval_store
+    return await approval_store.expire_stale()
+
+
+def register_default_jobs(scheduler: JobScheduler) -> JobScheduler:
+    """Register the alert, analysis, prediction, automation, health-score and approval-expiry sweeps"""
+    scheduler.register(Job(
+        'debit_card_alerts', debit_card_alerts,
+        parse_schedule(DEBIT_CARD_ALERTS_SCHEDULE, JOB_JITTER),
+        incremental=True, full_sweep_every=FULL_SWEEP_EVERY
+    ))
+    scheduler.register(Job(
+        'vehicle_maintenance_analysis', vehicle_maintenance_analysis,
+        parse_schedule(VEHICLE_ANALYSIS_SCHEDULE, JOB_JITTER)
+    ))
+    scheduler.register(Job(
+        'maintenance_predictions', maintenance_predictions,
+        parse_schedule(MAINTENANCE_PREDICTIONS_SCHEDULE, JOB_JITTER),
+        incremental=True, full_sweep_every=FULL_SWEEP_EVERY
+    ))
+    scheduler.register(Job(
+        'automation_triggers', automation_triggers,
+        parse_schedule(AUTOMATION_TRIGGERS_SCHEDULE, JOB_JITTER)
+    ))
+    scheduler.register(Job(
+        'asset_health_scores', asset_health_scores,
+        parse_schedule(ASSET_HEALTH_SCHEDULE, JOB_JITTER)
+    ))
+    scheduler.register(Job(
+        'email_approval_expiry', email_approval_expiry,
+        parse_schedule(EMAIL_APPROVAL_EXPIRY_SCHEDULE, JOB_JITTER)
+    ))
+    return scheduler
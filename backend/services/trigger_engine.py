@@ -0,0 +1,334 @@
+"""
+Automation trigger engine.
+
+Active triggers are compiled into a data dependency plus a predicate over a
+summary of that data:
+
+- ``budget_threshold``: the budget variance forecast for the trigger's
+  department, summarized as the largest absolute expected variance;
+- ``vendor_performance``: vendor reliability scores, summarized as the lowest
+  score;
+- ``maintenance_prediction``: asset maintenance predictions, summarized as the
+  fewest days until maintenance per priority.
+
+A sweep groups triggers by dependency, loads each dependency once
+(concurrently), and checks every trigger against the shared summary, so the
+cost of a sweep no longer grows with the number of triggers. Actions of the
+fired triggers run concurrently; their notification, alert and report records
+go to ``ai_insights`` in one ``insert_many``, and the triggers' check and
+execution bookkeeping is written with ``update_many``. A trigger whose
+condition keeps holding is executed again only once its cooldown
+(``cooldown_seconds`` on the trigger, ``TRIGGER_COOLDOWN_SECONDS`` by default)
+has passed since ``last_executed_at``. ``evaluate`` runs the checks alone,
+without executing actions or writing anything, for read-only views such as
+the AI dashboard.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# Fired triggers whose actions are built at the same time
+TRIGGER_ACTION_CONCURRENCY = int(os.getenv("TRIGGER_ACTION_CONCURRENCY", "50"))
+# Minimum time between two executions of a trigger whose condition keeps holding
+TRIGGER_COOLDOWN_SECONDS = float(os.getenv("TRIGGER_COOLDOWN_SECONDS", "86400"))
+
+# Errors reported per action type when its record could not be written
+ACTION_ERRORS = {
+    'notification': 'Error sending notification',
+    'alert': 'Error creating alert',
+    'report': 'Error generating report'
+}
+
+
+class CompiledTrigger:
+    def __init__(self, trigger: Dict[str, Any], dependency: Optional[Tuple],
+                 predicate: Callable[[Any], bool]):
+        self.id = trigger['_id']
+        self.trigger = trigger
+        self.dependency = dependency
+        self.predicate = predicate
+
+
+def compile_trigger(trigger: Dict[str, Any]) -> CompiledTrigger:
+    """Bind a trigger's conditions into (dependency, predicate over the dependency summary)"""
+    conditions = trigger.get('conditions', {})
+    trigger_type = trigger.get('trigger_type')
+
+    if trigger_type == 'budget_threshold':
+        # Spending variance above the threshold
+        threshold_percentage = conditions.get('threshold_percentage', 20)
+        return CompiledTrigger(
+            trigger, ('budget', conditions.get('department')),
+            lambda max_variance: max_variance is not None and max_variance > threshold_percentage
+        )
+
+    if trigger_type == 'vendor_performance':
+        # Any vendor scoring below the minimum
+        min_score = conditions.get('min_score', 60)
+        return CompiledTrigger(
+            trigger, ('vendors',),
+            lambda lowest_score: lowest_score is not None and lowest_score < min_score
+        )
+
+    if trigger_type == 'maintenance_prediction':
+        # Any asset of the given priority due within the window
+        days_ahead = conditions.get('days_ahead', 30)
+        priority = conditions.get('priority', 'MEDIUM')
+        return CompiledTrigger(
+            trigger, ('maintenance',),
+            lambda soonest: priority in soonest and soonest[priority] <= days_ahead
+        )
+
+    return CompiledTrigger(trigger, None, lambda summary: False)
+
+
+class TriggerEngine:
+    def __init__(self, ai_service, action_concurrency: int = TRIGGER_ACTION_CONCURRENCY):
+        self.ai = ai_service
+        self.triggers = ai_service.collections['automation_triggers']
+        self.insights = ai_service.collections['ai_insights']
+        self.action_concurrency = action_concurrency
+
+    # ---------------- shared data ----------------
+
+    async def _load(self, key: Tuple, snapshot) -> Any:
+        """Load and summarize one dependency (None when it is unavailable)"""
+        kind = key[0]
+
+        if kind == 'budget':
+            data = await self.ai.predict_budget_variance(department=key[1], months_ahead=1)
+            if not data['success']:
+                return None
+            return max((abs(p.get('expected_variance', 0)) for p in data['predictions']), default=None)
+
+        if kind == 'vendors':
+            # Conditions are only read here; persisting vendor scores is left to the vendor-scoring endpoint
+            data = await self.ai.score_vendor_reliability(snapshot=snapshot, persist=False)
+            return self._lowest_score(data)
+
+        if kind == 'maintenance':
+            data = await self.ai.predict_asset_maintenance()
+            soonest: Dict[str, int] = {}
+            if data['success']:
+                for prediction in data['predictions']:
+                    priority = prediction['priority']
+                    soonest[priority] = min(soonest.get(priority, prediction['days_until_maintenance']),
+                                            prediction['days_until_maintenance'])
+            return soonest
+
+        if kind == 'report':
+            trigger_type = key[1]
+            if trigger_type == 'budget_threshold':
+                return await self.ai.predict_budget_variance(months_ahead=3)
+            if trigger_type == 'vendor_performance':
+                return await self.ai.score_vendor_reliability()
+            if trigger_type == 'maintenance_prediction':
+                return await self.ai.predict_asset_maintenance()
+            return {'message': 'No specific data available for this trigger type'}
+
+        raise ValueError(f"Unknown trigger dependency {key}")
+
+    @staticmethod
+    def _lowest_score(data: Dict[str, Any]) -> Optional[float]:
+        if not data['success']:
+            return None
+        return min((v['reliability_score'] for v in data['scores']), default=None)
+
+    @staticmethod
+    def _shared(loads: Dict[Tuple, asyncio.Task], key: Tuple, load: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        # One load per key per sweep, shared by every trigger and action that needs it
+        if key not in loads:
+            loads[key] = asyncio.ensure_future(load())
+        return loads[key]
+
+    # ---------------- actions ----------------
+
+    async def _build_actions(self, trigger: Dict[str, Any], loads: Dict[Tuple, asyncio.Task],
+                             snapshot) -> List[Tuple[str, Optional[Dict[str, Any]], Dict[str, Any]]]:
+        """(action, ai_insights record, result) for each of a fired trigger's actions"""
+        built = []
+        now = datetime.utcnow()
+
+        for action in trigger.get('actions', []):
+            action_type = action.get('type')
+
+            if action_type == 'send_notification':
+                # In a real implementation, this would send actual notifications
+                # For now, we'll just log and store the notification
+                notification = {
+                    'trigger_id': trigger['_id'],
+                    'trigger_name': trigger['name'],
+                    'message': action.get('message', f'Automation trigger "{trigger["name"]}" has been activated'),
+                    'recipients': action.get('recipients', ['admin']),
+                    'sent_at': now,
+                    'status': 'sent'
+                }
+                record = {'_id': ObjectId(), 'type': 'trigger_notification', 'data': notification, 'created_at': now}
+                built.append(('notification', record, {'success': True, 'message': 'Notification sent successfully'}))
+
+            elif action_type == 'create_alert':
+                record = {
+                    '_id': ObjectId(),
+                    'type': 'automation_trigger',
+                    'trigger_id': trigger['_id'],
+                    'trigger_name': trigger['name'],
+                    'title': action.get('title', f'Automation Alert: {trigger["name"]}'),
+                    'message': action.get('message', 'An automation trigger has been activated'),
+                    'priority': action.get('priority', 'MEDIUM'),
+                    'created_at': now,
+                    'status': 'active'
+                }
+                built.append(('alert', record, {
+                    'success': True,
+                    'alert_id': str(record['_id']),
+                    'message': 'Alert created successfully'
+                }))
+
+            elif action_type == 'generate_report':
+                key = ('report', trigger.get('trigger_type'))
+                try:
+                    report_data = await self._shared(loads, key, lambda: self._load(key, snapshot))
+                except Exception as e:
+                    built.append(('report', None, {'success': False, 'message': f"{ACTION_ERRORS['report']}: {str(e)}"}))
+                    continue
+                report = {
+                    'trigger_id': trigger['_id'],
+                    'trigger_name': trigger['name'],
+                    'report_type': action.get('report_type', 'summary'),
+                    'data': report_data,
+                    'generated_at': now
+                }
+                record = {'_id': ObjectId(), 'type': 'trigger_report', 'data': report, 'created_at': now}
+                built.append(('report', record, {
+                    'success': True,
+                    'report_id': str(record['_id']),
+                    'message': 'Report generated successfully'
+                }))
+
+        return built
+
+    # ---------------- sweep ----------------
+
+    async def evaluate(self, snapshot=None, vendor_scores: Optional[Awaitable[Dict[str, Any]]] = None
+                       ) -> Tuple[List[CompiledTrigger], List[Dict[str, Any]], Dict[Tuple, asyncio.Task]]:
+        """(active triggers, the ones whose conditions hold, loaded dependencies); writes nothing.
+
+        ``vendor_scores`` is a vendor-scoring result the caller already has in
+        flight, used instead of scoring vendors again.
+        """
+        compiled = []
+        async for trigger in self.triggers.find({'is_active': True}):
+            item = compile_trigger(trigger)
+            trigger['_id'] = str(trigger['_id'])
+            compiled.append(item)
+
+        # Each dependency is loaded once, concurrently
+        loads: Dict[Tuple, asyncio.Task] = {}
+        if vendor_scores is not None and any(item.dependency == ('vendors',) for item in compiled):
+            async def lowest_score():
+                return self._lowest_score(await vendor_scores)
+            self._shared(loads, ('vendors',), lowest_score)
+        for item in compiled:
+            if item.dependency is not None:
+                self._shared(loads, item.dependency, lambda key=item.dependency: self._load(key, snapshot))
+        summaries = {}
+        for key, task in loads.items():
+            try:
+                summaries[key] = await task
+            except Exception as e:
+                logger.error(f"Error evaluating trigger conditions ({key[0]}): {str(e)}")
+                summaries[key] = None
+
+        fired = []
+        for item in compiled:
+            if item.dependency is None:
+                continue
+            try:
+                if item.predicate(summaries[item.dependency]):
+                    fired.append(item.trigger)
+            except Exception as e:
+                logger.error(f"Error evaluating trigger conditions: {str(e)}")
+        return compiled, fired, loads
+
+    @staticmethod
+    def _cooling_down(trigger: Dict[str, Any], now: datetime) -> bool:
+        last_executed = trigger.get('last_executed_at')
+        if not isinstance(last_executed, datetime):
+            return False
+        cooldown = trigger.get('cooldown_seconds', TRIGGER_COOLDOWN_SECONDS)
+        return now - last_executed < timedelta(seconds=cooldown)
+
+    async def sweep(self, snapshot=None) -> Dict[str, Any]:
+        """Check every active trigger against shared data and execute the ones that fire"""
+        compiled, firing, loads = await self.evaluate(snapshot)
+
+        # A trigger whose condition still holds is not executed again within its cooldown
+        now = datetime.utcnow()
+        fired = [trigger for trigger in firing if not self._cooling_down(trigger, now)]
+
+        # Build every fired trigger's actions concurrently
+        semaphore = asyncio.Semaphore(self.action_concurrency)
+
+        async def build(trigger):
+            async with semaphore:
+                return await self._build_actions(trigger, loads, snapshot)
+
+        built = await asyncio.gather(*(build(trigger) for trigger in fired))
+
+        # All action records in one write
+        records = [record for actions in built for _, record, _ in actions if record is not None]
+        if records:
+            try:
+                await self.insights.insert_many(records, ordered=False)
+            except Exception as e:
+                logger.error(f"Error writing trigger actions: {str(e)}")
+                for actions in built:
+                    for i, (label, record, _) in enumerate(actions):
+                        if record is not None:
+                            actions[i] = (label, record, {'success': False, 'message': f"{ACTION_ERRORS[label]}: {str(e)}"})
+
+        executed_at = datetime.utcnow()
+        executed_triggers = [{
+            'trigger_id': trigger['_id'],
+            'trigger_name': trigger['name'],
+            'executed_at': executed_at,
+            'result': {
+                'success': True,
+                'actions_executed': len(actions),
+                'results': [{'action': label, 'result': result} for label, _, result in actions]
+            }
+        } for trigger, actions in zip(fired, built)]
+
+        await self._record_sweep(compiled, {trigger['_id'] for trigger in fired}, executed_at)
+
+        return {
+            'success': True,
+            'triggers_checked': len(compiled),
+            'triggers_executed': len(executed_triggers),
+            'triggers_cooling_down': len(firing) - len(fired),
+            'executed_triggers': executed_triggers
+        }
+
+    async def _record_sweep(self, compiled: List[CompiledTrigger], fired_ids: set, at: datetime):
+        # Bookkeeping only; a failure here must not fail the sweep
+        if not compiled:
+            return
+        try:
+            await self.triggers.update_many(
+                {'_id': {'$in': [item.id for item in compiled]}},
+                {'$set': {'last_checked_at': at}}
+            )
+            if fired_ids:
+                await self.triggers.update_many(
+                    {'_id': {'$in': [item.id for item in compiled if item.trigger['_id'] in fired_ids]}},
+                    {'$set': {'last_executed_at': at}, '$inc': {'execution_count': 1}}
+                )
+        except Exception as e:
+            logger.warning(f"Could not record automation trigger sweep: {str(e)}")
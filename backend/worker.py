@@ -0,0 +1,69 @@
+"""
+Standalone worker for the scheduled sweeps.
+
+Runs the job scheduler outside the API process:
+
+    python worker.py                      # run every job on its schedule
+    python worker.py --run debit_card_alerts [--full]   # run one job once and exit
+
+Several workers (and API replicas with SCHEDULER_ENABLED=true) can run at the
+same time; the scheduler's locks make every run single-flight. The worker also
+drains the outbound email queue (EMAIL_QUEUE_WORKERS, 0 to disable).
+"""
+
+import sys
+import json
+import signal
+import asyncio
+import logging
+import argparse
+
+from services.job_scheduler import job_scheduler
+from services.scheduled_jobs import register_default_jobs
+from services.email_queue import email_queue, EMAIL_QUEUE_WORKERS
+from services.index_registry import index_registry
+
+
+async def run_forever():
+    # Indexes of the collections the worker itself uses (the API builds the rest)
+    await index_registry.ensure_all()
+    await job_scheduler.start()
+    await email_queue.start(EMAIL_QUEUE_WORKERS)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    await job_scheduler.stop()
+    await email_queue.stop()
+    await index_registry.stop()
+
+
+async def run_once(job_name: str, full_sweep: bool) -> int:
+    run = await job_scheduler.run_job(job_name, full_sweep=full_sweep, trigger="worker")
+    print(json.dumps(run, default=str, indent=2))
+    return 0 if run['status'] in ('succeeded', 'skipped') else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="UniverserERP background job worker")
+    parser.add_argument("--run", metavar="JOB", help="run one job once and exit")
+    parser.add_argument("--full", action="store_true", help="with --run, do a full instead of incremental sweep")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    register_default_jobs(job_scheduler)
+
+    if args.run:
+        if args.run not in job_scheduler.jobs:
+            parser.error(f"unknown job {args.run!r}, expected one of: {', '.join(job_scheduler.jobs)}")
+        return asyncio.run(run_once(args.run, args.full))
+
+    asyncio.run(run_forever())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
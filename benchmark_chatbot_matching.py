@@ -0,0 +1,100 @@
+import sys
+import os
+import random
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from fuzzywuzzy import fuzz
+
+from routes.chatbot_router import ERPChatbot, ModuleMatchIndex, load_erp_training_data
+
+QUERIES = [
+    "Hi", "payment help", "financial help", "thanks", "bye",
+    "Tell me about HR management", "What is financial management?", "How do I manage fleet?",
+    "Tell me about maintenance", "What is inventory management?",
+    "How many debit cards do we have?", "Count the number of drivers", "How many active vehicles are there?",
+    "Show me all debit cards", "List the drivers", "Show recent sales invoices",
+    "What is the total amount of purchase invoices?", "Show overdue accounts receivable",
+    "How do I create a purchase invoice?", "How do I track shipments?", "Tell me about payroll processing",
+    "How do I approve a capital call?", "What are SPV companies?", "How do I book a travel trip?",
+    "Show low stock inventory items", "How do I schedule vehicle maintenance?",
+    "What does the housing module do?", "How do I add a team member?", "Explain racing payments",
+    "How do I generate a payroll journal?", "Where can I see accounts payable aging?",
+    "How do I set a debit card spending limit?", "What reports are available?", "Help me with abroad staff visas"
+]
+RANDOM_QUERIES = 3000
+
+
+def legacy_best_match(module_keywords, user_lower):
+    # The per-message loop the chatbot used before ModuleMatchIndex
+    best_match = None
+    best_score = 0
+    for module_name in module_keywords.keys():
+        score = fuzz.partial_ratio(user_lower, module_name)
+        if score > best_score and score > 60:
+            best_score = score
+            best_match = module_name
+    if best_score < 70:
+        for module_name, data in module_keywords.items():
+            for feature in data['features']:
+                score = fuzz.partial_ratio(user_lower, feature)
+                if score > best_score and score > 50:
+                    best_score = score
+                    best_match = module_name
+            for question in data['questions']:
+                score = fuzz.partial_ratio(user_lower, question)
+                if score > best_score and score > 60:
+                    best_score = score
+                    best_match = module_name
+    return best_match
+
+
+def scaled(module_keywords, copies):
+    """The training modules repeated under new names, to see how matching scales"""
+    keywords = dict(module_keywords)
+    for i in range(1, copies):
+        for name, data in module_keywords.items():
+            keywords[f"{name} {i}"] = {
+                'features': [f"{feature} {i}" for feature in data['features']],
+                'questions': [f"{question} ({i})" for question in data['questions']],
+                'responses': data['responses']
+            }
+    return keywords
+
+
+def random_queries(module_keywords, count):
+    words = sorted({word for name, data in module_keywords.items()
+                    for text in [name, *data['features'], *data['questions']] for word in text.split()})
+    rng = random.Random(42)
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))) for _ in range(count)]
+
+
+def per_message_us(fn, queries):
+    seconds = min(timeit.repeat(lambda: [fn(q) for q in queries], number=1, repeat=3))
+    return seconds / len(queries) * 1e6
+
+
+def main():
+    training_data = load_erp_training_data()
+    if not training_data:
+        print("ERROR: Failed to load training data")
+        return
+    module_keywords = ERPChatbot(training_data).module_keywords
+    queries = [q.lower() for q in QUERIES]
+
+    print(f"Chatbot module matching benchmark ({len(queries)} sample questions, best of 3)\n")
+    for copies in (1, 4):
+        keywords = scaled(module_keywords, copies)
+        index = ModuleMatchIndex(keywords)
+
+        mismatches = sum(legacy_best_match(keywords, q) != index.best_match(q)
+                         for q in queries + random_queries(keywords, RANDOM_QUERIES))
+        legacy = per_message_us(lambda q: legacy_best_match(keywords, q), queries)
+        indexed = per_message_us(index.best_match, queries)
+        print(f"{len(keywords):3d} modules ({len(index.texts):4d} candidates): "
+              f"{legacy:8.0f} us -> {indexed:6.0f} us per message "
+              f"({legacy / indexed:.1f}x, {mismatches} mismatches)")
+
+
+if __name__ == "__main__":
+    main()
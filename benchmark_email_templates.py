@@ -0,0 +1,83 @@
+import sys
+import os
+import timeit
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from email_service import (
+    FROM_EMAIL, CAPITAL_CALL_TEMPLATE, create_capital_call_alert_html,
+    create_maintenance_alert_html, create_payroll_journal_notification_html, generated_at
+)
+from services.email_templates import SharedMimeBody
+
+RECIPIENTS = 2000
+
+CAPITAL_CALL = {
+    "fund_name": "Growth Fund I",
+    "call_number": "CC-2024-007",
+    "called_amount": 2500000.0,
+    "due_date": "2024-12-31",
+    "purpose": "Follow-on investment",
+    "description": "Second closing of the Series B round"
+}
+
+JOURNAL_ENTRIES = [
+    {"entryNumber": f"JE-{i:04d}", "description": f"Payroll line {i}", "totalDebit": 1234.5 * i, "totalCredit": 1234.5 * i}
+    for i in range(50)
+]
+
+
+def per_recipient_us(label, fn, number=RECIPIENTS):
+    seconds = min(timeit.repeat(fn, number=number, repeat=3))
+    print(f"{label:<58} {seconds / number * 1e6:10.2f} us")
+
+
+def legacy_mime(to, subject, html):
+    # What sending used to cost per recipient: build and serialize a full message
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = FROM_EMAIL
+    msg['To'] = to
+    msg.attach(MIMEText(html, 'html'))
+    return msg.as_string()
+
+
+def main():
+    print(f"Email template render benchmark ({RECIPIENTS} recipients, best of 3)\n")
+
+    per_recipient_us("capital call: full render", lambda: create_capital_call_alert_html(
+        investor_name="Valued Investor", **CAPITAL_CALL))
+
+    bound = CAPITAL_CALL_TEMPLATE.bind(
+        fund_name=CAPITAL_CALL["fund_name"], call_number=CAPITAL_CALL["call_number"],
+        called_amount=CAPITAL_CALL["called_amount"], due_date=CAPITAL_CALL["due_date"],
+        purpose=CAPITAL_CALL["purpose"],
+        description_html=f"<p><strong>Description:</strong> {CAPITAL_CALL['description']}</p>",
+        generated_at=generated_at()
+    )
+    per_recipient_us("capital call: shared variables bound, per-recipient name", lambda: bound.render(
+        investor_name="Valued Investor"))
+
+    per_recipient_us("maintenance alert: full render", lambda: create_maintenance_alert_html(
+        recipient_name="Fleet Manager", asset_name="Truck 12", alert_type="mileage_based", severity="critical",
+        title="Service overdue", description="Mileage past service interval", predicted_date="2024-12-01",
+        recommended_action="Schedule service", estimated_cost=450.0))
+
+    per_recipient_us("payroll journal (50 entries): full render", lambda: create_payroll_journal_notification_html(
+        recipient_name="Accounting Team", batch_number="PJ-001", total_amount=61725.0, total_entries=50,
+        period_name="2024-11", posted_by="system", journal_entries=JOURNAL_ENTRIES), number=RECIPIENTS // 10)
+
+    html = create_capital_call_alert_html(investor_name="Valued Investor", **CAPITAL_CALL)
+    subject = f"Capital Call Notice - {CAPITAL_CALL['fund_name']} ({CAPITAL_CALL['call_number']})"
+    addresses = iter([f"investor{i}@example.com" for i in range(RECIPIENTS * 10)])
+
+    per_recipient_us("MIME: message built per recipient", lambda: legacy_mime(next(addresses), subject, html))
+
+    shared = SharedMimeBody(subject, html, FROM_EMAIL)
+    per_recipient_us("MIME: shared body, per-recipient header", lambda: shared.for_recipient(next(addresses)))
+
+
+if __name__ == "__main__":
+    main()
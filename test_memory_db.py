@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Exercise the in-memory MongoDB engine against the MongoDB semantics our code relies on"""
+
+import sys
+import os
+import asyncio
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from pymongo import InsertOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from memory_db import MemoryClient
+
+
+async def ids(collection, query, **kwargs):
+    return sorted([doc['_id'] async for doc in collection.find(query, **kwargs)])
+
+
+async def run_tests():
+    client = MemoryClient()
+    db = client['test']
+
+    # Null and missing fields
+    people = db.people
+    await people.insert_many([
+        {'_id': 1, 'name': 'Ann', 'manager': None, 'age': 30},
+        {'_id': 2, 'name': 'Bob', 'age': '41'},
+        {'_id': 3, 'name': 'Cy', 'manager': 'Ann', 'age': 25.5, 'tags': ['a', 'b']},
+    ])
+    assert await ids(people, {'manager': {'$in': [None, 'Ann']}}) == [1, 2, 3]
+    assert await ids(people, {'manager': {'$ne': None}}) == [3]
+    assert await ids(people, {'manager': None}) == [1, 2]
+    print("SUCCESS: $in with None and $ne: None treat missing fields as null")
+
+    assert await ids(people, {'$expr': {'$eq': [{'$ifNull': ['$manager', 'none']}, 'none']}}) == [1, 2]
+    assert await ids(people, {'$expr': {'$gt': ['$age', 26]}}) == [1, 2]
+    print("SUCCESS: $expr with $ifNull and BSON-ordered comparisons")
+
+    assert await ids(people, {'age': {'$type': 'string'}}) == [2]
+    assert await ids(people, {'age': {'$type': ['int', 'double']}}) == [1, 3]
+    assert await ids(people, {'manager': {'$type': 'null'}}) == [1]
+    assert await ids(people, {'age': {'$gt': 20}}) == [1, 3]
+    print("SUCCESS: $type aliases and type-bracketed range queries")
+
+    # Unique, partial and sparse indexes
+    users = db.users
+    await users.create_index('email', unique=True)
+    await users.create_index('code', unique=True, sparse=True)
+    await users.create_index('slug', unique=True, partialFilterExpression={'active': True})
+    await users.insert_many([{'email': 'a@x'}, {'email': 'b@x'}])
+    try:
+        await users.insert_one({'email': 'a@x'})
+        raise AssertionError("duplicate email was accepted")
+    except DuplicateKeyError:
+        pass
+    await users.insert_one({'email': 'c@x', 'slug': 'one', 'active': False})
+    await users.insert_one({'email': 'd@x', 'slug': 'one', 'active': True})
+    try:
+        await users.insert_one({'email': 'e@x', 'slug': 'one', 'active': True})
+        raise AssertionError("duplicate active slug was accepted")
+    except DuplicateKeyError:
+        pass
+    await users.insert_one({'email': 'f@x', 'code': 'K'})
+    try:
+        await users.insert_one({'email': 'g@x', 'code': 'K'})
+        raise AssertionError("duplicate code was accepted")
+    except DuplicateKeyError:
+        pass
+    try:
+        await users.update_one({'email': 'b@x'}, {'$set': {'email': 'a@x'}})
+        raise AssertionError("update to a duplicate email was accepted")
+    except DuplicateKeyError:
+        pass
+    print("SUCCESS: unique, sparse and partial indexes reject duplicates they cover")
+
+    # Unordered inserts keep going and report every failure
+    try:
+        await users.insert_many([{'email': 'a@x'}, {'email': 'h@x'}, {'email': 'b@x'}], ordered=False)
+        raise AssertionError("duplicates were accepted")
+    except BulkWriteError as e:
+        errors = e.details['writeErrors']
+        assert [error['index'] for error in errors] == [0, 2], errors
+        assert all(error['code'] == 11000 for error in errors)
+        assert e.details['nInserted'] == 1, e.details
+    assert await users.count_documents({'email': 'h@x'}) == 1
+    try:
+        await users.bulk_write([InsertOne({'email': 'i@x'}), InsertOne({'email': 'i@x'}), InsertOne({'email': 'j@x'})])
+        raise AssertionError("ordered duplicate was accepted")
+    except BulkWriteError as e:
+        assert e.details['nInserted'] == 1 and e.details['writeErrors'][0]['index'] == 1, e.details
+    assert await users.count_documents({'email': 'j@x'}) == 0
+    print("SUCCESS: BulkWriteError details for unordered and ordered writes")
+
+    # Upserts seed the new document from the filter's equality conditions
+    counters = db.counters
+    await counters.update_one({'_id': 'global', 'kind': 'totals', 'n': {'$gt': 5}},
+                              {'$inc': {'n': 1}, '$setOnInsert': {'created': True}}, upsert=True)
+    assert await counters.find_one({'_id': 'global'}) == {'_id': 'global', 'kind': 'totals', 'n': 1, 'created': True}
+    doc = await counters.find_one_and_update({'_id': 'global'}, {'$inc': {'n': 2}, '$setOnInsert': {'created': False}},
+                                             upsert=True, return_document=ReturnDocument.AFTER)
+    assert doc['n'] == 3 and doc['created'] is True, doc
+    print("SUCCESS: upserts seed from the filter and $setOnInsert only applies on insert")
+
+    # Aggregation: $dateToString and $topN
+    orders = db.orders
+    await orders.insert_many([
+        {'vendor': 'v1', 'amount': 10, 'at': datetime(2024, 1, 5, 8, 30)},
+        {'vendor': 'v1', 'amount': 30, 'at': datetime(2024, 1, 20)},
+        {'vendor': 'v1', 'amount': 20, 'at': datetime(2024, 2, 1)},
+        {'vendor': 'v2', 'amount': 5, 'at': datetime(2024, 2, 3)},
+    ])
+    months = [row async for row in orders.aggregate([
+        {'$group': {'_id': {'$dateToString': {'format': '%Y-%m', 'date': '$at'}}, 'total': {'$sum': '$amount'}}},
+        {'$sort': {'_id': 1}}
+    ])]
+    assert months == [{'_id': '2024-01', 'total': 40}, {'_id': '2024-02', 'total': 25}], months
+    top = [row async for row in orders.aggregate([
+        {'$group': {'_id': '$vendor', 'top': {'$topN': {'n': 2, 'sortBy': {'amount': -1}, 'output': '$amount'}}}},
+        {'$sort': {'_id': 1}}
+    ])]
+    assert top == [{'_id': 'v1', 'top': [30, 20]}, {'_id': 'v2', 'top': [5]}], top
+    print("SUCCESS: $dateToString and $topN aggregations")
+
+    # Collations compare strings case-insensitively and need a matching index
+    tasks = db.tasks
+    await tasks.insert_many([{'_id': i, 'status': status} for i, status in
+                             enumerate(['Active', 'active', 'inProgress', 'ON hold', 'Done'])])
+    await tasks.create_index('status')
+    await tasks.create_index('status', collation={'locale': 'en', 'strength': 2}, name='status_ci')
+    collation = {'locale': 'en', 'strength': 2}
+    assert await tasks.count_documents({'status': 'ACTIVE'}, collation=collation) == 2
+    assert await tasks.count_documents({'status': 'ACTIVE'}) == 0
+    assert await ids(tasks, {'status': {'$in': ['inprogress', 'on HOLD']}}, collation=collation) == [2, 3]
+    assert await ids(tasks, {'status': {'$gte': 'done', '$lt': 'j'}}, collation=collation) == [2, 4]
+    plan = (await tasks.find({'status': 'active'}, collation=collation).explain())['queryPlanner']['winningPlan']
+    assert plan['inputStage']['indexName'] == 'status_ci', plan
+    plan = (await tasks.find({'status': 'active'}).explain())['queryPlanner']['winningPlan']
+    assert plan['inputStage']['indexName'] == 'status_1', plan
+    print("SUCCESS: strength 2 collation matches any casing through the collated index")
+
+    # Sessions and transactions run the same code paths (without rollback)
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            assert session.in_transaction
+            await orders.insert_one({'vendor': 'v3', 'amount': 1}, session=session)
+        assert not session.in_transaction
+        result = await session.with_transaction(
+            lambda s: orders.update_one({'vendor': 'v3'}, {'$inc': {'amount': 1}}, session=s))
+        assert result.modified_count == 1
+    assert session.has_ended
+    assert (await orders.find_one({'vendor': 'v3'}))['amount'] == 2
+    try:
+        client.watch
+        raise AssertionError("a MongoClient method became a database")
+    except AttributeError:
+        pass
+    print("SUCCESS: start_session, transactions and unsupported client methods")
+
+
+def test_memory_db():
+    print("Testing the in-memory MongoDB engine...")
+    asyncio.run(run_tests())
+    print("\nSUCCESS: All tests completed successfully!")
+
+
+if __name__ == "__main__":
+    test_memory_db()
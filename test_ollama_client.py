@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Exercise OllamaClient against a local fake Ollama server (no model needed)"""
+
+import sys
+import os
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from services.ollama_client import OllamaClient, OllamaUnavailable
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Answers /api/tags and /api/generate like Ollama; ``mode`` switches failure behaviour"""
+    mode = "ok"
+    tag_requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            FakeOllama.tag_requests += 1
+            if FakeOllama.mode == "down":
+                self._send(503, b"{}")
+            else:
+                self._send(200, json.dumps({"models": [{"name": "llama2"}]}).encode())
+        else:
+            self._send(404, b"{}")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if FakeOllama.mode == "down":
+            self._send(503, b"{}")
+            return
+        if not payload.get("stream"):
+            self._send(200, json.dumps({"response": " Hello there ", "done": True}).encode())
+            return
+
+        lines = [
+            json.dumps({"response": "Hel", "done": False}),
+            "{not json",
+            json.dumps({"response": "lo", "done": False}),
+            json.dumps({"response": "", "done": True}),
+        ]
+        self._send(200, ("\n".join(lines) + "\n").encode(), "application/x-ndjson")
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_tests(base_url):
+    client = OllamaClient(base_url=base_url, probe_ttl=0.5, failure_threshold=2, cooldown=1.0)
+    try:
+        # One-shot generation
+        text = await client.generate("hi")
+        assert text == "Hello there", text
+        print("SUCCESS: generate returned the full response")
+
+        # Streaming relays tokens and skips the malformed line
+        tokens = [token async for token in client.stream_generate("hi")]
+        assert tokens == ["Hel", "lo"], tokens
+        print("SUCCESS: stream_generate relayed tokens past a malformed chunk")
+
+        # The availability probe is cached for probe_ttl
+        FakeOllama.tag_requests = 0
+        client._available = None
+        for _ in range(5):
+            assert await client.is_available()
+        assert FakeOllama.tag_requests == 1, FakeOllama.tag_requests
+        print("SUCCESS: availability probe served from cache")
+
+        # Repeated failures open the circuit; no requests are made while it is open
+        FakeOllama.mode = "down"
+        for _ in range(2):
+            try:
+                await client.generate("hi")
+            except OllamaUnavailable:
+                pass
+        assert client.circuit_open
+        FakeOllama.tag_requests = 0
+        assert not await client.is_available()
+        assert FakeOllama.tag_requests == 0
+        print("SUCCESS: circuit opened after repeated failures")
+
+        # After the cooldown a successful probe closes it again
+        FakeOllama.mode = "ok"
+        await asyncio.sleep(1.1)
+        assert await client.is_available()
+        assert not client.circuit_open
+        print("SUCCESS: circuit closed after cooldown")
+    finally:
+        await client.aclose()
+
+
+def test_ollama_client():
+    print("Testing OllamaClient against a fake Ollama server...")
+    server = start_server()
+    try:
+        asyncio.run(run_tests(f"http://127.0.0.1:{server.server_address[1]}"))
+        print("\nSUCCESS: All tests completed successfully!")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_ollama_client()